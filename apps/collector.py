@@ -14,13 +14,31 @@ import sys
 import time
 import argparse
 import sqlite3
-from typing import Dict, Any, Optional
+import threading
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
 
 from utils.logger import get_logger
 from utils.config import config
 from utils.modbus.client import create_modbus_client, connect_client, close_client
 from utils.modbus.motor import SinamicV20
-from utils.database.operations import create_database_if_not_exists, generate_update_query
+from utils.database.operations import (
+    create_database,
+    generate_history_delete_query,
+    generate_history_insert_query,
+    generate_latest_upsert_query,
+    history_table_name
+)
+from utils.database.schema import RegisterSchema, get_schema
+from utils.database.partitions import PartitionedHistory
+from utils.database.hot_store import HotStore
+from utils.data.record_log import RecordLog
+from utils.data.spool import Spool, SpoolReplayer, TARGET_DATABASE, TARGET_HISTORY, spooled_values
+from utils.ipc.shared_snapshot import SnapshotPublisher
+from utils.ipc.stream import SnapshotStreamServer
 
 logger = get_logger(__name__)
 
@@ -36,13 +54,22 @@ def parse_args():
     return parser.parse_args()
 
 
-def init_database(db_path: str, table_name: str) -> sqlite3.Connection:
+def init_database(
+    db_path: str,
+    table_name: str,
+    fleet: bool = False,
+    values: Optional[str] = None,
+    timeout: float = 5.0
+) -> sqlite3.Connection:
     """
     Initialize the database connection and create table if needed.
     
     Args:
         db_path: Path to the SQLite database file
         table_name: Name of the table to use
+        fleet: Whether to create the per-device latest-value and history tables
+        values: How register values are stored ('raw', 'scaled' or 'generated')
+        timeout: Time to wait for a database lock in seconds
         
     Returns:
         Database connection object
@@ -54,11 +81,11 @@ def init_database(db_path: str, table_name: str) -> sqlite3.Connection:
             os.makedirs(db_dir)
             logger.info(f"Created directory for database: {db_dir}")
         
-        # Connect to database
-        conn = sqlite3.connect(db_path)
-        
         # Create table if it doesn't exist
-        create_database_if_not_exists(conn, table_name)
+        create_database(db_path, table_name, fleet, values)
+        
+        # Connect to database
+        conn = sqlite3.connect(db_path, timeout=timeout)
         
         logger.info(f"Database initialized at {db_path}")
         return conn
@@ -68,11 +95,41 @@ def init_database(db_path: str, table_name: str) -> sqlite3.Connection:
         raise
 
 
+@lru_cache(maxsize=None)
+def table_queries(table_name: str, schema: RegisterSchema) -> Tuple[str, str, str]:
+    """
+    Get the queries writing one device's snapshot, generated once per table.
+    
+    Args:
+        table_name: Snapshot table name
+        schema: Register schema of the tables
+        
+    Returns:
+        Tuple of (snapshot update query, latest-value upsert query, history insert query)
+    """
+    return (
+        schema.update_sql(table_name),
+        generate_latest_upsert_query(table_name, schema.columns),
+        generate_history_insert_query(table_name, schema.columns)
+    )
+
+
 def collect_and_store_data(
     inverter: SinamicV20,
     conn: sqlite3.Connection,
     table_name: str,
-    row_id: int = 0
+    row_id: int = 0,
+    history: Optional[PartitionedHistory] = None,
+    record_log: Optional[RecordLog] = None,
+    publisher: Optional[SnapshotPublisher] = None,
+    stream: Optional[SnapshotStreamServer] = None,
+    fleet: bool = False,
+    update_snapshot: bool = True,
+    commit: bool = True,
+    schema: Optional[RegisterSchema] = None,
+    spool: Optional[Spool] = None,
+    uncommitted: Optional[List[Tuple[int, float, List[Optional[int]]]]] = None,
+    snapshot: Optional[Tuple[float, List[Optional[int]]]] = None
 ) -> bool:
     """
     Collect data from the inverter and store it in the database.
@@ -82,27 +139,85 @@ def collect_and_store_data(
         conn: Database connection
         table_name: Table name to update
         row_id: ID of the row to update
+        history: Optional partitioned history store to append the snapshot to
+        record_log: Optional memory-mapped record log to append the raw registers to
+        publisher: Optional shared-memory channel to publish the latest snapshot to
+        stream: Optional Unix socket stream to push the snapshot to subscribers
+        fleet: Whether to write the snapshot to the per-device fleet tables
+        update_snapshot: Whether to update the row_id row of the snapshot table
+        commit: Whether to commit the transaction, False to batch several devices
+        schema: Register schema of the tables, None to use the configured one
+        spool: Optional spool receiving the snapshot if the database or history
+            can't be written
+        uncommitted: Optional list collecting (device ID, timestamp, raw values)
+            of fleet rows left uncommitted, to spool them if the commit fails
+        snapshot: Optional (timestamp, raw values) already read from the
+            inverter, None to read it now
         
     Returns:
         True if successful, False otherwise
     """
     try:
-        # Get data from inverter
-        data = inverter.read_raw_all_address_convert_dict()
+        # Get data from inverter, unless it was read already
+        if snapshot is None:
+            snapshot = (time.time(), inverter.read_raw_all_address())
+        timestamp, raw_values = snapshot
+        schema = schema or get_schema()
+        values = schema.convert(raw_values)
         
-        if not data:
+        if not values:
             logger.warning("No data received from inverter")
             return False
             
-        # Generate update query
-        update_query = generate_update_query(table_name, data, row_id)
+        # Publish to consumers first, so they don't wait on the database
+        if publisher is not None:
+            publisher.publish(timestamp, raw_values)
+        if stream is not None:
+            stream.publish(timestamp, raw_values)
+            
+        update_query, upsert_query, insert_query = table_queries(table_name, schema)
+        failed = 0
         
-        # Execute query
-        cursor = conn.cursor()
-        cursor.execute(update_query)
-        conn.commit()
+        try:
+            cursor = conn.cursor()
+            
+            if update_snapshot:
+                cursor.execute(update_query, values + (row_id,))
+                
+            if fleet:
+                row = (inverter.slave_id, timestamp) + values
+                cursor.execute(upsert_query, row)
+                cursor.execute(insert_query, row)
+                
+            if commit:
+                conn.commit()
+            elif fleet and uncommitted is not None:
+                uncommitted.append((inverter.slave_id, timestamp, raw_values))
+                
+        except sqlite3.Error as e:
+            if spool is None:
+                raise
+            logger.warning(f"Database unavailable, spooling snapshot: {e}")
+            # Only the fleet history has to be caught up, the snapshot row is refreshed next cycle
+            failed |= TARGET_DATABASE if fleet else 0
         
-        logger.debug(f"Data collected and stored with {len(data)} parameters")
+        # Append to history
+        if history is not None:
+            try:
+                history.append(timestamp, dict(zip(schema.columns, values)), inverter.slave_id)
+            except (sqlite3.Error, OSError) as e:
+                if spool is None:
+                    raise
+                logger.warning(f"History unavailable, spooling snapshot: {e}")
+                failed |= TARGET_HISTORY
+                
+        if failed:
+            spool.append(inverter.slave_id, timestamp, raw_values, failed)
+            
+        if record_log is not None:
+            record_log.append(timestamp, raw_values)
+        
+        logger.debug(f"Data collected and stored with {len(values)} parameters")
         return True
         
     except Exception as e:
@@ -110,6 +225,96 @@ def collect_and_store_data(
         return False
 
 
+def commit_cycle(
+    conn: sqlite3.Connection,
+    uncommitted: List[Tuple[int, float, List[Optional[int]]]],
+    spool: Optional[Spool] = None
+) -> bool:
+    """
+    Commit the rows written during a collection cycle.
+    
+    If the commit fails, the transaction is rolled back and the fleet
+    rows it held are spooled for replay.
+    
+    Args:
+        conn: Database connection
+        uncommitted: (device ID, timestamp, raw values) of the uncommitted fleet rows
+        spool: Optional spool receiving the rows if the commit fails
+        
+    Returns:
+        True if the cycle was committed, False otherwise
+    """
+    try:
+        conn.commit()
+        return True
+        
+    except sqlite3.Error as e:
+        logger.warning(f"Error committing collection cycle: {e}")
+        conn.rollback()
+        
+        if spool is not None:
+            for device_id, timestamp, raw_values in uncommitted:
+                spool.append(device_id, timestamp, raw_values, TARGET_DATABASE)
+        return False
+        
+    finally:
+        uncommitted.clear()
+
+
+def replay_spooled(
+    records: np.ndarray,
+    conn: sqlite3.Connection,
+    table_name: str,
+    schema: RegisterSchema,
+    history: Optional[PartitionedHistory] = None,
+    lock: Optional[threading.RLock] = None
+) -> None:
+    """
+    Write spooled snapshots to the stores they missed, in bulk.
+    
+    Fleet history rows are inserted with a single executemany in one
+    transaction; the latest-value table is only updated by snapshots newer
+    than the row it holds. Rows already stored for the same device and
+    timestamp are replaced, so replaying a segment again after a failure
+    doesn't duplicate the rows that were written the first time.
+    
+    Args:
+        records: Array of spool records in append order
+        conn: Database connection of the replay thread, or the hot store's
+        table_name: Snapshot table name
+        schema: Register schema of the tables
+        history: Partitioned history store, shared with the collection loop
+        lock: Lock held while writing to a connection shared with the
+            collection loop (the hot store's)
+        
+    Raises:
+        sqlite3.Error: If the database is still unavailable
+    """
+    raw_rows = spooled_values(records)
+    rows = [
+        (int(device_id), float(ts)) + schema.convert(raw)
+        for device_id, ts, raw in zip(records['device_id'], records['ts'], raw_rows)
+    ]
+    to_database = [row for row, targets in zip(rows, records['targets']) if targets & TARGET_DATABASE]
+    to_history = [row for row, targets in zip(rows, records['targets']) if targets & TARGET_HISTORY]
+    
+    if to_history and history is not None:
+        for device_id in sorted({row[0] for row in to_history}):
+            history.append_many(
+                [(row[1], dict(zip(schema.columns, row[2:]))) for row in to_history if row[0] == device_id],
+                device_id,
+                replace=True
+            )
+            
+    if to_database:
+        with lock or nullcontext(), conn:
+            conn.executemany(generate_history_delete_query(table_name), [row[:2] for row in to_database])
+            conn.executemany(generate_history_insert_query(table_name, schema.columns), to_database)
+            conn.executemany(generate_latest_upsert_query(table_name, schema.columns, only_newer=True), to_database)
+            
+    logger.debug(f"Replayed {len(to_database)} database rows and {len(to_history)} history rows")
+
+
 def main():
     """Main application entry point."""
     try:
@@ -135,10 +340,20 @@ def main():
         method = modbus_config.get('method', 'rtu')
         baudrate = modbus_config.get('baudrate', 9600)
         slave_id = modbus_config.get('slave_id', 2)
+        slave_ids = modbus_config.get('slave_ids') or [slave_id]
         
         db_path = args.db_path or database_config.get('path', 'data/inverter.db')
         table_name = database_config.get('table_name', 'sinamicv20')
         row_id = database_config.get('row_id', 0)
+        fleet = database_config.get('fleet', {}).get('enabled', False) or len(slave_ids) > 1
+        schema = get_schema(database_config.get('schema', {}).get('values'))
+        history_config = database_config.get('history', {})
+        record_log_config = database_config.get('record_log', {})
+        shm_config = config.get('ipc', {}).get('shared_memory', {})
+        stream_config = config.get('ipc', {}).get('stream', {})
+        spool_config = database_config.get('spool', {})
+        spool_enabled = spool_config.get('enabled', False)
+        hot_config = database_config.get('hot_store', {})
         
         interval = args.interval or collector_config.get('interval', 1.0)
         
@@ -155,21 +370,119 @@ def main():
             logger.error("Failed to connect to Modbus client")
             return 1
             
-        # Create inverter instance
-        inverter = SinamicV20(client=client, slave_id=slave_id)
+        # Create one inverter instance per drive on the bus
+        inverters = [SinamicV20(client=client, slave_id=device_id) for device_id in slave_ids]
+        inverter = inverters[0]
+        
+        if len(inverters) > 1:
+            logger.info(
+                f"Collecting from {len(inverters)} drives; the snapshot table, record log "
+                f"and IPC channels carry drive {inverter.slave_id} only"
+            )
         
         # Initialize database
-        conn = init_database(db_path, table_name)
+        # With a spool, a locked database is spooled around instead of waited on
+        lock_timeout = spool_config.get('lock_timeout', 0.1) if spool_enabled else 5.0
+        conn = init_database(db_path, table_name, fleet, schema.values, lock_timeout)
+        
+        # Move the database to memory if the hot store is enabled
+        hot = None
+        if hot_config.get('enabled', False):
+            conn.close()
+            hot = HotStore(db_path)
+            conn = hot.connection
+            if fleet and hot_config.get('retention'):
+                hot.retain(history_table_name(table_name), hot_config['retention'])
+        
+        # Initialize partitioned history if enabled
+        history = None
+        if history_config.get('enabled', False):
+            history = PartitionedHistory(
+                columns=schema.columns,
+                directory=history_config.get('path'),
+                table_name=table_name,
+                period=history_config.get('partition'),
+                retention=history_config.get('retention'),
+                column_defs=schema.column_defs
+            )
+        
+        # Initialize memory-mapped record log if enabled
+        record_log = None
+        if record_log_config.get('enabled', False):
+            record_log = RecordLog(
+                record_log_config.get('path', 'data/snapshots.rlog'),
+                capacity=record_log_config.get('capacity', 604800),
+                n_channels=inverter.ADDRESS_LENGTH
+            )
+        
+        # Create shared-memory snapshot channel if enabled
+        publisher = None
+        if shm_config.get('enabled', False):
+            publisher = SnapshotPublisher(
+                shm_config.get('name', 'modcon_snapshot'),
+                n_channels=inverter.ADDRESS_LENGTH
+            )
+        
+        # Start snapshot stream server if enabled
+        stream = None
+        if stream_config.get('enabled', False):
+            stream = SnapshotStreamServer(
+                stream_config.get('path', 'data/modcon.sock'),
+                n_channels=inverter.ADDRESS_LENGTH,
+                queue_size=stream_config.get('queue_size', 256)
+            )
+        
+        # Open the store-and-forward spool and its replay thread if enabled
+        spool = None
+        replayer = None
+        if spool_enabled:
+            spool = Spool(
+                spool_config.get('path', 'data/spool'),
+                n_channels=inverter.ADDRESS_LENGTH,
+                fsync_interval=spool_config.get('fsync_interval', 1.0),
+                fsync_batch=spool_config.get('fsync_batch', 64)
+            )
+            # The hot store's connection is shared with the loop, under its lock
+            replay_conn = hot.connection if hot is not None else sqlite3.connect(
+                db_path, timeout=5.0, check_same_thread=False
+            )
+            replay_lock = hot.lock if hot is not None else None
+            # The history store is shared with the loop, so only one instance applies retention
+            replayer = SpoolReplayer(
+                spool,
+                lambda records: replay_spooled(records, replay_conn, table_name, schema, history, replay_lock),
+                interval=spool_config.get('replay_interval', 5.0)
+            )
+        
+        # Transactions on the hot store's connection are serialized with the spool replay
+        cycle_lock = hot.lock if hot is not None else nullcontext()
         
         # Main collection loop
+        uncommitted = []
         try:
             logger.info("Starting data collection loop")
             
             while True:
                 start_time = time.time()
                 
-                # Collect and store data
-                success = collect_and_store_data(inverter, conn, table_name, row_id)
+                # Read the whole fleet before taking the lock, so the spool
+                # replay never waits on Modbus I/O
+                snapshots = [(time.time(), device.read_raw_all_address()) for device in inverters]
+                
+                # Store the data, committing once per cycle for the whole fleet
+                with cycle_lock:
+                    success = collect_and_store_data(
+                        inverter, conn, table_name, row_id, history, record_log, publisher, stream,
+                        fleet=fleet, commit=False, schema=schema, spool=spool, uncommitted=uncommitted,
+                        snapshot=snapshots[0]
+                    )
+                    for other, snapshot in zip(inverters[1:], snapshots[1:]):
+                        success = collect_and_store_data(
+                            other, conn, table_name, history=history,
+                            fleet=True, update_snapshot=False, commit=False, schema=schema,
+                            spool=spool, uncommitted=uncommitted, snapshot=snapshot
+                        ) and success
+                    success = commit_cycle(conn, uncommitted, spool) and success
                 
                 if success:
                     logger.info("Data collection cycle completed successfully")
@@ -188,7 +501,24 @@ def main():
             
         finally:
             # Clean up resources
-            conn.close()
+            if replayer is not None:
+                replayer.stop()
+                if hot is None:
+                    replay_conn.close()
+            if spool is not None:
+                spool.close()
+            if hot is not None:
+                hot.close()
+            else:
+                conn.close()
+            if history is not None:
+                history.close()
+            if record_log is not None:
+                record_log.close()
+            if publisher is not None:
+                publisher.close()
+            if stream is not None:
+                stream.close()
             close_client(client)
             logger.info("Resources cleaned up")
             
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Model Compilation Application
+
+This application exports a trained scikit-learn model (e.g. the model of
+notebooks/speed_analysis.ipynb) to a .npz file the maintainer evaluates
+with NumPy alone, and checks that the exported model gives the same
+outputs as the original.
+
+Usage:
+    python -m apps.compile_model MODEL [OUTPUT] [--check-rows N]
+"""
+
+import sys
+import time
+import argparse
+import warnings
+from pathlib import Path
+
+import numpy as np
+from joblib import load
+
+from utils.logger import get_logger
+from utils.ml.kernel import NumpyClassifier, check_parity, export_model
+
+logger = get_logger(__name__)
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description='Export a trained model for NumPy-only inference')
+    parser.add_argument('model', help='Trained model file (.joblib)')
+    parser.add_argument('output', nargs='?', help='Output file (default: the model file with a .npz suffix)')
+    parser.add_argument('--check-rows', type=int, default=10000,
+                        help='Number of random register snapshots the outputs are compared on')
+    parser.add_argument('--no-compress', action='store_true', help='Store the arrays uncompressed')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
+    return parser.parse_args()
+
+
+def main():
+    """Main application entry point."""
+    try:
+        # Parse command-line arguments
+        args = parse_args()
+        
+        # Configure logging
+        if args.verbose:
+            import logging
+            logging.getLogger().setLevel(logging.DEBUG)
+            
+        output = args.output or str(Path(args.model).with_suffix('.npz'))
+        
+        # Models pickled by another scikit-learn version, or fitted on a
+        # DataFrame, warn on every call but export and compare fine
+        warnings.simplefilter('ignore', UserWarning)
+        model = load(args.model)
+        
+        export_model(model, output, compress=not args.no_compress)
+        kernel = NumpyClassifier.load(output)
+        
+        # Compare the outputs on random raw register values
+        rng = np.random.default_rng(0)
+        X = rng.integers(0, 65536, size=(args.check_rows, kernel.n_features_in_)).astype(np.float64)
+        difference = check_parity(model, kernel, X)
+        
+        start = time.perf_counter()
+        model.predict(X)
+        model_time = time.perf_counter() - start
+        start = time.perf_counter()
+        kernel.predict(X)
+        kernel_time = time.perf_counter() - start
+        
+        logger.info(
+            f"Outputs match on {X.shape[0]} rows (max probability difference {difference:.2g}), "
+            f"predict took {model_time * 1000:.1f} ms with the model and {kernel_time * 1000:.1f} ms with the kernel"
+        )
+        logger.info(f"Wrote {output} ({Path(output).stat().st_size} bytes)")
+        return 0
+        
+    except Exception as e:
+        logger.exception(f"Error in model compilation: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+History Export Application
+
+This application exports a time range of the inverter history to an
+Arrow IPC or Parquet file, for analysis with pandas, Polars, DuckDB or
+any other Arrow-aware tool.
+
+Usage:
+    python -m apps.export OUTPUT [--start TIME] [--end TIME] [--device ID] [--columns NAME ...]
+"""
+
+import sys
+import argparse
+
+from utils.logger import get_logger
+from utils.config import config
+from utils.database.export import EXPORT_FORMATS, export_history, parse_time
+
+logger = get_logger(__name__)
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description='Export the history to Arrow IPC or Parquet')
+    parser.add_argument('output', help='Output file (.parquet or .arrow)')
+    parser.add_argument('--config', type=str, help='Path to configuration file')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), help='Output format (default: from the file name)')
+    parser.add_argument('--source', choices=['database', 'partitions'], default='database',
+                        help='Export the history table of the database or the partitioned history files')
+    parser.add_argument('--db-path', type=str, help='Database file path')
+    parser.add_argument('--history-dir', type=str, help='Directory of the partitioned history files')
+    parser.add_argument('--device', type=int, help='Device ID to export (default: every device)')
+    parser.add_argument('--start', type=str, help='Range start, Unix timestamp or ISO 8601 (UTC)')
+    parser.add_argument('--end', type=str, help='Range end (exclusive), Unix timestamp or ISO 8601 (UTC)')
+    parser.add_argument('--columns', nargs='+', help='Register columns to export (default: all)')
+    parser.add_argument('--batch-rows', type=int, default=65536, help='Number of rows per record batch')
+    parser.add_argument('--compression', type=str, help='Compression codec, e.g. zstd, lz4 or snappy')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
+    return parser.parse_args()
+
+
+def main():
+    """Main application entry point."""
+    try:
+        # Parse command-line arguments
+        args = parse_args()
+        
+        # Configure logging
+        if args.verbose:
+            import logging
+            logging.getLogger().setLevel(logging.DEBUG)
+        
+        # Load config file if specified
+        if args.config:
+            config.load_from_file(args.config)
+            
+        total = export_history(
+            args.output,
+            fmt=args.format,
+            columns=args.columns,
+            device=args.device,
+            t0=parse_time(args.start),
+            t1=parse_time(args.end),
+            source=args.source,
+            db_path=args.db_path,
+            history_dir=args.history_dir,
+            batch_rows=args.batch_rows,
+            compression=args.compression
+        )
+        
+        logger.info(f"Export finished: {total} rows written to {args.output}")
+        return 0
+        
+    except Exception as e:
+        logger.exception(f"Error in export application: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+CSV Ingest Application
+
+This application bulk-loads CSV captures, such as the files in assets/data
+or those written by DataCollector in the field, into the history table of
+the SQLite database.
+
+Usage:
+    python -m apps.ingest [--db-path DB_PATH] [--device-id ID] FILE_OR_DIR [...]
+"""
+
+import sys
+import argparse
+from pathlib import Path
+from typing import List
+
+from utils.logger import get_logger
+from utils.config import config
+from utils.database.ingest import ingest_csv_files
+
+logger = get_logger(__name__)
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description='Bulk-load CSV captures into the database')
+    parser.add_argument('paths', nargs='+', help='CSV files, or directories searched for *.csv')
+    parser.add_argument('--config', type=str, help='Path to configuration file')
+    parser.add_argument('--db-path', type=str, help='Database file path')
+    parser.add_argument('--device-id', type=int, help='Device ID to store the rows under')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='Sampling interval in seconds, for files without a TIMESTAMP column')
+    parser.add_argument('--workers', type=int, help='Number of parsing processes (default: one per CPU)')
+    parser.add_argument('--chunk-rows', type=int, default=50000, help='Number of lines parsed at once')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
+    return parser.parse_args()
+
+
+def expand_paths(paths: List[str]) -> List[str]:
+    """
+    Expand directories to the CSV files they contain.
+    
+    Args:
+        paths: File and directory paths
+        
+    Returns:
+        Sorted list of CSV file paths
+    """
+    files = []
+    
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(str(p) for p in path.rglob('*.csv')))
+        elif path.exists():
+            files.append(str(path))
+        else:
+            logger.warning(f"Skipping missing path: {path}")
+            
+    return files
+
+
+def main():
+    """Main application entry point."""
+    try:
+        # Parse command-line arguments
+        args = parse_args()
+        
+        # Configure logging
+        if args.verbose:
+            import logging
+            logging.getLogger().setLevel(logging.DEBUG)
+        
+        # Load config file if specified
+        if args.config:
+            config.load_from_file(args.config)
+            
+        files = expand_paths(args.paths)
+        if not files:
+            logger.error("No CSV files to ingest")
+            return 1
+            
+        device_id = args.device_id
+        if device_id is None:
+            device_id = config.get('modbus', {}).get('slave_id', 2)
+            
+        total = ingest_csv_files(
+            files,
+            db_path=args.db_path,
+            device_id=device_id,
+            interval=args.interval,
+            workers=args.workers,
+            chunk_rows=args.chunk_rows
+        )
+        
+        logger.info(f"Ingest finished: {total} rows from {len(files)} files")
+        return 0
+        
+    except Exception as e:
+        logger.exception(f"Error in ingest application: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
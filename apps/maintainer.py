@@ -16,13 +16,24 @@ import time
 import argparse
 import sqlite3
 import numpy as np
-from typing import Dict, Any, Optional, Tuple, List
+from typing import Dict, Any, Optional, Sequence, Tuple, List
 from pathlib import Path
-from joblib import load
 
 from utils.logger import get_logger
+from utils.alerts import AlertDispatcher, AlertManager, BandClassifier, create_sink
 from utils.config import config
-from utils.database.operations import execute_query
+from utils.modbus.motor import SinamicV20
+from utils.database.operations import history_table_name, latest_table_name
+from utils.database.schema import RegisterSchema, get_schema
+from utils.database.watch import DataVersionWatcher, fetch_rows_after, last_rowid
+from utils.data.record_log import unpack_snapshot
+from utils.ipc.shared_snapshot import SnapshotReader
+from utils.ipc.stream import SnapshotSubscriber
+from utils.ml.anomaly import AnomalyEvent, StreamingAnomalyDetector
+from utils.ml.features import RollingFeatureEngine
+from utils.ml.inference import BatchPredictor, BatchResult, feature_indices, snapshot_features
+from utils.ml.registry import ModelRegistry
+from utils.ml.rules import RuleEngine, RuleEvent
 
 logger = get_logger(__name__)
 
@@ -43,9 +54,48 @@ DEFAULT_CONFIG = {
     },
     "maintainer": {
         "interval": 2.0,
+        "source": "database",
+        "shm_name": "modcon_snapshot",
+        "stream_path": "data/modcon.sock",
         "model_path": "models/model.joblib",
         "rpm_conversion_factor": 8.10/242,
-        "speed_field_index": 24
+        "speed_field_index": 24,
+        "model_reload_interval": 5.0,
+        "model_mmap_mode": "r",
+        "batch_window": 0,
+        "batch_max_delay": 2.0,
+        "rolling_features": False,
+        "feature_channels": ["SPEED", "CURRENT", "TORQUE", "DC_BUS_VOLTS"],
+        "feature_windows": [10, 60, 300],
+        "fleet": False,
+        "event_driven": False,
+        "event_poll_interval": 0.05
+    },
+    "anomaly": {
+        "enabled": False,
+        "channels": None,
+        "alpha": 0.05,
+        "z_threshold": 4.0,
+        "cusum_k": 0.5,
+        "cusum_h": 8.0,
+        "warmup": 30,
+        "sensitivity": {}
+    },
+    "rules": {
+        "enabled": False,
+        "limits": True,
+        "exclude": ["FREQ_ACTUAL", "LOW_PASS", "PRM_ERROR_CODE"],
+        "constants": {},
+        "rules": []
+    },
+    "alerts": {
+        "enabled": True,
+        "speed_hysteresis": 0.3,
+        "repeat_interval": 300.0,
+        "rate_limit": 30,
+        "rate_window": 60.0,
+        "queue_size": 1000,
+        "sinks": [{"type": "log"}]
     }
 }
 
@@ -57,6 +107,14 @@ def parse_args():
     parser.add_argument('--interval', type=float, help='Monitoring interval in seconds')
     parser.add_argument('--db-path', type=str, help='Database file path')
     parser.add_argument('--model-path', type=str, help='Path to ML model file')
+    parser.add_argument('--source', type=str, choices=['database', 'shared_memory', 'stream'],
+                        help='Where to read the latest snapshot from')
+    parser.add_argument('--batch-window', type=int,
+                        help='Score snapshots in windows of this many rows (0 to score the latest snapshot only)')
+    parser.add_argument('--fleet', action='store_true',
+                        help='Evaluate the latest snapshot of every device each cycle')
+    parser.add_argument('--event-driven', action='store_true',
+                        help='Wait for new snapshots and evaluate each one once instead of polling every interval')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
     return parser.parse_args()
 
@@ -88,58 +146,791 @@ def connect_to_database(db_path: str) -> sqlite3.Connection:
         raise
 
 
-def load_ml_model(model_path: str) -> Any:
+def get_motor_data(
+    conn: sqlite3.Connection,
+    table_name: str,
+    row_id: int,
+    columns: Optional[List[str]] = None
+) -> Tuple[Optional[List[Any]], Optional[str]]:
     """
-    Load the machine learning model.
+    Get motor data from the database.
     
     Args:
-        model_path: Path to the saved model file
+        conn: Database connection
+        table_name: Name of the table
+        row_id: ID of the row to fetch
+        columns: SQL expressions of the columns to fetch after the ID, None for all columns
         
     Returns:
-        Loaded model object
+        Tuple containing (data row, error message if any)
+    """
+    try:
+        select = f"ID, {', '.join(columns)}" if columns else "*"
+        query = f"SELECT {select} FROM {table_name} WHERE ID = {row_id}"
+        result = conn.execute(query).fetchall()
         
-    Raises:
-        FileNotFoundError: If the model file doesn't exist
+        if not result or not result[0]:
+            return None, "No data found in database"
+            
+        return result[0], None
+        
+    except Exception as e:
+        logger.exception(f"Error fetching motor data: {e}")
+        return None, str(e)
+
+
+def get_motor_data_from_snapshot(
+    reader: SnapshotReader,
+    inverter: SinamicV20,
+    row_id: int
+) -> Tuple[Optional[List[Any]], Optional[str]]:
     """
-    if not os.path.exists(model_path):
-        logger.error(f"Model file not found: {model_path}")
-        raise FileNotFoundError(f"Model file not found: {model_path}")
+    Get motor data from the shared-memory snapshot channel.
+    
+    The snapshot is returned in the same layout as a database row
+    (ID followed by the parameter columns), so both sources can be
+    analyzed the same way. Registers flagged invalid in the snapshot are
+    None, like NULL columns, and evaluate_snapshot treats them as missing.
+    
+    Args:
+        reader: Attached shared-memory snapshot reader
+        inverter: SinamicV20 instance providing the register map
+        row_id: ID to report in the first column
         
+    Returns:
+        Tuple containing (data row, error message if any)
+    """
     try:
-        model = load(model_path)
-        logger.info(f"Loaded model from {model_path}")
-        return model
+        _, record = reader.read()
+        
+        if record is None:
+            return None, "No snapshot published yet"
+            
+        _, values = unpack_snapshot(record)
+        data = inverter.convert_values_to_dict(values)
+        
+        return [row_id] + list(data.values()), None
+        
     except Exception as e:
-        logger.exception(f"Error loading model: {e}")
-        raise
+        logger.exception(f"Error reading motor snapshot: {e}")
+        return None, str(e)
 
 
-def get_motor_data(conn: sqlite3.Connection, table_name: str, row_id: int) -> Tuple[Optional[List[Any]], Optional[str]]:
+def get_motor_data_from_stream(
+    subscriber: SnapshotSubscriber,
+    inverter: SinamicV20,
+    row_id: int,
+    timeout: float
+) -> Tuple[Optional[List[Any]], Optional[str]]:
     """
-    Get motor data from the database.
+    Get the newest motor data pushed on the snapshot stream.
+    
+    Snapshots that arrived since the last call are drained and only the
+    newest one is returned. If none arrived yet, waits up to timeout for one.
+    Registers flagged invalid in the snapshot are None, as in
+    get_motor_data_from_snapshot.
     
     Args:
-        conn: Database connection
-        table_name: Name of the table
-        row_id: ID of the row to fetch
+        subscriber: Connected snapshot stream subscriber
+        inverter: SinamicV20 instance providing the register map
+        row_id: ID to report in the first column
+        timeout: Maximum time to wait for a snapshot in seconds
         
     Returns:
         Tuple containing (data row, error message if any)
     """
     try:
-        query = f"SELECT * FROM {table_name} WHERE ID = {row_id}"
-        result = execute_query(conn, query)
+        records = subscriber.recv_pending()
+        record = records[-1] if records else subscriber.recv(timeout=timeout)
         
-        if not result or not result[0]:
-            return None, "No data found in database"
+        if record is None:
+            return None, f"No snapshot received within {timeout}s"
             
-        return result[0], None
+        _, values = unpack_snapshot(record)
+        data = inverter.convert_values_to_dict(values)
+        
+        return [row_id] + list(data.values()), None
         
     except Exception as e:
-        logger.exception(f"Error fetching motor data: {e}")
+        logger.exception(f"Error reading motor snapshot stream: {e}")
         return None, str(e)
 
 
+def get_history_after(
+    conn: sqlite3.Connection,
+    history_table: str,
+    columns: List[str],
+    after: int
+) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get every history row of every device inserted after a rowid.
+    
+    Rows are read by rowid rather than by timestamp, so rows inserted
+    late with older timestamps (e.g. spool replays) or sharing the
+    timestamp of the last row read are not skipped.
+    
+    Args:
+        conn: Database connection
+        history_table: Name of the history table
+        columns: SQL expressions of the feature columns
+        after: Rowid of the last row already read
+        
+    Returns:
+        Tuple of (rowid of the last row read, device IDs, timestamps,
+        feature matrix with NaN for missing values), in insertion order
+    """
+    # Rowids only go back if the newest rows were deleted (e.g. every
+    # row expired); resume after the current last row then
+    newest = last_rowid(conn, history_table)
+    if newest < after:
+        logger.warning(f"History rows after rowid {newest} were deleted, resuming from there")
+        after = newest
+        
+    devices = [np.zeros(0, dtype=np.int64)]
+    timestamps = [np.zeros(0)]
+    features = [np.zeros((0, len(columns)))]
+    
+    # Read everything committed since the last rows, in chunks
+    while True:
+        rowids, chunk_devices, chunk_timestamps, chunk = fetch_rows_after(conn, history_table, columns, after)
+        if not rowids.size:
+            break
+        after = int(rowids[-1])
+        devices.append(chunk_devices)
+        timestamps.append(chunk_timestamps)
+        features.append(chunk)
+        
+    return after, np.concatenate(devices), np.concatenate(timestamps), np.vstack(features)
+
+
+def require_history_table(conn: sqlite3.Connection, history_table: str, mode: str) -> None:
+    """
+    Check that the history table read by a monitoring mode exists.
+    
+    The collector only writes the history table in fleet mode, so a
+    single-drive database has none.
+    
+    Args:
+        conn: Database connection
+        history_table: Name of the history table
+        mode: Name of the monitoring mode, for the error message
+        
+    Raises:
+        ValueError: If the history table doesn't exist
+    """
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?"
+    if conn.execute(query, (history_table,)).fetchone() is None:
+        raise ValueError(
+            f"{mode} with the database source reads the {history_table} table, which the collector "
+            f"only writes in fleet mode; enable database.fleet.enabled or use the stream or "
+            f"shared_memory source"
+        )
+
+
+def get_fleet_data(
+    conn: sqlite3.Connection,
+    table_name: str,
+    columns: List[str]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Get the latest snapshot of every device in one query.
+    
+    Args:
+        conn: Database connection
+        table_name: Name of the snapshot table the latest values belong to
+        columns: SQL expressions of the feature columns
+        
+    Returns:
+        Tuple of (device IDs, timestamps, feature matrix with NaN for missing values),
+        ordered by device
+    """
+    query = f"SELECT DEVICE_ID, TS, {', '.join(columns)} FROM {latest_table_name(table_name)} ORDER BY DEVICE_ID"
+    rows = conn.execute(query).fetchall()
+    
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros((0, len(columns)))
+        
+    data = np.array(rows, dtype=np.float64)
+    return data[:, 0].astype(np.int64), data[:, 1], data[:, 2:]
+
+
+def report_batch(result: BatchResult, predictor: BatchPredictor) -> None:
+    """
+    Log the predictions and the inference latency of a scored window.
+    
+    Args:
+        result: Scored window
+        predictor: Predictor that scored it, for latency statistics
+    """
+    n = result.predictions.shape[0]
+    classes, counts = np.unique(result.predictions, return_counts=True)
+    summary = ", ".join(f"{c}: {k}" for c, k in zip(classes.tolist(), counts.tolist()))
+    
+    logger.info(
+        f"ML batch of {n} snapshots from {len(np.unique(result.devices))} devices "
+        f"scored in {result.latency * 1000:.2f} ms ({result.latency * 1e6 / max(n, 1):.1f} us/snapshot) "
+        f"=> {summary or 'no complete snapshot'}"
+    )
+    if result.skipped:
+        logger.warning(f"Skipped {result.skipped} snapshots with unread registers")
+        
+    stats = predictor.latency_stats()
+    logger.debug(f"Batch latency over {stats['batches']} batches: mean {stats['mean_ms']:.2f} ms, "
+                 f"p95 {stats['p95_ms']:.2f} ms, max {stats['max_ms']:.2f} ms")
+
+
+def alert_speeds(
+    alerts: AlertManager,
+    speed_bands: BandClassifier,
+    devices: np.ndarray,
+    speeds: np.ndarray,
+    timestamp: Optional[float] = None
+) -> np.ndarray:
+    """
+    Classify the speed of each device with hysteresis and update its speed alerts.
+    
+    Args:
+        alerts: Alert manager
+        speed_bands: Classifier of the speeds into SPEED_RANGES
+        devices: Device IDs, each at most once
+        speeds: Speed of each device
+        timestamp: Time of the speeds, None for now
+        
+    Returns:
+        Speed status of each device
+    """
+    statuses = speed_bands.classify(devices.tolist(), speeds)
+    for device, speed, status in zip(devices.tolist(), speeds.tolist(), statuses.tolist()):
+        message = f"SPEED = {speed:.2f} => {status.upper()} SPEED"
+        logger.debug(f"Device {device}: {message}")
+        for band in ("slow", "high"):
+            alerts.observe(device, f"speed_{band}", status == band, message, speed, timestamp=timestamp)
+    return statuses
+
+
+def report_speeds(
+    devices: np.ndarray,
+    features: np.ndarray,
+    speed_feature: int,
+    rpm_conversion: float,
+    alerts: Optional[AlertManager] = None,
+    speed_bands: Optional[BandClassifier] = None
+) -> None:
+    """
+    Log the speed status of the newest snapshot of each device.
+    
+    Args:
+        devices: Device ID of each feature row
+        features: Feature matrix in time order
+        speed_feature: Index of the speed in the feature rows
+        rpm_conversion: Factor converting the raw speed value
+        alerts: Alert manager notified instead of logging every status, None to log them
+        speed_bands: Classifier of the speeds with hysteresis, for the alerts
+    """
+    if alerts is not None:
+        latest = {device: i for i, device in enumerate(devices.tolist())}
+        rows = np.array(list(latest.values()))
+        speeds = np.nan_to_num(features[rows, speed_feature]) * rpm_conversion
+        alert_speeds(alerts, speed_bands, np.array(list(latest)), speeds)
+        return
+        
+    for device in np.unique(devices):
+        raw_speed = features[devices == device][-1, speed_feature]
+        status, message = analyze_speed(0 if np.isnan(raw_speed) else raw_speed * rpm_conversion)
+        
+        if status in ["slow", "high"]:
+            logger.warning(f"Device {device}: {message}")
+        else:
+            logger.info(f"Device {device}: {message}")
+
+
+def evaluate_snapshot(
+    data: Sequence[Any],
+    row_id: int,
+    speed_index: int,
+    rpm_conversion: float,
+    registry: ModelRegistry,
+    engine: Optional[RollingFeatureEngine] = None,
+    detector: Optional[StreamingAnomalyDetector] = None,
+    rules: Optional[RuleEngine] = None,
+    alerts: Optional[AlertManager] = None,
+    speed_bands: Optional[BandClassifier] = None,
+    timestamp: Optional[float] = None
+) -> None:
+    """
+    Analyze the speed of one snapshot and run the detector, rules and model on it.
+    
+    Registers that could not be read are None (NULL in the database) and
+    are treated as missing: the speed check is skipped without a speed,
+    and the model only scores complete snapshots.
+    
+    Args:
+        data: Snapshot row, the ID followed by the raw feature values
+        row_id: Device ID of the snapshot
+        speed_index: Index of the speed in the row (after the ID column)
+        rpm_conversion: Factor converting the raw speed value
+        registry: Registry providing the current model version
+        engine: Rolling feature engine whose features follow the raw ones, None for raw features only
+        detector: Anomaly detector run on the snapshot, None to disable it
+        rules: Rule engine run on the snapshot, None to disable it
+        alerts: Alert manager notified of speed, rule and anomaly alerts, None to log them
+        speed_bands: Classifier of the speeds with hysteresis, for the alerts
+        timestamp: Time of the snapshot, None for now
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    features = np.array([np.nan if value is None else value for value in data[1:]], dtype=np.float64)
+    
+    # Extract and analyze speed
+    raw_speed = features[speed_index - 1] if features.size >= speed_index else 0.0
+    if np.isnan(raw_speed):
+        logger.warning("Speed could not be read, skipping the speed check")
+    else:
+        speed = raw_speed * rpm_conversion
+        
+        # Analyze speed, notifying out-of-range speeds as alerts if enabled
+        if alerts is not None:
+            alert_speeds(alerts, speed_bands, np.array([row_id]), np.array([speed], dtype=np.float64))
+        else:
+            status, message = analyze_speed(speed)
+            
+            # Log status message
+            if status in ["slow", "high"]:
+                logger.warning(message)
+            else:
+                logger.info(message)
+                
+    if detector is not None:
+        report_anomalies(detector.update([row_id], timestamp, features[np.newaxis]), alerts)
+    if rules is not None:
+        report_rule_events(rules.update([row_id], timestamp, features[np.newaxis]), alerts)
+        
+    # Add ML prediction if model is available, in the version current for this cycle
+    model = registry.model
+    if model is None:
+        return
+        
+    try:
+        if engine is not None:
+            features = np.concatenate([features, engine.update(row_id, timestamp, features)])
+        if np.isnan(features).any():
+            logger.debug("Skipping ML prediction until the snapshot and rolling windows are complete")
+            return
+            
+        prediction = model.predict([features])[0]
+        logger.info(f"ML model prediction: {prediction}")
+        if registry.reference is None:
+            registry.set_reference([features])
+    except Exception as e:
+        logger.exception(f"Error in ML prediction: {e}")
+
+
+def report_anomalies(events: List[AnomalyEvent], alerts: Optional[AlertManager] = None) -> None:
+    """
+    Log the anomaly events of the detector.
+    
+    Args:
+        events: Events of the processed snapshots
+        alerts: Alert manager de-duplicating the events, None to log them all
+    """
+    for event in events:
+        if alerts is not None:
+            alerts.event(
+                event.device, f"anomaly_{event.channel}_{event.kind}",
+                f"{event.channel} {event.kind} (value {event.value:.2f}, baseline {event.baseline:.2f}, "
+                f"score {event.score:.1f})",
+                event.value, timestamp=event.timestamp
+            )
+            continue
+        logger.warning(
+            f"Anomaly on device {event.device}: {event.channel} {event.kind} "
+            f"(value {event.value:.2f}, baseline {event.baseline:.2f}, score {event.score:.1f})"
+        )
+
+
+def report_rule_events(events: List[RuleEvent], alerts: Optional[AlertManager] = None) -> None:
+    """
+    Log the rules raised and cleared by the rule engine.
+    
+    Args:
+        events: Events of the processed snapshots
+        alerts: Alert manager notified of the events, None to log them
+    """
+    for event in events:
+        if alerts is not None:
+            alerts.observe(
+                event.device, event.rule, event.state == 'raised',
+                f"{event.channel} = {event.value:.2f} (threshold {event.threshold:.2f})",
+                event.value, event.severity, event.timestamp
+            )
+        elif event.state == 'raised':
+            log = logger.error if event.severity == 'critical' else logger.warning
+            log(f"Rule {event.rule} raised on device {event.device}: "
+                f"{event.channel} = {event.value:.2f} (threshold {event.threshold:.2f})")
+        else:
+            logger.info(f"Rule {event.rule} cleared on device {event.device}: {event.channel} = {event.value:.2f}")
+
+
+def monitor_batched(
+    predictor: BatchPredictor,
+    source: str,
+    interval: float,
+    schema: RegisterSchema,
+    conn: Optional[sqlite3.Connection],
+    history_table: str,
+    reader: Optional[SnapshotReader],
+    subscriber: Optional[SnapshotSubscriber],
+    device_id: int,
+    speed_index: int,
+    rpm_conversion: float,
+    engine: Optional[RollingFeatureEngine] = None,
+    detector: Optional[StreamingAnomalyDetector] = None,
+    registry: Optional[ModelRegistry] = None,
+    rules: Optional[RuleEngine] = None,
+    alerts: Optional[AlertManager] = None,
+    speed_bands: Optional[BandClassifier] = None
+) -> None:
+    """
+    Feed snapshots to a batch predictor until interrupted.
+    
+    From the database every history row of every device inserted after
+    startup is scored, read by rowid, from the stream every pushed
+    snapshot, and from shared memory each newly published snapshot.
+    
+    Args:
+        predictor: Batch predictor holding the model
+        source: Snapshot source ('database', 'shared_memory' or 'stream')
+        interval: Polling interval in seconds
+        schema: Register schema of the snapshots
+        conn: Database connection, for the database source
+        history_table: Name of the history table, for the database source
+        reader: Shared-memory snapshot reader, for the shared_memory source
+        subscriber: Snapshot stream subscriber, for the stream source
+        device_id: Device ID of snapshots from shared memory or the stream
+        speed_index: Index of the speed in database rows (after the ID column)
+        rpm_conversion: Factor converting the raw speed value
+        engine: Rolling feature engine whose features follow the raw ones, None for raw features only
+        detector: Anomaly detector run on every snapshot, None to disable it
+        registry: Registry providing new model versions, swapped in between cycles
+        rules: Rule engine run on every snapshot, None to disable it
+        alerts: Alert manager notified of speed, rule and anomaly alerts, None to log them
+        speed_bands: Classifier of the speeds with hysteresis, for the alerts
+    """
+    indices = feature_indices(schema)
+    raw_columns = [schema.raw_expression(name) for name in schema.register_names]
+    speed_feature = speed_index - 1
+    after = 0
+    if conn is not None:
+        require_history_table(conn, history_table, "Batched inference")
+        after = last_rowid(conn, history_table)
+    last_seq = 0
+    model_version = registry.version if registry is not None else 0
+    
+    logger.info(f"Scoring snapshots in windows of {predictor.window_size} rows")
+    
+    while True:
+        start_time = time.time()
+        
+        if registry is not None and registry.version != model_version:
+            current = registry.current
+            predictor.set_model(current.model)
+            model_version = current.version
+            logger.info(f"Scoring with model version {model_version}")
+        results: List[BatchResult] = []
+        
+        devices = np.zeros(0, dtype=np.int64)
+        timestamps = np.zeros(0)
+        features = np.zeros((0, len(indices)))
+        
+        if subscriber is not None:
+            records = subscriber.recv_pending()
+            if not records:
+                record = subscriber.recv(timeout=interval)
+                records = [record] if record is not None else []
+            if records:
+                records = np.array(records)
+                features, timestamps = snapshot_features(records, indices), records['ts']
+        elif reader is not None:
+            seq, record = reader.read()
+            if record is not None and seq != last_seq:
+                last_seq = seq
+                features, timestamps = snapshot_features(record, indices), np.atleast_1d(record['ts'])
+        else:
+            after, devices, timestamps, features = get_history_after(conn, history_table, raw_columns, after)
+                
+        if subscriber is not None or reader is not None:
+            devices = np.full(timestamps.shape[0], device_id)
+        if features.shape[0]:
+            report_speeds(devices, features, speed_feature, rpm_conversion, alerts, speed_bands)
+            if detector is not None:
+                report_anomalies(detector.update_many(devices, timestamps, features), alerts)
+            if rules is not None:
+                report_rule_events(rules.update_many(devices, timestamps, features), alerts)
+            if engine is not None:
+                features = np.hstack([features, engine.update_many(devices, timestamps, features)])
+            if registry is not None and registry.reference is None:
+                complete = features[~np.isnan(features).any(axis=1)]
+                if complete.shape[0]:
+                    registry.set_reference(complete[:predictor.window_size])
+            results = predictor.add_many(features, devices, timestamps)
+            
+        late = predictor.poll()
+        if late is not None:
+            results.append(late)
+            
+        for result in results:
+            report_batch(result, predictor)
+            
+        # The stream source already waited for data
+        if subscriber is None:
+            time.sleep(max(0, interval - (time.time() - start_time)))
+
+
+def report_fleet(
+    devices: np.ndarray,
+    speeds: np.ndarray,
+    statuses: np.ndarray,
+    predictions: Optional[np.ndarray],
+    stale: int,
+    elapsed: float,
+    warn_speeds: bool = True
+) -> None:
+    """
+    Log the state of the fleet after a cycle.
+    
+    Devices with a slow or high speed get a warning each, unless speed
+    alerts are notified instead; the other ones are only summarized, and
+    listed at debug level.
+    
+    Args:
+        devices: Device IDs evaluated in the cycle
+        speeds: Speed of each device
+        statuses: Speed status of each device
+        predictions: Model prediction of each device, None without a model
+            (entries are None for incomplete snapshots)
+        stale: Number of devices without a new snapshot since the last cycle
+        elapsed: Time spent evaluating the cycle, in seconds
+        warn_speeds: Whether to log a warning per device out of the normal speed range
+    """
+    names, counts = np.unique(statuses, return_counts=True)
+    summary = ", ".join(f"{name}: {count}" for name, count in zip(names.tolist(), counts.tolist()))
+    logger.info(f"Fleet of {devices.shape[0]} devices evaluated in {elapsed * 1000:.2f} ms => {summary}"
+                f"{f' ({stale} without a new snapshot)' if stale else ''}")
+    
+    for i in np.flatnonzero(((statuses == "slow") | (statuses == "high")) & warn_speeds):
+        _, message = analyze_speed(speeds[i])
+        logger.warning(f"Device {devices[i]}: {message}")
+        
+    if predictions is not None:
+        known = np.array([p is not None for p in predictions], dtype=bool)
+        classes, counts = np.unique(predictions[known].astype(str), return_counts=True)
+        logger.info(f"ML model predictions: {', '.join(f'{c}: {k}' for c, k in zip(classes, counts)) or 'none'}")
+        
+    for i in range(devices.shape[0]):
+        prediction = predictions[i] if predictions is not None else None
+        logger.debug(f"Device {devices[i]}: speed {speeds[i]:.2f} ({statuses[i]}), prediction {prediction}")
+
+
+def monitor_fleet(
+    conn: sqlite3.Connection,
+    table_name: str,
+    interval: float,
+    schema: RegisterSchema,
+    speed_index: int,
+    rpm_conversion: float,
+    registry: ModelRegistry,
+    engine: Optional[RollingFeatureEngine] = None,
+    detector: Optional[StreamingAnomalyDetector] = None,
+    rules: Optional[RuleEngine] = None,
+    alerts: Optional[AlertManager] = None,
+    speed_bands: Optional[BandClassifier] = None
+) -> None:
+    """
+    Evaluate the latest snapshot of every device each cycle until interrupted.
+    
+    The snapshots come from the latest-value table in one query and are
+    stacked into one matrix, so the speed check, the anomaly detector and
+    the rule engine and the model each run once per cycle whatever the
+    number of devices.
+    Devices whose snapshot didn't change since the last cycle are skipped.
+    
+    Args:
+        conn: Database connection
+        table_name: Name of the snapshot table the latest values belong to
+        interval: Monitoring interval in seconds
+        schema: Register schema of the snapshots
+        speed_index: Index of the speed in database rows (after the ID column)
+        rpm_conversion: Factor converting the raw speed value
+        registry: Registry providing the current model version
+        engine: Rolling feature engine whose features follow the raw ones, None for raw features only
+        detector: Anomaly detector run on every new snapshot, None to disable it
+        rules: Rule engine run on every new snapshot, None to disable it
+        alerts: Alert manager notified of speed, rule and anomaly alerts, None to log them
+        speed_bands: Classifier of the speeds with hysteresis, for the alerts
+    """
+    raw_columns = [schema.raw_expression(name) for name in schema.register_names]
+    speed_feature = speed_index - 1
+    last_seen: Dict[int, float] = {}
+    
+    logger.info("Evaluating the latest snapshot of every device")
+    
+    while True:
+        start_time = time.time()
+        
+        devices, timestamps, features = get_fleet_data(conn, table_name, raw_columns)
+        fresh = np.array([last_seen.get(device) != ts for device, ts in zip(devices.tolist(), timestamps.tolist())],
+                         dtype=bool)
+        stale = int(devices.shape[0] - fresh.sum())
+        devices, timestamps, features = devices[fresh], timestamps[fresh], features[fresh]
+        last_seen.update(zip(devices.tolist(), timestamps.tolist()))
+        
+        if devices.shape[0]:
+            speeds = np.nan_to_num(features[:, speed_feature]) * rpm_conversion
+            if alerts is not None:
+                statuses = alert_speeds(alerts, speed_bands, devices, speeds)
+            else:
+                statuses = classify_speeds(speeds)
+                
+            if detector is not None:
+                report_anomalies(detector.update(devices, timestamps, features), alerts)
+            if rules is not None:
+                report_rule_events(rules.update(devices, timestamps, features), alerts)
+            if engine is not None:
+                features = np.hstack([features, engine.update_many(devices, timestamps, features)])
+                
+            # Score the complete snapshots with one call to the model version current for this cycle
+            predictions = None
+            model = registry.model
+            if model is not None:
+                predictions = np.full(devices.shape[0], None, dtype=object)
+                complete = ~np.isnan(features).any(axis=1)
+                if complete.any():
+                    try:
+                        predictions[complete] = list(model.predict(features[complete]))
+                        if registry.reference is None:
+                            registry.set_reference(features[complete])
+                    except Exception as e:
+                        logger.exception(f"Error in ML prediction: {e}")
+                        
+            report_fleet(devices, speeds, statuses, predictions, stale, time.time() - start_time, alerts is None)
+        elif stale:
+            logger.debug(f"No new snapshot from the {stale} devices")
+        else:
+            logger.warning(f"No device in {latest_table_name(table_name)}")
+            
+        time.sleep(max(0, interval - (time.time() - start_time)))
+
+
+def monitor_events(
+    source: str,
+    interval: float,
+    schema: RegisterSchema,
+    conn: Optional[sqlite3.Connection],
+    history_table: str,
+    reader: Optional[SnapshotReader],
+    subscriber: Optional[SnapshotSubscriber],
+    device_id: int,
+    speed_index: int,
+    rpm_conversion: float,
+    registry: ModelRegistry,
+    poll_interval: float = 0.05,
+    engine: Optional[RollingFeatureEngine] = None,
+    detector: Optional[StreamingAnomalyDetector] = None,
+    rules: Optional[RuleEngine] = None,
+    alerts: Optional[AlertManager] = None,
+    speed_bands: Optional[BandClassifier] = None
+) -> None:
+    """
+    Evaluate every new snapshot as soon as it arrives until interrupted.
+    
+    Instead of waking up every interval, the loop blocks until new data
+    exists: on the database's data version for the database source (new
+    history rows are then read by rowid, each exactly once), on the
+    publication sequence for shared memory, and on the socket for the
+    stream. The snapshots that arrived are evaluated together, with one
+    model call. interval only bounds the wait, so that new model
+    versions are picked up while no data arrives.
+    
+    Args:
+        source: Snapshot source ('database', 'shared_memory' or 'stream')
+        interval: Longest wait for new data in seconds
+        schema: Register schema of the snapshots
+        conn: Database connection, for the database source
+        history_table: Name of the history table, for the database source
+        reader: Shared-memory snapshot reader, for the shared_memory source
+        subscriber: Snapshot stream subscriber, for the stream source
+        device_id: Device ID of snapshots from shared memory or the stream
+        speed_index: Index of the speed in database rows (after the ID column)
+        rpm_conversion: Factor converting the raw speed value
+        registry: Registry providing the current model version
+        poll_interval: Time between checks for new data in seconds, for the
+            database and shared_memory sources
+        engine: Rolling feature engine whose features follow the raw ones, None for raw features only
+        detector: Anomaly detector run on every snapshot, None to disable it
+        rules: Rule engine run on every snapshot, None to disable it
+        alerts: Alert manager notified of speed, rule and anomaly alerts, None to log them
+        speed_bands: Classifier of the speeds with hysteresis, for the alerts
+    """
+    indices = feature_indices(schema)
+    raw_columns = [schema.raw_expression(name) for name in schema.register_names]
+    speed_feature = speed_index - 1
+    
+    watcher = None
+    after = 0
+    if conn is not None:
+        require_history_table(conn, history_table, "Event-driven mode")
+        watcher = DataVersionWatcher(conn, poll_interval)
+        after = last_rowid(conn, history_table)
+        
+    logger.info(f"Waiting for new snapshots from the {source} source")
+    
+    while True:
+        devices = np.zeros(0, dtype=np.int64)
+        timestamps = np.zeros(0)
+        features = np.zeros((0, len(indices)))
+        
+        if subscriber is not None:
+            record = subscriber.recv(timeout=interval)
+            if record is not None:
+                records = np.array([record] + subscriber.recv_pending())
+                features, timestamps = snapshot_features(records, indices), records['ts']
+        elif reader is not None:
+            record = reader.wait_for_update(timeout=interval, poll_interval=poll_interval)
+            if record is not None:
+                features, timestamps = snapshot_features(record, indices), np.atleast_1d(record['ts'])
+        elif watcher.wait(timeout=interval):
+            after, devices, timestamps, features = get_history_after(conn, history_table, raw_columns, after)
+                
+        if not timestamps.size:
+            continue
+        if subscriber is not None or reader is not None:
+            devices = np.full(timestamps.shape[0], device_id)
+            
+        report_speeds(devices, features, speed_feature, rpm_conversion, alerts, speed_bands)
+        if detector is not None:
+            report_anomalies(detector.update_many(devices, timestamps, features), alerts)
+        if rules is not None:
+            report_rule_events(rules.update_many(devices, timestamps, features), alerts)
+        if engine is not None:
+            features = np.hstack([features, engine.update_many(devices, timestamps, features)])
+            
+        # Score the complete snapshots with one call to the model version current for this batch
+        model = registry.model
+        complete = ~np.isnan(features).any(axis=1)
+        if model is not None and complete.any():
+            try:
+                predictions = model.predict(features[complete])
+                classes, counts = np.unique(predictions, return_counts=True)
+                summary = ", ".join(f"{c}: {k}" for c, k in zip(classes.tolist(), counts.tolist()))
+                logger.info(f"ML model predictions for {predictions.shape[0]} new snapshots: {summary}")
+                if registry.reference is None:
+                    registry.set_reference(features[complete])
+            except Exception as e:
+                logger.exception(f"Error in ML prediction: {e}")
+                
+        logger.debug(f"Evaluated {timestamps.shape[0]} snapshots, "
+                     f"{max(0.0, time.time() - float(timestamps.max())) * 1000:.1f} ms after the newest was taken")
+
+
 def analyze_speed(speed: float) -> Tuple[str, str]:
     """
     Analyze the motor speed and determine status and message.
@@ -163,6 +954,21 @@ def analyze_speed(speed: float) -> Tuple[str, str]:
         return "high", f"SPEED = {speed:.2f} => WARNING HIGH SPEED!"
 
 
+def classify_speeds(speeds: np.ndarray) -> np.ndarray:
+    """
+    Classify many motor speeds at once, as analyze_speed does.
+    
+    Args:
+        speeds: Motor speeds
+        
+    Returns:
+        Array of status names
+    """
+    names = np.array(list(SPEED_RANGES))
+    bounds = [SPEED_RANGES[name][1] for name in list(SPEED_RANGES)[:-1]]
+    return names[np.searchsorted(bounds, speeds, side='left')]
+
+
 def main():
     """Main application entry point."""
     try:
@@ -192,78 +998,197 @@ def main():
         row_id = config['database']['row_id']
         
         interval = args.interval or config['maintainer']['interval']
+        source = args.source or config['maintainer']['source']
         model_path = args.model_path or config['maintainer']['model_path']
         rpm_conversion = config['maintainer']['rpm_conversion_factor']
         speed_index = config['maintainer']['speed_field_index']
         
+        # Read the register columns back as raw values, in the register map layout
+        schema = get_schema(config['database'].get('schema', {}).get('values'))
+        raw_columns = [schema.raw_expression(name) for name in schema.register_names]
+        
         # Ensure model directory exists
         model_dir = os.path.dirname(model_path)
         if model_dir and not os.path.exists(model_dir):
             os.makedirs(model_dir)
             logger.info(f"Created directory for model: {model_dir}")
         
-        # Connect to database
-        conn = connect_to_database(db_path)
+        # Connect to the data source
+        conn = None
+        reader = None
+        subscriber = None
+        if source in ('shared_memory', 'stream'):
+            inverter = SinamicV20(client=None, slave_id=config.get('modbus', {}).get('slave_id', 2))
+            
+        if source == 'shared_memory':
+            reader = SnapshotReader(config['maintainer']['shm_name'])
+        elif source == 'stream':
+            subscriber = SnapshotSubscriber(config['maintainer']['stream_path'])
+        else:
+            conn = connect_to_database(db_path)
         
-        # Load ML model if it exists, otherwise proceed without it
-        model = None
-        try:
-            model = load_ml_model(model_path)
-        except FileNotFoundError:
-            logger.warning(f"Model file not found at {model_path}, continuing without ML predictions")
+        # Load ML model if it exists, otherwise proceed without it; new
+        # versions of the file are loaded in the background
+        registry = ModelRegistry(
+            model_path,
+            poll_interval=config['maintainer']['model_reload_interval'],
+            mmap_mode=config['maintainer']['model_mmap_mode']
+        )
+        model = registry.model
+        if model is None:
+            logger.warning(f"No usable model at {model_path}, continuing without ML predictions")
+        
+        logger.info(f"Starting maintenance monitor with interval={interval}s, source={source}")
         
-        logger.info(f"Starting maintenance monitor with interval={interval}s")
+        batch_window = args.batch_window
+        if batch_window is None:
+            batch_window = config['maintainer']['batch_window']
+        if batch_window and model is None:
+            logger.warning("Batched inference needs a model, scoring the latest snapshot only")
+            batch_window = 0
+            
+        # Streaming anomaly detection over the register values
+        detector = None
+        anomaly_config = config['anomaly']
+        if anomaly_config['enabled']:
+            detector = StreamingAnomalyDetector.from_schema(
+                schema,
+                anomaly_config['channels'],
+                alpha=anomaly_config['alpha'],
+                z_threshold=anomaly_config['z_threshold'],
+                cusum_k=anomaly_config['cusum_k'],
+                cusum_h=anomaly_config['cusum_h'],
+                warmup=anomaly_config['warmup'],
+                sensitivity=anomaly_config['sensitivity']
+            )
+            logger.info(f"Watching {len(detector.channels)} channels for anomalies")
+            
+        # Register limits and configured rules, evaluated on every snapshot
+        rules = None
+        rules_config = config['rules']
+        if rules_config['enabled']:
+            rules = RuleEngine.from_schema(
+                schema,
+                rules_config['rules'],
+                limits=rules_config['limits'],
+                exclude=rules_config['exclude'],
+                constants=rules_config['constants']
+            )
+            logger.info(f"Checking {len(rules.rules)} rules")
+            
+        # Alerts are de-duplicated and delivered to the sinks from background threads
+        alerts = None
+        speed_bands = None
+        dispatcher = None
+        alerts_config = config['alerts']
+        if alerts_config['enabled']:
+            dispatcher = AlertDispatcher(
+                [create_sink(spec) for spec in alerts_config['sinks']], alerts_config['queue_size']
+            )
+            alerts = AlertManager(
+                dispatcher,
+                repeat_interval=alerts_config['repeat_interval'],
+                rate_limit=alerts_config['rate_limit'],
+                rate_window=alerts_config['rate_window']
+            )
+            speed_bands = BandClassifier(SPEED_RANGES, alerts_config['speed_hysteresis'])
+            logger.info(f"Sending alerts to {', '.join(sink.name for sink in dispatcher.sinks)}")
+            
+        # Rolling features are appended to the raw ones for models trained on both
+        engine = None
+        if config['maintainer']['rolling_features'] and model is not None:
+            engine = RollingFeatureEngine.from_schema(
+                schema, config['maintainer']['feature_channels'], config['maintainer']['feature_windows']
+            )
+            expected = len(schema.register_names) + engine.n_features
+            if getattr(model, 'n_features_in_', expected) != expected:
+                logger.warning(f"Model expects {model.n_features_in_} features, not {expected} raw and rolling "
+                               f"features, disabling rolling features")
+                engine = None
         
+        fleet = args.fleet or config['maintainer']['fleet']
+        if fleet and source != 'database':
+            logger.warning(f"Fleet mode reads the latest-value table, ignoring it for the {source} source")
+            fleet = False
+        
+        event_driven = args.event_driven or config['maintainer']['event_driven']
+        if event_driven and (fleet or batch_window):
+            logger.warning("Event-driven mode evaluates every new snapshot, ignoring the fleet and batch modes")
+        hot_config = config['database'].get('hot_store', {})
+        if event_driven and source == 'database' and hot_config.get('enabled'):
+            # The hot store only writes the database file when it backs up
+            logger.warning(
+                f"The collector keeps the database in memory and writes it every "
+                f"{hot_config.get('backup_interval')}s, so new rows are only seen at backup time; "
+                f"use the stream or shared_memory source to evaluate snapshots as they are read"
+            )
+            
         # Main monitoring loop
         try:
-            while True:
-                start_time = time.time()
-                
-                # Get motor data
-                data, error = get_motor_data(conn, table_name, row_id)
-                
-                if error:
-                    logger.error(f"Error getting motor data: {error}")
-                    time.sleep(interval)
-                    continue
-                
-                # Extract and analyze speed
-                raw_speed_value = data[speed_index] if data and len(data) > speed_index else 0
-                speed = raw_speed_value * rpm_conversion
-                
-                # Analyze speed
-                status, message = analyze_speed(speed)
-                
-                # Log status message
-                if status in ["slow", "high"]:
-                    logger.warning(message)
-                else:
-                    logger.info(message)
+            if event_driven:
+                monitor_events(
+                    source, interval, schema, conn, history_table_name(table_name),
+                    reader, subscriber, config.get('modbus', {}).get('slave_id', 2),
+                    speed_index, rpm_conversion, registry, config['maintainer']['event_poll_interval'],
+                    engine, detector, rules, alerts, speed_bands
+                )
+            elif fleet:
+                monitor_fleet(
+                    conn, table_name, interval, schema, speed_index, rpm_conversion,
+                    registry, engine, detector, rules, alerts, speed_bands
+                )
+            elif batch_window:
+                predictor = BatchPredictor(model, batch_window, config['maintainer']['batch_max_delay'])
+                monitor_batched(
+                    predictor, source, interval, schema, conn, history_table_name(table_name),
+                    reader, subscriber, config.get('modbus', {}).get('slave_id', 2),
+                    speed_index, rpm_conversion, engine, detector, registry, rules,
+                    alerts, speed_bands
+                )
+            else:
+                while True:
+                    start_time = time.time()
                     
-                # Add ML prediction if model is available
-                if model is not None and data:
-                    try:
-                        # Remove ID column for prediction
-                        features = np.array(data[1:])
-                        prediction = model.predict([features])[0]
-                        logger.info(f"ML model prediction: {prediction}")
-                    except Exception as e:
-                        logger.exception(f"Error in ML prediction: {e}")
-                
-                # Calculate sleep time to maintain interval
-                elapsed = time.time() - start_time
-                sleep_time = max(0, interval - elapsed)
-                
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
+                    # Get motor data
+                    if reader is not None:
+                        data, error = get_motor_data_from_snapshot(reader, inverter, row_id)
+                    elif subscriber is not None:
+                        data, error = get_motor_data_from_stream(subscriber, inverter, row_id, interval)
+                    else:
+                        data, error = get_motor_data(conn, table_name, row_id, raw_columns)
+                    
+                    if error:
+                        logger.error(f"Error getting motor data: {error}")
+                        time.sleep(interval)
+                        continue
+                    
+                    evaluate_snapshot(
+                        data, row_id, speed_index, rpm_conversion, registry,
+                        engine, detector, rules, alerts, speed_bands
+                    )
+                    
+                    # Calculate sleep time to maintain interval
+                    elapsed = time.time() - start_time
+                    sleep_time = max(0, interval - elapsed)
+                    
+                    if sleep_time > 0:
+                        time.sleep(sleep_time)
                     
         except KeyboardInterrupt:
             logger.info("Maintenance monitor stopped by user")
             
         finally:
             # Clean up resources
-            conn.close()
-            logger.info("Database connection closed")
+            registry.close()
+            if dispatcher is not None:
+                dispatcher.close()
+            if conn is not None:
+                conn.close()
+                logger.info("Database connection closed")
+            if reader is not None:
+                reader.close()
+            if subscriber is not None:
+                subscriber.close()
             
         return 0
         
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Model Training Application
+
+This application trains a motor state classifier on a time range of the
+inverter history, streaming the history in chunks, cross-validates it and
+writes a new version of the model with its metrics. The new version can
+be deployed to the path the maintainer watches, which reloads it.
+
+Usage:
+    python -m apps.train [--model TYPE] [--start TIME] [--end TIME] [--output-dir DIR] [--deploy PATH]
+"""
+
+import sys
+import argparse
+
+from utils.logger import get_logger
+from utils.config import config
+from utils.database.export import parse_time
+from utils.ml.features import DEFAULT_CHANNELS, DEFAULT_WINDOWS
+from utils.ml.training import FREQUENCY_LEVELS, LABEL_REGISTER, MODEL_TYPES, TrainingSpec, train
+
+logger = get_logger(__name__)
+
+
+def parse_args():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description='Train a motor state classifier on the history')
+    parser.add_argument('--config', type=str, help='Path to configuration file')
+    parser.add_argument('--model', choices=list(MODEL_TYPES), default='sgd', help='Model type to train')
+    parser.add_argument('--name', type=str, help='Model name in the output directory (default: the model type)')
+    parser.add_argument('--source', choices=['database', 'partitions'], default='database',
+                        help='Train on the history table of the database or the partitioned history files')
+    parser.add_argument('--db-path', type=str, help='Database file path')
+    parser.add_argument('--history-dir', type=str, help='Directory of the partitioned history files')
+    parser.add_argument('--device', type=int, help='Device ID to train on (default: every device)')
+    parser.add_argument('--start', type=str, help='Range start, Unix timestamp or ISO 8601 (UTC)')
+    parser.add_argument('--end', type=str, help='Range end (exclusive), Unix timestamp or ISO 8601 (UTC)')
+    parser.add_argument('--label-register', type=str, default=LABEL_REGISTER,
+                        help='Frequency register labeling the snapshots')
+    parser.add_argument('--levels', type=float, nargs='+', default=list(FREQUENCY_LEVELS),
+                        help='Frequency of each class, in Hz')
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help='Largest distance to a level for a snapshot to be labeled, in Hz')
+    parser.add_argument('--rolling-features', action='store_true',
+                        help='Append the rolling-window features to the register values')
+    parser.add_argument('--folds', type=int, default=5, help='Number of cross-validation folds, 0 to skip')
+    parser.add_argument('--fold-block', type=float, default=3600.0,
+                        help='Seconds of one device kept in the same fold')
+    parser.add_argument('--workers', type=int, help='Number of cross-validation processes (default: one per CPU)')
+    parser.add_argument('--epochs', type=int, default=5, help='Passes over the history for the sgd model')
+    parser.add_argument('--max-rows', type=int, default=200000,
+                        help='Sample size for the models trained in memory (logistic, forest)')
+    parser.add_argument('--batch-rows', type=int, default=65536, help='Number of rows read at once')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--output-dir', type=str, default='models', help='Directory of the model versions')
+    parser.add_argument('--deploy', type=str,
+                        help='Copy the new version to this model path (.joblib or .npz) for the maintainer')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
+    return parser.parse_args()
+
+
+def main():
+    """Main application entry point."""
+    try:
+        # Parse command-line arguments
+        args = parse_args()
+
+        # Configure logging
+        if args.verbose:
+            import logging
+            logging.getLogger().setLevel(logging.DEBUG)
+
+        # Load config file if specified
+        if args.config:
+            config.load_from_file(args.config)
+
+        spec = TrainingSpec(
+            model=args.model,
+            source=args.source,
+            db_path=args.db_path,
+            history_dir=args.history_dir,
+            device=args.device,
+            t0=parse_time(args.start),
+            t1=parse_time(args.end),
+            label_register=args.label_register,
+            levels=tuple(args.levels),
+            tolerance=args.tolerance,
+            rolling_features=args.rolling_features,
+            feature_channels=tuple(config.get('maintainer', {}).get('feature_channels', DEFAULT_CHANNELS)),
+            feature_windows=tuple(config.get('maintainer', {}).get('feature_windows', DEFAULT_WINDOWS)),
+            folds=args.folds,
+            fold_block=args.fold_block,
+            epochs=args.epochs,
+            max_rows=args.max_rows,
+            batch_rows=args.batch_rows,
+            seed=args.seed
+        )
+
+        version_dir = train(spec, args.output_dir, args.name, args.workers, args.deploy)
+        logger.info(f"Training finished: {version_dir}")
+        return 0
+
+    except Exception as e:
+        logger.exception(f"Error in training application: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,7 +20,10 @@ from PyQt5 import QtWidgets, QtCore
 
 from utils.logger import get_logger
 from utils.config import config
-from utils.database.operations import execute_query
+from utils.modbus.motor import SinamicV20
+from utils.data.record_log import valid_mask
+from utils.ipc.shared_snapshot import SnapshotReader
+from utils.ipc.stream import SnapshotSubscriber
 from utils.visualization.realtime_plot import RealtimePlot
 
 logger = get_logger(__name__)
@@ -35,6 +38,9 @@ DEFAULT_CONFIG = {
     "visualization": {
         "n_points": 100,
         "update_interval": 50,
+        "source": "database",
+        "shm_name": "modcon_snapshot",
+        "stream_path": "data/modcon.sock",
         "rpm_conversion_factor": 8.10/242,
         "title": "Motor Speed Visualization",
         "y_label": "Speed (RPM)",
@@ -51,6 +57,8 @@ def parse_args():
     parser.add_argument('--interval', type=int, help='Update interval in milliseconds')
     parser.add_argument('--db-path', type=str, help='Database file path')
     parser.add_argument('--points', type=int, help='Number of data points to display')
+    parser.add_argument('--source', type=str, choices=['database', 'shared_memory', 'stream'],
+                        help='Where to read the latest snapshot from')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose output')
     return parser.parse_args()
 
@@ -101,7 +109,10 @@ class DatabaseVisualizer(QtWidgets.QMainWindow):
         title: Optional[str] = None,
         y_label: Optional[str] = None,
         x_label: Optional[str] = None,
-        y_range: Optional[Tuple[float, float]] = None
+        y_range: Optional[Tuple[float, float]] = None,
+        source: str = 'database',
+        shm_name: str = 'modcon_snapshot',
+        stream_path: str = 'data/modcon.sock'
     ):
         """
         Initialize the database visualizer.
@@ -117,6 +128,9 @@ class DatabaseVisualizer(QtWidgets.QMainWindow):
             y_label: Y-axis label
             x_label: X-axis label
             y_range: Y-axis range as (min, max)
+            source: Data source, 'database', 'shared_memory' or 'stream'
+            shm_name: Name of the shared-memory snapshot channel
+            stream_path: Path of the collector's snapshot stream socket
         """
         super(DatabaseVisualizer, self).__init__()
         
@@ -130,12 +144,24 @@ class DatabaseVisualizer(QtWidgets.QMainWindow):
         self.row_id = row_id
         self.rpm_conversion = rpm_conversion
         
-        # Initialize database connection
+        # Initialize data source
+        self.reader = None
+        self.subscriber = None
+        self.notifier = None
         try:
-            self.conn = connect_to_database(db_path)
-            self.cursor = self.conn.cursor()
+            if source in ('shared_memory', 'stream'):
+                register_map = SinamicV20(client=None, slave_id=0)
+                self.speed_index = register_map.ADDRESS_LIST.index(register_map.SPEED_ADDRESS)
+                
+            if source == 'shared_memory':
+                self.reader = SnapshotReader(shm_name)
+            elif source == 'stream':
+                self.subscriber = SnapshotSubscriber(stream_path)
+            else:
+                self.conn = connect_to_database(db_path)
+                self.cursor = self.conn.cursor()
         except Exception as e:
-            logger.exception(f"Error initializing database connection: {e}")
+            logger.exception(f"Error initializing data source: {e}")
             raise
         
         # Create plot
@@ -153,8 +179,15 @@ class DatabaseVisualizer(QtWidgets.QMainWindow):
         # Set up the central widget
         self.setCentralWidget(self.plot.create_widget())
         
-        # Start the plot updates
-        self.plot.start_timer(update_callback=self._get_speed_data)
+        # Start the plot updates: pushed snapshots are plotted as soon as
+        # they arrive, other sources are sampled on the timer
+        if self.subscriber is not None:
+            self.notifier = QtCore.QSocketNotifier(
+                self.subscriber.fileno(), QtCore.QSocketNotifier.Read, self
+            )
+            self.notifier.activated.connect(self._on_stream_data)
+        else:
+            self.plot.start_timer(update_callback=self._get_speed_data)
         
         logger.info("Database visualizer initialized")
     
@@ -166,16 +199,19 @@ class DatabaseVisualizer(QtWidgets.QMainWindow):
             The current motor speed in RPM, or 0 if there was an error
         """
         try:
+            if self.reader is not None:
+                return self._get_speed_from_snapshot()
+                
             query = f"SELECT SPEED FROM {self.table_name} WHERE ID = {self.row_id}"
-            result = execute_query(self.conn, query)
+            result = self.cursor.execute(query).fetchall()
             
             if not result or not result[0]:
                 logger.warning("No data found in database")
                 return 0.0
                 
-            # Extract and convert speed value
+            # Extract and convert speed value, NULL if it could not be read
             raw_speed = result[0][0]
-            speed = raw_speed * self.rpm_conversion
+            speed = float('nan') if raw_speed is None else raw_speed * self.rpm_conversion
             
             logger.debug(f"Current speed: {speed:.2f} RPM")
             return speed
@@ -184,6 +220,56 @@ class DatabaseVisualizer(QtWidgets.QMainWindow):
             logger.exception(f"Error getting speed data: {e}")
             return 0.0
     
+    def _get_speed_from_snapshot(self) -> float:
+        """
+        Get speed data from the shared-memory snapshot channel.
+        
+        Returns:
+            The current motor speed in RPM, or 0 if nothing was published yet
+        """
+        _, record = self.reader.read()
+        
+        if record is None:
+            logger.warning("No snapshot published yet")
+            return 0.0
+            
+        speed = self._speed_from_record(record)
+        
+        logger.debug(f"Current speed: {speed:.2f} RPM")
+        return speed
+    
+    def _speed_from_record(self, record: Any) -> float:
+        """
+        Convert the speed register of a snapshot record to RPM.
+        
+        Args:
+            record: Snapshot record from the shared memory or the stream
+            
+        Returns:
+            The motor speed in RPM, or NaN (a gap in the plot) if the
+            register could not be read
+        """
+        if not valid_mask(record)[self.speed_index]:
+            return float('nan')
+            
+        return float(record['values'][self.speed_index]) * self.rpm_conversion
+    
+    def _on_stream_data(self) -> None:
+        """Plot every snapshot that arrived on the stream."""
+        try:
+            records = self.subscriber.recv_pending()
+        except ConnectionError as e:
+            logger.error(f"Snapshot stream closed: {e}")
+            self.notifier.setEnabled(False)
+            return
+            
+        for record in records:
+            self.plot.append_value(self._speed_from_record(record), redraw=False)
+            
+        if records:
+            self.plot.redraw()
+            logger.debug(f"Plotted {len(records)} streamed snapshots")
+    
     def closeEvent(self, event: Any) -> None:
         """
         Handle window close event.
@@ -201,6 +287,13 @@ class DatabaseVisualizer(QtWidgets.QMainWindow):
                 self.conn.close()
                 logger.info("Database connection closed")
                 
+            if self.reader is not None:
+                self.reader.close()
+                
+            if self.subscriber is not None:
+                self.notifier.setEnabled(False)
+                self.subscriber.close()
+                
         except Exception as e:
             logger.exception(f"Error during shutdown: {e}")
             
@@ -239,6 +332,9 @@ def main():
         
         n_points = args.points or config['visualization']['n_points']
         update_interval = args.interval or config['visualization']['update_interval']
+        source = args.source or config['visualization']['source']
+        shm_name = config['visualization']['shm_name']
+        stream_path = config['visualization']['stream_path']
         rpm_conversion = config['visualization']['rpm_conversion_factor']
         title = config['visualization']['title']
         y_label = config['visualization']['y_label']
@@ -265,7 +361,10 @@ def main():
             title=title,
             y_label=y_label,
             x_label=x_label,
-            y_range=y_range
+            y_range=y_range,
+            source=source,
+            shm_name=shm_name,
+            stream_path=stream_path
         )
         window.show()
         
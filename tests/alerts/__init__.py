@@ -0,0 +1,5 @@
+"""
+Test modules for the alerts package.
+
+This package contains test modules for alert tracking and delivery.
+"""
@@ -0,0 +1,120 @@
+"""
+Tests for alert state tracking.
+
+Usage:
+    python -m pytest tests/alerts/test_manager.py
+"""
+
+import time
+
+import numpy as np
+
+from utils.alerts.manager import AlertManager, BandClassifier
+
+SPEED_RANGES = {
+    "stopped": (0, 0.1),
+    "slow": (0.1, 7),
+    "normal": (7, 13),
+    "high": (13, float('inf'))
+}
+
+
+def _states(alerts):
+    """States of the alerts that were notified."""
+    return [alert.state for alert in alerts if alert is not None]
+
+
+def test_repeats_are_deduplicated():
+    """A condition holding over many cycles is notified when raised and cleared only."""
+    manager = AlertManager(repeat_interval=0, rate_limit=0)
+    alerts = [manager.observe(1, 'speed_high', True, timestamp=t) for t in range(10)]
+    alerts.append(manager.observe(1, 'speed_high', False, timestamp=10))
+
+    assert _states(alerts) == ['raised', 'cleared']
+    assert alerts[-1].count == 9
+    assert manager.active() == []
+
+
+def test_reminders_after_repeat_interval():
+    """An alert still raised is reminded every repeat_interval with its count."""
+    manager = AlertManager(repeat_interval=5.0, rate_limit=0)
+    alerts = [manager.observe(1, 'rule', True, timestamp=float(t)) for t in range(12)]
+
+    assert _states(alerts) == ['raised', 'repeat', 'repeat']
+    assert [alert.count for alert in alerts if alert is not None] == [1, 5, 5]
+    assert manager.active(1) == [(1, 'rule')]
+
+
+def test_rate_limit_suppresses_raise_and_clear():
+    """Alerts beyond the rate limit are dropped, and so are their clears."""
+    manager = AlertManager(repeat_interval=0, rate_limit=3, rate_window=3600.0)
+    raised = [manager.observe(device, 'rule', True) for device in range(5)]
+    cleared = [manager.observe(device, 'rule', False) for device in range(5)]
+
+    assert _states(raised) == ['raised'] * 3
+    assert manager.suppressed == 2
+    assert _states(cleared) == ['cleared'] * 3
+
+
+def test_rate_limited_raise_is_notified_later():
+    """A raise suppressed during a burst is notified once the budget refills."""
+    manager = AlertManager(repeat_interval=0, rate_limit=1, rate_window=0.05)
+    assert manager.observe(1, 'rule', True) is not None
+    assert manager.observe(2, 'rule', True, severity='critical') is None
+    assert manager.observe(2, 'rule', True) is None
+
+    time.sleep(0.1)
+    alert = manager.observe(2, 'rule', True, severity='critical')
+    assert (alert.device, alert.state, alert.severity, alert.count) == (2, 'raised', 'critical', 3)
+    assert manager.suppressed == 1
+    assert _states([manager.observe(2, 'rule', False)]) == ['cleared']
+
+
+def test_events_deduplicated_per_interval():
+    """One-shot events of a rule are notified at most once per repeat_interval."""
+    manager = AlertManager(repeat_interval=60.0, rate_limit=0)
+    alerts = [manager.event(1, 'anomaly_SPEED_zscore', timestamp=t) for t in (0.0, 10.0, 30.0, 61.0)]
+    alerts.append(manager.event(2, 'anomaly_SPEED_zscore', timestamp=30.0))
+
+    assert _states(alerts) == ['event', 'event', 'event']
+    assert alerts[3].count == 3
+
+
+def test_dispatcher_receives_alerts():
+    """Notified alerts are submitted to the dispatcher."""
+    class Dispatcher:
+        def __init__(self):
+            self.alerts = []
+
+        def submit(self, alert):
+            self.alerts.append(alert)
+
+    dispatcher = Dispatcher()
+    manager = AlertManager(dispatcher, repeat_interval=0, rate_limit=0)
+    manager.observe(3, 'rule', True, 'too hot', 91.0, 'critical')
+    manager.observe(3, 'rule', True)
+
+    alert, = dispatcher.alerts
+    assert (alert.device, alert.severity, alert.message, alert.value) == (3, 'critical', 'too hot', 91.0)
+
+
+def test_band_hysteresis_stops_flapping():
+    """A value hovering around a boundary keeps its band until past the margin."""
+    bands = BandClassifier(SPEED_RANGES, margin=0.3)
+    speeds = [12.9, 13.1, 12.95, 13.2, 13.4, 13.0, 12.8, 12.6]
+    statuses = [bands.classify([1], [speed])[0] for speed in speeds]
+    assert statuses == ['normal', 'normal', 'normal', 'normal', 'high', 'high', 'high', 'normal']
+
+    # Without a previous band, values are classified as analyze_speed does
+    fresh = BandClassifier(SPEED_RANGES)
+    assert fresh.classify([1, 2, 3, 4, 5], np.array([0.0, 0.1, 5.0, 13.0, 20.0])).tolist() == [
+        'stopped', 'stopped', 'slow', 'normal', 'high'
+    ]
+
+
+def test_band_hysteresis_reaches_narrow_bands():
+    """A margin wider than the 'stopped' band still lets a slow motor stop."""
+    bands = BandClassifier(SPEED_RANGES, margin=0.3)
+    speeds = [0.0, 5.0, 0.0, 0.3, 0.5, 0.08, 0.04]
+    statuses = [bands.classify([1], [speed])[0] for speed in speeds]
+    assert statuses == ['stopped', 'slow', 'stopped', 'stopped', 'slow', 'slow', 'stopped']
@@ -0,0 +1,146 @@
+"""
+Tests for alert delivery to the sinks.
+
+Usage:
+    python -m pytest tests/alerts/test_sinks.py
+"""
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from utils.alerts.manager import Alert
+from utils.alerts.sinks import AlertDispatcher, AlertSink, FileSink, UnixSocketSink, WebhookSink, create_sink
+
+
+def _alert(device=1, state='raised'):
+    """A sample alert."""
+    return Alert(device, 'speed_high', state, 'warning', 'SPEED = 14.00', 14.0, 1700000000.0, 1)
+
+
+class SlowSink(AlertSink):
+    """Sink taking a while per alert."""
+
+    name = 'slow'
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.alerts = []
+
+    def send(self, alert):
+        time.sleep(self.delay)
+        self.alerts.append(alert)
+
+
+class FailingSink(AlertSink):
+    """Sink failing on every alert."""
+
+    name = 'failing'
+
+    def send(self, alert):
+        raise OSError("unreachable")
+
+
+def test_slow_sink_does_not_block_submit(tmp_path):
+    """Submitting returns at once while a slow sink delivers in the background."""
+    slow = SlowSink(0.2)
+    path = tmp_path / 'alerts.jsonl'
+    dispatcher = AlertDispatcher([slow, FileSink(str(path))])
+
+    start = time.monotonic()
+    for device in range(3):
+        dispatcher.submit(_alert(device))
+    assert time.monotonic() - start < 0.05
+
+    # The file sink isn't held up by the slow one
+    assert dispatcher._workers[1].flush(timeout=1.0)
+    assert len(path.read_text().splitlines()) == 3
+
+    dispatcher.close()
+    assert [alert.device for alert in slow.alerts] == [0, 1, 2]
+
+
+def test_full_queue_drops_oldest_and_failures_are_counted():
+    """A sink behind by more than the queue loses its oldest alerts; failures don't stop delivery."""
+    slow = SlowSink(0.05)
+    dispatcher = AlertDispatcher([slow, FailingSink()], queue_size=2)
+    for device in range(10):
+        dispatcher.submit(_alert(device))
+    assert dispatcher.flush(timeout=2.0)
+
+    stats = dispatcher.stats()
+    assert stats['slow']['dropped'] >= 7
+    assert stats['slow']['sent'] == len(slow.alerts) <= 3
+    assert stats['failing']['sent'] == 0
+    assert stats['failing']['failed'] + stats['failing']['dropped'] == 10
+    assert slow.alerts[-1].device == 9
+    dispatcher.close()
+
+
+def test_unix_socket_sink(tmp_path):
+    """Alerts are sent as JSON lines to the socket listener."""
+    path = str(tmp_path / 'alerts.sock')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+
+    sink = UnixSocketSink(path)
+    sink.send(_alert(1))
+    sink.send(_alert(1, 'cleared'))
+    conn, _ = server.accept()
+    conn.settimeout(1.0)
+    data = b''
+    while data.count(b'\n') < 2:
+        data += conn.recv(4096)
+
+    lines = [json.loads(line) for line in data.decode().splitlines()]
+    assert [line['state'] for line in lines] == ['raised', 'cleared']
+    sink.close()
+    conn.close()
+    server.close()
+
+
+def test_webhook_sink_posts_json():
+    """Alerts are POSTed as JSON to the webhook."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.handle_request, daemon=True)
+    thread.start()
+
+    WebhookSink(f"http://127.0.0.1:{server.server_port}/alerts").send(_alert(4))
+    thread.join(timeout=2.0)
+    server.server_close()
+    assert received[0]['device'] == 4
+    assert received[0]['rule'] == 'speed_high'
+
+
+def test_create_sink_from_config(tmp_path):
+    """Sinks are built from their configuration."""
+    sink = create_sink({'type': 'file', 'path': str(tmp_path / 'a.jsonl')})
+    assert isinstance(sink, FileSink)
+    sink.close()
+    with pytest.raises(ValueError):
+        create_sink({'type': 'pager'})
+
+
+def test_sinks_must_implement_send():
+    """A sink class without send can't be instantiated."""
+    class Incomplete(AlertSink):
+        name = 'incomplete'
+
+    with pytest.raises(TypeError):
+        Incomplete()
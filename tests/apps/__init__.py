@@ -0,0 +1,5 @@
+"""
+Test modules for the applications.
+
+This package contains test modules for the command-line applications.
+"""
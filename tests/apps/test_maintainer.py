@@ -0,0 +1,139 @@
+"""
+Tests for the maintenance monitor.
+
+Usage:
+    python -m pytest tests/apps/test_maintainer.py
+"""
+
+import os
+import sqlite3
+
+import joblib
+import numpy as np
+import pytest
+
+from apps.maintainer import (
+    evaluate_snapshot,
+    get_history_after,
+    get_motor_data,
+    get_motor_data_from_snapshot,
+    monitor_batched,
+    monitor_events
+)
+from utils.database.operations import create_database, generate_history_insert_query
+from utils.database.schema import get_schema
+from utils.ipc.shared_snapshot import SnapshotPublisher, SnapshotReader
+from utils.ml.inference import BatchPredictor
+from utils.ml.anomaly import StreamingAnomalyDetector
+from utils.ml.registry import ModelRegistry
+from utils.ml.rules import RuleEngine
+from utils.modbus.motor import SinamicV20
+
+linear_model = pytest.importorskip('sklearn.linear_model')
+
+
+def _registry(tmp_path, n_features: int) -> ModelRegistry:
+    """Deploy a small model and load it."""
+    X = np.random.default_rng(0).normal(size=(40, n_features))
+    model = linear_model.LogisticRegression().fit(X, (X[:, 0] > 0).astype(int))
+    path = str(tmp_path / 'model.joblib')
+    joblib.dump(model, path)
+    return ModelRegistry(path, poll_interval=0)
+
+
+def test_null_speed_is_treated_as_missing(tmp_path):
+    """A snapshot whose SPEED is NULL is evaluated without crashing the loop."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=False, values='raw')
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE sinamicv20 SET SPEED = NULL WHERE ID = 0")
+    conn.commit()
+
+    schema = get_schema('raw')
+    raw_columns = [schema.raw_expression(name) for name in schema.register_names]
+    data, error = get_motor_data(conn, 'sinamicv20', 0, raw_columns)
+    conn.close()
+    assert error is None and data[schema.register_names.index('SPEED') + 1] is None
+
+    detector = StreamingAnomalyDetector.from_schema(schema, ['SPEED', 'CURRENT'])
+    rules = RuleEngine.from_schema(schema)
+    with _registry(tmp_path, len(schema.register_names)) as registry:
+        evaluate_snapshot(
+            data, 0, schema.register_names.index('SPEED') + 1, 0.1, registry,
+            detector=detector, rules=rules, timestamp=1.0
+        )
+        assert registry.reference is None
+
+    assert detector.state.count[0].tolist() == [0, 1]
+
+
+def test_invalid_snapshot_speed_is_treated_as_missing(tmp_path):
+    """A shared-memory snapshot with the SPEED validity bit clear is evaluated without crashing."""
+    inverter = SinamicV20(client=None, slave_id=0)
+    schema = get_schema('raw')
+    values = [1] * len(inverter.ADDRESS_LIST)
+    values[inverter.ADDRESS_LIST.index(inverter.SPEED_ADDRESS)] = None
+    name = f"modcon_test_maintainer_{os.getpid()}"
+
+    with SnapshotPublisher(name) as publisher, SnapshotReader(name) as reader:
+        publisher.publish(1.0, values)
+        data, error = get_motor_data_from_snapshot(reader, inverter, 0)
+
+    speed_index = schema.register_names.index('SPEED') + 1
+    assert error is None and data[speed_index] is None
+
+    detector = StreamingAnomalyDetector.from_schema(schema, ['SPEED', 'CURRENT'])
+    with _registry(tmp_path, len(schema.register_names)) as registry:
+        evaluate_snapshot(data, 0, speed_index, 0.1, registry, detector=detector, timestamp=1.0)
+
+    assert detector.state.count[0].tolist() == [0, 1]
+
+
+def test_event_mode_needs_the_history_table(tmp_path):
+    """Event-driven monitoring of a single-drive database fails with a clear error."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=False, values='raw')
+    conn = sqlite3.connect(db_path)
+    schema = get_schema('raw')
+
+    with ModelRegistry(str(tmp_path / 'missing.joblib'), poll_interval=0) as registry:
+        with pytest.raises(ValueError, match='database.fleet.enabled'):
+            monitor_events('database', 0.01, schema, conn, 'sinamicv20_history', None, None, 0,
+                           schema.register_names.index('SPEED') + 1, 0.1, registry)
+    conn.close()
+
+
+def test_batched_mode_needs_the_history_table(tmp_path):
+    """Batched monitoring of a single-drive database fails with a clear error."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=False, values='raw')
+    conn = sqlite3.connect(db_path)
+    schema = get_schema('raw')
+
+    with pytest.raises(ValueError, match='database.fleet.enabled'):
+        monitor_batched(BatchPredictor(None, 4), 'database', 0.01, schema, conn, 'sinamicv20_history',
+                        None, None, 0, schema.register_names.index('SPEED') + 1, 0.1)
+    conn.close()
+
+
+def test_history_is_read_by_rowid(tmp_path):
+    """Rows inserted late with older or equal timestamps are still read, each once."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=True, values='raw')
+    schema = get_schema('raw')
+    columns = [schema.raw_expression(name) for name in schema.register_names]
+    insert = generate_history_insert_query('sinamicv20', schema.columns)
+    row = [0] * len(schema.columns)
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany(insert, [(1, 10.0, *row), (2, 10.0, *row)])
+    after, devices, timestamps, _ = get_history_after(conn, 'sinamicv20_history', columns, 0)
+    assert devices.tolist() == [1, 2] and timestamps.tolist() == [10.0, 10.0]
+
+    # A spool replay inserts older rows and rows sharing the last timestamp
+    conn.executemany(insert, [(3, 10.0, *row), (1, 5.0, *row)])
+    after, devices, timestamps, features = get_history_after(conn, 'sinamicv20_history', columns, after)
+    assert devices.tolist() == [3, 1] and timestamps.tolist() == [10.0, 5.0]
+    assert features.shape == (2, len(columns))
+    assert get_history_after(conn, 'sinamicv20_history', columns, after)[1].size == 0
+    conn.close()
@@ -0,0 +1,6 @@
+"""
+Test modules for the data package.
+
+This package contains test modules for the data package components,
+including the archive format and file I/O helpers.
+"""
@@ -0,0 +1,85 @@
+"""
+Tests for the compressed columnar archive format.
+
+Usage:
+    python -m pytest tests/data/test_archive.py
+"""
+
+import numpy as np
+import pytest
+
+from utils.data.archive import (
+    ArchiveReader,
+    MISSING_VALUE,
+    varint_decode,
+    varint_encode,
+    write_archive,
+    zigzag_decode,
+    zigzag_encode
+)
+
+COLUMNS = ['SPEED', 'CURRENT', 'RATED_PWR']
+
+
+def _sample(n_rows: int = 1000):
+    """Build timestamps with jitter and a mix of changing and constant columns."""
+    rng = np.random.default_rng(0)
+    timestamps = 1.7e9 + np.arange(n_rows) + rng.random(n_rows) * 0.01
+    values = np.column_stack([
+        200 + rng.integers(-5, 5, n_rows),
+        np.repeat([50, 51, 52, 53], n_rows // 4),
+        np.full(n_rows, 55)
+    ])
+    return timestamps, values
+
+
+def test_integer_codecs_round_trip():
+    """Zigzag and varint coding are lossless across the full int64 range."""
+    signed = np.array([0, -1, 1, -2 ** 63, 2 ** 63 - 1], dtype=np.int64)
+    encoded = varint_encode(zigzag_encode(signed))
+    np.testing.assert_array_equal(zigzag_decode(varint_decode(encoded, signed.size)), signed)
+
+
+def test_archive_round_trip(tmp_path):
+    """Snapshots, including missing registers, are read back unchanged."""
+    timestamps, values = _sample()
+    rows = values.tolist()
+    rows[3][0] = None
+
+    path = tmp_path / 'capture.mcar'
+    size = write_archive(str(path), COLUMNS, timestamps, rows, block_size=256)
+
+    with ArchiveReader(str(path)) as reader:
+        read_ts, read_values = reader.read()
+        n_blocks = len(reader.blocks)
+
+    expected = values.copy()
+    expected[3, 0] = MISSING_VALUE
+    np.testing.assert_allclose(read_ts, timestamps, atol=1e-6)
+    np.testing.assert_array_equal(read_values, expected)
+    assert n_blocks == 4
+    assert size < values.size * 2
+
+
+def test_range_scan_and_min_max_index(tmp_path):
+    """Range reads trim to the window and the block index filters by value."""
+    timestamps, values = _sample()
+    path = tmp_path / 'capture.mcar'
+    write_archive(str(path), COLUMNS, timestamps, values, block_size=250)
+
+    reader = ArchiveReader(str(path))
+    read_ts, read_values = reader.read(['CURRENT'], t0=timestamps[100], t1=timestamps[600])
+
+    assert read_ts.size == 500
+    np.testing.assert_array_equal(read_values[:, 0], values[100:600, 1])
+    assert [block.n_rows for block in reader.blocks_matching('CURRENT', 52, 52)] == [250]
+
+
+def test_reader_rejects_other_files(tmp_path):
+    """Empty and foreign files are refused before any block is read."""
+    path = tmp_path / 'other.mcar'
+
+    for content in (b'', b'not an archive at all'):
+        path.write_bytes(content)
+        with pytest.raises(ValueError, match='Not a ModCon archive'):
+            ArchiveReader(str(path))
@@ -0,0 +1,125 @@
+"""
+Tests for the buffered CSV writer and the streaming CSV reader.
+
+Usage:
+    python -m pytest tests/data/test_file_io.py
+"""
+
+import numpy as np
+
+from utils.data.collector import DataCollector
+from utils.data.file_io import (
+    CSVBlockReader,
+    CSVWriter,
+    parse_csv_lines,
+    read_csv,
+    read_csv_array,
+    read_csv_blocks
+)
+from utils.database.schema import get_schema
+from utils.modbus.motor import SinamicV20
+
+
+def test_rows_are_buffered_until_flush(tmp_path):
+    """Rows reach the file when flush_rows is reached or the writer is closed."""
+    path = str(tmp_path / 'out' / 'data.csv')
+
+    writer = CSVWriter(path, ['TIMESTAMP', 'A', 'B'], flush_rows=3, flush_interval=3600)
+    writer.write_row([1.0, 1, 2])
+    writer.write_row([2.0, 3, None])
+    assert len(read_csv(path)) == 1
+
+    writer.write_row([3.0, 5, 6])
+    assert len(read_csv(path)) == 4
+
+    writer.write_rows([[4.0, 7, 8]])
+    writer.close()
+    assert writer.closed
+    assert read_csv(path) == [
+        ['TIMESTAMP', 'A', 'B'], ['1.0', '1', '2'], ['2.0', '3', ''], ['3.0', '5', '6'], ['4.0', '7', '8']
+    ]
+
+
+def test_time_based_flush_and_existing_header(tmp_path):
+    """A zero flush interval writes every row, and reopening keeps the existing header."""
+    path = str(tmp_path / 'data.csv')
+
+    with CSVWriter(path, ['A'], flush_rows=100, flush_interval=0) as writer:
+        writer.write_row([1])
+        assert len(read_csv(path)) == 2
+
+    with CSVWriter(path, ['TIMESTAMP', 'A']) as writer:
+        assert writer.header == ['A']
+        writer.write_row([2])
+
+    assert read_csv(path) == [['A'], ['1'], ['2']]
+
+
+def test_parse_csv_lines_fills_empty_fields():
+    """Empty fields anywhere on a line are parsed as NaN."""
+    data = parse_csv_lines([',1,2\n', '3,,\n', '5,6,7\r\n'], 3)
+    assert data.shape == (3, 3)
+    assert np.isnan(data).tolist() == [[True, False, False], [False, True, True], [False, False, False]]
+    assert data[2].tolist() == [5.0, 6.0, 7.0]
+
+
+def test_block_reader_types_and_caches_captures(tmp_path):
+    """Register captures stream as uint16 blocks, and full reads go through the sidecar cache."""
+    schema = get_schema('raw')
+    path = tmp_path / 'capture.csv'
+    path.write_text(
+        ','.join(schema.register_names) + '\n'
+        + ''.join(','.join([str(i)] * (len(schema.columns) - 1) + ['']) + '\n' for i in range(10))
+    )
+
+    reader = CSVBlockReader(str(path), chunk_rows=4)
+    assert reader.columns == schema.columns
+    assert reader.dtype == np.uint16
+    assert not reader.has_timestamp
+
+    blocks = list(reader)
+    assert [block.values.shape[0] for block in blocks] == [4, 4, 2]
+    assert blocks[0].values.dtype == np.uint16
+    assert not blocks[0].valid[:, -1].any()
+    assert np.isnan(blocks[0].as_float()[:, -1]).all()
+
+    columns, block = read_csv_array(str(path))
+    assert columns == schema.columns
+    assert block.values[:, 0].tolist() == list(range(10))
+    assert (tmp_path / 'capture.csv.npz').exists()
+
+    # Changing the capture invalidates the cache
+    with open(path, 'a') as f:
+        f.write(','.join(['10'] * len(schema.columns)) + '\n')
+    assert read_csv_array(str(path))[1].values.shape[0] == 11
+
+
+def test_block_reader_with_timestamps_and_floats(tmp_path):
+    """Non-register columns are read as floats and the TIMESTAMP column is split off."""
+    path = tmp_path / 'other.csv'
+    path.write_text('TIMESTAMP,A,B\n1.5,0.25,\n2.5,-1,3\n')
+
+    block = next(read_csv_blocks(str(path)))
+    assert block.timestamps.tolist() == [1.5, 2.5]
+    assert block.values.dtype == np.float64
+    assert block.values[1].tolist() == [-1.0, 3.0]
+    assert block.valid.tolist() == [[True, False], [True, True]]
+
+
+def test_collector_header_names_every_value(tmp_path):
+    """The collector's header has one name per value read, so captures read back by name."""
+    schema = get_schema('raw')
+    inverter = SinamicV20(client=None, slave_id=0)
+    inverter.read_raw_all_address = lambda: list(range(len(inverter.ADDRESS_LIST)))
+    path = tmp_path / 'data.csv'
+
+    with DataCollector(inverter, str(path), append=False) as collector:
+        collector.collect_data_point()
+
+    header = path.read_text().splitlines()[0].split(',')
+    assert header[1:] == schema.columns
+    assert len(header) == len(path.read_text().splitlines()[1].split(','))
+
+    columns, block = read_csv_array(str(path))
+    assert columns == schema.columns
+    assert block.values[0].tolist() == list(range(len(schema.columns)))
@@ -0,0 +1,56 @@
+"""
+Tests for the memory-mapped snapshot record log.
+
+Usage:
+    python -m pytest tests/data/test_record_log.py
+"""
+
+from utils.data.record_log import RecordLog, RecordLogReader, valid_mask
+
+
+def test_reader_sees_appends_and_validity(tmp_path):
+    """Readers see appended records and the bitmask flags unread registers."""
+    path = str(tmp_path / 'snapshots.rlog')
+
+    with RecordLog(path, capacity=16, n_channels=10) as log:
+        reader = RecordLogReader(path)
+        assert reader.latest() is None
+
+        log.append(100.0, [1] * 9 + [None])
+        log.append(101.0, [2] * 10)
+
+        assert reader.count == 2
+        assert list(reader.last(5)['ts']) == [100.0, 101.0]
+        assert valid_mask(reader.last(2)).sum(axis=1).tolist() == [9, 10]
+
+
+def test_ring_buffer_wraps_in_time_order(tmp_path):
+    """Once full, the oldest records are overwritten and reads stay ordered."""
+    path = str(tmp_path / 'snapshots.rlog')
+
+    with RecordLog(path, capacity=8, n_channels=4) as log:
+        for i in range(21):
+            log.append(float(i), [i] * 4)
+
+        reader = RecordLogReader(path)
+        # The slot of the oldest record is the next one written, so it's left out
+        assert list(reader.last(8)['ts']) == [float(i) for i in range(14, 21)]
+        assert list(reader.since(0.0)['ts']) == [float(i) for i in range(14, 21)]
+        assert list(reader.since(17.5)['ts']) == [18.0, 19.0, 20.0]
+        assert list(reader.last_seconds(1.5)['values'][:, 0]) == [19, 20]
+
+
+def test_slot_being_written_is_never_read(tmp_path):
+    """A record half-written over the oldest slot doesn't show up in reads."""
+    path = str(tmp_path / 'snapshots.rlog')
+
+    with RecordLog(path, capacity=8, n_channels=4) as log:
+        for i in range(16):
+            log.append(float(i), [i] * 4)
+
+        # Start overwriting the oldest slot without publishing the count
+        log.records[16 % 8]['ts'] = 99.0
+
+        reader = RecordLogReader(path)
+        assert list(reader.last(8)['ts']) == [float(i) for i in range(9, 16)]
+        assert list(reader.last_seconds(100.0)['ts']) == [float(i) for i in range(9, 16)]
@@ -0,0 +1,71 @@
+"""
+Tests for the store-and-forward spool.
+
+Usage:
+    python -m pytest tests/data/test_spool.py
+"""
+
+from utils.data.spool import Spool, SpoolReplayer, TARGET_HISTORY, spooled_values
+
+
+def test_append_seal_and_read(tmp_path):
+    """Spooled snapshots are read back with their targets and missing values."""
+    with Spool(str(tmp_path), n_channels=4) as spool:
+        spool.append(2, 100.0, [1, 2, None, 4])
+        spool.append(3, 101.0, [5, 6, 7, 8], TARGET_HISTORY)
+
+        segments = spool.seal()
+        assert len(segments) == 1
+
+        records = spool.read_segment(segments[0])
+        assert records['device_id'].tolist() == [2, 3]
+        assert records['targets'].tolist() == [1, TARGET_HISTORY]
+        assert spooled_values(records) == [[1, 2, None, 4], [5, 6, 7, 8]]
+
+
+def test_torn_and_corrupted_records_are_skipped(tmp_path):
+    """A torn tail and records failing their checksum are ignored on replay."""
+    with Spool(str(tmp_path), n_channels=4) as spool:
+        for i in range(3):
+            spool.append(1, float(i), [i, i, i, i])
+        path = spool.seal()[0]
+
+    data = bytearray(path.read_bytes())
+    data[-spool.dtype.itemsize + 20] ^= 0xFF
+    path.write_bytes(bytes(data) + b'\x00' * 7)
+
+    reopened = Spool(str(tmp_path), n_channels=4)
+    records = reopened.read_segment(path)
+    reopened.close()
+
+    assert records['ts'].tolist() == [0.0, 1.0]
+
+
+def test_replayer_retries_until_store_recovers(tmp_path):
+    """Segments are kept while the store fails and removed once replayed."""
+    replayed = []
+    store_up = False
+
+    def replay(records):
+        if not store_up:
+            raise RuntimeError("database is locked")
+        replayed.extend(records['ts'].tolist())
+
+    with Spool(str(tmp_path), n_channels=2) as spool:
+        replayer = SpoolReplayer(spool, replay, interval=3600)
+        spool.append(1, 1.0, [1, 1])
+
+        assert not replayer.replay_pending()
+        spool.append(1, 2.0, [2, 2])
+
+        # Failed attempts don't seal a new segment while one is waiting
+        assert not replayer.replay_pending()
+        assert len(spool.sealed()) == 1
+        assert len(spool.seal()) == 2
+
+        store_up = True
+        assert replayer.replay_pending()
+        replayer.stop()
+
+        assert replayed == [1.0, 2.0]
+        assert not spool.has_data
@@ -0,0 +1,6 @@
+"""
+Test modules for the database package.
+
+This package contains test modules for the database package components,
+including the partitioned history store.
+"""
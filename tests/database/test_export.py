@@ -0,0 +1,77 @@
+"""
+Tests for the columnar history export.
+
+Usage:
+    python -m pytest tests/database/test_export.py
+"""
+
+import sqlite3
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+from utils.database.export import export_history
+from utils.database.operations import create_database, generate_history_insert_query
+from utils.database.partitions import PartitionedHistory
+from utils.database.schema import get_schema
+
+T0 = 1704067200.0
+
+
+def _make_db(path, n=1000):
+    """Create a fleet database with two devices and one missing value."""
+    schema = get_schema('raw')
+    create_database(str(path), 'sinamicv20', fleet=True, values='raw')
+
+    rows = []
+    for device in (1, 2):
+        for i in range(n):
+            values = [i % 65536] * len(schema.columns)
+            if device == 1 and i == 5:
+                values[schema.columns.index('SPEED')] = None
+            rows.append((device, T0 + i * 0.5) + tuple(values))
+
+    conn = sqlite3.connect(str(path))
+    conn.executemany(generate_history_insert_query('sinamicv20', schema.columns), rows)
+    conn.commit()
+    conn.close()
+
+
+def test_parquet_export_of_one_device_range(tmp_path):
+    """A device's time range is exported with typed columns and nulls for missing values."""
+    db_path = tmp_path / 'inverter.db'
+    _make_db(db_path)
+
+    output = tmp_path / 'out' / 'speed.parquet'
+    total = export_history(str(output), columns=['SPEED', 'CURRENT'], device=1,
+                           t0=T0, t1=T0 + 100, db_path=str(db_path), values='raw', batch_rows=64)
+    assert total == 200
+
+    table = pq.read_table(output)
+    assert table.column_names == ['DEVICE_ID', 'TS', 'SPEED', 'CURRENT']
+    assert table.schema.field('SPEED').type == pa.uint16()
+    assert table.schema.field('TS').type == pa.timestamp('us', tz='UTC')
+    assert table.column('SPEED').null_count == 1
+    assert table.column('SPEED').to_pylist()[:7] == [0, 1, 2, 3, 4, None, 6]
+    assert table.column('TS')[1].as_py().timestamp() == T0 + 0.5
+    assert not output.with_name('speed.parquet.tmp').exists()
+
+
+def test_arrow_export_of_partitions(tmp_path):
+    """The partitioned history is exported across partitions to an Arrow IPC file."""
+    schema = get_schema('raw')
+    with PartitionedHistory(schema.columns, str(tmp_path / 'history'), 'sinamicv20') as history:
+        history.append_many([(T0 + i * 3600.0, {'SPEED': i}) for i in range(48)], device_id=3)
+    assert len(list((tmp_path / 'history').glob('*.db'))) == 2
+
+    output = tmp_path / 'history.arrow'
+    total = export_history(str(output), columns=['SPEED'], source='partitions',
+                           history_dir=str(tmp_path / 'history'), values='raw')
+    assert total == 48
+
+    table = pa.ipc.open_file(str(output)).read_all()
+    assert table.column('SPEED').to_pylist() == list(range(48))
+    assert set(table.column('DEVICE_ID').to_pylist()) == {3}
@@ -0,0 +1,63 @@
+"""
+Tests for the fleet schema (per-device latest values and history).
+
+Usage:
+    python -m pytest tests/database/test_fleet.py
+"""
+
+import sqlite3
+
+from utils.database.operations import (
+    create_database,
+    fetch_latest,
+    generate_history_insert_query,
+    generate_latest_upsert_query,
+    query_range
+)
+
+
+def _columns(conn):
+    return [row[1] for row in conn.execute("PRAGMA table_info(sinamicv20)") if row[1] != 'ID']
+
+
+def test_latest_table_keeps_one_row_per_device(tmp_path):
+    """Upserts replace each device's row while the history keeps every sample."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=True)
+
+    conn = sqlite3.connect(db_path)
+    columns = _columns(conn)
+    upsert = generate_latest_upsert_query('sinamicv20', columns)
+    insert = generate_history_insert_query('sinamicv20', columns)
+
+    for t in range(3):
+        for device in range(1, 51):
+            row = (device, 1000.0 + t) + tuple(device * 10 + t for _ in columns)
+            conn.execute(upsert, row)
+            conn.execute(insert, row)
+    conn.commit()
+
+    latest = fetch_latest(conn, 'sinamicv20')
+    assert len(latest) == 50
+    assert latest[7]['TS'] == 1002.0 and latest[7]['SPEED'] == 72
+    assert list(fetch_latest(conn, 'sinamicv20', device=7)) == [7]
+    conn.close()
+
+    ts, values = query_range(7, ['SPEED'], db_path=db_path)
+    assert ts.tolist() == [1000.0, 1001.0, 1002.0]
+    assert values[:, 0].tolist() == [70, 71, 72]
+
+
+def test_range_query_uses_covering_index(tmp_path):
+    """Per-device range queries on covered columns never touch the table rows."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=True)
+
+    conn = sqlite3.connect(db_path)
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT TS, SPEED FROM sinamicv20_history "
+        "WHERE DEVICE_ID = 3 AND TS >= 0 AND TS < 10 ORDER BY TS"
+    ).fetchall()
+    conn.close()
+
+    assert any('COVERING INDEX' in row[-1] for row in plan)
@@ -0,0 +1,76 @@
+"""
+Tests for the in-memory hot store.
+
+Usage:
+    python -m pytest tests/database/test_hot_store.py
+"""
+
+import sqlite3
+import time
+
+from utils.database.hot_store import HotStore
+
+
+def test_backup_persists_and_reloads(tmp_path):
+    """Data written in memory reaches disk on backup and is loaded back on open."""
+    db_path = str(tmp_path / 'inverter.db')
+
+    store = HotStore(db_path, backup_interval=3600, checkpoint_interval=3600)
+    with store.connection:
+        store.connection.execute("CREATE TABLE t (TS REAL, V INTEGER)")
+        store.connection.executemany("INSERT INTO t VALUES (?, ?)", [(float(i), i) for i in range(100)])
+
+    disk = sqlite3.connect(db_path)
+    assert disk.execute("SELECT name FROM sqlite_master WHERE name = 't'").fetchone() is None
+
+    assert store.backup()
+    assert disk.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 100
+    disk.close()
+
+    assert store.prune('t', max_age=50, now=100.0) == 50
+    store.close()
+
+    reopened = HotStore(db_path)
+    assert reopened.connection.execute("SELECT MIN(V), COUNT(*) FROM t").fetchone() == (50, 50)
+    reopened.close()
+
+
+def test_background_backup_in_steps(tmp_path):
+    """The backup thread copies the database a few pages at a time while it's written."""
+    db_path = str(tmp_path / 'inverter.db')
+
+    store = HotStore(db_path, backup_interval=0.05, checkpoint_interval=3600, pages_per_step=2, step_pause=0.001)
+    store.retain('t', max_age=50)
+    with store.lock, store.connection:
+        store.connection.execute("CREATE TABLE t (TS REAL, V BLOB)")
+        store.connection.executemany("INSERT INTO t VALUES (?, ?)", [(time.time(), bytes(1000)) for _ in range(200)])
+        store.connection.execute("INSERT INTO t VALUES (0.0, NULL)")
+
+    deadline = time.monotonic() + 5.0
+    count = 0
+    while time.monotonic() < deadline and count != 200:
+        time.sleep(0.05)
+        disk = sqlite3.connect(db_path)
+        try:
+            count = disk.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+        except sqlite3.OperationalError:
+            pass
+        disk.close()
+
+    store.close()
+    assert count == 200
+
+
+def test_zero_backup_interval_only_backs_up_on_close(tmp_path):
+    """An explicit backup_interval of 0 disables scheduled backups."""
+    db_path = str(tmp_path / 'inverter.db')
+
+    store = HotStore(db_path, backup_interval=0, checkpoint_interval=3600)
+    assert store.backup_interval == 0
+    with store.connection:
+        store.connection.execute("CREATE TABLE t (TS REAL)")
+    store.close()
+
+    disk = sqlite3.connect(db_path)
+    assert disk.execute("SELECT name FROM sqlite_master WHERE name = 't'").fetchone() == ('t',)
+    disk.close()
@@ -0,0 +1,48 @@
+"""
+Tests for bulk CSV ingest.
+
+Usage:
+    python -m pytest tests/database/test_ingest.py
+"""
+
+import sqlite3
+
+from utils.data.file_io import TIMESTAMP_COLUMN
+from utils.database.ingest import ingest_csv_files
+from utils.database.schema import get_schema
+
+
+def test_ingest_with_timestamps(tmp_path):
+    """Rows are loaded with their timestamps, and indexes and latest row are rebuilt."""
+    schema = get_schema('raw')
+    n = len(schema.columns)
+    csv_path = tmp_path / 'capture.csv'
+
+    lines = [','.join([TIMESTAMP_COLUMN] + schema.columns)]
+    for i in range(100):
+        values = [str(i)] * n
+        if i == 99:
+            values[1] = ''
+        lines.append(','.join([str(1000.0 + i)] + values))
+    csv_path.write_text('\n'.join(lines) + '\n')
+
+    db_path = str(tmp_path / 'inverter.db')
+    assert ingest_csv_files([str(csv_path)], db_path, 'sinamicv20', device_id=3,
+                            values='raw', workers=1, chunk_rows=32) == 100
+
+    conn = sqlite3.connect(db_path)
+    second = schema.columns[1]
+    assert conn.execute(
+        f"SELECT COUNT(*), MIN(TS), MAX(TS) FROM sinamicv20_history WHERE DEVICE_ID = 3"
+    ).fetchone() == (100, 1000.0, 1099.0)
+    assert conn.execute(f"SELECT {second} FROM sinamicv20_history WHERE TS = 1099.0").fetchone() == (None,)
+
+    indexes = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'sinamicv20_history'"
+    )}
+    assert 'idx_sinamicv20_history_device_ts_cover' in indexes
+
+    assert conn.execute(
+        f"SELECT TS, {schema.columns[0]} FROM sinamicv20_latest WHERE DEVICE_ID = 3"
+    ).fetchone() == (1099.0, 99)
+    conn.close()
@@ -0,0 +1,84 @@
+"""
+Tests for the time-partitioned history store.
+
+Usage:
+    python -m pytest tests/database/test_partitions.py
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+
+from utils.database.partitions import PartitionedHistory, partition_key
+
+COLUMNS = ['SPEED', 'CURRENT']
+
+# 2024-01-01 00:00:00 UTC, a Monday
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+DAY = 86400.0
+
+
+def test_partition_key():
+    """Daily keys follow the UTC date, weekly keys the Monday of the week."""
+    assert partition_key(T0 + 3600, 'day') == '20240101'
+    assert partition_key(T0 + 2 * DAY + 5, 'week') == '20240101'
+    assert partition_key(T0 + 7 * DAY, 'week') == '20240108'
+
+
+def test_append_routes_rows_to_partitions(tmp_path):
+    """Rows land in the partition of their day and queries span partitions."""
+    with PartitionedHistory(COLUMNS, directory=str(tmp_path), period='day') as history:
+        history.append_many([
+            (T0 + 10, {'SPEED': 1, 'CURRENT': 10}),
+            (T0 + DAY + 10, {'SPEED': 2, 'CURRENT': 20}),
+            (T0 + 2 * DAY + 10, {'SPEED': 3, 'CURRENT': 30}),
+        ])
+
+        assert [key for key, _ in history.list_partitions()] == ['20240101', '20240102', '20240103']
+        assert history.query(['SPEED']) == [(T0 + 10, 1), (T0 + DAY + 10, 2), (T0 + 2 * DAY + 10, 3)]
+        assert history.query(['SPEED'], t0=T0 + DAY, t1=T0 + 2 * DAY) == [(T0 + DAY + 10, 2)]
+
+        conn = history.connect_view()
+        try:
+            total = conn.execute(f"SELECT SUM(CURRENT) FROM {history.history_table}").fetchone()[0]
+        finally:
+            conn.close()
+        assert total == 60
+
+
+def test_retention_unlinks_expired_partitions(tmp_path):
+    """Rolling into a new partition removes files outside the retention window."""
+    with PartitionedHistory(COLUMNS, directory=str(tmp_path), period='day', retention=2) as history:
+        for day in range(4):
+            history.append(T0 + day * DAY, {'SPEED': day, 'CURRENT': 0})
+
+        assert [key for key, _ in history.list_partitions()] == ['20240103', '20240104']
+        assert not history.partition_path('20240101').exists()
+
+
+def test_replaced_rows_are_not_duplicated(tmp_path):
+    """Appending the same rows again with replace keeps one row per device and timestamp."""
+    rows = [(T0 + 10, {'SPEED': 1, 'CURRENT': 10}), (T0 + DAY + 10, {'SPEED': 2, 'CURRENT': 20})]
+
+    with PartitionedHistory(COLUMNS, directory=str(tmp_path), period='day') as history:
+        history.append_many(rows, device_id=1)
+        history.append_many(rows, device_id=2)
+        history.append_many(rows, device_id=1, replace=True)
+
+        assert history.query(['SPEED']) == [(T0 + 10, 1), (T0 + 10, 1), (T0 + DAY + 10, 2), (T0 + DAY + 10, 2)]
+        assert history.query(['SPEED'], device=2) == [(T0 + 10, 1), (T0 + DAY + 10, 2)]
+        assert history.query(['SPEED'], t0=T0 + DAY, device=1) == [(T0 + DAY + 10, 2)]
+        assert history.query(['SPEED'], device=3) == []
+
+
+def test_partitions_without_device_id_are_migrated(tmp_path):
+    """Partitions written before fleet support are queried as device 0."""
+    conn = sqlite3.connect(str(tmp_path / 'sinamicv20_20240101.db'))
+    conn.execute("CREATE TABLE sinamicv20_history (TS REAL NOT NULL, SPEED INTEGER, CURRENT INTEGER)")
+    conn.executemany("INSERT INTO sinamicv20_history VALUES (?, ?, ?)", [(T0 + i, i, 0) for i in range(10)])
+    conn.commit()
+    conn.close()
+
+    with PartitionedHistory(COLUMNS, directory=str(tmp_path), period='day') as history:
+        ts, values = history.query_range(0, ['SPEED'], max_points=5)
+        assert 0 < ts.size <= 5
+        assert history.query_range(0, ['SPEED'])[1][:, 0].tolist() == list(range(10))
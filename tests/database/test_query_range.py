@@ -0,0 +1,100 @@
+"""
+Tests for the downsampling time-range query API.
+
+Usage:
+    python -m pytest tests/database/test_query_range.py
+"""
+
+import sqlite3
+
+import numpy as np
+
+from utils.database.operations import (
+    create_history_table,
+    generate_history_insert_query,
+    query_range
+)
+from utils.database.partitions import PartitionedHistory
+
+COLUMNS = ['SPEED', 'CURRENT']
+T0 = 1704067200.0
+
+
+def _make_db(path, n=5000):
+    """Create a history table with a sine-shaped SPEED and one spike."""
+    conn = sqlite3.connect(str(path))
+    create_history_table(conn, 'sinamicv20', COLUMNS)
+    speed = (1000 + 500 * np.sin(np.arange(n) / 100.0)).astype(int)
+    speed[1234] = 9999
+    rows = [(1, T0 + i, int(speed[i]), i % 7) for i in range(n)]
+    rows.append((2, T0, 1, 1))
+    conn.executemany(generate_history_insert_query('sinamicv20', COLUMNS), rows)
+    conn.commit()
+    conn.close()
+    return speed
+
+
+def test_raw_range(tmp_path):
+    """Without max_points the range is returned as stored, for one device only."""
+    db_path = tmp_path / 'inverter.db'
+    speed = _make_db(db_path)
+
+    ts, values = query_range(1, COLUMNS, T0 + 10, T0 + 20, db_path=str(db_path))
+    assert ts.tolist() == [T0 + i for i in range(10, 20)]
+    assert values[:, 0].tolist() == speed[10:20].tolist()
+
+
+def test_minmax_keeps_extremes(tmp_path):
+    """Min/max buckets respect max_points and keep spikes."""
+    db_path = tmp_path / 'inverter.db'
+    speed = _make_db(db_path)
+
+    ts, values = query_range(1, COLUMNS, max_points=200, db_path=str(db_path))
+    assert 0 < ts.size <= 200
+    assert np.all(np.diff(ts) >= 0)
+    assert values[:, 0].max() == 9999
+    assert values[:, 0].min() == speed.min()
+
+
+def test_lttb_point_count(tmp_path):
+    """LTTB returns exactly max_points samples including both ends."""
+    db_path = tmp_path / 'inverter.db'
+    _make_db(db_path)
+
+    ts, values = query_range(1, COLUMNS, max_points=100, method='lttb', db_path=str(db_path))
+    assert ts.size == 100
+    assert ts[0] == T0 and ts[-1] == T0 + 4999
+    assert 9999 in values[:, 0]
+
+
+def test_partitioned_minmax_across_days(tmp_path):
+    """Buckets spanning partition files are merged into one envelope."""
+    with PartitionedHistory(COLUMNS, directory=str(tmp_path), period='day') as history:
+        rows = [(T0 + i * 60.0, {'SPEED': i, 'CURRENT': 0}) for i in range(3 * 1440)]
+        history.append_many(rows, device_id=3)
+
+        ts, values = history.query_range(3, ['SPEED'], max_points=50)
+        assert 0 < ts.size <= 50
+        assert values[:, 0].min() == 0 and values[:, 0].max() == 3 * 1440 - 1
+        assert history.query_range(4, ['SPEED'], max_points=50)[0].size == 0
+
+
+def test_partitioned_matches_single_database(tmp_path):
+    """Both stores return raw rows when the range fits in max_points and agree otherwise."""
+    db_path = tmp_path / 'inverter.db'
+    _make_db(db_path)
+
+    with PartitionedHistory(COLUMNS, directory=str(tmp_path / 'history'), period='day') as history:
+        conn = sqlite3.connect(str(db_path))
+        rows = conn.execute("SELECT TS, SPEED, CURRENT FROM sinamicv20_history WHERE DEVICE_ID = 1").fetchall()
+        conn.close()
+        history.append_many([(ts, {'SPEED': s, 'CURRENT': c}) for ts, s, c in rows], device_id=1)
+
+        for method in ('minmax', 'lttb'):
+            for max_points in (5000, 100):
+                expected = query_range(1, COLUMNS, max_points=max_points, method=method, db_path=str(db_path))
+                ts, values = history.query_range(1, COLUMNS, max_points=max_points, method=method)
+                assert ts.tolist() == expected[0].tolist()
+                assert values.tolist() == expected[1].tolist()
+
+        assert history.query_range(1, COLUMNS, max_points=5000)[0].size == 5000
@@ -0,0 +1,92 @@
+"""
+Tests for the register-map-driven schema.
+
+Usage:
+    python -m pytest tests/database/test_schema.py
+"""
+
+import shutil
+import sqlite3
+from pathlib import Path
+
+from utils.database.operations import create_database
+from utils.database.schema import RegisterSchema, get_schema
+from utils.modbus.motor import SinamicV20
+
+
+def test_columns_follow_register_map():
+    """Every address gets its own column, duplicates are suffixed with their address."""
+    register_map = SinamicV20(client=None, slave_id=0)
+    schema = get_schema('raw')
+
+    assert len(schema.columns) == len(register_map.ADDRESS_LIST)
+    assert len(set(schema.columns)) == len(schema.columns)
+    assert 'INVERTER_VER' in schema.columns and 'INVERTER_VER_40301' in schema.columns
+    assert schema.register_names == list(register_map.name_to_address)
+    assert 'FAULT_8 INTEGER' in schema.column_defs
+
+
+def test_scaled_values_are_signed_and_scaled():
+    """Scaled mode stores engineering values and raw_expression reverses them."""
+    schema = RegisterSchema(SinamicV20(client=None, slave_id=0), 'scaled')
+    raw = [0] * len(schema.columns)
+    raw[schema.columns.index('FREQ_OUTPUT')] = 65536 - 1234
+    raw[schema.columns.index('CURRENT')] = 250
+
+    row = schema.to_dict(raw)
+    assert row['FREQ_OUTPUT'] == -12.34
+    assert row['CURRENT'] == 2.5
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute(schema.create_table_sql('t'))
+    conn.execute(schema.insert_sql('t'), (0,) + schema.convert(raw))
+    expression = schema.raw_expression('FREQ_OUTPUT')
+    assert conn.execute(f"SELECT {expression} FROM t").fetchone()[0] == 65536 - 1234
+
+
+def test_generated_columns(tmp_path):
+    """Generated columns expose scaled values computed by SQLite."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=False, values='generated')
+    schema = get_schema('generated')
+
+    raw = [0] * len(schema.columns)
+    raw[schema.columns.index('TORQUE')] = 65536 - 150
+
+    conn = sqlite3.connect(db_path)
+    conn.execute(schema.update_sql('sinamicv20'), schema.convert(raw) + (0,))
+    torque, scaled = conn.execute("SELECT TORQUE, TORQUE_SCALED FROM sinamicv20 WHERE ID = 0").fetchone()
+    conn.close()
+
+    assert torque == 65536 - 150
+    assert scaled == -1.5
+
+
+def test_existing_database_is_migrated(tmp_path):
+    """A table of the original schema gains the new columns and accepts full updates."""
+    db_path = str(tmp_path / 'inverter.db')
+    shutil.copy(Path(__file__).parents[2] / 'assets' / 'data' / 'db.db', db_path)
+    schema = get_schema('raw')
+
+    create_database(db_path, 'sinamicv20', fleet=True, values='raw')
+
+    conn = sqlite3.connect(db_path)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sinamicv20)")]
+    assert set(schema.columns) <= set(columns)
+    conn.execute(schema.update_sql('sinamicv20'), tuple(range(len(schema.columns))) + (0,))
+    assert conn.execute("SELECT INVERTER_VER_40301 FROM sinamicv20 WHERE ID = 0").fetchone()[0] == (
+        schema.columns.index('INVERTER_VER_40301')
+    )
+    conn.close()
+
+
+def test_seed_row_keeps_original_values(tmp_path):
+    """A new database is seeded with the values of the original schema."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=False, values='raw')
+
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT FAULT_ACK, REF_FREQ, PRM_ERROR_CODE, INVERTER_VER_40301 FROM sinamicv20").fetchone()
+    conn.close()
+
+    assert row == (999, 10000, 255, 0)
@@ -0,0 +1,79 @@
+"""
+Tests for database change notification.
+
+Usage:
+    python -m pytest tests/database/test_watch.py
+"""
+
+import sqlite3
+import threading
+import time
+
+from utils.database.operations import create_database, generate_history_insert_query
+from utils.database.watch import DataVersionWatcher, fetch_rows_after, last_rowid
+
+
+def _insert(db_path, rows):
+    """Insert history rows (device, ts, speed) from another connection."""
+    conn = sqlite3.connect(db_path)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sinamicv20_history)")][2:]
+    insert = generate_history_insert_query('sinamicv20', columns)
+    conn.executemany(insert, [(device, ts) + (speed,) * len(columns) for device, ts, speed in rows])
+    conn.commit()
+    conn.close()
+
+
+def test_watcher_reports_commits_of_other_connections(tmp_path):
+    """Commits by another connection are reported once; waiting times out otherwise."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=True)
+    conn = sqlite3.connect(db_path)
+    watcher = DataVersionWatcher(conn, poll_interval=0.005)
+
+    assert not watcher.changed()
+    assert not watcher.wait(timeout=0.05)
+
+    _insert(db_path, [(1, 1000.0, 5)])
+    assert watcher.changed()
+    assert not watcher.changed()
+    conn.close()
+
+
+def test_wait_wakes_up_on_commit(tmp_path):
+    """A blocked wait returns shortly after another connection commits."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=True)
+    conn = sqlite3.connect(db_path)
+    watcher = DataVersionWatcher(conn, poll_interval=0.005)
+
+    timer = threading.Timer(0.1, _insert, (db_path, [(1, 1000.0, 5)]))
+    start = time.monotonic()
+    timer.start()
+    assert watcher.wait(timeout=5.0)
+    assert time.monotonic() - start < 1.0
+    timer.join()
+    conn.close()
+
+
+def test_rows_after_are_read_exactly_once(tmp_path):
+    """Rows are fetched by rowid in insertion order, each once, in bounded chunks."""
+    db_path = str(tmp_path / 'inverter.db')
+    create_database(db_path, 'sinamicv20', fleet=True)
+    _insert(db_path, [(1, 1000.0, 1), (2, 1000.0, 2)])
+
+    conn = sqlite3.connect(db_path)
+    after = last_rowid(conn, 'sinamicv20_history')
+    assert after == 2
+
+    # Out-of-order timestamps are still read, as inserted
+    _insert(db_path, [(1, 1002.0, 3), (2, 999.0, 4), (1, 1001.0, 5)])
+    seen = []
+    while True:
+        rowids, devices, timestamps, features = fetch_rows_after(conn, 'sinamicv20_history', ['SPEED'], after, limit=2)
+        if not rowids.size:
+            break
+        after = int(rowids[-1])
+        seen += list(zip(devices.tolist(), timestamps.tolist(), features[:, 0].tolist()))
+
+    assert seen == [(1, 1002.0, 3.0), (2, 999.0, 4.0), (1, 1001.0, 5.0)]
+    conn.close()
@@ -0,0 +1,5 @@
+"""
+Test modules for the ipc package.
+
+This package contains test modules for the inter-process snapshot channels.
+"""
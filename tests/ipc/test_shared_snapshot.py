@@ -0,0 +1,29 @@
+"""
+Tests for the shared-memory latest-snapshot channel.
+
+Usage:
+    python -m pytest tests/ipc/test_shared_snapshot.py
+"""
+
+import os
+
+from utils.data.record_log import unpack_snapshot
+from utils.ipc.shared_snapshot import SnapshotPublisher, SnapshotReader
+
+
+def test_reader_sees_latest_snapshot():
+    """Readers get a consistent copy of the latest snapshot and detect updates."""
+    name = f"modcon_test_{os.getpid()}"
+
+    with SnapshotPublisher(name, n_channels=8) as publisher:
+        with SnapshotReader(name) as reader:
+            assert reader.read() == (0, None)
+
+            publisher.publish(10.0, [1, 2, 3, 4, 5, 6, 7, None])
+            seq, record = reader.read()
+            assert seq == 2
+            assert unpack_snapshot(record) == (10.0, [1, 2, 3, 4, 5, 6, 7, None])
+            assert reader.read_new() is None
+
+            publisher.publish(11.0, [0] * 8)
+            assert float(reader.wait_for_update(timeout=1.0)['ts']) == 11.0
@@ -0,0 +1,72 @@
+"""
+Tests for the Unix domain socket snapshot stream.
+
+Usage:
+    python -m pytest tests/ipc/test_stream.py
+"""
+
+import socket
+import time
+
+from utils.data.record_log import unpack_snapshot
+from utils.ipc.stream import SnapshotStreamServer, SnapshotSubscriber
+
+
+def _wait_for_subscribers(server: SnapshotStreamServer, count: int) -> None:
+    """Wait until the accept thread registered the expected subscribers."""
+    deadline = time.monotonic() + 2.0
+    while server.subscriber_count < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_subscribers_receive_published_snapshots(tmp_path):
+    """Every subscriber receives each snapshot in order."""
+    path = str(tmp_path / 'modcon.sock')
+
+    with SnapshotStreamServer(path, n_channels=4) as server:
+        with SnapshotSubscriber(path) as first, SnapshotSubscriber(path) as second:
+            _wait_for_subscribers(server, 2)
+            assert first.recv(timeout=0.01) is None
+
+            server.publish(1.0, [1, 2, 3, None])
+            server.publish(2.0, [4, 5, 6, 7])
+
+            for subscriber in (first, second):
+                assert unpack_snapshot(subscriber.recv(timeout=1.0)) == (1.0, [1, 2, 3, None])
+                assert unpack_snapshot(subscriber.recv(timeout=1.0)) == (2.0, [4, 5, 6, 7])
+
+
+def test_subscriber_sees_stream_close(tmp_path):
+    """Closing the server ends iteration on the subscriber side."""
+    path = str(tmp_path / 'modcon.sock')
+    server = SnapshotStreamServer(path, n_channels=4)
+
+    with SnapshotSubscriber(path) as subscriber:
+        _wait_for_subscribers(server, 1)
+        server.publish(1.0, [0, 0, 0, 0])
+        time.sleep(0.05)
+        server.close()
+
+        assert [float(record['ts']) for record in subscriber] == [1.0]
+
+
+def test_disconnected_subscribers_are_removed(tmp_path):
+    """Subscribers that disconnect are forgotten once a send to them fails."""
+    path = str(tmp_path / 'modcon.sock')
+
+    with SnapshotStreamServer(path, n_channels=4) as server:
+        sockets = [socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) for _ in range(5)]
+        for sock in sockets:
+            sock.connect(path)
+        _wait_for_subscribers(server, 5)
+        assert server.subscriber_count == 5
+
+        for sock in sockets:
+            sock.close()
+
+        deadline = time.monotonic() + 2.0
+        while server.subscriber_count and time.monotonic() < deadline:
+            server.publish(1.0, [1, 2, 3, 4])
+            time.sleep(0.01)
+
+        assert server.subscriber_count == 0
@@ -0,0 +1,5 @@
+"""
+Test modules for the ml package.
+
+This package contains test modules for model inference.
+"""
@@ -0,0 +1,95 @@
+"""
+Latency benchmark of the NumPy inference kernel against the scikit-learn model.
+
+Measures, for the shipped maintainer model, the cold start (imports and
+model load, in a fresh process) with its peak RSS (read from /proc, so
+Linux only), and the predict latency for a single snapshot and batches.
+
+Usage:
+    python -m tests.ml.bench_kernel [--model PATH] [--repeat N]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+from utils.ml.kernel import NumpyClassifier, export_model
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# Cold start scripts, printing the load time and peak RSS of a fresh process
+COLD_START = {
+    'sklearn': (
+        "import time, warnings; warnings.simplefilter('ignore'); start = time.perf_counter(); "
+        "from joblib import load; model = load({path!r}); "
+        "print(time.perf_counter() - start, open('/proc/self/status').read().split('VmHWM:')[1].split()[0])"
+    ),
+    'kernel': (
+        "import time; start = time.perf_counter(); "
+        "from utils.ml.kernel import NumpyClassifier; model = NumpyClassifier.load({path!r}); "
+        "print(time.perf_counter() - start, open('/proc/self/status').read().split('VmHWM:')[1].split()[0])"
+    )
+}
+
+
+def cold_start(name: str, path: str) -> tuple:
+    """Run a cold start script, returning (seconds, peak RSS in MB)."""
+    output = subprocess.run(
+        [sys.executable, '-c', COLD_START[name].format(path=path)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[0]), int(output[1]) / 1024
+
+
+def latency(predict, X: np.ndarray, repeat: int) -> float:
+    """Best time of a predict call in microseconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict(X)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description='Benchmark the NumPy kernel against the scikit-learn model')
+    parser.add_argument('--model', default=str(ROOT / 'assets' / 'model' / 'model.joblib'), help='Model file')
+    parser.add_argument('--repeat', type=int, default=200, help='Timing repetitions')
+    args = parser.parse_args()
+
+    from joblib import load
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        model = load(args.model)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        kernel_path = os.path.join(tmp, 'model.npz')
+        export_model(model, kernel_path)
+        kernel = NumpyClassifier.load(kernel_path)
+
+        print(f"{'cold start':<12}{'seconds':>10}{'peak RSS MB':>14}")
+        for name, path in (('sklearn', args.model), ('kernel', kernel_path)):
+            seconds, rss = cold_start(name, path)
+            print(f"{name:<12}{seconds:>10.3f}{rss:>14.1f}")
+
+    rng = np.random.default_rng(0)
+    print(f"\n{'rows':<8}{'sklearn us':>12}{'kernel us':>12}{'speedup':>10}")
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for rows in (1, 64, 4096):
+            X = rng.integers(0, 65536, size=(rows, kernel.n_features_in_)).astype(np.float64)
+            reference = latency(model.predict_proba, X, args.repeat)
+            fast = latency(kernel.predict_proba, X, args.repeat)
+            print(f"{rows:<8}{reference:>12.1f}{fast:>12.1f}{reference / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
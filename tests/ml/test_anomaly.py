@@ -0,0 +1,70 @@
+"""
+Tests for the streaming anomaly detector.
+
+Usage:
+    python -m pytest tests/ml/test_anomaly.py
+"""
+
+import numpy as np
+
+from utils.database.schema import ChannelScaling
+from utils.ml.anomaly import StreamingAnomalyDetector
+
+
+def _noise(n: int, devices: int = 2, channels: int = 3, seed: int = 0) -> np.ndarray:
+    """Generate stationary samples around 100."""
+    return 100 + np.random.default_rng(seed).normal(size=(n, devices, channels))
+
+
+def test_outlier_and_shift_are_flagged():
+    """A spike raises a z-score event and a sustained offset a CUSUM event."""
+    detector = StreamingAnomalyDetector(['A', 'B', 'C'], warmup=20)
+    samples = _noise(300)
+    samples[100, 1, 0] += 50
+    samples[200:, 0, 2] += 2.5
+
+    events = []
+    for t, cycle in enumerate(samples):
+        events += detector.update([1, 2], float(t), cycle)
+
+    spike = [e for e in events if e.kind == 'zscore' and e.timestamp == 100.0]
+    assert [(e.device, e.channel) for e in spike] == [(2, 'A')]
+    assert spike[0].value > 140 and abs(spike[0].baseline - 100) < 1
+
+    shifts = [e for e in events if e.kind == 'cusum_high']
+    assert shifts and all((e.device, e.channel) == (1, 'C') for e in shifts)
+    assert 200 <= shifts[0].timestamp < 215
+
+
+def test_warmup_and_unread_channels():
+    """Nothing is flagged during warmup, and unread registers leave the baseline alone."""
+    detector = StreamingAnomalyDetector(['A'], warmup=5)
+    assert detector.update([0], 0.0, [[10.0]]) == []
+    assert detector.update([0], 1.0, [[1000.0]]) == []
+
+    mean = detector.state.mean.copy()
+    detector.update([0], 2.0, [[np.nan]])
+    assert np.array_equal(detector.state.mean, mean)
+    assert detector.state.count[0, 0] == 2
+
+
+def test_sensitivity_and_register_conversion():
+    """Sensitivity scales a channel's thresholds, and signed registers are converted."""
+    detector = StreamingAnomalyDetector(
+        ['SPEED', 'TORQUE'], warmup=0, sensitivity={'SPEED': 4.0},
+        min_std=[1.0, 1.0], scaling=ChannelScaling(np.array([2, 0]), np.array([1.0, 100.0]), np.array([True, True]))
+    )
+    detector.update([0], 0.0, [[65436, 0, 65535]])
+    assert detector.state.mean[0].tolist() == [-1.0, -1.0]
+
+    events = detector.update([0], 1.0, [[65436, 0, 1]])
+    assert [(e.channel, e.kind) for e in events] == [('SPEED', 'zscore')]
+
+
+def test_update_many_splits_cycles_per_device():
+    """Several samples of a device in one block are processed in order."""
+    detector = StreamingAnomalyDetector(['A'], alpha=0.5, warmup=100)
+    detector.update_many(np.array([1, 2, 1, 1]), np.arange(4.0), np.array([[0.0], [5.0], [2.0], [4.0]]))
+
+    assert detector.state.count[:2, 0].tolist() == [3, 1]
+    assert detector.state.mean[1, 0] == 5.0
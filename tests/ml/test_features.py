@@ -0,0 +1,59 @@
+"""
+Tests for the incremental rolling-window features.
+
+Usage:
+    python -m pytest tests/ml/test_features.py
+"""
+
+import numpy as np
+
+from utils.database.schema import ChannelScaling
+from utils.ml.features import FEATURE_STATS, RollingFeatureEngine
+
+
+def _reference(t: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Compute the window statistics from scratch."""
+    slope = np.polyfit(t - t[0], y, 1)[0] if len(t) > 1 else np.full(y.shape[1], np.nan)
+    return np.array([
+        y.mean(axis=0), y.var(axis=0), np.sqrt((y * y).mean(axis=0)),
+        y.min(axis=0), y.max(axis=0), slope, y.max(axis=0) - y.min(axis=0)
+    ])
+
+
+def test_incremental_features_match_recomputation():
+    """Running statistics match a full recomputation, across many buffer wraps."""
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(250, 2)) * 50 + 1000
+    times = 1.7e9 + np.cumsum(rng.uniform(0.5, 1.5, 250))
+    engine = RollingFeatureEngine(['A', 'B'], [4, 30])
+
+    for i in range(250):
+        features = engine.update(1, times[i], values[i]).reshape(2, len(FEATURE_STATS), 2)
+        for stats, size in zip(features, engine.windows):
+            start = max(0, i - size + 1)
+            expected = _reference(times[start:i + 1], values[start:i + 1])
+            assert np.allclose(stats, expected, rtol=1e-6, atol=1e-6, equal_nan=True)
+
+
+def test_schema_engine_converts_and_fills_registers():
+    """Raw register values are scaled, and unread ones repeat their last value."""
+    engine = RollingFeatureEngine(['TORQUE'], [3], ChannelScaling(np.array([1]), np.array([100.0]), np.array([True])))
+    assert engine.feature_names[:2] == ['TORQUE_mean_3', 'TORQUE_var_3']
+    assert engine.n_features == len(FEATURE_STATS)
+
+    assert np.isnan(engine.update(0, 0.0, [7, None])).all()
+    features = engine.update(0, 1.0, [7, 65436])
+    assert features[0] == -1.0
+
+    features = engine.update(0, 2.0, [7, None])
+    assert features[0] == -1.0 and features[FEATURE_STATS.index('slope')] == 0.0
+
+
+def test_devices_have_separate_windows():
+    """Samples of one device don't affect the features of another."""
+    engine = RollingFeatureEngine(['A'], [5])
+    features = engine.update_many(np.array([1, 2, 1]), np.array([0.0, 0.0, 1.0]), np.array([[1.0], [50.0], [3.0]]))
+
+    assert features[:, 0].tolist() == [1.0, 50.0, 2.0]
+    engine.reset(1)
+    assert engine.update(1, 2.0, [9.0])[0] == 9.0
@@ -0,0 +1,74 @@
+"""
+Tests for batched model inference.
+
+Usage:
+    python -m pytest tests/ml/test_inference.py
+"""
+
+import numpy as np
+import pytest
+
+from utils.data.record_log import pack_snapshot, snapshot_dtype
+from utils.ml.inference import BatchPredictor, snapshot_features
+
+linear_model = pytest.importorskip('sklearn.linear_model')
+
+
+def _model(n_features: int = 4) -> "linear_model.LogisticRegression":
+    """Fit a small classifier on random data."""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, n_features))
+    y = (X[:, 0] > 0).astype(int) + (X[:, 1] > 0).astype(int)
+    return linear_model.LogisticRegression().fit(X, y)
+
+
+def test_windows_match_single_predictions():
+    """Each full window is scored once, with the predictions of the model."""
+    model = _model()
+    predictor = BatchPredictor(model, window_size=8)
+    X = np.random.default_rng(1).normal(size=(20, 4))
+
+    results = predictor.add_many(X, np.arange(20) % 3, np.arange(20.0))
+    assert [len(result.predictions) for result in results] == [8, 8]
+    assert np.array_equal(np.concatenate([r.predictions for r in results]), model.predict(X[:16]))
+    assert np.array_equal(results[1].timestamps, np.arange(8.0, 16.0))
+    assert np.allclose(results[0].probabilities, model.predict_proba(X[:8]))
+
+    rest = predictor.flush()
+    assert len(rest.predictions) == 4
+    assert predictor.flush() is None
+    assert predictor.latency_stats()['batches'] == 3
+
+
+def test_incomplete_rows_are_skipped():
+    """Rows with unread registers are left out of the model call."""
+    predictor = BatchPredictor(_model(), window_size=3)
+    assert predictor.add([0.1, 0.2, 0.3, 0.4], device=1, timestamp=1.0) == []
+    assert predictor.add([0.1, None, 0.3, 0.4], device=1, timestamp=2.0) == []
+
+    result, = predictor.add([0.5, 0.6, 0.7, 0.8], device=2, timestamp=3.0)
+    assert result.skipped == 1
+    assert result.devices.tolist() == [1, 2]
+    assert result.timestamps.tolist() == [1.0, 3.0]
+
+
+def test_poll_scores_partial_window_after_max_delay():
+    """A partial window is scored once its oldest snapshot waited max_delay."""
+    predictor = BatchPredictor(_model(), window_size=100, max_delay=0.5)
+    predictor.add([0.1, 0.2, 0.3, 0.4])
+    opened = predictor.window.opened_at
+
+    assert predictor.poll(now=opened + 0.1) is None
+    assert len(predictor.poll(now=opened + 0.5).predictions) == 1
+    assert predictor.poll(now=opened + 1.0) is None
+
+
+def test_snapshot_features_from_records():
+    """Feature rows are gathered from snapshot records with NaN for unread registers."""
+    records = np.zeros(2, dtype=snapshot_dtype(4))
+    pack_snapshot(records[0], 1.0, [10, 20, 30, 40])
+    pack_snapshot(records[1], 2.0, [11, None, 31, 41])
+
+    features = snapshot_features(records, np.array([0, 1, 3]))
+    assert features[0].tolist() == [10.0, 20.0, 40.0]
+    assert features[1, 0] == 11.0 and np.isnan(features[1, 1]) and features[1, 2] == 41.0
@@ -0,0 +1,86 @@
+"""
+Tests for the NumPy inference kernel.
+
+Usage:
+    python -m pytest tests/ml/test_kernel.py
+"""
+
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from utils.ml.kernel import NumpyClassifier, check_parity, export_model
+
+ensemble = pytest.importorskip('sklearn.ensemble')
+linear_model = pytest.importorskip('sklearn.linear_model')
+svm = pytest.importorskip('sklearn.svm')
+tree = pytest.importorskip('sklearn.tree')
+
+MODEL_PATH = Path(__file__).resolve().parents[2] / 'assets' / 'model' / 'model.joblib'
+
+MODELS = [
+    linear_model.LogisticRegression(max_iter=500),
+    linear_model.SGDClassifier(loss='log_loss', random_state=0),
+    linear_model.RidgeClassifier(),
+    svm.LinearSVC(),
+    tree.DecisionTreeClassifier(random_state=0),
+    ensemble.RandomForestClassifier(n_estimators=15, random_state=0),
+    ensemble.ExtraTreesClassifier(n_estimators=15, random_state=0)
+]
+
+
+def _data(n_classes: int, missing: bool):
+    """Generate a classification problem, with unread values for the tree models."""
+    rng = np.random.default_rng(n_classes)
+    X = rng.normal(size=(400, 5))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    if n_classes == 3:
+        y += (X[:, 2] > 0.5).astype(int)
+    if missing:
+        X[rng.random(X.shape) < 0.05] = np.nan
+    return X, y
+
+
+@pytest.mark.parametrize('n_classes', [2, 3])
+@pytest.mark.parametrize('model', MODELS, ids=lambda model: type(model).__name__)
+def test_kernel_matches_model(tmp_path, model, n_classes):
+    """Exported kernels give the predictions and probabilities of the original models."""
+    X, y = _data(n_classes, missing='Tree' in type(model).__name__ or 'Forest' in type(model).__name__)
+    model.fit(X, y)
+
+    path = str(tmp_path / 'model.npz')
+    export_model(model, path)
+    kernel = NumpyClassifier.load(path)
+
+    assert kernel.n_features_in_ == 5 and np.array_equal(kernel.classes_, model.classes_)
+    assert hasattr(kernel, 'predict_proba') == hasattr(model, 'predict_proba')
+    assert check_parity(model, kernel, X, atol=1e-12) <= 1e-12
+
+
+def test_shipped_model_parity(tmp_path):
+    """The exported maintainer model reproduces the shipped one on raw register values."""
+    joblib = pytest.importorskip('joblib')
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        model = joblib.load(MODEL_PATH)
+        path = str(tmp_path / 'model.npz')
+        export_model(model, path)
+        kernel = NumpyClassifier.load(path)
+
+        X = np.random.default_rng(0).integers(0, 65536, size=(2000, model.n_features_in_)).astype(np.float64)
+        check_parity(model, kernel, X)
+
+    assert list(kernel.feature_names_in_) == list(model.feature_names_in_)
+
+
+def test_unsupported_model_and_width(tmp_path):
+    """Unsupported models are refused and inputs of the wrong width rejected."""
+    with pytest.raises(TypeError):
+        export_model(object(), str(tmp_path / 'model.npz'))
+
+    X, y = _data(2, missing=False)
+    export_model(linear_model.LogisticRegression().fit(X, y), str(tmp_path / 'model.npz'))
+    with pytest.raises(ValueError):
+        NumpyClassifier.load(str(tmp_path / 'model.npz')).predict(np.zeros((1, 4)))
@@ -0,0 +1,75 @@
+"""
+Tests for the hot-reloading model registry.
+
+Usage:
+    python -m pytest tests/ml/test_registry.py
+"""
+
+import os
+import time
+
+import joblib
+import numpy as np
+import pytest
+
+from utils.ml.kernel import NumpyClassifier, export_model
+from utils.ml.registry import ModelRegistry
+
+linear_model = pytest.importorskip('sklearn.linear_model')
+
+
+def _deploy(path, n_features: int, seed: int) -> None:
+    """Fit a model and rename it over the model file."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(60, n_features))
+    model = linear_model.LogisticRegression().fit(X, (X[:, 0] > 0).astype(int))
+    joblib.dump(model, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+
+def test_new_versions_replace_the_model(tmp_path):
+    """Valid new files are loaded memory-mapped; invalid ones keep the current model."""
+    path = str(tmp_path / 'model.joblib')
+    with ModelRegistry(path, poll_interval=0) as registry:
+        assert registry.model is None and registry.version == 0
+
+        _deploy(path, 4, seed=0)
+        assert registry.check()
+        assert isinstance(registry.model.coef_, np.memmap)
+        assert not registry.check()
+
+        registry.set_reference(np.zeros((3, 4)))
+        _deploy(path, 5, seed=1)
+        assert not registry.check()
+        assert registry.version == 1 and registry.model.n_features_in_ == 4
+
+        _deploy(path, 4, seed=2)
+        assert registry.check()
+        assert registry.version == 2
+
+
+def test_background_reload(tmp_path):
+    """The watch thread picks up a replaced file."""
+    path = str(tmp_path / 'model.joblib')
+    _deploy(path, 3, seed=0)
+
+    with ModelRegistry(path, poll_interval=0.01) as registry:
+        first = registry.model
+        _deploy(path, 3, seed=1)
+
+        deadline = time.monotonic() + 2.0
+        while registry.version < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert registry.version == 2 and registry.model is not first
+
+
+def test_exported_kernel_is_loaded(tmp_path):
+    """Models exported to .npz are loaded as NumPy kernels."""
+    X = np.random.default_rng(0).normal(size=(60, 3))
+    model = linear_model.LogisticRegression().fit(X, (X[:, 0] > 0).astype(int))
+    path = str(tmp_path / 'model.npz')
+    export_model(model, path)
+
+    with ModelRegistry(path, poll_interval=0, reference=X[:5]) as registry:
+        assert isinstance(registry.model, NumpyClassifier)
+        assert np.array_equal(registry.model.predict(X), model.predict(X))
@@ -0,0 +1,108 @@
+"""
+Tests for the limit-check rule engine.
+
+Usage:
+    python -m pytest tests/ml/test_rules.py
+"""
+
+import numpy as np
+import pytest
+
+from utils.database.schema import get_schema
+from utils.ml.rules import LimitRule, RuleEngine, limit_rules, parse_rule
+
+
+def test_parse_rule_thresholds():
+    """Conditions compare with a number, a scaled constant or a scaled channel."""
+    rule = parse_rule({'condition': 'CURRENT > 12.5'})
+    assert (rule.channel, rule.operator, rule.threshold, rule.threshold_channel) == ('CURRENT', '>', 12.5, None)
+
+    rule = parse_rule({'name': 'overcurrent', 'condition': 'CURRENT > 0.9 * RATED_CURRENT', 'duration': 10},
+                      constants={'RATED_CURRENT': 20.0})
+    assert rule.name == 'overcurrent'
+    assert rule.threshold == pytest.approx(18.0)
+    assert rule.duration == 10.0
+
+    rule = parse_rule({'condition': 'ACTUAL_PWR >= 0.95 * RATED_PWR'})
+    assert (rule.threshold_channel, rule.threshold_factor) == ('RATED_PWR', 0.95)
+
+    with pytest.raises(ValueError):
+        parse_rule({'condition': 'CURRENT is high'})
+    with pytest.raises(ValueError):
+        parse_rule({'condition': 'CURRENT > 1', 'severity': 'urgent'})
+
+
+def test_limit_rules_from_register_map():
+    """Registers with numeric limits get a min and a max rule, others none."""
+    schema = get_schema('raw')
+    rules = {rule.name: rule for rule in limit_rules(schema, exclude=['SPEED'])}
+    assert rules['CURRENT_max'].threshold == pytest.approx(163.83)
+    assert rules['TORQUE_min'].threshold == pytest.approx(-325.0)
+    assert 'SPEED_max' not in rules
+    assert 'WDOG_ACTION_max' not in rules
+    assert 'DIGITAL_OUT_1_max' not in rules
+
+
+def test_duration_and_hysteresis():
+    """A rule raises once violated for its duration and clears past the hysteresis."""
+    engine = RuleEngine([LimitRule('hot', 'T', '>', 80.0, duration=10.0, hysteresis=5.0)], ['T'])
+    events = []
+    for t, value in enumerate([70, 85, 90, 79, 85, 86, 90, 82, 77, 74]):
+        events += [(t, e.state) for e in engine.update([1], t * 5.0, [[value]])]
+
+    # Violated from t=4 (20 s), raised at t=6 (30 s), still raised at 77, cleared at 74
+    assert events == [(6, 'raised'), (9, 'cleared')]
+
+
+def test_unread_values_keep_state():
+    """NaN samples neither raise, clear nor reset a rule's duration."""
+    engine = RuleEngine([LimitRule('high', 'X', '>', 1.0, duration=2.0)], ['X'])
+    assert engine.update([1], 0.0, [[5.0]]) == []
+    assert engine.update([1], 1.0, [[np.nan]]) == []
+    event, = engine.update([1], 2.0, [[5.0]])
+    assert event.state == 'raised'
+    assert engine.active(1) == ['high']
+    assert engine.update([1], 3.0, [[np.nan]]) == []
+    assert engine.active(1) == ['high']
+
+
+def test_devices_are_independent_and_vectorized():
+    """One call evaluates every rule of every device with its own state."""
+    rules = [LimitRule('a_high', 'A', '>', 10.0), LimitRule('b_low', 'B', '<', 0.0),
+             LimitRule('a_over_b', 'A', '>', 0.0, threshold_channel='B', threshold_factor=2.0)]
+    engine = RuleEngine(rules, ['A', 'B'])
+    values = np.array([[5.0, 1.0], [11.0, 1.0], [1.0, -1.0]])
+
+    events = engine.update([1, 2, 3], 0.0, values)
+    assert sorted((e.device, e.rule) for e in events) == [
+        (1, 'a_over_b'), (2, 'a_high'), (2, 'a_over_b'), (3, 'a_over_b'), (3, 'b_low')
+    ]
+    assert engine.update([1, 2, 3], 1.0, values) == []
+
+    events = engine.update([2], 2.0, [[1.0, 1.0]])
+    assert sorted((e.rule, e.state) for e in events) == [('a_high', 'cleared'), ('a_over_b', 'cleared')]
+    assert engine.active(3) == ['b_low', 'a_over_b']
+
+
+def test_from_schema_converts_raw_values():
+    """Raw register rows are converted to engineering units before the checks."""
+    schema = get_schema('raw')
+    engine = RuleEngine.from_schema(schema, [{'name': 'reverse', 'condition': 'TORQUE < -10'}], limits=False)
+    row = np.zeros((1, len(schema.register_names)))
+    row[0, schema.register_names.index('TORQUE')] = 65536 - 1500
+
+    event, = engine.update([7], 0.0, row)
+    assert event.rule == 'reverse'
+    assert event.value == pytest.approx(-15.0)
+
+
+def test_limits_flag_out_of_range_registers():
+    """The register map limits flag a value beyond its documented range."""
+    schema = get_schema('raw')
+    engine = RuleEngine.from_schema(schema)
+    row = np.zeros((2, len(schema.register_names)))
+    row[1, schema.register_names.index('CURRENT')] = 20000
+
+    events = engine.update([1, 2], 0.0, row)
+    assert 'CURRENT_max' in {e.rule for e in events if e.device == 2}
+    assert 'CURRENT_max' not in {e.rule for e in events if e.device == 1}
@@ -0,0 +1,31 @@
+"""
+Tests for the per-device state arrays.
+
+Usage:
+    python -m pytest tests/ml/test_state.py
+"""
+
+import numpy as np
+
+from utils.ml.state import DeviceStates, device_runs
+
+
+def test_rows_are_allocated_and_reset():
+    """New devices get rows holding the initial values, reset restores them."""
+    state = DeviceStates(2, since=np.nan, raised=False)
+    assert state.rows([7, 3]).tolist() == [0, 1]
+    assert state.rows([3, 9]).tolist() == [1, 2]
+    assert len(state) == 3 and state.row(5) is None
+    assert state.raised.dtype == bool and np.isnan(state.since[:3]).all()
+
+    state.since[state.row(3)] = 1.0
+    state.raised[:] = True
+    state.reset(3)
+    assert np.isnan(state.since[1]).all() and not state.raised[1].any()
+    assert state.raised[0].all()
+
+
+def test_device_runs_hold_each_device_once():
+    """Runs break before a device repeats."""
+    devices = np.array([1, 2, 1, 1, 3, 2])
+    assert [devices[run].tolist() for run in device_runs(devices)] == [[1, 2], [1], [1, 3, 2]]
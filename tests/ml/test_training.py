@@ -0,0 +1,152 @@
+"""
+Tests for the streaming training pipeline.
+
+Usage:
+    python -m pytest tests/ml/test_training.py
+"""
+
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn.linear_model')
+
+from utils.database.operations import create_database, generate_history_insert_query
+from utils.database.schema import get_schema
+from utils.ml.kernel import NumpyClassifier
+from utils.ml.training import (
+    FrequencyLabeler,
+    TrainingSpec,
+    assign_folds,
+    classification_metrics,
+    confusion_matrix,
+    fit_model,
+    train
+)
+
+T0 = 1704067200.0
+
+
+def _make_db(path, n=400):
+    """Create a history of two devices cycling through the four frequency levels."""
+    schema = get_schema('raw')
+    create_database(str(path), 'sinamicv20', fleet=True, values='raw')
+    rng = np.random.default_rng(0)
+    freq = schema.columns.index('FREQ_OUTPUT')
+    # One register raised per class, so every class is linearly separable
+    marker = [schema.columns.index(name) for name in ('SPEED', 'CURRENT', 'TORQUE', 'DC_BUS_VOLTS')]
+
+    rows = []
+    for device in (1, 2):
+        for i in range(n):
+            label = (i // 25) % 4
+            level = (0, 7, 10, 13)[label]
+            values = rng.integers(0, 100, len(schema.columns))
+            values[freq] = level * 100 + rng.integers(-20, 20) if level else 0
+            values[marker[label]] += 500
+            if i % 50 == 49:
+                values[freq] = 850
+            rows.append((device, T0 + i * 10.0) + tuple(int(v) for v in values))
+
+    conn = sqlite3.connect(str(path))
+    conn.executemany(generate_history_insert_query('sinamicv20', schema.columns), rows)
+    conn.commit()
+    conn.close()
+
+
+def _spec(tmp_path, **kwargs) -> TrainingSpec:
+    """Training run over the test history."""
+    db_path = tmp_path / 'inverter.db'
+    if not db_path.exists():
+        _make_db(db_path)
+    return TrainingSpec(db_path=str(db_path), table_name='sinamicv20', values='raw', folds=3,
+                        fold_block=600.0, batch_rows=97, **kwargs)
+
+
+def test_labeler_picks_nearest_level():
+    """Snapshots get the nearest level's class, -1 when unread or out of tolerance."""
+    schema = get_schema('raw')
+    labeler = FrequencyLabeler(schema, 'FREQ_OUTPUT', (0, 7, 10, 13), tolerance=1.0)
+    raw = np.zeros((5, len(schema.register_names)))
+    raw[:, labeler.scaling.indices[0]] = [0, 699, 1300, 850, np.nan]
+    assert labeler(raw).tolist() == [0, 1, 3, -1, -1]
+
+    with pytest.raises(ValueError):
+        FrequencyLabeler(schema, 'NOT_A_REGISTER')
+
+
+def test_folds_keep_time_blocks_together():
+    """Rows of the same device and block share a fold, spread over all folds."""
+    devices = np.repeat([1, 2], 1000)
+    timestamps = np.tile(T0 + np.arange(1000) * 60.0, 2)
+    folds = assign_folds(devices, timestamps, 5, 3600.0)
+
+    blocks = np.floor(timestamps / 3600.0)
+    for key in set(zip(devices.tolist(), blocks.tolist())):
+        mask = (devices == key[0]) & (blocks == key[1])
+        assert len(set(folds[mask].tolist())) == 1
+    assert set(folds.tolist()) == set(range(5))
+    assert np.array_equal(folds, assign_folds(devices, timestamps, 5, 3600.0))
+
+
+def test_sgd_trains_on_raw_features(tmp_path):
+    """The incremental model is trained on standardized chunks and scores raw features."""
+    spec = _spec(tmp_path, model='sgd', epochs=3)
+    model, rows = fit_model(spec)
+    assert rows == 800 - 16
+    assert classification_metrics(confusion_matrix(spec, model))['accuracy'] > 0.95
+
+    # Same data, same seed, same model
+    again, _ = fit_model(spec)
+    assert np.array_equal(model.coef_, again.coef_)
+
+
+def test_reservoir_sample_bounds_memory(tmp_path):
+    """Models without partial_fit see every row but train on at most max_rows."""
+    spec = _spec(tmp_path, model='logistic', max_rows=150)
+    model, rows = fit_model(spec)
+    assert rows == 784
+    assert classification_metrics(confusion_matrix(spec, model))['accuracy'] > 0.9
+
+
+def test_holdout_fold_is_excluded(tmp_path):
+    """Training without a fold skips its rows."""
+    spec = _spec(tmp_path, model='naive_bayes')
+    _, all_rows = fit_model(spec)
+    _, train_rows = fit_model(spec, holdout=0)
+    held_out = confusion_matrix(spec, fit_model(spec)[0], fold=0).sum()
+    assert train_rows + held_out == all_rows
+
+
+def test_metrics_from_confusion_matrix():
+    """Accuracy and per-class scores come from the confusion matrix."""
+    metrics = classification_metrics(np.array([[8, 2], [0, 10]]))
+    assert metrics['rows'] == 20
+    assert metrics['accuracy'] == pytest.approx(0.9)
+    assert metrics['classes']['0']['precision'] == pytest.approx(1.0)
+    assert metrics['classes']['0']['recall'] == pytest.approx(0.8)
+    assert metrics['classes']['1']['support'] == 10
+
+
+def test_train_writes_versions_and_deploys(tmp_path):
+    """Each run writes a new version with its metrics, and deploys it on request."""
+    spec = _spec(tmp_path, model='sgd', epochs=2)
+    output_dir = tmp_path / 'models'
+    deployed = tmp_path / 'deployed' / 'model.npz'
+
+    first = train(spec, str(output_dir), workers=1)
+    second = train(spec, str(output_dir), workers=2, deploy=str(deployed))
+    assert (first.name, second.name) == ('v0001', 'v0002')
+    assert sorted(path.name for path in second.iterdir()) == ['metrics.json', 'model.joblib', 'model.npz']
+
+    metrics = json.loads((second / 'metrics.json').read_text())
+    assert metrics['train_rows'] == 784
+    assert metrics['spec']['label_register'] == 'FREQ_OUTPUT'
+    assert len(metrics['features']) == 71
+    assert len(metrics['cross_validation']['per_fold']) == 3
+    assert metrics['cross_validation']['accuracy_mean'] > 0.9
+
+    kernel = NumpyClassifier.load(str(deployed))
+    assert kernel.n_features_in_ == 71
@@ -0,0 +1,17 @@
+"""
+Alerting utilities for ModCon.
+
+This module provides the alert state tracking used by the maintainer and
+the sinks notifications are delivered to.
+"""
+
+from utils.alerts.manager import Alert, AlertManager, BandClassifier
+from utils.alerts.sinks import (
+    AlertDispatcher,
+    AlertSink,
+    FileSink,
+    LogSink,
+    UnixSocketSink,
+    WebhookSink,
+    create_sink
+)
@@ -0,0 +1,309 @@
+"""
+Alert state tracking for ModCon.
+
+This module turns the conditions evaluated every cycle (speed out of
+range, raised rules, anomalies) into alerts. The state of each (device,
+rule) pair is kept so a condition that holds over many cycles is
+notified once when raised, reminded at most every repeat_interval
+seconds and notified again when it clears. Banded values such as the
+speed are classified with hysteresis so they don't flap around the band
+boundaries, and a token bucket caps the number of notifications.
+"""
+
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Alert(NamedTuple):
+    """
+    A notification about one rule of one device.
+
+    state is 'raised', 'repeat' (reminder of an alert still raised),
+    'cleared' or 'event' (one-shot alert, e.g. an anomaly). count is the
+    number of observations since the previous notification.
+    """
+    device: int
+    rule: str
+    state: str
+    severity: str
+    message: str
+    value: Optional[float]
+    timestamp: float
+    count: int
+
+
+class _AlertState:
+    """State of one (device, rule) pair."""
+
+    __slots__ = ('active', 'notified', 'raised_at', 'last_sent', 'count')
+
+    def __init__(self):
+        self.active = False
+        self.notified = False
+        self.raised_at = 0.0
+        self.last_sent = 0.0
+        self.count = 0
+
+
+class BandClassifier:
+    """
+    Classifies values into bands, with hysteresis at the band boundaries.
+
+    A value only leaves its current band once it is past the band's bounds
+    by margin, so a value hovering around a boundary keeps its band instead
+    of flapping between two. At each boundary the margin is capped at half
+    the width of the band on the other side, so a value in the middle of a
+    narrow band (e.g. 'stopped') always reaches it. Each key (e.g. a device)
+    has its own band.
+    """
+
+    def __init__(self, bands: Dict[str, Tuple[float, float]], margin: float = 0.0):
+        """
+        Initialize the classifier.
+
+        Args:
+            bands: (lower, upper] bounds of each band, in increasing order,
+                as SPEED_RANGES
+            margin: Distance past a bound needed to change band
+        """
+        self.names = np.array(list(bands))
+        self.lower = np.array([low for low, _ in bands.values()], dtype=np.float64)
+        self.upper = np.array([high for _, high in bands.values()], dtype=np.float64)
+        self.margin = margin
+
+        # Margin past the lower and upper bound of each band
+        half_widths = (self.upper - self.lower) / 2
+        self.lower_margin = np.minimum(margin, np.concatenate(([margin], half_widths[:-1])))
+        self.upper_margin = np.minimum(margin, np.concatenate((half_widths[1:], [margin])))
+        self._bands: Dict[int, int] = {}
+
+    def classify(self, keys: Sequence[int], values: np.ndarray) -> np.ndarray:
+        """
+        Classify the values of several keys.
+
+        Args:
+            keys: Key of each value, each at most once
+            values: Values to classify
+
+        Returns:
+            Array of band names
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        band = np.minimum(np.searchsorted(self.upper[:-1], values, side='left'), len(self.names) - 1)
+
+        previous = np.array([self._bands.get(key, -1) for key in keys], dtype=np.intp)
+        known = previous >= 0
+        kept = previous.clip(0)
+        inside = ((values > self.lower[kept] - self.lower_margin[kept])
+                  & (values <= self.upper[kept] + self.upper_margin[kept]))
+        # The lowest band includes its lower bound
+        inside |= (kept == 0) & (values <= self.upper[0] + self.upper_margin[0])
+        band = np.where(known & inside, previous, band)
+
+        self._bands.update(zip(keys, band.tolist()))
+        return self.names[band]
+
+    def reset(self, key: Optional[int] = None) -> None:
+        """
+        Forget the band of a key.
+
+        Args:
+            key: Key, None for every key
+        """
+        if key is None:
+            self._bands.clear()
+        else:
+            self._bands.pop(key, None)
+
+
+class AlertManager:
+    """
+    De-duplicated, rate-limited alerts per (device, rule).
+
+    observe is called every cycle with whether a condition holds; it
+    returns an alert when the condition is raised, still holds after
+    repeat_interval seconds, or clears. Alerts go to the dispatcher when
+    one is given. A raised alert beyond the rate limit stays pending and
+    is notified on the first later observation with the budget for it;
+    the clearing of an alert that was never notified is not notified.
+    """
+
+    def __init__(
+        self,
+        dispatcher=None,
+        repeat_interval: float = 300.0,
+        rate_limit: int = 30,
+        rate_window: float = 60.0
+    ):
+        """
+        Initialize the manager.
+
+        Args:
+            dispatcher: AlertDispatcher the alerts are submitted to, None to
+                only return them
+            repeat_interval: Seconds between reminders of an alert still
+                raised, 0 to never remind
+            rate_limit: Maximum number of notifications per rate_window, 0
+                for no limit
+            rate_window: Length of the rate-limit window in seconds
+        """
+        self.dispatcher = dispatcher
+        self.repeat_interval = repeat_interval
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self._states: Dict[Tuple[int, str], _AlertState] = {}
+        self._tokens = float(rate_limit)
+        self._refilled_at = time.monotonic()
+        self.suppressed = 0
+
+    def _take_token(self, retry: bool = False) -> bool:
+        """Take a notification from the token bucket, False if it's empty.
+
+        Failed retries of a pending alert are not counted as suppressed again.
+        """
+        if not self.rate_limit:
+            return True
+
+        now = time.monotonic()
+        self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled_at) * self.rate_limit / self.rate_window)
+        self._refilled_at = now
+        if self._tokens < 1:
+            if not retry:
+                self.suppressed += 1
+            return False
+        self._tokens -= 1
+        return True
+
+    def _send(self, alert: Alert) -> Alert:
+        """Submit an alert to the dispatcher."""
+        if self.dispatcher is not None:
+            self.dispatcher.submit(alert)
+        return alert
+
+    def observe(
+        self,
+        device: int,
+        rule: str,
+        active: bool,
+        message: str = '',
+        value: Optional[float] = None,
+        severity: str = 'warning',
+        timestamp: Optional[float] = None
+    ) -> Optional[Alert]:
+        """
+        Update the state of a rule of a device.
+
+        Args:
+            device: Device ID
+            rule: Rule name
+            active: Whether the rule's condition holds
+            message: Description of the current state
+            value: Value that triggered the rule
+            severity: Severity of the alert
+            timestamp: Time of the observation, None for now
+
+        Returns:
+            Alert to notify, None if nothing changed or it is rate limited
+        """
+        key = (device, rule)
+        state = self._states.get(key)
+        if state is None:
+            if not active:
+                return None
+            state = self._states[key] = _AlertState()
+        timestamp = time.time() if timestamp is None else timestamp
+
+        if active and not state.active:
+            state.active = True
+            state.raised_at = timestamp
+            state.count = 1
+            state.notified = self._take_token()
+            if not state.notified:
+                return None
+            state.last_sent = timestamp
+            state.count = 0
+            return self._send(Alert(device, rule, 'raised', severity, message, value, timestamp, 1))
+
+        if active:
+            state.count += 1
+            if not state.notified:
+                # Raised while rate limited: notified once the budget allows
+                state.notified = self._take_token(retry=True)
+                if not state.notified:
+                    return None
+                count, state.count = state.count, 0
+                state.last_sent = timestamp
+                return self._send(Alert(device, rule, 'raised', severity, message, value, timestamp, count))
+            if (state.notified and self.repeat_interval and timestamp - state.last_sent >= self.repeat_interval
+                    and self._take_token()):
+                count, state.count = state.count, 0
+                state.last_sent = timestamp
+                return self._send(Alert(device, rule, 'repeat', severity, message, value, timestamp, count))
+            return None
+
+        if not state.active:
+            return None
+
+        # Cleared: only notified if the raising was
+        del self._states[key]
+        if not state.notified:
+            return None
+        return self._send(Alert(device, rule, 'cleared', severity, message, value, timestamp, state.count))
+
+    def event(
+        self,
+        device: int,
+        rule: str,
+        message: str = '',
+        value: Optional[float] = None,
+        severity: str = 'warning',
+        timestamp: Optional[float] = None
+    ) -> Optional[Alert]:
+        """
+        Notify a one-shot event, at most once per repeat_interval per rule.
+
+        Args:
+            device: Device ID
+            rule: Rule name, e.g. the anomaly channel and kind
+            message: Description of the event
+            value: Value that triggered the event
+            severity: Severity of the alert
+            timestamp: Time of the event, None for now
+
+        Returns:
+            Alert to notify, None if it was de-duplicated or suppressed
+        """
+        key = (device, rule)
+        timestamp = time.time() if timestamp is None else timestamp
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _AlertState()
+        elif timestamp - state.last_sent < self.repeat_interval:
+            state.count += 1
+            return None
+
+        if not self._take_token():
+            state.count += 1
+            return None
+        count, state.count = state.count + 1, 0
+        state.last_sent = timestamp
+        return self._send(Alert(device, rule, 'event', severity, message, value, timestamp, count))
+
+    def active(self, device: Optional[int] = None) -> List[Tuple[int, str]]:
+        """
+        Get the raised alerts.
+
+        Args:
+            device: Device ID, None for every device
+
+        Returns:
+            List of (device, rule) pairs
+        """
+        return [key for key, state in self._states.items()
+                if state.active and (device is None or key[0] == device)]
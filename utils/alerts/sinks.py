@@ -0,0 +1,380 @@
+"""
+Alert notification sinks for ModCon.
+
+This module delivers alerts to local sinks (the log, a JSON-lines file,
+a Unix domain socket, an HTTP webhook) from background threads. Each
+sink has its own bounded queue and sender thread, so the monitoring loop
+only appends to a queue and a slow or unreachable sink never delays it
+or the other sinks; when a sink falls behind, its oldest queued alerts
+are dropped.
+"""
+
+import json
+import socket
+import threading
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from utils.logger import get_logger
+from utils.alerts.manager import Alert
+
+logger = get_logger(__name__)
+
+
+def alert_to_json(alert: Alert) -> str:
+    """
+    Encode an alert as one line of JSON.
+
+    Args:
+        alert: Alert to encode
+
+    Returns:
+        JSON object with the alert fields, without a trailing newline
+    """
+    return json.dumps(alert._asdict())
+
+
+class AlertSink(ABC):
+    """
+    Destination of alert notifications.
+    """
+
+    name = 'sink'
+
+    @abstractmethod
+    def send(self, alert: Alert) -> None:
+        """
+        Deliver an alert, raising on failure.
+
+        Args:
+            alert: Alert to deliver
+        """
+
+    def close(self) -> None:
+        """Release the sink's resources."""
+
+
+class LogSink(AlertSink):
+    """
+    Logs alerts, as errors for critical ones and warnings otherwise.
+    """
+
+    name = 'log'
+
+    def send(self, alert: Alert) -> None:
+        """
+        Log an alert.
+
+        Args:
+            alert: Alert to log
+        """
+        text = f"[{alert.state}] device {alert.device} {alert.rule}: {alert.message}"
+        if alert.count > 1:
+            text += f" ({alert.count} occurrences)"
+
+        if alert.state == 'cleared':
+            logger.info(text)
+        elif alert.severity == 'critical':
+            logger.error(text)
+        else:
+            logger.warning(text)
+
+
+class FileSink(AlertSink):
+    """
+    Appends alerts to a JSON-lines file.
+    """
+
+    name = 'file'
+
+    def __init__(self, path: str = 'data/alerts.jsonl'):
+        """
+        Open the file for appending.
+
+        Args:
+            path: Path to the alert file
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def send(self, alert: Alert) -> None:
+        """
+        Append an alert to the file.
+
+        Args:
+            alert: Alert to write
+        """
+        self._file.write(alert_to_json(alert) + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        """Close the file."""
+        self._file.close()
+
+
+class UnixSocketSink(AlertSink):
+    """
+    Sends alerts as JSON lines to a listener on a Unix domain socket.
+
+    The connection is opened on the first alert and reopened after a
+    failure, so the listener may start after the maintainer.
+    """
+
+    name = 'socket'
+
+    def __init__(self, path: str = 'data/alerts.sock', timeout: float = 5.0):
+        """
+        Initialize the sink.
+
+        Args:
+            path: Path of the listening socket
+            timeout: Connection and send timeout in seconds
+        """
+        self.path = path
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+
+    def send(self, alert: Alert) -> None:
+        """
+        Send an alert to the listener.
+
+        Args:
+            alert: Alert to send
+        """
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._sock = sock
+
+        try:
+            self._sock.sendall((alert_to_json(alert) + '\n').encode('utf-8'))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """Close the connection."""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+
+class WebhookSink(AlertSink):
+    """
+    POSTs alerts as JSON to an HTTP endpoint, e.g. a local relay.
+    """
+
+    name = 'webhook'
+
+    def __init__(self, url: str, timeout: float = 5.0, headers: Optional[Dict[str, str]] = None):
+        """
+        Initialize the sink.
+
+        Args:
+            url: Endpoint URL
+            timeout: Request timeout in seconds
+            headers: Additional request headers
+        """
+        self.url = url
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+
+    def send(self, alert: Alert) -> None:
+        """
+        POST an alert to the endpoint.
+
+        Args:
+            alert: Alert to send
+        """
+        request = urllib.request.Request(self.url, alert_to_json(alert).encode('utf-8'), self.headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def create_sink(spec: Dict[str, Any]) -> AlertSink:
+    """
+    Create a sink from its configuration.
+
+    Args:
+        spec: Dictionary with 'type' ('log', 'file', 'socket' or 'webhook')
+            and the sink's constructor arguments
+
+    Returns:
+        Sink instance
+    """
+    options = dict(spec)
+    kind = options.pop('type', None)
+    sinks = {'log': LogSink, 'file': FileSink, 'socket': UnixSocketSink, 'webhook': WebhookSink}
+    if kind not in sinks:
+        raise ValueError(f"Unknown alert sink type {kind}, expected one of {', '.join(sinks)}")
+    return sinks[kind](**options)
+
+
+class _SinkWorker:
+    """
+    Bounded queue and sender thread of one sink.
+    """
+
+    def __init__(self, sink: AlertSink, queue_size: int):
+        """
+        Start the sender thread.
+
+        Args:
+            sink: Sink to deliver to
+            queue_size: Maximum number of queued alerts
+        """
+        self.sink = sink
+        self.queue = deque(maxlen=queue_size)
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.closed = False
+        self._busy = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def push(self, alert: Alert) -> None:
+        """
+        Queue an alert, dropping the oldest one if the queue is full.
+
+        Args:
+            alert: Alert to deliver
+        """
+        with self._cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(alert)
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        """Deliver queued alerts until closed and drained."""
+        while True:
+            with self._cond:
+                while not self.queue and not self.closed:
+                    self._cond.wait()
+                if not self.queue:
+                    return
+                alert = self.queue.popleft()
+                self._busy = True
+
+            try:
+                self.sink.send(alert)
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Alert sink {self.sink.name} failed: {e}")
+
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the queue is empty, returning whether it is."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.queue and not self._busy, timeout)
+
+    def close(self, timeout: float) -> None:
+        """Stop the thread once the queue is delivered, or after timeout."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.sink.close()
+
+
+class AlertDispatcher:
+    """
+    Delivers alerts to several sinks from background threads.
+
+    submit only queues the alert, so it never blocks the caller.
+    """
+
+    def __init__(self, sinks: Sequence[AlertSink], queue_size: int = 1000):
+        """
+        Start a sender thread per sink.
+
+        Args:
+            sinks: Sinks to deliver every alert to
+            queue_size: Maximum number of alerts queued per sink
+        """
+        self._workers = [_SinkWorker(sink, queue_size) for sink in sinks]
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    @property
+    def sinks(self) -> List[AlertSink]:
+        """Sinks the alerts are delivered to."""
+        return [worker.sink for worker in self._workers]
+
+    def submit(self, alert: Alert) -> None:
+        """
+        Queue an alert for every sink.
+
+        Args:
+            alert: Alert to deliver
+        """
+        for worker in self._workers:
+            worker.push(alert)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued alert has been handled.
+
+        Args:
+            timeout: Maximum time to wait per sink, None to wait indefinitely
+
+        Returns:
+            Whether every queue is empty
+        """
+        return all([worker.flush(timeout) for worker in self._workers])
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get the delivery counters of each sink.
+
+        Returns:
+            Dictionary mapping sink names to sent, failed, dropped and queued counts
+        """
+        return {
+            worker.sink.name: {
+                'sent': worker.sent,
+                'failed': worker.failed,
+                'dropped': worker.dropped,
+                'queued': len(worker.queue)
+            }
+            for worker in self._workers
+        }
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Deliver the queued alerts and stop the sender threads.
+
+        Args:
+            timeout: Maximum time to wait for each sink
+        """
+        for worker in self._workers:
+            worker.close(timeout)
+        self._workers = []
@@ -20,16 +20,73 @@ DEFAULT_CONFIG = {
         'parity': 'N',
         'baudrate': 9600,
         'slave_id': 2,
+        'slave_ids': [],
         'timeout': 3.0
     },
     'database': {
         'path': 'data/inverter.db',
         'table_name': 'sinamicv20',
-        'default_id': 0
+        'default_id': 0,
+        'schema': {
+            'values': 'raw'
+        },
+        'fleet': {
+            'enabled': False,
+            'covering_columns': ['SPEED', 'CURRENT', 'TORQUE', 'FREQ_OUTPUT']
+        },
+        'history': {
+            'enabled': False,
+            'path': 'data/history',
+            'partition': 'day',
+            'retention': 30
+        },
+        'record_log': {
+            'enabled': False,
+            'path': 'data/snapshots.rlog',
+            'capacity': 604800
+        },
+        'hot_store': {
+            'enabled': False,
+            'backup_interval': 60.0,
+            'checkpoint_interval': 300.0,
+            'checkpoint_mode': 'TRUNCATE',
+            'synchronous': 'NORMAL',
+            'pages_per_step': 256,
+            'step_pause': 0.005,
+            'retention': 86400
+        },
+        'spool': {
+            'enabled': False,
+            'path': 'data/spool',
+            'fsync_interval': 1.0,
+            'fsync_batch': 64,
+            'replay_interval': 5.0,
+            'lock_timeout': 0.1
+        }
+    },
+    'ipc': {
+        'shared_memory': {
+            'enabled': False,
+            'name': 'modcon_snapshot'
+        },
+        'stream': {
+            'enabled': False,
+            'path': 'data/modcon.sock',
+            'queue_size': 256
+        }
     },
     'data_collection': {
         'n_samples': 100,
         'csv_file': 'data/data.csv',
+        'flush_rows': 100,
+        'flush_interval': 5.0,
+        'rotation': {
+            'enabled': False,
+            'path': 'data/segments',
+            'max_bytes': 67108864,
+            'interval': 86400,
+            'compression': 'gzip'
+        },
         'sleep_time': 2
     },
     'visualization': {
@@ -0,0 +1,598 @@
+"""
+Compressed columnar archive for ModCon.
+
+This module provides a writer and reader for cold storage of register
+snapshots. Snapshots are grouped into blocks and every register column is
+stored separately, either run-length encoded (for the many registers that
+barely change) or as delta + zigzag + varint. Timestamps are delta-of-delta
+encoded and each block carries a min/max index, so range scans can skip
+whole blocks without decoding them.
+"""
+
+import json
+import mmap
+import struct
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Tuple, NamedTuple, Iterator, Union
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# File and block markers
+FILE_MAGIC = b'MCAR'
+FILE_VERSION = 1
+BLOCK_MAGIC = b'MCBK'
+
+# Column encodings
+ENCODING_RLE = 1
+ENCODING_DELTA = 2
+
+# Value used for registers that could not be read
+MISSING_VALUE = -1
+
+# Timestamps are stored as integer microseconds
+TIME_SCALE = 1_000_000
+
+_FILE_HEADER = struct.Struct('<4sBI')
+_BLOCK_HEADER = struct.Struct('<4sIIIdd')
+_COLUMN_ENTRY = struct.Struct('<BqqI')
+_LENGTH = struct.Struct('<I')
+
+
+class BlockInfo(NamedTuple):
+    """Index entry describing one block of an archive."""
+    offset: int
+    n_rows: int
+    ts_min: float
+    ts_max: float
+    col_min: np.ndarray
+    col_max: np.ndarray
+
+
+def zigzag_encode(values: np.ndarray) -> np.ndarray:
+    """
+    Map signed integers to unsigned ones so small magnitudes stay small.
+
+    Args:
+        values: Array of int64 values
+
+    Returns:
+        Array of uint64 values
+    """
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def zigzag_decode(values: np.ndarray) -> np.ndarray:
+    """
+    Invert zigzag_encode.
+
+    Args:
+        values: Array of uint64 values
+
+    Returns:
+        Array of int64 values
+    """
+    values = values.astype(np.uint64)
+    return ((values >> np.uint64(1)).view(np.int64)) ^ -((values & np.uint64(1)).view(np.int64))
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+    """
+    Encode unsigned integers as LEB128 varints.
+
+    Args:
+        values: Array of uint64 values
+
+    Returns:
+        Encoded bytes
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if values.size == 0:
+        return b''
+
+    # Number of 7-bit groups needed for every value
+    n_bytes = np.ones(values.size, dtype=np.int64)
+    remaining = values >> np.uint64(7)
+    while remaining.any():
+        n_bytes += remaining > 0
+        remaining >>= np.uint64(7)
+
+    starts = np.cumsum(n_bytes) - n_bytes
+    out = np.zeros(int(n_bytes.sum()), dtype=np.uint8)
+
+    for k in range(int(n_bytes.max())):
+        mask = n_bytes > k
+        group = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        continuation = (n_bytes[mask] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[mask] + k] = (group | continuation).astype(np.uint8)
+
+    return out.tobytes()
+
+
+def varint_decode(data: bytes, count: int) -> np.ndarray:
+    """
+    Decode LEB128 varints.
+
+    Args:
+        data: Encoded bytes
+        count: Number of values to decode
+
+    Returns:
+        Array of uint64 values
+    """
+    if count == 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf < 0x80)[:count]
+    if ends.size < count:
+        raise ValueError(f"Truncated varint data: expected {count} values, found {ends.size}")
+
+    buf = buf[:ends[-1] + 1]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+
+    # Position of every byte within its value
+    positions = np.arange(buf.size) - np.repeat(starts, lengths)
+    groups = (buf & 0x7F).astype(np.uint64) << (positions.astype(np.uint64) * np.uint64(7))
+
+    return np.add.reduceat(groups, starts)
+
+
+def _encode_column(values: np.ndarray) -> Tuple[int, bytes]:
+    """
+    Encode one register column, choosing the smaller of RLE and delta.
+
+    Args:
+        values: Array of int64 values
+
+    Returns:
+        Tuple of (encoding, payload)
+    """
+    run_starts = np.concatenate(([0], np.flatnonzero(np.diff(values)) + 1))
+
+    # Constant and slowly changing columns are run-length encoded
+    if run_starts.size * 2 < values.size:
+        run_lengths = np.diff(np.concatenate((run_starts, [values.size])))
+        pairs = np.empty(run_starts.size * 2, dtype=np.uint64)
+        pairs[0::2] = zigzag_encode(values[run_starts])
+        pairs[1::2] = run_lengths.astype(np.uint64)
+        return ENCODING_RLE, _LENGTH.pack(run_starts.size) + varint_encode(pairs)
+
+    deltas = np.diff(values, prepend=np.int64(0))
+    return ENCODING_DELTA, varint_encode(zigzag_encode(deltas))
+
+
+def _decode_column(encoding: int, payload: bytes, n_rows: int) -> np.ndarray:
+    """
+    Decode one register column.
+
+    Args:
+        encoding: Column encoding
+        payload: Encoded bytes
+        n_rows: Number of rows in the block
+
+    Returns:
+        Array of int64 values
+    """
+    if encoding == ENCODING_RLE:
+        (n_runs,) = _LENGTH.unpack_from(payload)
+        pairs = varint_decode(payload[_LENGTH.size:], n_runs * 2)
+        return np.repeat(zigzag_decode(pairs[0::2]), pairs[1::2].astype(np.int64))
+
+    if encoding == ENCODING_DELTA:
+        return np.cumsum(zigzag_decode(varint_decode(payload, n_rows)))
+
+    raise ValueError(f"Unknown column encoding: {encoding}")
+
+
+def _encode_timestamps(timestamps: np.ndarray) -> bytes:
+    """
+    Delta-of-delta encode timestamps in microseconds.
+
+    Args:
+        timestamps: Array of Unix timestamps in seconds
+
+    Returns:
+        Encoded bytes
+    """
+    micros = np.round(np.asarray(timestamps, dtype=np.float64) * TIME_SCALE).astype(np.int64)
+    deltas = np.diff(micros)
+    sequence = np.concatenate((micros[:1], deltas[:1], np.diff(deltas)))
+    return varint_encode(zigzag_encode(sequence))
+
+
+def _decode_timestamps(payload: bytes, n_rows: int) -> np.ndarray:
+    """
+    Invert _encode_timestamps.
+
+    Args:
+        payload: Encoded bytes
+        n_rows: Number of rows in the block
+
+    Returns:
+        Array of Unix timestamps in seconds
+    """
+    sequence = zigzag_decode(varint_decode(payload, n_rows))
+    deltas = np.cumsum(sequence[1:])
+    micros = sequence[0] + np.concatenate(([0], np.cumsum(deltas)))
+    return micros.astype(np.float64) / TIME_SCALE
+
+
+def _to_matrix(values: Any, n_columns: int) -> np.ndarray:
+    """
+    Convert register values to an int64 matrix, mapping None to MISSING_VALUE.
+
+    Args:
+        values: 2D array or sequence of rows
+        n_columns: Expected number of columns
+
+    Returns:
+        Array of shape (n_rows, n_columns)
+    """
+    if isinstance(values, np.ndarray):
+        matrix = values.astype(np.int64)
+    else:
+        matrix = np.array(
+            [[MISSING_VALUE if v is None else v for v in row] for row in values],
+            dtype=np.int64
+        )
+
+    matrix = matrix.reshape(-1, n_columns)
+    return matrix
+
+
+class ArchiveWriter:
+    """
+    Writer for the compressed columnar archive format.
+
+    Snapshots are buffered and written as one block every block_size rows.
+    """
+
+    def __init__(self, filepath: str, columns: Sequence[str], block_size: int = 4096):
+        """
+        Initialize the archive writer, creating a new archive file.
+
+        Args:
+            filepath: Path to the archive file
+            columns: Register column names, in storage order
+            block_size: Number of snapshots per block
+        """
+        self.filepath = Path(filepath)
+        self.columns = list(columns)
+        self.block_size = block_size
+        self.rows_written = 0
+
+        self._timestamps: List[float] = []
+        self._rows: List[Sequence[Any]] = []
+
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.filepath, 'wb')
+
+        header = json.dumps({'columns': self.columns, 'time_scale': TIME_SCALE}).encode('utf-8')
+        self._file.write(_FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, len(header)))
+        self._file.write(header)
+
+        logger.info(f"ArchiveWriter initialized, writing to {self.filepath}")
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    def append(self, timestamp: float, values: Union[Sequence[Any], Dict[str, Any]]) -> None:
+        """
+        Append one snapshot.
+
+        Args:
+            timestamp: Unix timestamp of the snapshot
+            values: Register values in column order, or a dictionary keyed by column name
+        """
+        if isinstance(values, dict):
+            values = [values.get(column) for column in self.columns]
+
+        self._timestamps.append(timestamp)
+        self._rows.append(values)
+
+        if len(self._rows) >= self.block_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered snapshots as a block."""
+        if not self._rows:
+            return
+
+        self.write_block(np.array(self._timestamps), self._rows)
+        self._timestamps = []
+        self._rows = []
+
+    def write_block(self, timestamps: np.ndarray, values: Any) -> None:
+        """
+        Write a block of snapshots directly.
+
+        Args:
+            timestamps: Array of Unix timestamps, in time order
+            values: Matrix of register values with one column per archive column
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        matrix = _to_matrix(values, len(self.columns))
+
+        if matrix.shape[0] != timestamps.size:
+            raise ValueError(f"Got {timestamps.size} timestamps for {matrix.shape[0]} rows")
+        if timestamps.size == 0:
+            return
+
+        ts_payload = _encode_timestamps(timestamps)
+        entries = []
+        payloads = []
+
+        for i in range(len(self.columns)):
+            column = matrix[:, i]
+            encoding, payload = _encode_column(column)
+            entries.append(_COLUMN_ENTRY.pack(encoding, int(column.min()), int(column.max()), len(payload)))
+            payloads.append(payload)
+
+        body = b''.join([_LENGTH.pack(len(ts_payload)), ts_payload] + entries + payloads)
+        self._file.write(_BLOCK_HEADER.pack(
+            BLOCK_MAGIC, len(body), timestamps.size, len(self.columns),
+            float(timestamps[0]), float(timestamps[-1])
+        ))
+        self._file.write(body)
+
+        self.rows_written += timestamps.size
+        logger.debug(f"Wrote block of {timestamps.size} rows ({len(body)} bytes) to {self.filepath}")
+
+    def close(self) -> None:
+        """Flush remaining snapshots and close the file."""
+        if self._file.closed:
+            return
+
+        self.flush()
+        self._file.close()
+        logger.info(f"Closed archive {self.filepath} with {self.rows_written} rows")
+
+
+class ArchiveReader:
+    """
+    Reader for the compressed columnar archive format.
+
+    The file is memory-mapped rather than read, and the block index is
+    built on open by reading block headers only, so queries only page in
+    and decode the blocks they touch, skipping the rest by time range or
+    by column min/max.
+    """
+
+    def __init__(self, filepath: str):
+        """
+        Open an archive and build its block index.
+
+        Args:
+            filepath: Path to the archive file
+        """
+        self.filepath = Path(filepath)
+
+        with open(self.filepath, 'rb') as f:
+            if self.filepath.stat().st_size < _FILE_HEADER.size:
+                raise ValueError(f"Not a ModCon archive: {self.filepath}")
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_len = _FILE_HEADER.unpack_from(self._data)
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            self.close()
+            if magic != FILE_MAGIC:
+                raise ValueError(f"Not a ModCon archive: {self.filepath}")
+            raise ValueError(f"Unsupported archive version {version}: {self.filepath}")
+
+        header = json.loads(self._data[_FILE_HEADER.size:_FILE_HEADER.size + header_len].decode('utf-8'))
+        self.columns: List[str] = header['columns']
+        self._column_index = {name: i for i, name in enumerate(self.columns)}
+
+        self.blocks: List[BlockInfo] = []
+        offset = _FILE_HEADER.size + header_len
+
+        while offset < len(self._data):
+            block = self._read_block_info(offset)
+            self.blocks.append(block)
+            body_len = _BLOCK_HEADER.unpack_from(self._data, offset)[1]
+            offset += _BLOCK_HEADER.size + body_len
+
+        logger.debug(f"Opened archive {self.filepath} with {len(self.blocks)} blocks")
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    def close(self) -> None:
+        """Unmap the archive file."""
+        self._data.close()
+
+    def _read_block_info(self, offset: int) -> BlockInfo:
+        """
+        Read the index entry of the block at offset.
+
+        Args:
+            offset: Byte offset of the block header
+
+        Returns:
+            BlockInfo for the block
+        """
+        magic, _, n_rows, n_columns, ts_min, ts_max = _BLOCK_HEADER.unpack_from(self._data, offset)
+        if magic != BLOCK_MAGIC:
+            raise ValueError(f"Corrupt block at offset {offset} in {self.filepath}")
+
+        pos = offset + _BLOCK_HEADER.size
+        (ts_len,) = _LENGTH.unpack_from(self._data, pos)
+        pos += _LENGTH.size + ts_len
+
+        col_min = np.empty(n_columns, dtype=np.int64)
+        col_max = np.empty(n_columns, dtype=np.int64)
+        for i in range(n_columns):
+            _, col_min[i], col_max[i], _ = _COLUMN_ENTRY.unpack_from(self._data, pos + i * _COLUMN_ENTRY.size)
+
+        return BlockInfo(offset, n_rows, ts_min, ts_max, col_min, col_max)
+
+    @property
+    def n_rows(self) -> int:
+        """Total number of snapshots in the archive."""
+        return sum(block.n_rows for block in self.blocks)
+
+    def _decode_block(
+        self,
+        block: BlockInfo,
+        column_ids: List[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decode the timestamps and the selected columns of a block.
+
+        Args:
+            block: Block index entry
+            column_ids: Indices of the columns to decode
+
+        Returns:
+            Tuple of (timestamps, matrix of shape (n_rows, len(column_ids)))
+        """
+        pos = block.offset + _BLOCK_HEADER.size
+        (ts_len,) = _LENGTH.unpack_from(self._data, pos)
+        pos += _LENGTH.size
+        timestamps = _decode_timestamps(self._data[pos:pos + ts_len], block.n_rows)
+        pos += ts_len
+
+        n_columns = len(self.columns)
+        entries = [_COLUMN_ENTRY.unpack_from(self._data, pos + i * _COLUMN_ENTRY.size) for i in range(n_columns)]
+        payload_offsets = np.cumsum([0] + [entry[3] for entry in entries])
+        payload_base = pos + n_columns * _COLUMN_ENTRY.size
+
+        matrix = np.empty((block.n_rows, len(column_ids)), dtype=np.int64)
+        for j, i in enumerate(column_ids):
+            encoding = entries[i][0]
+            start = payload_base + payload_offsets[i]
+            matrix[:, j] = _decode_column(encoding, self._data[start:start + entries[i][3]], block.n_rows)
+
+        return timestamps, matrix
+
+    def iter_blocks(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        t0: Optional[float] = None,
+        t1: Optional[float] = None
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Iterate over decoded blocks overlapping a time range.
+
+        Args:
+            columns: Columns to decode, or None for all
+            t0: Range start timestamp, or None for unbounded
+            t1: Range end timestamp (exclusive), or None for unbounded
+
+        Yields:
+            Tuples of (timestamps, matrix) trimmed to the range
+        """
+        column_ids = [self._column_index[name] for name in (columns or self.columns)]
+
+        for block in self.blocks:
+            if t0 is not None and block.ts_max < t0:
+                continue
+            if t1 is not None and block.ts_min >= t1:
+                continue
+
+            timestamps, matrix = self._decode_block(block, column_ids)
+
+            mask = np.ones(timestamps.size, dtype=bool)
+            if t0 is not None:
+                mask &= timestamps >= t0
+            if t1 is not None:
+                mask &= timestamps < t1
+
+            yield timestamps[mask], matrix[mask]
+
+    def read(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        t0: Optional[float] = None,
+        t1: Optional[float] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Read snapshots in a time range.
+
+        Args:
+            columns: Columns to decode, or None for all
+            t0: Range start timestamp, or None for unbounded
+            t1: Range end timestamp (exclusive), or None for unbounded
+
+        Returns:
+            Tuple of (timestamps, matrix of shape (n_rows, n_columns)),
+            with MISSING_VALUE for registers that could not be read
+        """
+        n_columns = len(columns or self.columns)
+        parts = list(self.iter_blocks(columns, t0, t1))
+
+        if not parts:
+            return np.zeros(0, dtype=np.float64), np.zeros((0, n_columns), dtype=np.int64)
+
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+    def blocks_matching(self, column: str, low: int, high: int) -> List[BlockInfo]:
+        """
+        Find the blocks where a column may take values in [low, high].
+
+        Only the min/max index is consulted, no block is decoded.
+
+        Args:
+            column: Column name
+            low: Lower bound (inclusive)
+            high: Upper bound (inclusive)
+
+        Returns:
+            List of matching block index entries
+        """
+        i = self._column_index[column]
+        return [block for block in self.blocks if block.col_max[i] >= low and block.col_min[i] <= high]
+
+
+def write_archive(
+    filepath: str,
+    columns: Sequence[str],
+    timestamps: np.ndarray,
+    values: Any,
+    block_size: int = 4096
+) -> int:
+    """
+    Write snapshots to a new archive file.
+
+    Args:
+        filepath: Path to the archive file
+        columns: Register column names, in storage order
+        timestamps: Array of Unix timestamps, in time order
+        values: Matrix of register values with one column per archive column
+        block_size: Number of snapshots per block
+
+    Returns:
+        Size of the archive in bytes
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    matrix = _to_matrix(values, len(columns))
+
+    with ArchiveWriter(filepath, columns, block_size=block_size) as writer:
+        for start in range(0, timestamps.size, block_size):
+            writer.write_block(timestamps[start:start + block_size], matrix[start:start + block_size])
+
+    return Path(filepath).stat().st_size
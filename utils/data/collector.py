@@ -5,15 +5,16 @@ This module provides functions for collecting data from Modbus devices
 and saving it to CSV files or databases.
 """
 
-import csv
 import time
-from datetime import datetime
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 
 from utils.logger import get_logger
 from utils.config import config
 from utils.modbus.motor import SinamicV20
+from utils.database.schema import get_schema
+from utils.data.file_io import CSVWriter, TIMESTAMP_COLUMN
+from utils.data.segments import RotatingCSVWriter
 
 logger = get_logger(__name__)
 
@@ -25,7 +26,9 @@ class DataCollector:
         self, 
         inverter: SinamicV20, 
         csv_file: Optional[str] = None,
-        append: bool = True
+        append: bool = True,
+        flush_rows: Optional[int] = None,
+        flush_interval: Optional[float] = None
     ):
         """
         Initialize the DataCollector.
@@ -34,6 +37,8 @@ class DataCollector:
             inverter: The SinamicV20 inverter instance
             csv_file: Path to the CSV file to write data to
             append: Whether to append to an existing file or create a new one
+            flush_rows: Number of buffered rows that triggers a write to the file
+            flush_interval: Maximum time in seconds between writes to the file
         """
         self.inverter = inverter
         self.count = 0
@@ -41,38 +46,49 @@ class DataCollector:
         # Get configuration
         data_config = config.get('data_collection', {})
         self.csv_file = csv_file or data_config.get('csv_file', 'data/data.csv')
+        flush_rows = flush_rows or data_config.get('flush_rows', 100)
+        flush_interval = flush_interval or data_config.get('flush_interval', 5.0)
         
-        # Ensure directory exists
-        Path(self.csv_file).parent.mkdir(parents=True, exist_ok=True)
+        # The file stays open for the lifetime of the collector. The header
+        # names every value read_raw_all_address returns, one per address
+        headers = [TIMESTAMP_COLUMN] + get_schema('raw').columns
+        rotation = data_config.get('rotation', {})
+        if rotation.get('enabled', False):
+            self.writer = RotatingCSVWriter(
+                rotation.get('path', 'data/segments'),
+                headers,
+                prefix=Path(self.csv_file).stem,
+                max_bytes=rotation.get('max_bytes', 64 * 1024 * 1024),
+                interval=rotation.get('interval', 86400.0),
+                compression=rotation.get('compression', 'gzip'),
+                flush_rows=flush_rows,
+                flush_interval=flush_interval
+            )
+        else:
+            self.writer = CSVWriter(self.csv_file, headers, append, flush_rows, flush_interval)
         
-        # Create or append to CSV file
-        if not append or not Path(self.csv_file).exists():
-            self._write_header()
+        # Files written before the timestamp column existed keep their layout
+        self.write_timestamp = bool(self.writer.header) and self.writer.header[0] == TIMESTAMP_COLUMN
+        if not self.write_timestamp:
+            logger.warning(f"{self.csv_file} has no {TIMESTAMP_COLUMN} column, appending rows without timestamps")
             
         logger.info(f"DataCollector initialized, writing to {self.csv_file}")
         
-    def _write_header(self) -> None:
-        """Write the CSV header with parameter names."""
-        try:
-            headers = list(self.inverter.name_to_address.keys())
-            self._write_csv(headers)
-            logger.info(f"Wrote header to {self.csv_file}")
-        except Exception as e:
-            logger.exception(f"Error writing CSV header: {e}")
-            
-    def _write_csv(self, data: List[Any]) -> None:
+    def __enter__(self):
         """
-        Write a row of data to the CSV file.
-        
-        Args:
-            data: List of values to write
+        Context manager entry point.
         """
-        try:
-            with open(self.csv_file, 'a', newline='') as outfile:
-                writer = csv.writer(outfile)
-                writer.writerow(data)
-        except Exception as e:
-            logger.exception(f"Error writing to CSV: {e}")
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+        
+    def close(self) -> None:
+        """Flush buffered rows and close the CSV file."""
+        self.writer.close()
                 
     def collect_data_point(self) -> List[Any]:
         """
@@ -83,8 +99,7 @@ class DataCollector:
         """
         try:
             # Get current timestamp
-            current_time = datetime.now()
-            timestamp = current_time.timestamp()
+            timestamp = time.time()
             
             # Get inverter values
             list_of_values = self.inverter.read_raw_all_address()
@@ -92,8 +107,11 @@ class DataCollector:
             # Log collection
             logger.info(f"Collected data point {self.count}: {len(list_of_values)} values at {timestamp}")
             
-            # Write to CSV
-            self._write_csv(list_of_values)
+            # Buffer the row; the writer flushes it to the CSV file
+            if self.write_timestamp:
+                self.writer.write_row([round(timestamp, 3)] + list_of_values)
+            else:
+                self.writer.write_row(list_of_values)
             
             self.count += 1
             return list_of_values
@@ -128,4 +146,5 @@ class DataCollector:
         except Exception as e:
             logger.exception(f"Error in continuous data collection: {e}")
         finally:
+            self.writer.flush()
             logger.info(f"Data collection finished, collected {points_collected} points")
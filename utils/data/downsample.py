@@ -0,0 +1,133 @@
+"""
+Downsampling utilities for ModCon.
+
+This module reduces long time series to a bounded number of points for
+plotting, either by keeping the extremes of fixed-width time buckets
+(min/max) or with the Largest-Triangle-Three-Buckets (LTTB) algorithm.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Select the points of a series to keep with LTTB.
+
+    The first and last points are always kept. The remaining points are
+    split into n_out - 2 buckets and from each bucket the point forming the
+    largest triangle with the previously kept point and the average of the
+    next bucket is kept.
+
+    Args:
+        x: Array of x values (e.g. timestamps), increasing
+        y: Array of y values; NaN values are treated as 0
+        n_out: Number of points to keep
+
+    Returns:
+        Sorted array of indices into x and y
+    """
+    n = x.size
+    if n_out >= n or n_out < 3:
+        return np.arange(n) if n_out >= n else np.linspace(0, n - 1, max(n_out, 0)).astype(np.int64)
+
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    x = np.asarray(x, dtype=np.float64)
+
+    # Bucket edges over the points between the first and the last
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+
+        if i + 2 < n_out - 1:
+            next_start, next_end = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        area = np.abs(
+            (x[prev] - avg_x) * (y[start:end] - y[prev])
+            - (x[prev] - x[start:end]) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        indices[i + 1] = prev
+
+    return indices
+
+
+def merge_buckets(
+    bucket_ids: np.ndarray,
+    ts_min: np.ndarray,
+    ts_max: np.ndarray,
+    mins: np.ndarray,
+    maxs: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Combine min/max buckets computed separately (e.g. per partition).
+
+    Args:
+        bucket_ids: Array of bucket numbers, one per row
+        ts_min: First timestamp of each row's bucket
+        ts_max: Last timestamp of each row's bucket
+        mins: Matrix of per-column minimums, one row per bucket row
+        maxs: Matrix of per-column maximums, one row per bucket row
+
+    Returns:
+        The same arrays with exactly one row per bucket, sorted by bucket
+    """
+    order = np.argsort(bucket_ids, kind='stable')
+    bucket_ids, ts_min, ts_max = bucket_ids[order], ts_min[order], ts_max[order]
+    mins, maxs = mins[order], maxs[order]
+
+    starts = np.flatnonzero(np.concatenate(([True], np.diff(bucket_ids) != 0)))
+    if starts.size == bucket_ids.size:
+        return bucket_ids, ts_min, ts_max, mins, maxs
+
+    return (
+        bucket_ids[starts],
+        np.minimum.reduceat(ts_min, starts),
+        np.maximum.reduceat(ts_max, starts),
+        np.fmin.reduceat(mins, starts, axis=0),
+        np.fmax.reduceat(maxs, starts, axis=0)
+    )
+
+
+def buckets_to_points(
+    ts_min: np.ndarray,
+    ts_max: np.ndarray,
+    mins: np.ndarray,
+    maxs: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turn min/max buckets into a plottable series of two points per bucket.
+
+    Each bucket yields its minimums at its first timestamp and its
+    maximums at its last timestamp, preserving the envelope of the data.
+
+    Args:
+        ts_min: First timestamp of each bucket
+        ts_max: Last timestamp of each bucket
+        mins: Matrix of per-column minimums
+        maxs: Matrix of per-column maximums
+
+    Returns:
+        Tuple of (timestamps, values matrix)
+    """
+    n = ts_min.size
+    timestamps = np.empty(2 * n, dtype=np.float64)
+    values = np.empty((2 * n, mins.shape[1]), dtype=np.float64)
+
+    timestamps[0::2], timestamps[1::2] = ts_min, ts_max
+    values[0::2], values[1::2] = mins, maxs
+
+    # Buckets holding a single sample would produce duplicate points
+    keep = np.ones(2 * n, dtype=bool)
+    keep[1::2] = ts_max > ts_min
+    return timestamps[keep], values[keep]
@@ -5,17 +5,30 @@ This module provides functions for reading and writing data to/from
 various file formats, including CSV, JSON, and others.
 """
 
+import io
 import os
+import re
 import csv
 import json
-from typing import List, Dict, Any, Optional, Union
+import time
+from itertools import islice
+from typing import List, Dict, Any, Iterator, NamedTuple, Optional, Sequence, Tuple, Union
 from pathlib import Path
 
+import numpy as np
+
 from utils.logger import get_logger
 from utils.config import config
+from utils.database.schema import get_schema
 
 logger = get_logger(__name__)
 
+# Name of the optional first CSV column holding Unix timestamps
+TIMESTAMP_COLUMN = 'TIMESTAMP'
+
+# Empty CSV field: at the start of a line, between two commas or before the line end
+_EMPTY_FIELD = re.compile(r'^(?=,)|(?<=,)(?=,|\r?$)', re.MULTILINE)
+
 
 def write_csv(
     data: List[Any],
@@ -43,22 +56,14 @@ def write_csv(
         
         # Make sure the directory exists
         directory = os.path.dirname(filepath)
-        if directory and not os.path.exists(directory):
-            os.makedirs(directory)
-            logger.info(f"Created directory: {directory}")
-        
-        # Determine if we need to write headers
-        file_exists = os.path.exists(filepath)
-        write_headers = headers is not None and (not file_exists or not append)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
         
-        # Open file in appropriate mode
-        mode = 'a' if append and file_exists else 'w'
-        
-        with open(filepath, mode, newline='') as f:
+        with open(filepath, 'a' if append else 'w', newline='') as f:
             writer = csv.writer(f)
             
-            # Write headers if needed
-            if write_headers:
+            # Write headers if the file is new or empty
+            if headers is not None and f.tell() == 0:
                 writer.writerow(headers)
                 logger.debug(f"Wrote headers to {filepath}")
             
@@ -80,6 +85,134 @@ def write_csv(
         return False
 
 
+class CSVWriter:
+    """
+    Long-lived CSV writer that keeps its file open and buffers rows.
+    
+    Rows are written to the file when flush_rows rows are buffered, when
+    flush_interval seconds have passed since the last flush (checked on each
+    write), and on close. Rows still buffered are lost on a crash, so the
+    flush policy bounds the data at risk.
+    """
+    
+    def __init__(
+        self,
+        filepath: str,
+        headers: Optional[List[str]] = None,
+        append: bool = True,
+        flush_rows: int = 100,
+        flush_interval: float = 5.0
+    ):
+        """
+        Open the CSV file, writing the headers if it is new or empty.
+        
+        Args:
+            filepath: Path to the output file
+            headers: Column headers to include at the top of a new file
+            append: Whether to append to an existing file or overwrite it
+            flush_rows: Number of buffered rows that triggers a flush
+            flush_interval: Maximum time in seconds between flushes
+        """
+        self.filepath = filepath
+        self.flush_rows = max(flush_rows, 1)
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._file = open(filepath, 'a' if append else 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._buffer: List[Sequence[Any]] = []
+        self._last_flush = time.monotonic()
+        
+        # Size of the file in bytes, updated on every flush
+        self.size = 0
+        
+        # Header of an existing file, so callers can match its layout
+        self.header: Optional[List[str]] = None
+        if self._file.tell() == 0:
+            if headers is not None:
+                self._writer.writerow(headers)
+                self._file.flush()
+            self.header = list(headers) if headers is not None else None
+        else:
+            with open(filepath, 'r', newline='') as f:
+                self.header = next(csv.reader(f), None)
+        self.size = self._file.tell()
+        
+        logger.debug(f"Opened {filepath} for buffered writing")
+    
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+    
+    @property
+    def closed(self) -> bool:
+        """Whether the writer has been closed."""
+        return self._file is None
+    
+    def write_row(self, row: Sequence[Any]) -> None:
+        """
+        Buffer one row, flushing if the flush policy says so.
+        
+        Args:
+            row: Values of the row
+        """
+        self._buffer.append(row)
+        
+        if len(self._buffer) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def write_rows(self, rows: Sequence[Sequence[Any]]) -> None:
+        """
+        Buffer several rows, flushing if the flush policy says so.
+        
+        Args:
+            rows: Rows of values
+        """
+        self._buffer.extend(rows)
+        
+        if len(self._buffer) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self) -> None:
+        """Write the buffered rows to the file."""
+        self._last_flush = time.monotonic()
+        if not self._buffer or self._file is None:
+            return
+        
+        self._writer.writerows(self._buffer)
+        self._file.flush()
+        self.size = self._file.tell()
+        
+        self.rows_written += len(self._buffer)
+        logger.debug(f"Flushed {len(self._buffer)} rows to {self.filepath}")
+        self._buffer.clear()
+    
+    def close(self) -> None:
+        """Flush the buffered rows and close the file."""
+        if self._file is None:
+            return
+        
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+            self._file = None
+        
+        logger.info(f"Closed {self.filepath} after writing {self.rows_written} rows")
+
+
 def read_csv(
     filepath: str,
     as_dict: bool = False,
@@ -88,6 +221,9 @@ def read_csv(
     """
     Read data from a CSV file.
     
+    The whole file is loaded as strings; use read_csv_blocks or
+    CSVBlockReader to stream large captures as typed arrays.
+    
     Args:
         filepath: Path to the CSV file
         as_dict: Whether to return data as list of dictionaries (True) or list of lists (False)
@@ -117,6 +253,263 @@ def read_csv(
         return []
 
 
+class CSVBlock(NamedTuple):
+    """
+    Chunk of typed rows read from a CSV capture.
+    """
+    timestamps: Optional[np.ndarray]
+    values: np.ndarray
+    valid: np.ndarray
+    
+    def as_float(self) -> np.ndarray:
+        """Get the values as a float matrix with NaN for missing fields."""
+        return np.where(self.valid, self.values, np.nan)
+
+
+def parse_csv_lines(lines: List[str], n_columns: int) -> np.ndarray:
+    """
+    Parse numeric CSV lines into a float matrix, NaN for empty fields.
+    
+    Args:
+        lines: CSV lines without the header
+        n_columns: Expected number of fields per line
+    
+    Returns:
+        Float matrix of shape (len(lines), n_columns)
+    """
+    # Registers that couldn't be read are written as empty fields; filling
+    # them in keeps np.loadtxt on its fast path
+    text = _EMPTY_FIELD.sub('nan', ''.join(lines))
+    data = np.loadtxt(io.StringIO(text), delimiter=',', dtype=np.float64, ndmin=2)
+    
+    if data.shape[1] != n_columns:
+        raise ValueError(f"Expected {n_columns} fields per line, found {data.shape[1]}")
+    return data
+
+
+def capture_columns(names: List[str], width: int) -> List[str]:
+    """
+    Get the column names of a CSV capture's values.
+    
+    Captures written before the collector wrote the schema's columns as
+    its header have one header name per register name but one value per
+    register address, so their columns are named after the schema instead.
+    
+    Args:
+        names: Header names, without the TIMESTAMP column
+        width: Number of values per row, without the timestamp
+    
+    Returns:
+        One column name per value
+    """
+    schema = get_schema('raw')
+    
+    if len(names) == width:
+        return list(names)
+    if list(names) == schema.register_names and width == len(schema.columns):
+        return list(schema.columns)
+    
+    logger.warning(f"Header has {len(names)} names for {width} values, naming the extra columns by position")
+    return list(names[:width]) + [f"COLUMN_{i}" for i in range(len(names), width)]
+
+
+class CSVBlockReader:
+    """
+    Streaming reader yielding a CSV capture as typed NumPy blocks.
+    
+    Only chunk_rows lines are held in memory at once, whatever the size of
+    the file. Values are read as uint16 when every column is a register of
+    the register map (raw 16-bit values), float64 otherwise. A sidecar
+    <file>.npz cache makes repeated full reads of the same capture instant;
+    it is rebuilt whenever the CSV file changes.
+    """
+    
+    def __init__(
+        self,
+        filepath: str,
+        chunk_rows: int = 50000,
+        dtype: Optional[np.dtype] = None
+    ):
+        """
+        Open a CSV capture and derive its columns and dtype from the header.
+        
+        Args:
+            filepath: Path to the CSV file
+            chunk_rows: Number of lines parsed at once
+            dtype: Dtype of the values, None to derive it from the header
+        """
+        self.filepath = filepath
+        self.chunk_rows = chunk_rows
+        
+        with open(filepath, 'r', newline='') as f:
+            names = f.readline().strip().split(',')
+            first_line = next((line for line in f if line.strip()), None)
+        
+        self.has_timestamp = names[0] == TIMESTAMP_COLUMN
+        if self.has_timestamp:
+            names = names[1:]
+        
+        width = first_line.count(',') + 1 if first_line else len(names) + self.has_timestamp
+        self.columns = capture_columns(names, width - self.has_timestamp)
+        
+        if dtype is None:
+            registers = set(get_schema('raw').columns)
+            dtype = np.uint16 if all(column in registers for column in self.columns) else np.float64
+        self.dtype = np.dtype(dtype)
+    
+    @property
+    def cache_path(self) -> str:
+        """Path of the sidecar cache file."""
+        return self.filepath + '.npz'
+    
+    def __iter__(self) -> Iterator[CSVBlock]:
+        """
+        Stream the capture.
+        
+        Yields:
+            CSVBlock per chunk, timestamps None if the file has no TIMESTAMP column
+        """
+        width = len(self.columns) + self.has_timestamp
+        
+        with open(self.filepath, 'r', newline='') as f:
+            f.readline()
+            
+            while True:
+                lines = [line for line in islice(f, self.chunk_rows) if line.strip()]
+                if not lines:
+                    return
+                
+                data = parse_csv_lines(lines, width)
+                timestamps = data[:, 0] if self.has_timestamp else None
+                yield self._typed_block(timestamps, data[:, self.has_timestamp:])
+    
+    def _typed_block(self, timestamps: Optional[np.ndarray], data: np.ndarray) -> CSVBlock:
+        """Convert a parsed float matrix to a typed block."""
+        valid = ~np.isnan(data)
+        
+        if self.dtype.kind in 'iu':
+            info = np.iinfo(self.dtype)
+            present = data[valid]
+            if present.size and (present.min() < info.min or present.max() > info.max
+                                 or not np.array_equal(present, np.round(present))):
+                raise ValueError(f"{self.filepath} holds values that don't fit {self.dtype}, read it as float64")
+            values = np.where(valid, data, 0).astype(self.dtype)
+        else:
+            values = data.astype(self.dtype)
+        
+        return CSVBlock(timestamps, values, valid)
+    
+    def read(self, cache: bool = False) -> CSVBlock:
+        """
+        Read the whole capture as one block.
+        
+        Args:
+            cache: Whether to load from, or create, the sidecar cache
+        
+        Returns:
+            CSVBlock with every row of the file
+        """
+        if cache:
+            block = self._load_cache()
+            if block is not None:
+                return block
+        
+        blocks = list(self)
+        if blocks:
+            timestamps = np.concatenate([b.timestamps for b in blocks]) if self.has_timestamp else None
+            block = CSVBlock(
+                timestamps,
+                np.concatenate([b.values for b in blocks]),
+                np.concatenate([b.valid for b in blocks])
+            )
+        else:
+            block = CSVBlock(
+                np.zeros(0) if self.has_timestamp else None,
+                np.zeros((0, len(self.columns)), dtype=self.dtype),
+                np.zeros((0, len(self.columns)), dtype=bool)
+            )
+        
+        if cache:
+            self._save_cache(block)
+        return block
+    
+    def _source_stamp(self) -> np.ndarray:
+        """Size and modification time identifying the CSV file's content."""
+        stat = os.stat(self.filepath)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    
+    def _load_cache(self) -> Optional[CSVBlock]:
+        """Load the sidecar cache, or None if it is missing or stale."""
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as cached:
+                if (not np.array_equal(cached['source'], self._source_stamp())
+                        or cached['columns'].tolist() != self.columns
+                        or cached['values'].dtype != self.dtype):
+                    logger.info(f"Cache {self.cache_path} is stale, re-reading {self.filepath}")
+                    return None
+                
+                timestamps = cached['timestamps'] if self.has_timestamp else None
+                block = CSVBlock(timestamps, cached['values'], cached['valid'])
+        except (OSError, KeyError, ValueError):
+            return None
+        
+        logger.debug(f"Loaded {block.values.shape[0]} rows of {self.filepath} from {self.cache_path}")
+        return block
+    
+    def _save_cache(self, block: CSVBlock) -> None:
+        """Write the sidecar cache atomically."""
+        tmp_path = self.cache_path + '.tmp'
+        
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    source=self._source_stamp(),
+                    columns=np.array(self.columns),
+                    timestamps=block.timestamps if block.timestamps is not None else np.zeros(0),
+                    values=block.values,
+                    valid=block.valid
+                )
+            os.replace(tmp_path, self.cache_path)
+            logger.debug(f"Cached {self.filepath} to {self.cache_path}")
+        except OSError as e:
+            logger.warning(f"Could not write cache {self.cache_path}: {e}")
+
+
+def read_csv_blocks(
+    filepath: str,
+    chunk_rows: int = 50000,
+    dtype: Optional[np.dtype] = None
+) -> Iterator[CSVBlock]:
+    """
+    Stream a CSV capture as typed NumPy blocks of at most chunk_rows rows.
+    
+    Args:
+        filepath: Path to the CSV file
+        chunk_rows: Number of lines parsed at once
+        dtype: Dtype of the values, None to derive it from the header
+    
+    Yields:
+        CSVBlock per chunk
+    """
+    yield from CSVBlockReader(filepath, chunk_rows, dtype)
+
+
+def read_csv_array(filepath: str, cache: bool = True) -> Tuple[List[str], CSVBlock]:
+    """
+    Read a whole CSV capture as typed arrays, using the sidecar cache.
+    
+    Args:
+        filepath: Path to the CSV file
+        cache: Whether to load from, or create, the <file>.npz sidecar cache
+    
+    Returns:
+        Tuple of (column names, CSVBlock with every row)
+    """
+    reader = CSVBlockReader(filepath)
+    return reader.columns, reader.read(cache=cache)
+
+
 def write_json(
     data: Union[Dict[str, Any], List[Any]],
     filepath: str,
@@ -0,0 +1,369 @@
+"""
+Memory-mapped fixed-record snapshot log for ModCon.
+
+This module stores snapshots as fixed-size binary records (timestamp,
+raw register values and a validity bitmask) in a preallocated file used
+as a ring buffer. Any number of reader processes can map the file and
+view it as a NumPy structured array without parsing anything.
+"""
+
+from pathlib import Path
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# File marker and version
+LOG_MAGIC = b'MCRL'
+LOG_VERSION = 1
+
+# Number of registers read from a Sinamics V20 per snapshot
+DEFAULT_CHANNELS = 72
+
+# Size of the header page preceding the records
+HEADER_SIZE = 4096
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('capacity', '<u8'),
+    ('n_channels', '<u4'),
+    ('record_size', '<u4'),
+    ('count', '<u8')
+])
+
+
+def snapshot_dtype(n_channels: int = DEFAULT_CHANNELS) -> np.dtype:
+    """
+    Get the structured dtype of one snapshot record.
+
+    Args:
+        n_channels: Number of register values per snapshot
+
+    Returns:
+        NumPy dtype with 'ts', 'values' and 'valid' fields
+    """
+    return np.dtype([
+        ('ts', '<f8'),
+        ('values', '<u2', (n_channels,)),
+        ('valid', 'u1', ((n_channels + 7) // 8,))
+    ])
+
+
+def pack_snapshot(
+    record: np.ndarray,
+    timestamp: float,
+    values: Sequence[Optional[int]]
+) -> None:
+    """
+    Fill a snapshot record in place.
+
+    Registers that could not be read (None) are stored as 0 and
+    flagged invalid in the bitmask.
+
+    Args:
+        record: Scalar record of snapshot_dtype to fill
+        timestamp: Unix timestamp of the snapshot
+        values: Raw register values, None for unread registers
+    """
+    valid = np.array([v is not None for v in values], dtype=bool)
+    record['ts'] = timestamp
+    record['values'] = [0 if v is None else v for v in values]
+    record['valid'] = np.packbits(valid, bitorder='little')
+
+
+def unpack_snapshot(record: np.ndarray) -> Tuple[float, List[Optional[int]]]:
+    """
+    Convert a snapshot record back to a timestamp and a list of values.
+
+    Args:
+        record: Scalar record of snapshot_dtype
+
+    Returns:
+        Tuple of (timestamp, raw register values with None for unread registers)
+    """
+    valid = valid_mask(record)
+    values = [int(v) if ok else None for v, ok in zip(record['values'], valid)]
+    return float(record['ts']), values
+
+
+def valid_mask(records: np.ndarray) -> np.ndarray:
+    """
+    Expand the validity bitmask of snapshot records.
+
+    Args:
+        records: Array of snapshot_dtype records
+
+    Returns:
+        Boolean array of shape (n_records, n_channels)
+    """
+    n_channels = records.dtype['values'].shape[0]
+    bits = np.unpackbits(records['valid'], axis=-1, bitorder='little')
+    return bits[..., :n_channels].astype(bool)
+
+
+def _open_header(filepath: Path, mode: str) -> np.memmap:
+    """
+    Map and validate the header of a record log.
+
+    Args:
+        filepath: Path to the log file
+        mode: np.memmap mode ('r' or 'r+')
+
+    Returns:
+        Memory-mapped header record
+    """
+    header = np.memmap(filepath, dtype=HEADER_DTYPE, mode=mode, shape=(1,))
+    if header['magic'][0] != LOG_MAGIC:
+        raise ValueError(f"Not a ModCon record log: {filepath}")
+    if header['version'][0] != LOG_VERSION:
+        raise ValueError(f"Unsupported record log version {header['version'][0]}: {filepath}")
+    return header
+
+
+class RecordLog:
+    """
+    Writer for the memory-mapped snapshot log.
+
+    The file is preallocated for capacity records. Once full, the oldest
+    records are overwritten. The record count in the header is updated
+    after each record is written, so readers never see a partial record
+    at the head of the log, and readers leave out the slot the writer
+    overwrites next, so at most capacity - 1 records are readable.
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        capacity: int = 86400,
+        n_channels: int = DEFAULT_CHANNELS
+    ):
+        """
+        Open a record log for writing, creating it if it doesn't exist.
+
+        Args:
+            filepath: Path to the log file
+            capacity: Number of records the file can hold
+            n_channels: Number of register values per snapshot
+        """
+        self.filepath = Path(filepath)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        if not self.filepath.exists():
+            self._create(capacity, n_channels)
+
+        self._header = _open_header(self.filepath, 'r+')
+        self.capacity = int(self._header['capacity'][0])
+        self.n_channels = int(self._header['n_channels'][0])
+        self.dtype = snapshot_dtype(self.n_channels)
+
+        self.records = np.memmap(
+            self.filepath, dtype=self.dtype, mode='r+',
+            offset=HEADER_SIZE, shape=(self.capacity,)
+        )
+
+        logger.info(f"RecordLog opened at {self.filepath} with capacity {self.capacity}")
+
+    def _create(self, capacity: int, n_channels: int) -> None:
+        """
+        Create and preallocate a new log file.
+
+        Args:
+            capacity: Number of records the file can hold
+            n_channels: Number of register values per snapshot
+        """
+        dtype = snapshot_dtype(n_channels)
+
+        with open(self.filepath, 'wb') as f:
+            f.truncate(HEADER_SIZE + capacity * dtype.itemsize)
+
+        header = np.memmap(self.filepath, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        header[0] = (LOG_MAGIC, LOG_VERSION, capacity, n_channels, dtype.itemsize, 0)
+        header.flush()
+        del header
+
+        logger.info(f"Created record log {self.filepath} ({HEADER_SIZE + capacity * dtype.itemsize} bytes)")
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    @property
+    def count(self) -> int:
+        """Total number of records appended since the log was created."""
+        return int(self._header['count'][0])
+
+    def append(self, timestamp: float, values: Sequence[Optional[int]]) -> None:
+        """
+        Append one snapshot.
+
+        Args:
+            timestamp: Unix timestamp of the snapshot
+            values: Raw register values in address order, None for unread registers
+        """
+        count = self.count
+        pack_snapshot(self.records[count % self.capacity], timestamp, values)
+        self._header['count'] = count + 1
+
+    def flush(self) -> None:
+        """Flush the mapped pages to disk."""
+        self.records.flush()
+        self._header.flush()
+
+    def close(self) -> None:
+        """Flush and unmap the log."""
+        if self.records is None:
+            return
+
+        self.flush()
+        self.records = None
+        self._header = None
+        logger.info(f"RecordLog closed at {self.filepath}")
+
+
+class RecordLogReader:
+    """
+    Zero-copy reader for the memory-mapped snapshot log.
+
+    Readers map the file read-only and can be opened by any number of
+    processes while the writer is appending. The slot following the most
+    recent record is never returned, as the writer may be filling it.
+    Returned views are only stable until the writer laps them; copy the
+    records that are kept for longer than the log's span.
+    """
+
+    def __init__(self, filepath: str):
+        """
+        Open a record log for reading.
+
+        Args:
+            filepath: Path to the log file
+
+        Raises:
+            FileNotFoundError: If the log file doesn't exist
+        """
+        self.filepath = Path(filepath)
+        if not self.filepath.exists():
+            raise FileNotFoundError(f"Record log not found: {filepath}")
+
+        self._header = _open_header(self.filepath, 'r')
+        self.capacity = int(self._header['capacity'][0])
+        self.n_channels = int(self._header['n_channels'][0])
+        self.dtype = snapshot_dtype(self.n_channels)
+
+        self.records = np.memmap(
+            self.filepath, dtype=self.dtype, mode='r',
+            offset=HEADER_SIZE, shape=(self.capacity,)
+        )
+
+    @property
+    def count(self) -> int:
+        """Total number of records appended since the log was created."""
+        return int(self._header['count'][0])
+
+    def last(self, n: int) -> np.ndarray:
+        """
+        Get the n most recent records in time order.
+
+        The result is a view into the mapped file unless the requested
+        records wrap around the end of the ring buffer.
+
+        Args:
+            n: Number of records
+
+        Returns:
+            Structured array of at most n (and capacity - 1) records
+        """
+        count = self.count
+        n = min(n, count, self.capacity - 1)
+        if n <= 0:
+            return self.records[:0]
+
+        end = count % self.capacity or self.capacity
+        start = end - n
+
+        if start >= 0:
+            return self.records[start:end]
+
+        return np.concatenate((self.records[start:], self.records[:end]))
+
+    def latest(self) -> Optional[np.ndarray]:
+        """
+        Get the most recent record.
+
+        Returns:
+            Scalar record, or None if the log is empty
+        """
+        records = self.last(1)
+        return records[0] if records.size else None
+
+    def since(self, t0: float) -> np.ndarray:
+        """
+        Get the records with a timestamp at or after t0, in time order.
+
+        Args:
+            t0: Unix timestamp
+
+        Returns:
+            Structured array of records
+        """
+        count = self.count
+        end = count % self.capacity or self.capacity
+        start = end - min(count, self.capacity - 1)
+
+        # Count matching records in the newer and (once wrapped) older
+        # segment, leaving out the slot being written
+        newer = self.records[max(start, 0):end]['ts']
+        n = newer.size - np.searchsorted(newer, t0, side='left')
+
+        if start < 0:
+            older = self.records[start:]['ts']
+            n += older.size - np.searchsorted(older, t0, side='left')
+
+        return self.last(int(n))
+
+    def last_seconds(self, seconds: float, now: Optional[float] = None) -> np.ndarray:
+        """
+        Get the records from the last given number of seconds.
+
+        Args:
+            seconds: Window length in seconds
+            now: Reference Unix timestamp, or None for the latest record
+
+        Returns:
+            Structured array of records
+        """
+        if now is None:
+            latest = self.latest()
+            if latest is None:
+                return self.records[:0]
+            now = float(latest['ts'])
+
+        return self.since(now - seconds)
+
+    def channel(self, records: np.ndarray, index: int, fill_value: Any = np.nan) -> np.ndarray:
+        """
+        Extract one register from records as floats, with invalid values replaced.
+
+        Args:
+            records: Array of snapshot records
+            index: Register index in address order
+            fill_value: Value to use for registers that could not be read
+
+        Returns:
+            Array of register values
+        """
+        values = records['values'][:, index].astype(np.float64)
+        values[~valid_mask(records)[:, index]] = fill_value
+        return values
@@ -0,0 +1,442 @@
+"""
+Rotating, compressed CSV segments for ModCon.
+
+This module splits long-running CSV captures into segment files, rotated
+when they reach a size limit or when a wall-clock period ends. Finished
+segments are compressed by a background thread (gzip, or zstd when the
+zstandard package is installed) and listed in a JSON manifest with the
+time range they cover, so readers only open the segments overlapping a
+query window.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, IO, List, Optional, Sequence
+
+from utils.logger import get_logger
+from utils.data.file_io import CSVWriter, TIMESTAMP_COLUMN
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = get_logger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Supported compression codecs and the suffix they add to segment files
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+
+
+class SegmentManifest:
+    """
+    JSON index of the segment files of a directory.
+
+    Each entry holds the file name, the timestamps of its first and last
+    rows, its row count, and whether it is still being written. The file
+    is replaced atomically on every save, so readers never see it torn.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Load the manifest of a segment directory, if there is one.
+
+        Args:
+            directory: Directory holding the segments and the manifest
+        """
+        self.directory = Path(directory)
+        self.path = self.directory / MANIFEST_NAME
+        self.entries: List[Dict[str, Any]] = []
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('segments', [])
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'segments': self.entries}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def covering(self, t0: Optional[float] = None, t1: Optional[float] = None) -> List[Path]:
+        """
+        Get the segments holding rows in a time range.
+
+        The segment being written has no end yet and covers everything
+        after its first row.
+
+        Args:
+            t0: Start of the range (inclusive), None for no lower bound
+            t1: End of the range (inclusive), None for no upper bound
+
+        Returns:
+            Paths of the overlapping segments, oldest first
+        """
+        paths = []
+
+        for entry in self.entries:
+            if t1 is not None and entry['start'] > t1:
+                continue
+            if t0 is not None and not entry['active'] and entry['end'] < t0:
+                continue
+            paths.append(self.directory / entry['file'])
+
+        return paths
+
+
+def segments_for_range(directory: str, t0: Optional[float] = None, t1: Optional[float] = None) -> List[Path]:
+    """
+    Get the segment files of a directory overlapping a time range.
+
+    Args:
+        directory: Segment directory
+        t0: Start of the range (inclusive), None for no lower bound
+        t1: End of the range (inclusive), None for no upper bound
+
+    Returns:
+        Paths of the overlapping segments, oldest first
+    """
+    return SegmentManifest(directory).covering(t0, t1)
+
+
+def open_segment(path: Path) -> IO[str]:
+    """
+    Open a segment for reading as text, decompressing it if needed.
+
+    Args:
+        path: Path to a plain, gzip or zstd segment file
+
+    Returns:
+        Text file object yielding the CSV lines
+    """
+    path = Path(path)
+
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', newline='')
+
+    if path.suffix == '.zst':
+        if zstandard is None:
+            raise ImportError("Reading zstd segments requires the zstandard package")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(stream, newline='')
+
+    return open(path, 'r', newline='')
+
+
+def compress_file(path: Path, compression: str = 'gzip', level: Optional[int] = None) -> Path:
+    """
+    Compress a file next to itself.
+
+    The compressed file is written under a temporary name and renamed
+    once complete, so a crash never leaves a truncated segment behind. The
+    original is kept; the caller removes it once nothing refers to it.
+
+    Args:
+        path: Path to the file
+        compression: Codec ('gzip' or 'zstd')
+        level: Compression level, None for the codec default
+
+    Returns:
+        Path of the compressed file
+    """
+    target = path.with_name(path.name + COMPRESSION_SUFFIXES[compression])
+    tmp_path = target.with_name(target.name + '.tmp')
+
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+        if compression == 'gzip':
+            with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=6 if level is None else level) as gz:
+                shutil.copyfileobj(src, gz, 1 << 20)
+        else:
+            compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+            compressor.copy_stream(src, dst)
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    os.replace(tmp_path, target)
+    return target
+
+
+def _last_timestamp(path: Path) -> Optional[float]:
+    """Read the timestamp of the last complete row of a plain CSV segment."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(f.tell() - 65536, 0))
+        lines = f.read().split(b'\n')
+
+    # The last element is empty, or a row torn by the crash
+    for line in reversed(lines[:-1]):
+        try:
+            return float(line.split(b',', 1)[0])
+        except ValueError:
+            continue
+    return None
+
+
+class RotatingCSVWriter:
+    """
+    CSV writer splitting its output into rotated, compressed segments.
+
+    Rows must start with a Unix timestamp. A new segment is started when
+    the current one reaches max_bytes (checked when rows are flushed) or
+    when a row falls into the next interval-aligned UTC period. Every
+    segment starts with the headers, so it can be read on its own.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        headers: List[str],
+        prefix: str = 'data',
+        max_bytes: Optional[int] = 64 * 1024 * 1024,
+        interval: Optional[float] = 86400.0,
+        compression: Optional[str] = 'gzip',
+        flush_rows: int = 100,
+        flush_interval: float = 5.0
+    ):
+        """
+        Open the segment directory and start the compression thread.
+
+        A segment left open by a previous run is closed and compressed.
+
+        Args:
+            directory: Directory holding the segments and the manifest
+            headers: Column headers, starting with the TIMESTAMP column
+            prefix: Prefix of the segment file names
+            max_bytes: Size that triggers a rotation, None for no size limit
+            interval: Rotation period in seconds, aligned on the Unix epoch, None for no time limit
+            compression: Codec for finished segments ('gzip' or 'zstd'), None to keep them plain
+            flush_rows: Number of buffered rows that triggers a write to the segment
+            flush_interval: Maximum time in seconds between writes to the segment
+        """
+        if not headers or headers[0] != TIMESTAMP_COLUMN:
+            raise ValueError(f"Segment headers must start with the {TIMESTAMP_COLUMN} column")
+        if compression is not None and compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unsupported compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package")
+
+        self.directory = Path(directory)
+        self.header = list(headers)
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.compression = compression
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest = SegmentManifest(str(self.directory))
+        self._lock = threading.Lock()
+        self._writer: Optional[CSVWriter] = None
+        self._entry: Optional[Dict[str, Any]] = None
+        self._period_end = float('inf')
+        self._seq = max((entry['seq'] for entry in self.manifest.entries), default=-1) + 1
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._compress_loop, daemon=True)
+        self._thread.start()
+
+        self._recover()
+        logger.info(f"RotatingCSVWriter writing segments to {self.directory}")
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        """Whether the writer has been closed."""
+        return self._queue is None
+
+    def _recover(self) -> None:
+        """Close segments left active by a crash and finish interrupted compressions."""
+        entries = []
+
+        for entry in self.manifest.entries:
+            path = self.directory / entry['file']
+
+            if entry['active']:
+                entry['active'] = False
+                if path.exists():
+                    entry['end'] = _last_timestamp(path) or entry['start']
+                logger.warning(f"Closed segment {entry['file']} left open by a previous run")
+
+            if path.suffix != '.csv':
+                # Compressed; the plain file may survive a crash before its removal
+                plain = path.with_suffix('')
+                if plain.exists():
+                    os.remove(plain)
+            elif self.compression and path.exists():
+                self._queue.put(entry)
+
+            if path.exists():
+                entries.append(entry)
+            else:
+                logger.warning(f"Dropping missing segment {entry['file']} from the manifest")
+
+        with self._lock:
+            self.manifest.entries = entries
+            self.manifest.save()
+
+    def _open(self, timestamp: float) -> None:
+        """Start a new segment whose first row has the given timestamp."""
+        moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+        name = f"{self.prefix}-{moment.strftime('%Y%m%dT%H%M%SZ')}-{self._seq:06d}.csv"
+
+        self._writer = CSVWriter(str(self.directory / name), self.header, False,
+                                 self.flush_rows, self.flush_interval)
+        self._entry = {
+            'file': name,
+            'seq': self._seq,
+            'start': timestamp,
+            'end': timestamp,
+            'rows': 0,
+            'active': True
+        }
+        self._seq += 1
+
+        if self.interval:
+            self._period_end = (timestamp // self.interval + 1) * self.interval
+        else:
+            self._period_end = float('inf')
+
+        with self._lock:
+            self.manifest.entries.append(self._entry)
+            self.manifest.save()
+
+        logger.info(f"Started segment {name}")
+
+    def rotate(self) -> None:
+        """Finish the current segment and queue it for compression."""
+        if self._writer is None:
+            return
+
+        self._writer.close()
+        entry = self._entry
+        self._writer = None
+        self._entry = None
+
+        with self._lock:
+            entry['active'] = False
+            self.manifest.save()
+
+        logger.info(f"Finished segment {entry['file']} with {entry['rows']} rows")
+        if self.compression:
+            self._queue.put(entry)
+
+    def write_row(self, row: Sequence[Any]) -> None:
+        """
+        Write one row, rotating first if it belongs to the next period.
+
+        Args:
+            row: Values of the row, starting with the Unix timestamp
+        """
+        timestamp = float(row[0])
+
+        if self._writer is not None and timestamp >= self._period_end:
+            self.rotate()
+        if self._writer is None:
+            self._open(timestamp)
+
+        self._writer.write_row(row)
+        self._entry['rows'] += 1
+        self._entry['end'] = max(self._entry['end'], timestamp)
+
+        if self.max_bytes and self._writer.size >= self.max_bytes:
+            self.rotate()
+
+    def flush(self) -> None:
+        """Write the buffered rows of the current segment to disk."""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def _compress_loop(self) -> None:
+        """Compress finished segments until a None entry is queued."""
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+
+            path = self.directory / entry['file']
+            start = time.monotonic()
+
+            try:
+                target = compress_file(path, self.compression)
+            except OSError as e:
+                logger.error(f"Error compressing segment {path}: {e}")
+                continue
+
+            # Readers follow the manifest, so it must point to the compressed
+            # file before the plain one goes away
+            with self._lock:
+                entry['file'] = target.name
+                self.manifest.save()
+            os.remove(path)
+
+            logger.debug(f"Compressed {path.name} to {target.name} in {time.monotonic() - start:.2f}s")
+
+    def close(self) -> None:
+        """Finish the current segment and wait for pending compressions."""
+        if self._queue is None:
+            return
+
+        self.rotate()
+        self._queue.put(None)
+        self._thread.join()
+        self._queue = None
+        logger.info(f"RotatingCSVWriter closed at {self.directory}")
+
+
+def read_segments(directory: str, t0: Optional[float] = None, t1: Optional[float] = None) -> List[List[str]]:
+    """
+    Read the rows of a time range from a segment directory.
+
+    Args:
+        directory: Segment directory
+        t0: Start of the range (inclusive), None for no lower bound
+        t1: End of the range (inclusive), None for no upper bound
+
+    Returns:
+        Rows (without headers) whose timestamp lies in the range, as lists of strings
+    """
+    rows = []
+
+    for path in segments_for_range(directory, t0, t1):
+        with open_segment(path) as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                # Skips blank lines and a row of the active segment still being written
+                try:
+                    timestamp = float(row[0])
+                except (IndexError, ValueError):
+                    continue
+                if (t0 is None or timestamp >= t0) and (t1 is None or timestamp <= t1):
+                    rows.append(row)
+
+    return rows
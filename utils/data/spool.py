@@ -0,0 +1,405 @@
+"""
+Crash-safe store-and-forward spool for ModCon.
+
+When the primary store can't be written (database locked, disk full,
+corruption), snapshots are appended to an on-disk spool of fixed-size,
+checksummed records instead of being dropped. Records are fsynced in
+batches by a background thread so the acquisition loop never waits on
+the disk, and a SpoolReplayer writes them back in bulk once the store
+recovers.
+"""
+
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.data.record_log import DEFAULT_CHANNELS, valid_mask
+
+logger = get_logger(__name__)
+
+SPOOL_MAGIC = b'MCSP'
+SPOOL_VERSION = 1
+
+# Stores a spooled snapshot still has to be written to
+TARGET_DATABASE = 1
+TARGET_HISTORY = 2
+
+SEGMENT_HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('n_channels', '<u4'),
+    ('reserved', '<u4')
+])
+
+
+def spool_dtype(n_channels: int = DEFAULT_CHANNELS) -> np.dtype:
+    """
+    Get the structured dtype of one spool record.
+
+    The CRC covers every byte of the record after the CRC field, so torn
+    or corrupted records are detected on replay.
+
+    Args:
+        n_channels: Number of register values per snapshot
+
+    Returns:
+        NumPy dtype of a spool record
+    """
+    return np.dtype([
+        ('crc', '<u4'),
+        ('device_id', '<u4'),
+        ('targets', '<u4'),
+        ('ts', '<f8'),
+        ('values', '<u2', (n_channels,)),
+        ('valid', 'u1', ((n_channels + 7) // 8,))
+    ])
+
+
+def spooled_values(records: np.ndarray) -> List[List[Optional[int]]]:
+    """
+    Convert spool records back to lists of raw register values.
+
+    Args:
+        records: Array of spool records
+
+    Returns:
+        List of raw value lists, with None for unread registers
+    """
+    valid = valid_mask(records)
+    values = records['values']
+    return [
+        [int(v) if ok else None for v, ok in zip(row, row_valid)]
+        for row, row_valid in zip(values, valid)
+    ]
+
+
+class Spool:
+    """
+    Append-only on-disk spool split into numbered segment files.
+
+    Appends go to the open segment. Sealing closes it so it can be
+    replayed and removed while new records go to the next segment.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        n_channels: int = DEFAULT_CHANNELS,
+        fsync_interval: float = 1.0,
+        fsync_batch: int = 64
+    ):
+        """
+        Open the spool and start the background fsync thread.
+
+        Segments left by a previous run are kept for replay.
+
+        Args:
+            directory: Directory holding the segment files
+            n_channels: Number of register values per snapshot
+            fsync_interval: Maximum time in seconds before appended records are fsynced
+            fsync_batch: Number of appended records that triggers an early fsync
+        """
+        self.directory = Path(directory)
+        self.n_channels = n_channels
+        self.dtype = spool_dtype(n_channels)
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+
+        self._record = np.zeros((), dtype=self.dtype)
+        self._file = None
+        self._path: Optional[Path] = None
+        self._unsynced = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        segments = self._segment_paths()
+        self._next_seq = int(segments[-1].stem.split('-')[1]) + 1 if segments else 0
+
+        if segments:
+            logger.warning(f"Spool {self.directory} holds {len(segments)} segments from a previous run")
+
+        self._thread = threading.Thread(target=self._fsync_loop, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    def _segment_paths(self) -> List[Path]:
+        """List the segment files on disk, oldest first."""
+        return sorted(self.directory.glob('spool-*.bin'))
+
+    def _open_segment(self) -> None:
+        """Start a new segment file."""
+        self._path = self.directory / f"spool-{self._next_seq:08d}.bin"
+        self._next_seq += 1
+
+        header = np.zeros((), dtype=SEGMENT_HEADER_DTYPE)
+        header['magic'] = SPOOL_MAGIC
+        header['version'] = SPOOL_VERSION
+        header['n_channels'] = self.n_channels
+
+        self._file = open(self._path, 'ab')
+        self._file.write(header.tobytes())
+        logger.info(f"Spooling to {self._path}")
+
+    def append(
+        self,
+        device_id: int,
+        timestamp: float,
+        values: Sequence[Optional[int]],
+        targets: int = TARGET_DATABASE
+    ) -> None:
+        """
+        Append one snapshot to the spool.
+
+        This only writes to the page cache; the record is made durable by
+        the fsync thread within fsync_interval seconds.
+
+        Args:
+            device_id: ID of the device the snapshot was read from
+            timestamp: Unix timestamp of the snapshot
+            values: Raw register values in address order, None for unread registers
+            targets: Bitmask of the stores the snapshot still has to be written to
+        """
+        record = self._record
+        record['device_id'] = device_id
+        record['targets'] = targets
+        record['ts'] = timestamp
+        record['values'] = [0 if v is None else v for v in values]
+        record['valid'] = np.packbits(np.array([v is not None for v in values], dtype=bool), bitorder='little')
+
+        data = record.tobytes()
+        record['crc'] = zlib.crc32(data[4:])
+
+        with self._cond:
+            if self._file is None:
+                self._open_segment()
+            self._file.write(record.tobytes())
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch:
+                self._cond.notify()
+
+    def _fsync_loop(self) -> None:
+        """Fsync appended records in batches until the spool is closed."""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._unsynced >= self.fsync_batch,
+                                    timeout=self.fsync_interval)
+                if self._closed:
+                    return
+                if self._file is None or not self._unsynced:
+                    continue
+
+                # Only the flush holds the lock; appends proceed during the fsync
+                try:
+                    self._file.flush()
+                    fd = os.dup(self._file.fileno())
+                    self._unsynced = 0
+                except OSError as e:
+                    logger.error(f"Error flushing spool segment {self._path}: {e}")
+                    continue
+
+            try:
+                os.fsync(fd)
+            except OSError as e:
+                logger.error(f"Error syncing spool segment: {e}")
+            finally:
+                os.close(fd)
+
+    def _sync_locked(self) -> None:
+        """Flush and fsync the open segment, with the lock held."""
+        if self._file is None or not self._unsynced:
+            return
+
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        except OSError as e:
+            logger.error(f"Error syncing spool segment {self._path}: {e}")
+
+    def seal(self) -> List[Path]:
+        """
+        Close the open segment so every spooled record can be replayed.
+
+        Returns:
+            Segment files ready for replay, oldest first
+        """
+        with self._cond:
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
+                self._path = None
+
+            return self._segment_paths()
+
+    def sealed(self) -> List[Path]:
+        """
+        List the sealed segments, leaving the open segment alone.
+
+        Returns:
+            Segment files ready for replay, oldest first
+        """
+        with self._cond:
+            return [path for path in self._segment_paths() if path != self._path]
+
+    @property
+    def has_data(self) -> bool:
+        """Whether any record is waiting to be replayed."""
+        with self._cond:
+            return self._file is not None or bool(self._segment_paths())
+
+    def read_segment(self, path: Path) -> np.ndarray:
+        """
+        Read the valid records of a sealed segment.
+
+        A record torn by a crash at the end of the file is ignored, as are
+        records failing their checksum.
+
+        Args:
+            path: Path to the segment file
+
+        Returns:
+            Array of spool records in append order
+        """
+        data = path.read_bytes()
+        header = np.frombuffer(data[:SEGMENT_HEADER_DTYPE.itemsize], dtype=SEGMENT_HEADER_DTYPE)
+
+        if header.size == 0 or header['magic'][0] != SPOOL_MAGIC:
+            logger.error(f"Ignoring invalid spool segment {path}")
+            return np.zeros(0, dtype=self.dtype)
+
+        dtype = spool_dtype(int(header['n_channels'][0]))
+        body = data[SEGMENT_HEADER_DTYPE.itemsize:]
+        n = len(body) // dtype.itemsize
+        if len(body) % dtype.itemsize:
+            logger.warning(f"Ignoring torn record at the end of {path}")
+
+        records = np.frombuffer(body[:n * dtype.itemsize], dtype=dtype)
+        raw = np.frombuffer(body[:n * dtype.itemsize], dtype=np.uint8).reshape(n, dtype.itemsize)
+        ok = np.array([zlib.crc32(row[4:].tobytes()) for row in raw], dtype=np.uint32) == records['crc']
+
+        if not ok.all():
+            logger.warning(f"Ignoring {int((~ok).sum())} corrupted records in {path}")
+
+        return records[ok]
+
+    def remove(self, path: Path) -> None:
+        """
+        Delete a replayed segment.
+
+        Args:
+            path: Path to the segment file
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def close(self) -> None:
+        """Fsync the open segment and stop the fsync thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+
+        self._thread.join()
+        self.seal()
+        logger.info(f"Spool closed at {self.directory}")
+
+
+class SpoolReplayer:
+    """
+    Background thread replaying spooled snapshots into the primary store.
+    """
+
+    def __init__(
+        self,
+        spool: Spool,
+        replay: Callable[[np.ndarray], None],
+        interval: float = 5.0
+    ):
+        """
+        Start the replay thread.
+
+        Args:
+            spool: Spool to replay
+            replay: Function writing an array of spool records to the store,
+                raising an exception if the store is still unavailable
+            interval: Time between replay attempts in seconds
+        """
+        self.spool = spool
+        self.replay = replay
+        self.interval = interval
+        self.replayed = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """Replay the spool periodically until stopped."""
+        while not self._stop.wait(self.interval):
+            if self.spool.has_data:
+                self.replay_pending()
+
+    def replay_pending(self) -> bool:
+        """
+        Replay every sealed segment, oldest first, then the open segment.
+
+        The open segment is only sealed once the segments sealed before it
+        were replayed, so a store that stays unavailable doesn't leave a
+        new segment behind on every attempt.
+
+        Returns:
+            True if the spool was emptied, False if the store is still unavailable
+        """
+        return self._replay_segments(self.spool.sealed()) and self._replay_segments(self.spool.seal())
+
+    def _replay_segments(self, paths: List[Path]) -> bool:
+        """
+        Replay and remove segments, stopping at the first failure.
+
+        Args:
+            paths: Sealed segment files, oldest first
+
+        Returns:
+            True if every segment was replayed, False otherwise
+        """
+        for path in paths:
+            records = self.spool.read_segment(path)
+
+            try:
+                if records.size:
+                    self.replay(records)
+            except Exception as e:
+                logger.warning(f"Spool replay deferred, store still unavailable: {e}")
+                return False
+
+            self.spool.remove(path)
+            self.replayed += records.size
+            logger.info(f"Replayed {records.size} spooled snapshots from {path.name}")
+
+        return True
+
+    def stop(self) -> None:
+        """Stop the replay thread."""
+        self._stop.set()
+        self._thread.join()
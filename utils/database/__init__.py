@@ -5,5 +5,7 @@ This module provides functions for database operations, including
 creating, reading from, and writing to SQLite databases.
 """
 
-from utils.database.manager import DatabaseManager
 from utils.database.operations import create_database, generate_update_query_by_id
+from utils.database.partitions import PartitionedHistory
+from utils.database.hot_store import HotStore
+from utils.database.watch import DataVersionWatcher
@@ -0,0 +1,346 @@
+"""
+Columnar export of the history for ModCon.
+
+This module streams time ranges of the history, either the history table
+of the main database or the partitioned history files, into Arrow IPC or
+Parquet files. Rows are fetched in batches, turned into NumPy columns and
+written as Arrow record batches, so memory use is bounded by the batch
+size whatever the length of the export. Requires the optional pyarrow
+package.
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from itertools import chain
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.config import config
+from utils.database.operations import _range_conditions, history_table_name
+from utils.database.partitions import PartitionedHistory
+from utils.database.schema import SCALED_SUFFIX, RegisterSchema, get_schema
+
+logger = get_logger(__name__)
+
+# Supported output formats and the file suffixes they are inferred from
+EXPORT_FORMATS = {
+    'parquet': ('.parquet', '.pq'),
+    'arrow': ('.arrow', '.feather', '.ipc')
+}
+
+
+def _pyarrow():
+    """
+    Import pyarrow on first use, so importing this module stays cheap.
+
+    Returns:
+        The pyarrow module, with its ipc and parquet modules loaded
+
+    Raises:
+        ImportError: If pyarrow is not installed
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Exporting the history requires the pyarrow package") from e
+    return pyarrow
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a command-line time as a Unix timestamp.
+
+    Args:
+        value: Unix timestamp or ISO 8601 date/time (UTC unless it has an offset)
+
+    Returns:
+        Unix timestamp, or None if value is None
+    """
+    if value is None:
+        return None
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def infer_format(output: str) -> str:
+    """
+    Infer the export format from an output file name.
+
+    Args:
+        output: Output file path
+
+    Returns:
+        Export format ('parquet' or 'arrow')
+    """
+    suffix = Path(output).suffix.lower()
+    for fmt, suffixes in EXPORT_FORMATS.items():
+        if suffix in suffixes:
+            return fmt
+    raise ValueError(f"Cannot infer the export format of {output}, use a .parquet or .arrow file")
+
+
+def export_schema(schema: RegisterSchema, columns: Sequence[str]) -> "pa.Schema":
+    """
+    Get the Arrow schema of an export.
+
+    Raw register columns are exported as uint16, scaled and generated
+    columns as float64, and TS as a UTC timestamp in microseconds.
+
+    Args:
+        schema: Register schema of the history table
+        columns: Exported register columns
+
+    Returns:
+        Arrow schema with DEVICE_ID, TS and the columns
+    """
+    pa = _pyarrow()
+    fields = [pa.field('DEVICE_ID', pa.uint32(), nullable=False),
+              pa.field('TS', pa.timestamp('us', tz='UTC'), nullable=False)]
+
+    for column in columns:
+        if column.endswith(SCALED_SUFFIX) and column[:-len(SCALED_SUFFIX)] in schema.columns:
+            fields.append(pa.field(column, pa.float64()))
+        elif column not in schema.columns:
+            raise ValueError(f"Unknown history column: {column}")
+        elif schema.values == 'scaled' and schema.registers[schema.columns.index(column)].needs_scaling:
+            fields.append(pa.field(column, pa.float64()))
+        else:
+            fields.append(pa.field(column, pa.uint16()))
+
+    return pa.schema(fields)
+
+
+def iter_history_batches(
+    conn: sqlite3.Connection,
+    history_table: str,
+    columns: Sequence[str],
+    device: Optional[int] = None,
+    t0: Optional[float] = None,
+    t1: Optional[float] = None,
+    batch_rows: int = 65536
+) -> Iterator[np.ndarray]:
+    """
+    Stream history rows as float matrices of at most batch_rows rows.
+
+    Args:
+        conn: Database connection
+        history_table: Name of the history table
+        columns: Register columns to fetch
+        device: Device ID, or None for every device
+        t0: Range start timestamp, or None for unbounded
+        t1: Range end timestamp (exclusive), or None for unbounded
+        batch_rows: Number of rows fetched at once
+
+    Yields:
+        Matrices of (DEVICE_ID, TS, columns...) with NaN for missing values,
+        ordered by device then time
+    """
+    where, params = _range_conditions(device, t0, t1)
+    width = len(columns) + 2
+    cursor = conn.execute(
+        f"SELECT DEVICE_ID, TS, {', '.join(columns)} FROM {history_table}{where} ORDER BY DEVICE_ID, TS",
+        params
+    )
+
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            return
+
+        try:
+            # Fast path for batches without missing values
+            data = np.fromiter(chain.from_iterable(rows), dtype=np.float64, count=len(rows) * width)
+            yield data.reshape(len(rows), width)
+        except TypeError:
+            yield np.array(rows, dtype=np.float64)
+
+
+def to_record_batch(data: np.ndarray, arrow_schema: "pa.Schema") -> "pa.RecordBatch":
+    """
+    Convert a batch of history rows to an Arrow record batch.
+
+    Args:
+        data: Matrix of (DEVICE_ID, TS, columns...) with NaN for missing values
+        arrow_schema: Arrow schema from export_schema
+
+    Returns:
+        Record batch with nulls for missing values
+    """
+    pa = _pyarrow()
+    arrays = [
+        pa.array(data[:, 0].astype(np.uint32), type=pa.uint32()),
+        pa.array(np.round(data[:, 1] * 1e6).astype(np.int64), type=arrow_schema.field('TS').type)
+    ]
+
+    for i, field in enumerate(list(arrow_schema)[2:], start=2):
+        column = data[:, i]
+        missing = np.isnan(column)
+        mask = missing if missing.any() else None
+
+        if pa.types.is_floating(field.type):
+            arrays.append(pa.array(column, type=field.type, mask=mask))
+        else:
+            values = np.where(missing, 0, column) if mask is not None else column
+            arrays.append(pa.array(values.astype(np.uint16), type=field.type, mask=mask))
+
+    return pa.RecordBatch.from_arrays(arrays, schema=arrow_schema)
+
+
+def history_paths(
+    source: str,
+    schema: RegisterSchema,
+    table_name: str,
+    db_path: Optional[str] = None,
+    history_dir: Optional[str] = None,
+    t0: Optional[float] = None,
+    t1: Optional[float] = None
+) -> List[Path]:
+    """
+    Get the database files holding a time range of the history.
+
+    Args:
+        source: 'database' for the history table of the main database,
+            'partitions' for the partitioned history files
+        schema: Register schema of the history table
+        table_name: Snapshot table name
+        db_path: Path to the SQLite database, for the database source
+        history_dir: Directory of the partitioned history files
+        t0: Range start timestamp, or None for unbounded
+        t1: Range end timestamp (exclusive), or None for unbounded
+
+    Returns:
+        Paths of the database files, in time order
+    """
+    if source not in ('database', 'partitions'):
+        raise ValueError(f"Unknown history source: {source}")
+
+    if source == 'partitions':
+        with PartitionedHistory(schema.columns, history_dir, table_name) as history:
+            return [path for _, path in history.partitions_for_range(t0, t1)]
+    return [Path(db_path)]
+
+
+class _BatchWriter:
+    """Arrow IPC or Parquet file writer behind one interface."""
+
+    def __init__(self, path: str, arrow_schema: "pa.Schema", fmt: str, compression: Optional[str]):
+        """
+        Open the output file.
+
+        Args:
+            path: Output file path
+            arrow_schema: Arrow schema of the batches
+            fmt: Export format ('parquet' or 'arrow')
+            compression: Codec, None for zstd with Parquet and no compression with Arrow IPC
+        """
+        pa = _pyarrow()
+        if fmt == 'parquet':
+            self._writer = pa.parquet.ParquetWriter(path, arrow_schema, compression=compression or 'zstd')
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=compression)
+            self._writer = pa.ipc.new_file(path, arrow_schema, options=options)
+
+    def write(self, batch: "pa.RecordBatch") -> None:
+        """Write one record batch."""
+        self._writer.write_batch(batch)
+
+    def close(self) -> None:
+        """Finish the file."""
+        self._writer.close()
+
+
+def export_history(
+    output: str,
+    fmt: Optional[str] = None,
+    columns: Optional[Sequence[str]] = None,
+    device: Optional[int] = None,
+    t0: Optional[float] = None,
+    t1: Optional[float] = None,
+    source: str = 'database',
+    db_path: Optional[str] = None,
+    table_name: Optional[str] = None,
+    history_dir: Optional[str] = None,
+    batch_rows: int = 65536,
+    compression: Optional[str] = None,
+    values: Optional[str] = None
+) -> int:
+    """
+    Export a time range of the history to an Arrow IPC or Parquet file.
+
+    The file is written under a temporary name and renamed once complete.
+
+    Args:
+        output: Output file path
+        fmt: Export format ('parquet' or 'arrow'), None to infer it from the file name
+        columns: Register columns to export, None for every register column
+        device: Device ID, or None for every device
+        t0: Range start timestamp, or None for unbounded
+        t1: Range end timestamp (exclusive), or None for unbounded
+        source: 'database' for the history table of the main database,
+            'partitions' for the partitioned history files
+        db_path: Path to the SQLite database
+        table_name: Snapshot table name
+        history_dir: Directory of the partitioned history files
+        batch_rows: Number of rows per record batch
+        compression: Codec (e.g. 'zstd', 'lz4', 'snappy'), None for the format default
+        values: How register values are stored, None to use the configuration
+
+    Returns:
+        Number of exported rows
+    """
+    _pyarrow()
+
+    db_config = config.get('database', {})
+    db_path = db_path or db_config.get('path', 'data/inverter.db')
+    table_name = table_name or db_config.get('table_name', 'sinamicv20')
+    fmt = fmt or infer_format(output)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    schema = get_schema(values)
+    columns = list(columns) if columns else list(schema.columns)
+    arrow_schema = export_schema(schema, columns)
+    history_table = history_table_name(table_name)
+    paths = history_paths(source, schema, table_name, db_path, history_dir, t0, t1)
+
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{output}.tmp"
+    writer = _BatchWriter(tmp_path, arrow_schema, fmt, compression)
+    start = time.monotonic()
+    total = 0
+
+    try:
+        for path in paths:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                for data in iter_history_batches(conn, history_table, columns, device, t0, t1, batch_rows):
+                    writer.write(to_record_batch(data, arrow_schema))
+                    total += data.shape[0]
+            finally:
+                conn.close()
+    except BaseException:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+
+    writer.close()
+    os.replace(tmp_path, output)
+
+    elapsed = time.monotonic() - start
+    logger.info(f"Exported {total} rows to {output} in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s)")
+    return total
@@ -0,0 +1,246 @@
+"""
+In-memory SQLite hot store for ModCon.
+
+This module keeps the working database in RAM, so writes and reads never
+wait on the disk, and persists it to the on-disk database with the SQLite
+online backup API on a schedule. Backups run on a background thread:
+the database is first copied to a second in-memory database, which only
+holds the writers for the time of a memory copy, and that frozen copy is
+written to disk a bounded number of pages at a time. The on-disk
+copy runs in WAL mode and is checkpointed on its own schedule, so the
+amount of data a power loss can cost is bounded by the backup and
+checkpoint intervals.
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils.logger import get_logger
+from utils.config import config
+
+logger = get_logger(__name__)
+
+# Supported WAL checkpoint modes and synchronous levels of the disk copy
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL')
+
+
+class HotStore:
+    """
+    In-memory database mirrored to disk by periodic online backups.
+
+    The in-memory connection is the one applications read from and write
+    to. Only this process can see it; other processes read the disk copy,
+    which lags by at most one backup interval. Threads sharing the
+    connection hold lock for the duration of their transactions.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        backup_interval: Optional[float] = None,
+        checkpoint_interval: Optional[float] = None,
+        checkpoint_mode: Optional[str] = None,
+        synchronous: Optional[str] = None,
+        pages_per_step: Optional[int] = None,
+        step_pause: Optional[float] = None
+    ):
+        """
+        Load the on-disk database into memory and start the backup thread.
+
+        Args:
+            db_path: Path to the on-disk SQLite database
+            backup_interval: Time between backups to disk in seconds, 0 to
+                only back up on close
+            checkpoint_interval: Time between WAL checkpoints of the disk copy in seconds
+            checkpoint_mode: WAL checkpoint mode ('PASSIVE', 'FULL', 'RESTART' or 'TRUNCATE')
+            synchronous: Synchronous level of the disk copy ('OFF', 'NORMAL' or 'FULL')
+            pages_per_step: Pages written to disk per backup step
+            step_pause: Pause between two backup steps in seconds, to spread
+                the disk writes
+        """
+        db_config = config.get('database', {})
+        hot_config = db_config.get('hot_store', {})
+
+        if backup_interval is None:
+            backup_interval = hot_config.get('backup_interval', 60.0)
+        if checkpoint_interval is None:
+            checkpoint_interval = hot_config.get('checkpoint_interval', 300.0)
+        if pages_per_step is None:
+            pages_per_step = hot_config.get('pages_per_step', 256)
+        if step_pause is None:
+            step_pause = hot_config.get('step_pause', 0.005)
+
+        self.db_path = db_path or db_config.get('path', 'data/inverter.db')
+        self.backup_interval = backup_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_mode = (checkpoint_mode or hot_config.get('checkpoint_mode', 'TRUNCATE')).upper()
+        self.synchronous = (synchronous or hot_config.get('synchronous', 'NORMAL')).upper()
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+
+        if self.checkpoint_mode not in CHECKPOINT_MODES:
+            raise ValueError(f"Unknown WAL checkpoint mode: {self.checkpoint_mode}")
+        if self.synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Unknown synchronous level: {self.synchronous}")
+        if self.pages_per_step <= 0:
+            raise ValueError(f"pages_per_step must be positive, got {self.pages_per_step}")
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._disk = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._disk.execute("PRAGMA journal_mode=WAL")
+        self._disk.execute(f"PRAGMA synchronous={self.synchronous}")
+
+        self.connection = sqlite3.connect(':memory:', check_same_thread=False)
+        self._disk.backup(self.connection)
+
+        now = time.monotonic()
+        self.last_backup = now
+        self.last_checkpoint = now
+
+        self.lock = threading.RLock()
+        self._backup_lock = threading.Lock()
+        self._retained: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread = None
+        if self.backup_interval > 0:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        logger.info(
+            f"HotStore loaded {self.db_path} into memory, backup every {self.backup_interval}s, "
+            f"{self.checkpoint_mode} checkpoint every {self.checkpoint_interval}s"
+        )
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    def _run(self) -> None:
+        """Prune the retained tables and back up every backup_interval until closed."""
+        while not self._stop.wait(self.backup_interval):
+            for table, max_age in list(self._retained.items()):
+                try:
+                    self.prune(table, max_age)
+                except sqlite3.Error as e:
+                    logger.error(f"Error pruning {table} from the hot store: {e}")
+            self.backup()
+
+    def retain(self, table: str, max_age: float) -> None:
+        """
+        Prune rows older than max_age seconds from a table before each backup.
+
+        Args:
+            table: Name of a table with a TS column
+            max_age: Maximum age of the rows in seconds
+        """
+        self._retained[table] = max_age
+
+    def _pause(self, status: int, remaining: int, total: int) -> None:
+        """Backup progress callback pausing between two steps."""
+        if remaining:
+            time.sleep(self.step_pause)
+
+    def backup(self) -> bool:
+        """
+        Copy the in-memory database to disk.
+
+        Committed data is copied to a frozen in-memory snapshot under lock,
+        then the snapshot is written to disk pages_per_step pages at a time
+        without holding the lock. Stepping the live database directly
+        wouldn't work: SQLite restarts the backup of an in-memory database
+        at every commit. A failed backup leaves the in-memory data untouched
+        and is retried at the next scheduled backup.
+
+        Returns:
+            True if the backup succeeded, False otherwise
+        """
+        with self._backup_lock:
+            start = time.monotonic()
+            self.last_backup = start
+            snapshot = sqlite3.connect(':memory:')
+
+            try:
+                with self.lock:
+                    self.connection.backup(snapshot)
+                frozen = time.monotonic()
+                snapshot.backup(self._disk, pages=self.pages_per_step, progress=self._pause)
+            except sqlite3.Error as e:
+                logger.error(f"Error backing up hot store to {self.db_path}: {e}")
+                return False
+            finally:
+                snapshot.close()
+
+            logger.debug(
+                f"Backed up hot store to {self.db_path} in {(time.monotonic() - start) * 1000:.1f} ms, "
+                f"writers held for {(frozen - start) * 1000:.1f} ms"
+            )
+
+            if start - self.last_checkpoint >= self.checkpoint_interval:
+                self.checkpoint()
+
+        return True
+
+    def checkpoint(self) -> None:
+        """Checkpoint the WAL of the disk copy into the main database file."""
+        self.last_checkpoint = time.monotonic()
+
+        try:
+            busy, wal_pages, moved = self._disk.execute(
+                f"PRAGMA wal_checkpoint({self.checkpoint_mode})"
+            ).fetchone()
+            logger.debug(f"WAL checkpoint of {self.db_path}: {moved}/{wal_pages} pages, busy={busy}")
+        except sqlite3.Error as e:
+            logger.error(f"Error checkpointing {self.db_path}: {e}")
+
+    def prune(self, table: str, max_age: float, now: Optional[float] = None) -> int:
+        """
+        Delete rows older than max_age seconds from a table with a TS column.
+
+        Keeps the in-memory database, and therefore each backup, bounded.
+
+        Args:
+            table: Name of the table
+            max_age: Maximum age of the rows in seconds
+            now: Reference Unix timestamp, None for the current time
+
+        Returns:
+            Number of deleted rows
+        """
+        cutoff = (time.time() if now is None else now) - max_age
+
+        with self.lock, self.connection:
+            cursor = self.connection.execute(f"DELETE FROM {table} WHERE TS < ?", (cutoff,))
+
+        if cursor.rowcount:
+            logger.debug(f"Pruned {cursor.rowcount} rows older than {max_age}s from {table}")
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Stop the backup thread, make a final backup and checkpoint, then close both databases."""
+        if self.connection is None:
+            return
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        if self.backup():
+            self.checkpoint()
+
+        self.connection.close()
+        self._disk.close()
+        self.connection = None
+        logger.info(f"HotStore closed, data persisted to {self.db_path}")
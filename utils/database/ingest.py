@@ -0,0 +1,314 @@
+"""
+Bulk CSV ingest for ModCon.
+
+This module loads CSV captures (the assets/data files and the files
+DataCollector writes in the field) into the history table. Files are
+parsed in chunks into NumPy arrays by worker processes, each writing
+its own unindexed staging database with executemany; the main process
+then merges the staging databases with INSERT ... SELECT and rebuilds
+the history indexes once at the end.
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.config import config
+from utils.data.file_io import CSVBlockReader
+from utils.database.operations import (
+    create_database,
+    create_history_table,
+    generate_history_insert_query,
+    history_table_name,
+    latest_table_name
+)
+from utils.database.schema import RegisterSchema, get_schema
+
+logger = get_logger(__name__)
+
+class IngestResult(NamedTuple):
+    """
+    Outcome of parsing one CSV file into a staging database.
+    """
+    filepath: str
+    staging_path: str
+    rows: int
+    first_ts: Optional[float]
+    last_ts: Optional[float]
+
+
+def _count_rows(filepath: str) -> int:
+    """Count the lines of a file without parsing it."""
+    count = 0
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            count += block.count(b'\n')
+    return count
+
+
+def _schema_matrix(reader: CSVBlockReader, schema: RegisterSchema, raw: np.ndarray) -> np.ndarray:
+    """Reorder the columns of a parsed chunk to the schema's, NaN for columns the file lacks."""
+    if reader.columns == schema.columns:
+        return raw
+
+    matrix = np.full((raw.shape[0], len(schema.columns)), np.nan)
+    for i, column in enumerate(schema.columns):
+        if column in reader.columns:
+            matrix[:, i] = raw[:, reader.columns.index(column)]
+    return matrix
+
+
+def _rows_for_insert(
+    schema: RegisterSchema,
+    device_id: int,
+    timestamps: np.ndarray,
+    raw: np.ndarray
+) -> List[tuple]:
+    """
+    Turn a chunk of typed arrays into parameter tuples for executemany.
+
+    Args:
+        schema: Register schema of the history table
+        device_id: Device ID of the rows
+        timestamps: Array of timestamps
+        raw: Float matrix of raw register values, NaN for unread registers
+
+    Returns:
+        List of (device_id, ts, values...) tuples
+    """
+    values = schema.convert_matrix(raw)
+    missing = np.isnan(values)
+
+    if schema.values == 'scaled':
+        cells = values.astype(object)
+    else:
+        cells = np.where(missing, 0, values).astype(np.int64).astype(object)
+
+    if missing.any():
+        cells[missing] = None
+
+    return [(device_id, ts) + tuple(row) for ts, row in zip(timestamps.tolist(), cells.tolist())]
+
+
+def drop_indexes(conn: sqlite3.Connection, table: str) -> List[str]:
+    """
+    Drop the indexes of a table, to rebuild them after a bulk load.
+
+    Args:
+        conn: Database connection
+        table: Name of the table
+
+    Returns:
+        CREATE INDEX statements recreating the dropped indexes
+    """
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (table,)
+    ).fetchall()
+
+    for name, _ in indexes:
+        conn.execute(f"DROP INDEX {name}")
+    conn.commit()
+
+    return [sql for _, sql in indexes]
+
+
+def ingest_to_staging(
+    filepath: str,
+    staging_path: str,
+    table_name: str,
+    device_id: int,
+    values: str = 'raw',
+    interval: float = 1.0,
+    start: Optional[float] = None,
+    chunk_rows: int = 50000
+) -> IngestResult:
+    """
+    Parse one CSV file into an unindexed staging database.
+
+    Runs in a worker process. Files without a TIMESTAMP column get
+    timestamps spaced by interval, ending at the file's modification time
+    unless start is given.
+
+    Args:
+        filepath: Path to the CSV file
+        staging_path: Path of the staging database to create
+        table_name: Snapshot table name
+        device_id: Device ID of the rows
+        values: How register values are stored ('raw', 'scaled' or 'generated')
+        interval: Sampling interval in seconds, for files without timestamps
+        start: Timestamp of the first row, for files without timestamps
+        chunk_rows: Number of lines parsed and inserted at once
+
+    Returns:
+        IngestResult describing the staging database
+    """
+    schema = get_schema(values)
+    conn = sqlite3.connect(staging_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    history_table = create_history_table(conn, table_name, schema.columns, column_defs=schema.column_defs)
+    drop_indexes(conn, history_table)
+    insert_query = generate_history_insert_query(table_name, schema.columns)
+
+    if start is None:
+        rows_in_file = max(_count_rows(filepath) - 1, 1)
+        start = os.path.getmtime(filepath) - (rows_in_file - 1) * interval
+
+    rows = 0
+    first_ts = last_ts = None
+
+    reader = CSVBlockReader(filepath, chunk_rows, dtype=np.float64)
+    unknown = [column for column in reader.columns if column not in schema.columns]
+    if unknown:
+        logger.warning(f"Ignoring {len(unknown)} columns of {filepath} missing from the schema: {unknown}")
+
+    try:
+        for block in reader:
+            raw = _schema_matrix(reader, schema, block.values)
+            timestamps = block.timestamps
+            if timestamps is None:
+                timestamps = start + (rows + np.arange(raw.shape[0])) * interval
+
+            with conn:
+                conn.executemany(insert_query, _rows_for_insert(schema, device_id, timestamps, raw))
+
+            rows += raw.shape[0]
+            first_ts = float(timestamps[0]) if first_ts is None else first_ts
+            last_ts = float(timestamps[-1])
+    finally:
+        conn.close()
+
+    return IngestResult(filepath, staging_path, rows, first_ts, last_ts)
+
+
+def ingest_csv_files(
+    files: Sequence[str],
+    db_path: Optional[str] = None,
+    table_name: Optional[str] = None,
+    device_id: int = 0,
+    values: Optional[str] = None,
+    interval: float = 1.0,
+    workers: Optional[int] = None,
+    chunk_rows: int = 50000
+) -> int:
+    """
+    Load CSV captures into the history table of a database.
+
+    Args:
+        files: Paths to the CSV files
+        db_path: Path to the SQLite database
+        table_name: Snapshot table name
+        device_id: Device ID of the rows
+        values: How register values are stored, None to use the configuration
+        interval: Sampling interval in seconds, for files without timestamps
+        workers: Number of parsing processes, None for one per CPU
+        chunk_rows: Number of lines parsed and inserted at once
+
+    Returns:
+        Number of rows ingested
+    """
+    db_config = config.get('database', {})
+    db_path = db_path or db_config.get('path', 'data/inverter.db')
+    table_name = table_name or db_config.get('table_name', 'sinamicv20')
+    schema = get_schema(values)
+    workers = workers or os.cpu_count() or 1
+
+    create_database(db_path, table_name, fleet=True, values=schema.values)
+    history_table = history_table_name(table_name)
+    columns = ", ".join(['DEVICE_ID', 'TS'] + schema.columns)
+
+    staging_dir = tempfile.mkdtemp(prefix='ingest-', dir=str(Path(db_path).parent))
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA cache_size=-65536")
+    index_statements = drop_indexes(conn, history_table)
+
+    start_time = time.monotonic()
+    total = 0
+    jobs = [
+        (str(filepath), os.path.join(staging_dir, f"{i:05d}.db"), table_name, device_id,
+         schema.values, interval, None, chunk_rows)
+        for i, filepath in enumerate(files)
+    ]
+    logger.info(f"Ingesting {len(jobs)} files into {db_path} with {workers} workers")
+
+    def merge(result: IngestResult) -> None:
+        conn.execute("ATTACH DATABASE ? AS staging", (result.staging_path,))
+        try:
+            with conn:
+                conn.execute(
+                    f"INSERT INTO main.{history_table} ({columns}) "
+                    f"SELECT {columns} FROM staging.{history_table}"
+                )
+        finally:
+            conn.execute("DETACH DATABASE staging")
+            os.remove(result.staging_path)
+        logger.info(f"Ingested {result.rows} rows from {result.filepath}")
+
+    try:
+        if workers == 1:
+            for job in jobs:
+                result = ingest_to_staging(*job)
+                merge(result)
+                total += result.rows
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(ingest_to_staging, *job) for job in jobs]
+                for future in as_completed(futures):
+                    result = future.result()
+                    merge(result)
+                    total += result.rows
+    finally:
+        # Building the indexes once over the loaded rows is much faster than
+        # maintaining them row by row during the load
+        for statement in index_statements:
+            conn.execute(statement)
+        conn.commit()
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    update_latest_from_history(conn, table_name, schema.columns, device_id)
+    conn.close()
+
+    elapsed = time.monotonic() - start_time
+    logger.info(f"Ingested {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s)")
+    return total
+
+
+def update_latest_from_history(
+    conn: sqlite3.Connection,
+    table_name: str,
+    columns: Sequence[str],
+    device_id: int
+) -> None:
+    """
+    Refresh a device's latest-value row from its newest history row.
+
+    The row is only replaced if the history holds a more recent snapshot.
+
+    Args:
+        conn: Database connection
+        table_name: Snapshot table name
+        columns: Register column names
+        device_id: Device ID
+    """
+    latest_table = latest_table_name(table_name)
+    history_table = history_table_name(table_name)
+    names = ", ".join(['DEVICE_ID', 'TS'] + list(columns))
+    updates = ", ".join(f"{column} = excluded.{column}" for column in ['TS'] + list(columns))
+
+    with conn:
+        conn.execute(
+            f"INSERT INTO {latest_table} ({names}) "
+            f"SELECT {names} FROM {history_table} WHERE DEVICE_ID = ? ORDER BY TS DESC LIMIT 1 "
+            f"ON CONFLICT(DEVICE_ID) DO UPDATE SET {updates} WHERE excluded.TS > {latest_table}.TS",
+            (device_id,)
+        )
@@ -7,26 +7,49 @@ such as creating tables and generating SQL queries.
 
 import sqlite3
 import logging
-from typing import Dict, Any, Union, List, Optional
+from typing import Dict, Any, Union, List, Optional, Sequence, Tuple
 from pathlib import Path
 
+import numpy as np
+
 from utils.logger import get_logger
 from utils.config import config
+from utils.data.downsample import lttb_indices, merge_buckets, buckets_to_points
+from utils.database.schema import get_schema
 
 logger = get_logger(__name__)
 
+# Candidate rows fetched per output point before LTTB picks among them
+LTTB_PRESELECTION = 4
+
 
-def create_database(db_path: Optional[str] = None, table_name: Optional[str] = None) -> None:
+def create_database(
+    db_path: Optional[str] = None,
+    table_name: Optional[str] = None,
+    fleet: Optional[bool] = None,
+    values: Optional[str] = None
+) -> None:
     """
     Create the database and tables needed for the ModCon application.
     
+    The tables are generated from the SinamicV20 register map. In fleet
+    mode the per-device latest-value table and the history table are
+    created next to the snapshot table, so any number of drives can
+    share one database.
+    
     Args:
         db_path: Path to the SQLite database file
         table_name: Name of the table to create
+        fleet: Whether to create the fleet tables, None to use the configuration
+        values: How register values are stored ('raw', 'scaled' or 'generated'),
+            None to use the configuration
     """
     db_config = config.get('database', {})
     db_path = db_path or db_config.get('path', 'data/inverter.db')
     table_name = table_name or db_config.get('table_name', 'sinamicv20')
+    fleet_config = db_config.get('fleet', {})
+    fleet = fleet if fleet is not None else fleet_config.get('enabled', False)
+    schema = get_schema(values)
     
     # Ensure directory exists
     Path(db_path).parent.mkdir(parents=True, exist_ok=True)
@@ -37,112 +60,25 @@ def create_database(db_path: Optional[str] = None, table_name: Optional[str] = N
         conn = sqlite3.connect(db_path)
         c = conn.cursor()
         
-        # Create the table with all the parameters for the Sinamics V20 inverter
-        c.execute(f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                ID INT PRIMARY KEY,
-                WDOG_TIME INT,
-                WDOG_ACTION INT,
-                FREQ_REF INT,
-                RUN_ENABLE INT,
-                CMD_FWD_REV INT,
-                CMD_START INT,
-                FAULT_ACK INT,
-                PID_SETP_REF INT,
-                ENABLE_PID INT,
-                CURRENT_LMT INT,
-                ACCEL_TIME INT,
-                DECEL_TIME INT,
-                DIGITAL_OUT_1 INT,
-                DIGITAL_OUT_2 INT,
-                REF_FREQ INT,
-                PID_UP_LMT INT,
-                PID_LO_LMT INT,
-                P_GAIN INT,
-                I_GAIN INT,
-                D_GAIN INT,
-                FEEDBK_GAIN INT,
-                LOW_PASS INT,
-                FREQ_OUTPUT INT,
-                SPEED INT,
-                CURRENT INT,
-                TORQUE INT,
-                ACTUAL_PWR INT,
-                TOTAL_KWH INT,
-                DC_BUS_VOLTS INT,
-                REFERENCE INT,
-                RATED_PWR INT,
-                OUTPUT_VOLTS INT,
-                FWD_REV INT,
-                STOP_RUN INT,
-                AT_MAX_FREQ INT,
-                CONTROL_MODE INT,
-                ENABLED INT,
-                READY_TO_RUN INT,
-                ANALOG_IN_1 INT,
-                ANALOG_IN_2 INT,
-                ANALOG_OUT_1 INT,
-                FREQ_ACTUAL INT,
-                PID_SETP_OUT INT,
-                PID_OUTPUT INT,
-                PID_FEEDBACK INT,
-                DIGITAL_IN_1 INT,
-                DIGITAL_IN_2 INT,
-                DIGITAL_IN_3 INT,
-                DIGITAL_IN_4 INT,
-                FAULT INT,
-                LAST_FAULT INT,
-                FAULT_1 INT,
-                FAULT_2 INT,
-                FAULT_3 INT,
-                WARNING INT,
-                LAST_WARNING INT,
-                INVERTER_VER INT,
-                DRIVE_MODEL INT,
-                STW INT,
-                HSW INT,
-                ZSW INT,
-                HIW INT,
-                INVERTER_MODEL INT,
-                HAND_AUTO INT,
-                FAULT_4 INT,
-                FAULT_5 INT,
-                FAULT_6 INT,
-                FAULT_7 INT,
-                FAULT_8 FLOAT,
-                PRM_ERROR_CODE INT,
-                PI_FEEDBACK INT
-            )
-        """)
+        # Create the table with all the registers of the Sinamics V20 inverter
+        c.execute(schema.create_table_sql(table_name))
+        
+        # Tables created by older versions lack the newer register columns
+        add_missing_columns(conn, table_name, schema.column_defs)
         
         # Check if we need to insert the initial row
         c.execute(f"SELECT COUNT(*) FROM {table_name} WHERE ID = 0")
         count = c.fetchone()[0]
         
         if count == 0:
-            # Insert initial values
-            c.execute(f"""
-                INSERT INTO {table_name} (
-                    ID, WDOG_TIME, WDOG_ACTION, FREQ_REF, RUN_ENABLE, CMD_FWD_REV, CMD_START,
-                    FAULT_ACK, PID_SETP_REF, ENABLE_PID, CURRENT_LMT, ACCEL_TIME, DECEL_TIME,
-                    DIGITAL_OUT_1, DIGITAL_OUT_2, REF_FREQ, PID_UP_LMT, PID_LO_LMT, P_GAIN,
-                    I_GAIN, D_GAIN, FEEDBK_GAIN, LOW_PASS, FREQ_OUTPUT, SPEED, CURRENT,
-                    TORQUE, ACTUAL_PWR, TOTAL_KWH, DC_BUS_VOLTS, REFERENCE, RATED_PWR,
-                    OUTPUT_VOLTS, FWD_REV, STOP_RUN, AT_MAX_FREQ, CONTROL_MODE, ENABLED,
-                    READY_TO_RUN, ANALOG_IN_1, ANALOG_IN_2, ANALOG_OUT_1, FREQ_ACTUAL,
-                    PID_SETP_OUT, PID_OUTPUT, PID_FEEDBACK, DIGITAL_IN_1, DIGITAL_IN_2,
-                    DIGITAL_IN_3, DIGITAL_IN_4, FAULT, LAST_FAULT, FAULT_1, FAULT_2, FAULT_3,
-                    WARNING, LAST_WARNING, INVERTER_VER, DRIVE_MODEL, STW, HSW, ZSW, HIW,
-                    INVERTER_MODEL, HAND_AUTO, FAULT_4, FAULT_5, FAULT_6, FAULT_7, FAULT_8,
-                    PRM_ERROR_CODE, PI_FEEDBACK
-                )
-                VALUES (
-                    0, 0, 0, 0, 0, 0, 0, 999, 0, 1186, 1000, 1000, 1, 0, 1500, 10000, 0, 3000,
-                    0, 0, 10000, 10000, 0, 0, 0, 0, 0, 17, 315, 7, 55, 0, 1, 0, 0, 1, 1, 0, 0,
-                    21, 0, 0, 999, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 394, 6307, 0, 0, 60209,
-                    0, 6307, 394, 1, 0, 0, 0, 0, 0.0, 255, 12
-                )
-            """)
+            # Insert initial values from the register map defaults
+            c.execute(schema.insert_sql(table_name), (0,) + schema.seed_row())
+        
+        if fleet:
+            create_latest_table(conn, table_name, schema.columns, schema.column_defs)
+            create_history_table(
+                conn, table_name, schema.columns, fleet_config.get('covering_columns'), schema.column_defs
+            )
         
         conn.commit()
         logger.info("Database created successfully")
@@ -231,3 +167,596 @@ def execute_query(
             conn.close()
             
     return result
+
+
+def add_missing_columns(
+    conn: sqlite3.Connection,
+    table_name: str,
+    column_defs: Sequence[str]
+) -> List[str]:
+    """
+    Add the columns an existing table lacks.
+    
+    Tables created by older versions of the schema are migrated in place
+    with ALTER TABLE, so statements naming every schema column keep
+    working on existing databases. Added columns are NULL in existing rows.
+    
+    Args:
+        conn: Database connection
+        table_name: Name of the table to migrate
+        column_defs: Column definitions the table should have
+        
+    Returns:
+        Names of the added columns
+    """
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table_name})")}
+    added = []
+    
+    for column_def in column_defs:
+        name = column_def.split()[0]
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table_name} ADD COLUMN {column_def}")
+            added.append(name)
+            
+    if added:
+        logger.info(f"Added columns {', '.join(added)} to table {table_name}")
+    return added
+
+
+def history_table_name(table_name: str) -> str:
+    """
+    Get the name of the append-only history table for a snapshot table.
+    
+    Args:
+        table_name: Name of the snapshot table (e.g. 'sinamicv20')
+        
+    Returns:
+        Name of the matching history table
+    """
+    return f"{table_name}_history"
+
+
+def create_history_table(
+    conn: sqlite3.Connection,
+    table_name: str,
+    columns: List[str],
+    covering_columns: Optional[Sequence[str]] = None,
+    column_defs: Optional[List[str]] = None
+) -> str:
+    """
+    Create the append-only history table and its timestamp index.
+    
+    Unlike the snapshot table, which holds a single row that is updated in
+    place, the history table receives one row per acquisition cycle and
+    device. Rows are indexed by (DEVICE_ID, TS) for time-range queries.
+    
+    Columns listed in covering_columns are appended to that index, so
+    time-range queries on them are answered from the index alone without
+    reading the wide table rows.
+    
+    Args:
+        conn: Database connection
+        table_name: Name of the snapshot table the history belongs to
+        columns: Register column names, in storage order
+        covering_columns: Columns to include in the (DEVICE_ID, TS) index
+        column_defs: Column definitions, None to store every column as INTEGER
+        
+    Returns:
+        Name of the history table
+    """
+    history_table = history_table_name(table_name)
+    column_defs = column_defs or [f"{column} INTEGER" for column in columns]
+    definitions = ",\n                ".join(column_defs)
+    
+    c = conn.cursor()
+    c.execute(f"""
+            CREATE TABLE IF NOT EXISTS {history_table} (
+                DEVICE_ID INTEGER NOT NULL DEFAULT 0,
+                TS REAL NOT NULL,
+                {definitions}
+            )
+        """)
+    # History tables from before fleet support have no DEVICE_ID column
+    add_missing_columns(conn, history_table, ["DEVICE_ID INTEGER NOT NULL DEFAULT 0"] + column_defs)
+    
+    covering = [column for column in (covering_columns or []) if column in columns]
+    if covering:
+        # The covering index also serves every plain (DEVICE_ID, TS) lookup
+        c.execute(f"DROP INDEX IF EXISTS idx_{history_table}_device_ts")
+        c.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{history_table}_device_ts_cover "
+            f"ON {history_table} (DEVICE_ID, TS, {', '.join(covering)})"
+        )
+    else:
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{history_table}_device_ts ON {history_table} (DEVICE_ID, TS)")
+    conn.commit()
+    
+    return history_table
+
+
+def generate_history_insert_query(table_name: str, columns: List[str]) -> str:
+    """
+    Generate a parameterized INSERT query for the history table.
+    
+    The query expects the device ID and the timestamp followed by the
+    register values, in the order given by columns.
+    
+    Args:
+        table_name: Name of the snapshot table the history belongs to
+        columns: Register column names, in storage order
+        
+    Returns:
+        SQL INSERT query string with '?' placeholders
+    """
+    history_table = history_table_name(table_name)
+    placeholders = ", ".join("?" for _ in range(len(columns) + 2))
+    
+    return f"INSERT INTO {history_table} (DEVICE_ID, TS, {', '.join(columns)}) VALUES ({placeholders});"
+
+
+def generate_history_delete_query(table_name: str) -> str:
+    """
+    Generate a parameterized query deleting the history rows of one snapshot.
+    
+    The query expects the device ID and the timestamp, and uses the
+    (DEVICE_ID, TS) index. Deleting before inserting makes a replayed
+    write idempotent.
+    
+    Args:
+        table_name: Name of the snapshot table the history belongs to
+        
+    Returns:
+        SQL DELETE query string with '?' placeholders
+    """
+    return f"DELETE FROM {history_table_name(table_name)} WHERE DEVICE_ID = ? AND TS = ?;"
+
+
+def latest_table_name(table_name: str) -> str:
+    """
+    Get the name of the per-device latest-value table for a snapshot table.
+    
+    Args:
+        table_name: Name of the snapshot table (e.g. 'sinamicv20')
+        
+    Returns:
+        Name of the matching latest-value table
+    """
+    return f"{table_name}_latest"
+
+
+def create_latest_table(
+    conn: sqlite3.Connection,
+    table_name: str,
+    columns: List[str],
+    column_defs: Optional[List[str]] = None
+) -> str:
+    """
+    Create the latest-value table holding one row per device.
+    
+    The table is keyed by DEVICE_ID, so the current state of a drive is
+    a primary key lookup however many drives and samples are stored.
+    
+    Args:
+        conn: Database connection
+        table_name: Name of the snapshot table the latest values belong to
+        columns: Register column names, in storage order
+        column_defs: Column definitions, None to store every column as INTEGER
+        
+    Returns:
+        Name of the latest-value table
+    """
+    latest_table = latest_table_name(table_name)
+    column_defs = column_defs or [f"{column} INTEGER" for column in columns]
+    definitions = ",\n                ".join(column_defs)
+    
+    c = conn.cursor()
+    c.execute(f"""
+            CREATE TABLE IF NOT EXISTS {latest_table} (
+                DEVICE_ID INTEGER PRIMARY KEY,
+                TS REAL NOT NULL,
+                {definitions}
+            )
+        """)
+    add_missing_columns(conn, latest_table, column_defs)
+    conn.commit()
+    
+    return latest_table
+
+
+def generate_latest_upsert_query(table_name: str, columns: List[str], only_newer: bool = False) -> str:
+    """
+    Generate a parameterized upsert query for the latest-value table.
+    
+    The query expects the device ID and the timestamp followed by the
+    register values, in the order given by columns, and replaces the
+    device's row in place if it already exists.
+    
+    Args:
+        table_name: Name of the snapshot table the latest values belong to
+        columns: Register column names, in storage order
+        only_newer: Whether to keep the existing row if it is more recent,
+            for writing snapshots out of order
+        
+    Returns:
+        SQL INSERT ... ON CONFLICT query string with '?' placeholders
+    """
+    latest_table = latest_table_name(table_name)
+    placeholders = ", ".join("?" for _ in range(len(columns) + 2))
+    updates = ", ".join(f"{column} = excluded.{column}" for column in ['TS'] + list(columns))
+    
+    condition = f" WHERE excluded.TS > {latest_table}.TS" if only_newer else ""
+    
+    return (
+        f"INSERT INTO {latest_table} (DEVICE_ID, TS, {', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT(DEVICE_ID) DO UPDATE SET {updates}{condition};"
+    )
+
+
+def fetch_latest(
+    conn: sqlite3.Connection,
+    table_name: str,
+    device: Optional[int] = None
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Fetch the latest values of one device or of the whole fleet.
+    
+    Args:
+        conn: Database connection
+        table_name: Name of the snapshot table the latest values belong to
+        device: Device ID, or None for every device
+        
+    Returns:
+        Dictionary mapping device IDs to dictionaries of column values,
+        including TS
+    """
+    latest_table = latest_table_name(table_name)
+    query = f"SELECT * FROM {latest_table}"
+    params: List[Any] = []
+    
+    if device is not None:
+        query += " WHERE DEVICE_ID = ?"
+        params.append(device)
+        
+    cursor = conn.execute(query, params)
+    names = [d[0] for d in cursor.description]
+    
+    return {row[0]: dict(zip(names[1:], row[1:])) for row in cursor.fetchall()}
+
+
+def _range_conditions(
+    device: Optional[int],
+    t0: Optional[float],
+    t1: Optional[float]
+) -> Tuple[str, List[Any]]:
+    """
+    Build the WHERE clause selecting one device and a time range.
+    
+    Args:
+        device: Device ID, or None for every device
+        t0: Range start timestamp, or None for unbounded
+        t1: Range end timestamp (exclusive), or None for unbounded
+        
+    Returns:
+        Tuple of (WHERE clause, empty if nothing is filtered, query parameters)
+    """
+    conditions = []
+    params: List[Any] = []
+    
+    if device is not None:
+        conditions.append("DEVICE_ID = ?")
+        params.append(device)
+    if t0 is not None:
+        conditions.append("TS >= ?")
+        params.append(t0)
+    if t1 is not None:
+        conditions.append("TS < ?")
+        params.append(t1)
+        
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+
+def fetch_history_arrays(
+    conn: sqlite3.Connection,
+    history_table: str,
+    device: int,
+    columns: Sequence[str],
+    t0: Optional[float] = None,
+    t1: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fetch raw history rows of one device as NumPy arrays.
+    
+    Args:
+        conn: Database connection
+        history_table: Name of the history table
+        device: Device ID
+        columns: Columns to fetch
+        t0: Range start timestamp, or None for unbounded
+        t1: Range end timestamp (exclusive), or None for unbounded
+        
+    Returns:
+        Tuple of (timestamps, values matrix with NaN for missing values)
+    """
+    where, params = _range_conditions(device, t0, t1)
+    query = f"SELECT TS, {', '.join(columns)} FROM {history_table}{where} ORDER BY TS"
+    rows = conn.execute(query, params).fetchall()
+    
+    if not rows:
+        return np.zeros(0), np.zeros((0, len(columns)))
+        
+    data = np.array(rows, dtype=np.float64)
+    return data[:, 0], data[:, 1:]
+
+
+def fetch_history_buckets(
+    conn: sqlite3.Connection,
+    history_table: str,
+    device: int,
+    columns: Sequence[str],
+    t0: float,
+    t1: float,
+    bucket_width: float
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Aggregate history rows of one device into min/max time buckets in SQL.
+    
+    Only one row per bucket leaves SQLite, whatever the number of samples.
+    
+    Args:
+        conn: Database connection
+        history_table: Name of the history table
+        device: Device ID
+        columns: Columns to aggregate
+        t0: Range start timestamp, also the origin of the buckets
+        t1: Range end timestamp (exclusive)
+        bucket_width: Bucket width in seconds
+        
+    Returns:
+        Tuple of (bucket ids, first timestamps, last timestamps, minimums, maximums)
+    """
+    where, params = _range_conditions(device, t0, t1)
+    aggregates = ", ".join(f"MIN({c})" for c in columns) + ", " + ", ".join(f"MAX({c})" for c in columns)
+    query = (
+        f"SELECT CAST((TS - ?) / ? AS INTEGER) AS BUCKET, MIN(TS), MAX(TS), {aggregates} "
+        f"FROM {history_table}{where} GROUP BY BUCKET ORDER BY BUCKET"
+    )
+    rows = conn.execute(query, [t0, bucket_width] + params).fetchall()
+    
+    n = len(columns)
+    if not rows:
+        empty = np.zeros((0, n))
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), empty, empty
+        
+    data = np.array(rows, dtype=np.float64)
+    return data[:, 0].astype(np.int64), data[:, 1], data[:, 2], data[:, 3:3 + n], data[:, 3 + n:]
+
+
+def history_time_bounds(
+    conn: sqlite3.Connection,
+    history_table: str,
+    device: int
+) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Get the first and last timestamps stored for a device.
+    
+    Args:
+        conn: Database connection
+        history_table: Name of the history table
+        device: Device ID
+        
+    Returns:
+        Tuple of (first, last) timestamps, or (None, None) if there is no data
+    """
+    query = f"SELECT MIN(TS), MAX(TS) FROM {history_table} WHERE DEVICE_ID = ?"
+    return conn.execute(query, (device,)).fetchone()
+
+
+def fetch_history_candidates(
+    conn: sqlite3.Connection,
+    history_table: str,
+    device: int,
+    columns: Sequence[str],
+    t0: float,
+    t1: float,
+    bucket_width: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Preselect the history rows LTTB can pick from, in SQL.
+    
+    From every time bucket only the first and last rows and the rows
+    holding the minimum and maximum of the first column leave SQLite,
+    so at most four rows per bucket are fetched.
+    
+    Args:
+        conn: Database connection
+        history_table: Name of the history table
+        device: Device ID
+        columns: Columns to fetch, the first one drives the selection
+        t0: Range start timestamp, also the origin of the buckets
+        t1: Range end timestamp (exclusive)
+        bucket_width: Bucket width in seconds
+        
+    Returns:
+        Tuple of (timestamps, values matrix) sorted by timestamp
+    """
+    where, params = _range_conditions(device, t0, t1)
+    rows = []
+    
+    # SQLite takes bare columns from the row holding the MIN/MAX aggregate
+    for aggregate in ("MIN(TS)", "MAX(TS)", f"MIN({columns[0]})", f"MAX({columns[0]})"):
+        query = (
+            f"SELECT {aggregate}, TS, {', '.join(columns)} FROM {history_table}{where} "
+            f"GROUP BY CAST((TS - ?) / ? AS INTEGER)"
+        )
+        rows.extend(row[1:] for row in conn.execute(query, params + [t0, bucket_width]))
+        
+    if not rows:
+        return np.zeros(0), np.zeros((0, len(columns)))
+        
+    data = np.array(rows, dtype=np.float64)
+    _, keep = np.unique(data[:, 0], return_index=True)
+    return data[keep, 0], data[keep, 1:]
+
+
+def downsample_arrays(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    max_points: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Downsample fetched history with LTTB on the first column.
+    
+    The same rows are kept for every column so they stay aligned.
+    
+    Args:
+        timestamps: Array of timestamps
+        values: Values matrix
+        max_points: Maximum number of rows to keep
+        
+    Returns:
+        Tuple of (timestamps, values matrix)
+    """
+    if timestamps.size <= max_points:
+        return timestamps, values
+        
+    indices = lttb_indices(timestamps, values[:, 0], max_points)
+    return timestamps[indices], values[indices]
+
+
+def query_history(
+    connections: Sequence[sqlite3.Connection],
+    history_table: str,
+    device: int,
+    columns: Sequence[str],
+    t0: Optional[float] = None,
+    t1: Optional[float] = None,
+    max_points: Optional[int] = None,
+    method: str = 'minmax'
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fetch and downsample the history of a device from one or more databases.
+    
+    The databases hold consecutive time ranges (e.g. history partitions).
+    Ranges of at most max_points rows are returned as stored. Longer
+    ranges are reduced inside SQLite: to min/max buckets, merged across
+    databases, or to at most LTTB_PRESELECTION * max_points candidate
+    rows that LTTB then picks from, so the rows fetched stay bounded.
+    
+    Args:
+        connections: Database connections, oldest range first
+        history_table: Name of the history table
+        device: Device ID
+        columns: Columns to fetch
+        t0: Range start timestamp, or None for the first sample
+        t1: Range end timestamp (exclusive), or None for unbounded
+        max_points: Maximum number of points to return, or None for all
+        method: Downsampling method, 'minmax' or 'lttb'
+        
+    Returns:
+        Tuple of (timestamps, values matrix of shape (n, len(columns)))
+        with NaN for missing values
+    """
+    if method not in ('minmax', 'lttb'):
+        raise ValueError(f"Unknown downsampling method: {method}")
+        
+    raw = max_points is None
+    if not raw:
+        where, params = _range_conditions(device, t0, t1)
+        query = f"SELECT COUNT(*) FROM {history_table}{where}"
+        count = sum(conn.execute(query, params).fetchone()[0] for conn in connections)
+        
+        # LTTB can read the raw rows as long as they are no more than its candidates
+        raw = count <= (max_points if method == 'minmax' else LTTB_PRESELECTION * max_points)
+        
+    if raw:
+        parts = [fetch_history_arrays(conn, history_table, device, columns, t0, t1) for conn in connections]
+        if not parts:
+            return np.zeros(0), np.zeros((0, len(columns)))
+            
+        timestamps = np.concatenate([p[0] for p in parts])
+        values = np.concatenate([p[1] for p in parts])
+        
+        if max_points is not None:
+            timestamps, values = downsample_arrays(timestamps, values, max_points)
+        return timestamps, values
+        
+    bounds = [history_time_bounds(conn, history_table, device) for conn in connections]
+    start = t0 if t0 is not None else min(b[0] for b in bounds if b[0] is not None)
+    end = t1 if t1 is not None else max(b[1] for b in bounds if b[1] is not None) + 1e-6
+    
+    if method == 'minmax':
+        bucket_width = (end - start) / max(max_points // 2, 1)
+        parts = [
+            fetch_history_buckets(conn, history_table, device, columns, start, end, bucket_width)
+            for conn in connections
+        ]
+        merged = merge_buckets(*(np.concatenate([p[i] for p in parts]) for i in range(5)))
+        return buckets_to_points(*merged[1:])
+        
+    # Every bucket yields up to four candidate rows
+    bucket_width = (end - start) / max(LTTB_PRESELECTION * max_points // 4, 1)
+    parts = [
+        fetch_history_candidates(conn, history_table, device, columns, start, end, bucket_width)
+        for conn in connections
+    ]
+    timestamps = np.concatenate([p[0] for p in parts])
+    values = np.concatenate([p[1] for p in parts])
+    return downsample_arrays(timestamps, values, max_points)
+
+
+def query_range(
+    device: int,
+    columns: Sequence[str],
+    t0: Optional[float] = None,
+    t1: Optional[float] = None,
+    max_points: Optional[int] = None,
+    method: str = 'minmax',
+    db_path: Optional[str] = None,
+    table_name: Optional[str] = None,
+    conn: Optional[sqlite3.Connection] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fetch the history of a device over a time range as NumPy arrays.
+    
+    When the range holds more than max_points samples the data is
+    downsampled before it leaves the storage layer, either with min/max
+    buckets aggregated inside SQLite ('minmax') or with LTTB ('lttb').
+    
+    Args:
+        device: Device ID
+        columns: Columns to fetch
+        t0: Range start timestamp, or None for the first sample
+        t1: Range end timestamp (exclusive), or None for unbounded
+        max_points: Maximum number of points to return, or None for all
+        method: Downsampling method, 'minmax' or 'lttb'
+        db_path: Path to the SQLite database
+        table_name: Name of the snapshot table the history belongs to
+        conn: Open connection to query (e.g. the hot store), None to open db_path read-only
+        
+    Returns:
+        Tuple of (timestamps, values matrix of shape (n, len(columns)))
+        with NaN for missing values
+    """
+    db_config = config.get('database', {})
+    db_path = db_path or db_config.get('path', 'data/inverter.db')
+    table_name = table_name or db_config.get('table_name', 'sinamicv20')
+    history_table = history_table_name(table_name)
+    
+    owned = conn is None
+    
+    try:
+        if owned:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        timestamps, values = query_history([conn], history_table, device, columns, t0, t1, max_points, method)
+        
+    except sqlite3.Error as e:
+        logger.exception(f"Error querying history range: {e}")
+        raise
+    finally:
+        if owned and conn is not None:
+            conn.close()
+            
+    logger.debug(f"Fetched {timestamps.size} points of {list(columns)} for device {device}")
+    return timestamps, values
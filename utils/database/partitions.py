@@ -0,0 +1,487 @@
+"""
+Time-partitioned history storage for ModCon.
+
+This module stores the history of inverter snapshots in one small SQLite
+file per day or per week. Writes only touch the current partition and its
+index, and retention removes whole partition files instead of running
+DELETE statements against one large table.
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Sequence
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.config import config
+from utils.database.operations import (
+    _range_conditions,
+    create_history_table,
+    generate_history_delete_query,
+    generate_history_insert_query,
+    history_table_name,
+    query_history
+)
+
+logger = get_logger(__name__)
+
+# Supported partition periods and their length
+PARTITION_PERIODS = {
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1)
+}
+
+
+def partition_start(timestamp: float, period: str) -> datetime:
+    """
+    Get the start of the partition containing a timestamp.
+
+    Partitions are aligned on UTC midnight, and weekly partitions start on Monday.
+
+    Args:
+        timestamp: Unix timestamp in seconds
+        period: Partition period ('day' or 'week')
+
+    Returns:
+        Timezone-aware UTC datetime of the partition start
+    """
+    if period not in PARTITION_PERIODS:
+        raise ValueError(f"Unsupported partition period: {period}")
+
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if period == 'week':
+        start -= timedelta(days=start.weekday())
+
+    return start
+
+
+def partition_key(timestamp: float, period: str) -> str:
+    """
+    Get the partition key (used in the file name) for a timestamp.
+
+    Args:
+        timestamp: Unix timestamp in seconds
+        period: Partition period ('day' or 'week')
+
+    Returns:
+        Partition key in YYYYMMDD format, the date the partition starts on
+    """
+    return partition_start(timestamp, period).strftime('%Y%m%d')
+
+
+def partition_bounds(key: str, period: str) -> Tuple[float, float]:
+    """
+    Get the time range covered by a partition.
+
+    Args:
+        key: Partition key in YYYYMMDD format
+        period: Partition period ('day' or 'week')
+
+    Returns:
+        Tuple of (start, end) Unix timestamps, end exclusive
+    """
+    start = datetime.strptime(key, '%Y%m%d').replace(tzinfo=timezone.utc)
+    end = start + PARTITION_PERIODS[period]
+    return start.timestamp(), end.timestamp()
+
+
+class PartitionedHistory:
+    """
+    History store split into one SQLite file per time partition.
+
+    Each partition file contains the regular history table for its period,
+    so any single file can be opened with the usual tools. Queries are
+    routed to the partitions overlapping the requested time range. Writes
+    are serialized by a lock, so one instance can be shared by several
+    threads (e.g. the collector and its spool replay thread).
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        directory: Optional[str] = None,
+        table_name: Optional[str] = None,
+        period: Optional[str] = None,
+        retention: Optional[int] = None,
+        column_defs: Optional[List[str]] = None
+    ):
+        """
+        Initialize the partitioned history store.
+
+        Args:
+            columns: Register column names, in storage order
+            directory: Directory holding the partition files
+            table_name: Name of the snapshot table the history belongs to
+            period: Partition period ('day' or 'week')
+            retention: Number of partitions to keep, or None to keep all
+            column_defs: Column definitions, None to store every column as INTEGER
+        """
+        db_config = config.get('database', {})
+        history_config = db_config.get('history', {})
+
+        self.columns = list(columns)
+        self.column_defs = column_defs
+        self.directory = Path(directory or history_config.get('path', 'data/history'))
+        self.table_name = table_name or db_config.get('table_name', 'sinamicv20')
+        self.period = period or history_config.get('partition', 'day')
+        self.retention = retention if retention is not None else history_config.get('retention')
+
+        if self.period not in PARTITION_PERIODS:
+            raise ValueError(f"Unsupported partition period: {self.period}")
+
+        self.history_table = history_table_name(self.table_name)
+        self._insert_query = generate_history_insert_query(self.table_name, self.columns)
+        self._delete_query = generate_history_delete_query(self.table_name)
+
+        # Connection to the partition currently receiving writes
+        self._current_key: Optional[str] = None
+        self._current_conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._migrate_partitions()
+        logger.info(f"PartitionedHistory initialized in {self.directory} with {self.period} partitions")
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    def partition_path(self, key: str) -> Path:
+        """
+        Get the file path of a partition.
+
+        Args:
+            key: Partition key
+
+        Returns:
+            Path to the partition database file
+        """
+        return self.directory / f"{self.table_name}_{key}.db"
+
+    def list_partitions(self) -> List[Tuple[str, Path]]:
+        """
+        List the partitions present on disk.
+
+        Returns:
+            List of (key, path) tuples sorted from oldest to newest
+        """
+        prefix = f"{self.table_name}_"
+        partitions = []
+
+        for path in self.directory.glob(f"{prefix}*.db"):
+            key = path.stem[len(prefix):]
+            if len(key) == 8 and key.isdigit():
+                partitions.append((key, path))
+
+        return sorted(partitions)
+
+    def _migrate_partitions(self) -> None:
+        """
+        Bring partitions written by older versions up to the current schema.
+
+        Queries open partitions read-only, so partitions lacking the
+        DEVICE_ID column are migrated once when the store is opened.
+        Every row of such a partition is attributed to device 0.
+        """
+        for key, path in self.list_partitions():
+            conn = sqlite3.connect(str(path))
+            try:
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({self.history_table})")}
+                if columns and 'DEVICE_ID' not in columns:
+                    create_history_table(conn, self.table_name, self.columns, column_defs=self.column_defs)
+                    logger.info(f"Migrated history partition {path}")
+            except sqlite3.Error as e:
+                logger.warning(f"Could not migrate history partition {path}: {e}")
+            finally:
+                conn.close()
+
+    def partitions_for_range(
+        self,
+        t0: Optional[float] = None,
+        t1: Optional[float] = None
+    ) -> List[Tuple[str, Path]]:
+        """
+        List the partitions overlapping a time range.
+
+        Args:
+            t0: Range start timestamp, or None for unbounded
+            t1: Range end timestamp (exclusive), or None for unbounded
+
+        Returns:
+            List of (key, path) tuples sorted from oldest to newest
+        """
+        selected = []
+
+        for key, path in self.list_partitions():
+            start, end = partition_bounds(key, self.period)
+            if t0 is not None and end <= t0:
+                continue
+            if t1 is not None and start >= t1:
+                continue
+            selected.append((key, path))
+
+        return selected
+
+    def _connection_for(self, timestamp: float) -> sqlite3.Connection:
+        """
+        Get the write connection for the partition containing a timestamp.
+
+        Rolling over to a new partition closes the previous one and applies
+        the retention policy.
+
+        Args:
+            timestamp: Unix timestamp of the row being written
+
+        Returns:
+            Connection to the partition database
+        """
+        key = partition_key(timestamp, self.period)
+
+        if key == self._current_key and self._current_conn is not None:
+            return self._current_conn
+
+        if self._current_conn is not None:
+            self._current_conn.close()
+
+        path = self.partition_path(key)
+        conn = sqlite3.connect(str(path), check_same_thread=False)
+        create_history_table(conn, self.table_name, self.columns, column_defs=self.column_defs)
+
+        self._current_key = key
+        self._current_conn = conn
+        logger.info(f"Writing history to partition {path}")
+
+        self.apply_retention(now=timestamp)
+        return conn
+
+    def append(self, timestamp: float, data: Dict[str, Any], device_id: int = 0) -> None:
+        """
+        Append one snapshot to the history.
+
+        Args:
+            timestamp: Unix timestamp of the snapshot
+            data: Dictionary of register values keyed by column name
+            device_id: ID of the device the snapshot was read from
+        """
+        self.append_many([(timestamp, data)], device_id)
+
+    def append_many(
+        self,
+        rows: Sequence[Tuple[float, Dict[str, Any]]],
+        device_id: int = 0,
+        replace: bool = False
+    ) -> None:
+        """
+        Append several snapshots of one device to the history.
+
+        Rows are grouped by partition and each group is written in a single
+        transaction.
+
+        Args:
+            rows: Sequence of (timestamp, data) tuples in time order
+            device_id: ID of the device the snapshots were read from
+            replace: Whether to delete rows of the device with the same
+                timestamps first, so writing the same rows again (e.g.
+                replaying a spool) doesn't duplicate them
+        """
+        batch: List[Tuple[Any, ...]] = []
+        batch_key: Optional[str] = None
+
+        with self._lock:
+            for timestamp, data in rows:
+                key = partition_key(timestamp, self.period)
+                if batch and key != batch_key:
+                    self._write_batch(batch, replace)
+                    batch = []
+                batch_key = key
+                batch.append((device_id, timestamp) + tuple(data.get(column) for column in self.columns))
+
+            if batch:
+                self._write_batch(batch, replace)
+
+    def _write_batch(self, batch: List[Tuple[Any, ...]], replace: bool = False) -> None:
+        """
+        Write rows belonging to a single partition.
+
+        Args:
+            batch: Rows as (device_id, timestamp, value, value, ...) tuples
+            replace: Whether to delete rows with the same device and timestamp first
+        """
+        conn = self._connection_for(batch[0][1])
+        with conn:
+            if replace:
+                conn.executemany(self._delete_query, [row[:2] for row in batch])
+            conn.executemany(self._insert_query, batch)
+        logger.debug(f"Appended {len(batch)} rows to partition {self._current_key}")
+
+    def query(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        t0: Optional[float] = None,
+        t1: Optional[float] = None,
+        device: Optional[int] = None
+    ) -> List[Tuple[Any, ...]]:
+        """
+        Fetch history rows in a time range across partitions.
+
+        Args:
+            columns: Columns to fetch, or None for all register columns
+            t0: Range start timestamp, or None for unbounded
+            t1: Range end timestamp (exclusive), or None for unbounded
+            device: Device ID, or None for every device
+
+        Returns:
+            List of (timestamp, value, ...) tuples in time order
+        """
+        columns = list(columns or self.columns)
+        where, params = _range_conditions(device, t0, t1)
+        query = f"SELECT TS, {', '.join(columns)} FROM {self.history_table}{where} ORDER BY TS"
+
+        rows: List[Tuple[Any, ...]] = []
+        for key, path in self.partitions_for_range(t0, t1):
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                rows.extend(conn.execute(query, params).fetchall())
+            finally:
+                conn.close()
+
+        return rows
+
+    def query_range(
+        self,
+        device: int,
+        columns: Sequence[str],
+        t0: Optional[float] = None,
+        t1: Optional[float] = None,
+        max_points: Optional[int] = None,
+        method: str = 'minmax'
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fetch the history of a device over a time range as NumPy arrays.
+
+        Works like operations.query_range across partitions: with 'minmax'
+        every partition aggregates its own buckets in SQL and buckets that
+        straddle a partition boundary are merged afterwards, with 'lttb'
+        every partition preselects its own candidate rows.
+
+        Args:
+            device: Device ID
+            columns: Columns to fetch
+            t0: Range start timestamp, or None for the first sample
+            t1: Range end timestamp (exclusive), or None for unbounded
+            max_points: Maximum number of points to return, or None for all
+            method: Downsampling method, 'minmax' or 'lttb'
+
+        Returns:
+            Tuple of (timestamps, values matrix of shape (n, len(columns)))
+            with NaN for missing values
+        """
+        partitions = self.partitions_for_range(t0, t1)
+        connections = [sqlite3.connect(f"file:{path}?mode=ro", uri=True) for _, path in partitions]
+
+        try:
+            return query_history(connections, self.history_table, device, columns, t0, t1, max_points, method)
+        finally:
+            for conn in connections:
+                conn.close()
+
+    def connect_view(
+        self,
+        t0: Optional[float] = None,
+        t1: Optional[float] = None
+    ) -> sqlite3.Connection:
+        """
+        Open a connection exposing the partitions as a single view.
+
+        The partitions overlapping the range are attached read-only and a
+        temporary view named after the history table is created over them,
+        so ad-hoc SQL can be run against the whole range.
+
+        Args:
+            t0: Range start timestamp, or None for unbounded
+            t1: Range end timestamp (exclusive), or None for unbounded
+
+        Returns:
+            In-memory connection with the partitions attached
+
+        Raises:
+            ValueError: If the range spans more partitions than SQLite can attach
+        """
+        partitions = self.partitions_for_range(t0, t1)
+        conn = sqlite3.connect(':memory:')
+
+        max_attached = 10
+        if hasattr(conn, 'getlimit'):
+            max_attached = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+
+        if len(partitions) > max_attached:
+            conn.close()
+            raise ValueError(
+                f"Range spans {len(partitions)} partitions, at most {max_attached} can be attached; "
+                f"use query() or narrow the range"
+            )
+
+        selects = []
+        for key, path in partitions:
+            schema = f"p{key}"
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (f"file:{path}?mode=ro",))
+            selects.append(f"SELECT * FROM {schema}.{self.history_table}")
+
+        if selects:
+            conn.execute(f"CREATE TEMP VIEW {self.history_table} AS {' UNION ALL '.join(selects)}")
+
+        return conn
+
+    def apply_retention(self, now: Optional[float] = None) -> List[Path]:
+        """
+        Remove partitions that fall outside the retention window.
+
+        Expired partitions are deleted by unlinking their files.
+
+        Args:
+            now: Reference Unix timestamp, or None for the current time
+
+        Returns:
+            List of removed partition paths
+        """
+        if not self.retention:
+            return []
+
+        now = now if now is not None else datetime.now(tz=timezone.utc).timestamp()
+        cutoff = partition_start(now, self.period) - PARTITION_PERIODS[self.period] * (self.retention - 1)
+        cutoff_key = cutoff.strftime('%Y%m%d')
+
+        removed = []
+        for key, path in self.list_partitions():
+            if key >= cutoff_key or key == self._current_key:
+                continue
+            try:
+                os.remove(path)
+                removed.append(path)
+                logger.info(f"Removed expired history partition {path}")
+            except OSError as e:
+                logger.exception(f"Error removing partition {path}: {e}")
+
+        return removed
+
+    def close(self) -> None:
+        """Close the connection to the current partition."""
+        with self._lock:
+            if self._current_conn is not None:
+                self._current_conn.close()
+                self._current_conn = None
+                self._current_key = None
@@ -0,0 +1,387 @@
+"""
+Register-map-driven database schema for ModCon.
+
+This module derives the column list, DDL and INSERT/UPDATE statements of
+the snapshot tables from the SinamicV20 register map, so the database
+can't drift from the registers that are actually read. Registers can be
+stored as raw 16-bit values, as scaled engineering values, or as raw
+values with generated columns exposing the scaled values.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.config import config
+from utils.modbus.motor import SinamicV20
+
+logger = get_logger(__name__)
+
+# Supported ways of storing register values
+VALUE_MODES = ('raw', 'scaled', 'generated')
+
+# Suffix of the generated columns exposing scaled values
+SCALED_SUFFIX = '_SCALED'
+
+# Raw values of the initial snapshot row, as shipped with the original
+# hand-written schema. Columns not listed start at the register map default.
+SEED_VALUES = {
+    'WDOG_TIME': 0, 'WDOG_ACTION': 0, 'FREQ_REF': 0, 'RUN_ENABLE': 0, 'CMD_FWD_REV': 0,
+    'CMD_START': 0, 'FAULT_ACK': 999, 'PID_SETP_REF': 0, 'ENABLE_PID': 1186, 'CURRENT_LMT': 1000,
+    'ACCEL_TIME': 1000, 'DECEL_TIME': 1, 'DIGITAL_OUT_1': 0, 'DIGITAL_OUT_2': 1500, 'REF_FREQ': 10000,
+    'PID_UP_LMT': 0, 'PID_LO_LMT': 3000, 'P_GAIN': 0, 'I_GAIN': 0, 'D_GAIN': 10000,
+    'FEEDBK_GAIN': 10000, 'LOW_PASS': 0, 'FREQ_OUTPUT': 0, 'SPEED': 0, 'CURRENT': 0,
+    'TORQUE': 0, 'ACTUAL_PWR': 17, 'TOTAL_KWH': 315, 'DC_BUS_VOLTS': 7, 'REFERENCE': 55,
+    'RATED_PWR': 0, 'OUTPUT_VOLTS': 1, 'FWD_REV': 0, 'STOP_RUN': 0, 'AT_MAX_FREQ': 1,
+    'CONTROL_MODE': 1, 'ENABLED': 0, 'READY_TO_RUN': 0, 'ANALOG_IN_1': 21, 'ANALOG_IN_2': 0,
+    'ANALOG_OUT_1': 0, 'FREQ_ACTUAL': 999, 'PID_SETP_OUT': 0, 'PID_OUTPUT': 0, 'PID_FEEDBACK': 0,
+    'DIGITAL_IN_1': 0, 'DIGITAL_IN_2': 0, 'DIGITAL_IN_3': 0, 'DIGITAL_IN_4': 0, 'FAULT': 0,
+    'LAST_FAULT': 0, 'FAULT_1': 0, 'FAULT_2': 0, 'FAULT_3': 0, 'WARNING': 0,
+    'LAST_WARNING': 394, 'INVERTER_VER': 6307, 'DRIVE_MODEL': 0, 'STW': 0, 'HSW': 60209,
+    'ZSW': 0, 'HIW': 6307, 'INVERTER_MODEL': 394, 'HAND_AUTO': 1, 'FAULT_4': 0,
+    'FAULT_5': 0, 'FAULT_6': 0, 'FAULT_7': 0, 'FAULT_8': 0, 'PRM_ERROR_CODE': 255,
+    'PI_FEEDBACK': 12
+}
+
+
+class RegisterColumn(NamedTuple):
+    """
+    Description of the column storing one register.
+    """
+    name: str
+    register: str
+    address: int
+    scale: float
+    signed: bool
+    unit: str
+    default: Any
+    minimum: Any = None
+    maximum: Any = None
+
+    @property
+    def needs_scaling(self) -> bool:
+        """Whether the raw value differs from the engineering value."""
+        return self.scale != 1 or self.signed
+
+
+class ChannelScaling(NamedTuple):
+    """
+    Conversion of channels read from raw rows to engineering values.
+
+    indices gives the position of each channel in the rows (None if rows
+    hold exactly the channels), scales the factor dividing each raw value
+    and signed whether it is a signed 16-bit value.
+    """
+    indices: Optional[np.ndarray]
+    scales: np.ndarray
+    signed: np.ndarray
+
+    @classmethod
+    def identity(cls, n: int) -> 'ChannelScaling':
+        """
+        Get the conversion of rows already holding n engineering values.
+
+        Args:
+            n: Number of channels
+
+        Returns:
+            ChannelScaling leaving the values unchanged
+        """
+        return cls(None, np.ones(n), np.zeros(n, dtype=bool))
+
+    def subset(self, channels: Sequence[int]) -> 'ChannelScaling':
+        """
+        Get the conversion of some of the channels.
+
+        Args:
+            channels: Positions of the channels to keep
+
+        Returns:
+            ChannelScaling of the selected channels, in the given order
+        """
+        channels = np.asarray(channels, dtype=np.intp)
+        indices = channels if self.indices is None else self.indices[channels]
+        return ChannelScaling(indices, self.scales[channels], self.signed[channels])
+
+    def convert(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Select the channels from raw rows and convert them.
+
+        Args:
+            rows: Float row or matrix of raw values, NaN for unread registers
+
+        Returns:
+            Engineering values of the channels, NaN for unread registers
+        """
+        values = rows if self.indices is None else rows[..., self.indices]
+        return np.where(self.signed & (values >= 32768), values - 65536, values) / self.scales
+
+
+def _signed_sql(column: str) -> str:
+    """SQL expression reinterpreting a raw 16-bit column as signed."""
+    return f"(CASE WHEN {column} >= 32768 THEN {column} - 65536 ELSE {column} END)"
+
+
+class RegisterSchema:
+    """
+    Column layout and SQL statements generated from a register map.
+
+    Columns follow the register addresses in read order. A register name
+    mapped to several addresses gets one column per address, the later
+    ones suffixed with their address (e.g. INVERTER_VER_40301).
+    """
+
+    def __init__(self, register_map: SinamicV20, values: str = 'raw'):
+        """
+        Build the schema for a register map.
+
+        Args:
+            register_map: SinamicV20 instance providing the register map
+            values: How register values are stored ('raw', 'scaled' or 'generated')
+        """
+        if values not in VALUE_MODES:
+            raise ValueError(f"Unknown value storage mode: {values}")
+
+        self.values = values
+        self.registers: List[RegisterColumn] = []
+        seen = set()
+
+        for address in register_map.ADDRESS_LIST:
+            param = register_map.address_to_param[address]
+            register = param['NAME']
+            name = register if register not in seen else f"{register}_{address}"
+            seen.add(register)
+
+            minimum = param['MIN']
+            signed = isinstance(minimum, (int, float)) and not isinstance(minimum, bool) and minimum < 0
+            self.registers.append(RegisterColumn(
+                name, register, address, param['SCALE'], signed, param['UNIT'], param['VALUE'],
+                minimum, param['MAX']
+            ))
+
+        self.columns = [column.name for column in self.registers]
+
+        # Precomputed per-column conversion, applied on every snapshot
+        self._scaling = [
+            (column.scale, column.signed) if values == 'scaled' and column.needs_scaling else None
+            for column in self.registers
+        ]
+
+    @property
+    def register_names(self) -> List[str]:
+        """Register names in read order, without duplicates (the SinamicV20 dict layout)."""
+        return list(dict.fromkeys(column.register for column in self.registers))
+
+    @property
+    def column_defs(self) -> List[str]:
+        """Column definitions for CREATE TABLE, including generated columns."""
+        defs = []
+
+        for column, scaling in zip(self.registers, self._scaling):
+            defs.append(f"{column.name} {'REAL' if scaling else 'INTEGER'}")
+
+        if self.values == 'generated':
+            for column in self.registers:
+                if column.needs_scaling:
+                    raw = _signed_sql(column.name) if column.signed else column.name
+                    defs.append(
+                        f"{column.name}{SCALED_SUFFIX} REAL GENERATED ALWAYS AS "
+                        f"({raw} / {float(column.scale)}) VIRTUAL"
+                    )
+
+        return defs
+
+    def create_table_sql(self, table_name: str) -> str:
+        """
+        Generate the CREATE TABLE statement of the snapshot table.
+
+        Args:
+            table_name: Name of the snapshot table
+
+        Returns:
+            SQL CREATE TABLE statement
+        """
+        column_defs = ",\n                ".join(self.column_defs)
+        return f"""
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                ID INTEGER PRIMARY KEY,
+                {column_defs}
+            )
+        """
+
+    def insert_sql(self, table_name: str) -> str:
+        """
+        Generate a parameterized INSERT statement for the snapshot table.
+
+        The statement expects the row ID followed by the column values.
+
+        Args:
+            table_name: Name of the snapshot table
+
+        Returns:
+            SQL INSERT statement with '?' placeholders
+        """
+        placeholders = ", ".join("?" for _ in range(len(self.columns) + 1))
+        return f"INSERT INTO {table_name} (ID, {', '.join(self.columns)}) VALUES ({placeholders});"
+
+    def update_sql(self, table_name: str) -> str:
+        """
+        Generate a parameterized UPDATE statement for the snapshot table.
+
+        The statement expects the column values followed by the row ID.
+
+        Args:
+            table_name: Name of the snapshot table
+
+        Returns:
+            SQL UPDATE statement with '?' placeholders
+        """
+        updates = ", ".join(f"{column} = ?" for column in self.columns)
+        return f"UPDATE {table_name} SET {updates} WHERE ID = ?;"
+
+    def convert(self, raw_values: Sequence[Optional[int]]) -> Tuple[Any, ...]:
+        """
+        Convert raw register values, in read order, to stored column values.
+
+        Args:
+            raw_values: Raw register values, None for unread registers
+
+        Returns:
+            Tuple of column values in column order
+        """
+        if self.values != 'scaled':
+            return tuple(raw_values)
+
+        row = []
+        for value, scaling in zip(raw_values, self._scaling):
+            if value is None or scaling is None:
+                row.append(value)
+                continue
+
+            scale, signed = scaling
+            if signed and value >= 32768:
+                value -= 65536
+            row.append(value / scale)
+
+        return tuple(row)
+
+    def convert_matrix(self, raw: np.ndarray) -> np.ndarray:
+        """
+        Convert many snapshots of raw register values at once.
+
+        Args:
+            raw: Float matrix of raw values, one row per snapshot in column
+                order, with NaN for unread registers
+
+        Returns:
+            Float matrix of stored column values, NaN for unread registers
+        """
+        if self.values != 'scaled':
+            return raw
+
+        values = raw.copy()
+        for i, scaling in enumerate(self._scaling):
+            if scaling is None:
+                continue
+
+            scale, signed = scaling
+            if signed:
+                values[:, i] = np.where(values[:, i] >= 32768, values[:, i] - 65536, values[:, i])
+            values[:, i] /= scale
+
+        return values
+
+    def to_dict(self, raw_values: Sequence[Optional[int]]) -> Dict[str, Any]:
+        """
+        Convert raw register values to a dictionary keyed by column name.
+
+        Args:
+            raw_values: Raw register values, None for unread registers
+
+        Returns:
+            Dictionary of stored column values
+        """
+        return dict(zip(self.columns, self.convert(raw_values)))
+
+    def seed_row(self) -> Tuple[Any, ...]:
+        """
+        Get the initial row values.
+
+        Columns keep the values of the original schema (SEED_VALUES); newer
+        columns start at their register map default.
+
+        Returns:
+            Tuple of column values in column order
+        """
+        raw_values = []
+
+        for column in self.registers:
+            if column.name in SEED_VALUES:
+                raw_values.append(SEED_VALUES[column.name])
+            elif column.default is None:
+                raw_values.append(None)
+            else:
+                raw_values.append(int(round(float(column.default) * column.scale)) & 0xFFFF)
+
+        return self.convert(raw_values)
+
+    def channel_scaling(self, channels: Sequence[str]) -> ChannelScaling:
+        """
+        Get the conversion of registers read from raw feature rows.
+
+        Feature rows hold one raw value per register name, in the order of
+        register_names.
+
+        Args:
+            channels: Register names
+
+        Returns:
+            ChannelScaling of the registers, in the given order
+        """
+        names = self.register_names
+        registers = [self.registers[self.columns.index(channel)] for channel in channels]
+        return ChannelScaling(
+            np.array([names.index(channel) for channel in channels], dtype=np.intp),
+            np.array([register.scale for register in registers], dtype=np.float64),
+            np.array([register.signed for register in registers], dtype=bool)
+        )
+
+    def raw_expression(self, column_name: str) -> str:
+        """
+        Get an SQL expression reading a column back as a raw register value.
+
+        Args:
+            column_name: Name of a stored column
+
+        Returns:
+            SQL expression evaluating to the raw 16-bit value
+        """
+        index = self.columns.index(column_name)
+        if self._scaling[index] is None:
+            return column_name
+
+        scale, signed = self._scaling[index]
+        raw = f"CAST(ROUND({column_name} * {scale}) AS INTEGER)"
+        return f"(({raw} + 65536) % 65536)" if signed else raw
+
+
+@lru_cache(maxsize=None)
+def get_schema(values: Optional[str] = None) -> RegisterSchema:
+    """
+    Get the schema of the SinamicV20 register map, built once per process.
+
+    Args:
+        values: How register values are stored, None to use the configuration
+
+    Returns:
+        Cached RegisterSchema instance
+    """
+    values = values or config.get('database', {}).get('schema', {}).get('values', 'raw')
+    if values not in VALUE_MODES:
+        raise ValueError(f"Unknown value storage mode: {values}")
+
+    schema = RegisterSchema(SinamicV20(client=None, slave_id=0), values)
+    logger.info(f"Generated schema with {len(schema.columns)} register columns ({values} values)")
+    return schema
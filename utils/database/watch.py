@@ -0,0 +1,137 @@
+"""
+Change notification for SQLite databases for ModCon.
+
+This module lets a reader wait for other connections to commit to a
+database instead of re-running its queries on a timer. SQLite's
+PRAGMA data_version changes whenever another connection commits, and
+checking it reads no table, so it can be polled at a short interval for
+a fraction of the cost of a SELECT. New history rows are then fetched by
+rowid, so each row is read exactly once.
+
+The history table has no AUTOINCREMENT key, so SQLite gives a new row the
+largest rowid plus one. Rowids keep growing as long as the newest rows
+are kept, which holds when only the oldest rows are deleted (retention).
+If the newest rows are deleted, their rowids are reused and rows inserted
+with them before the reader notices can be missed.
+"""
+
+import sqlite3
+import time
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DataVersionWatcher:
+    """
+    Waits for commits to a database by other connections.
+
+    SQLite only reports commits made by other connections (and processes),
+    such as the collector's; the watcher's own writes are not reported.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, poll_interval: float = 0.05):
+        """
+        Initialize the watcher at the current version of the database.
+
+        Args:
+            conn: Connection used to read the database
+            poll_interval: Time between version checks in seconds
+        """
+        self.conn = conn
+        self.poll_interval = poll_interval
+        self.version = self._data_version()
+
+    def _data_version(self) -> int:
+        """Read the data version of the connection."""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed(self) -> bool:
+        """
+        Check whether another connection committed since the last check.
+
+        Returns:
+            Whether the database changed
+        """
+        version = self._data_version()
+        if version == self.version:
+            return False
+        self.version = version
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until another connection commits.
+
+        Args:
+            timeout: Maximum time to wait in seconds, or None to wait forever
+
+        Returns:
+            Whether the database changed, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while not self.changed():
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(self.poll_interval, remaining))
+            else:
+                time.sleep(self.poll_interval)
+        return True
+
+
+def last_rowid(conn: sqlite3.Connection, table: str) -> int:
+    """
+    Get the largest rowid of a table.
+
+    Args:
+        conn: Database connection
+        table: Table name
+
+    Returns:
+        Largest rowid, 0 for an empty table
+    """
+    return conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+
+
+def fetch_rows_after(
+    conn: sqlite3.Connection,
+    history_table: str,
+    columns: Sequence[str],
+    after: int,
+    limit: int = 65536
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fetch the history rows inserted after a rowid.
+
+    Rows reusing the rowids of deleted newest rows are not returned, see
+    the module documentation.
+
+    Args:
+        conn: Database connection
+        history_table: Name of the history table
+        columns: SQL expressions of the feature columns
+        after: Rowid of the last row already read
+        limit: Maximum number of rows returned
+
+    Returns:
+        Tuple of (rowids, device IDs, timestamps, feature matrix with NaN
+        for missing values), in insertion order
+    """
+    rows = conn.execute(
+        f"SELECT rowid, DEVICE_ID, TS, {', '.join(columns)} FROM {history_table} "
+        f"WHERE rowid > ? ORDER BY rowid LIMIT ?",
+        (after, limit)
+    ).fetchall()
+
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros((0, len(columns)))
+
+    data = np.array(rows, dtype=np.float64)
+    return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2], data[:, 3:]
@@ -0,0 +1,10 @@
+"""
+Inter-process communication utilities for ModCon.
+
+This module provides channels for handing snapshots from the collector
+to consumers such as the maintainer and the visualizer without going
+through the database.
+"""
+
+from utils.ipc.shared_snapshot import SnapshotPublisher, SnapshotReader
+from utils.ipc.stream import SnapshotStreamServer, SnapshotSubscriber
@@ -0,0 +1,259 @@
+"""
+Shared-memory latest-snapshot channel.
+
+The collector publishes the most recent snapshot into a named
+multiprocessing.shared_memory block guarded by a seqlock-style version
+counter. Consumers read it without locks: a read is retried if the
+counter was odd (write in progress) or changed while copying.
+"""
+
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.data.record_log import DEFAULT_CHANNELS, snapshot_dtype, pack_snapshot
+
+logger = get_logger(__name__)
+
+SHM_MAGIC = b'MCSS'
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('n_channels', '<u4'),
+    ('seq', '<u8')
+])
+
+# Channels published by this process, whose tracker registration must be kept
+_published_names = set()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to an existing shared memory block without taking ownership.
+
+    Before Python 3.13 every attaching process registers the block with
+    its resource tracker, which unlinks it when the process exits. Readers
+    must not do that, so the registration is undone unless this process
+    is also the publisher.
+
+    Args:
+        name: Name of the shared memory block
+
+    Returns:
+        Attached SharedMemory instance
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    shm = shared_memory.SharedMemory(name=name)
+    if name in _published_names:
+        return shm
+
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception as e:
+        logger.debug(f"Could not unregister shared memory {name} from resource tracker: {e}")
+    return shm
+
+
+class SnapshotPublisher:
+    """
+    Writer side of the shared-memory snapshot channel.
+
+    Only one publisher may write to a channel.
+    """
+
+    def __init__(self, name: str = 'modcon_snapshot', n_channels: int = DEFAULT_CHANNELS):
+        """
+        Create the shared memory block for the channel.
+
+        A stale block left by a previous run under the same name is replaced.
+
+        Args:
+            name: Name of the shared memory block
+            n_channels: Number of register values per snapshot
+        """
+        self.name = name
+        self.n_channels = n_channels
+        dtype = snapshot_dtype(n_channels)
+        size = HEADER_DTYPE.itemsize + dtype.itemsize
+
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            logger.warning(f"Replaced stale shared memory block {name}")
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self._header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._shm.buf)
+        self._record = np.ndarray((), dtype=dtype, buffer=self._shm.buf, offset=HEADER_DTYPE.itemsize)
+        self._header['magic'] = SHM_MAGIC
+        self._header['n_channels'] = n_channels
+        self._header['seq'] = 0
+        _published_names.add(name)
+
+        logger.info(f"SnapshotPublisher created shared memory {name} ({size} bytes)")
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    def publish(self, timestamp: float, values: Sequence[Optional[int]]) -> None:
+        """
+        Publish a new snapshot.
+
+        Args:
+            timestamp: Unix timestamp of the snapshot
+            values: Raw register values in address order, None for unread registers
+        """
+        seq = int(self._header['seq'])
+        self._header['seq'] = seq + 1
+        pack_snapshot(self._record, timestamp, values)
+        self._header['seq'] = seq + 2
+
+    def close(self) -> None:
+        """Release and remove the shared memory block."""
+        if self._shm is None:
+            return
+
+        del self._header, self._record
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = None
+        _published_names.discard(self.name)
+        logger.info(f"SnapshotPublisher closed shared memory {self.name}")
+
+
+class SnapshotReader:
+    """
+    Lock-free reader side of the shared-memory snapshot channel.
+    """
+
+    def __init__(self, name: str = 'modcon_snapshot'):
+        """
+        Attach to the channel.
+
+        Args:
+            name: Name of the shared memory block
+
+        Raises:
+            FileNotFoundError: If no publisher has created the channel
+        """
+        self.name = name
+        self._shm = _attach(name)
+        self._header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._shm.buf)
+
+        if self._header['magic'] != SHM_MAGIC:
+            self.close()
+            raise ValueError(f"Shared memory {name} is not a ModCon snapshot channel")
+
+        self.n_channels = int(self._header['n_channels'])
+        self._record = np.ndarray(
+            (), dtype=snapshot_dtype(self.n_channels), buffer=self._shm.buf, offset=HEADER_DTYPE.itemsize
+        )
+        self.last_seq = 0
+
+        logger.info(f"SnapshotReader attached to shared memory {name}")
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    @property
+    def seq(self) -> int:
+        """Current version counter, odd while a write is in progress."""
+        return int(self._header['seq'])
+
+    def read(self, max_retries: int = 1000) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Read a consistent copy of the latest snapshot.
+
+        Args:
+            max_retries: Number of attempts before giving up on a torn read
+
+        Returns:
+            Tuple of (version, snapshot record), with a None record if nothing
+            has been published yet or no consistent copy could be taken
+        """
+        for _ in range(max_retries):
+            before = int(self._header['seq'])
+            if before == 0:
+                return 0, None
+            if before & 1:
+                continue
+
+            record = self._record.copy()
+            if int(self._header['seq']) == before:
+                self.last_seq = before
+                return before, record
+
+        logger.warning(f"Could not read a consistent snapshot from {self.name}")
+        return self.last_seq, None
+
+    def read_new(self) -> Optional[np.ndarray]:
+        """
+        Read the latest snapshot only if it changed since the last read.
+
+        Returns:
+            Snapshot record, or None if no new snapshot was published
+        """
+        if self.seq == self.last_seq:
+            return None
+        return self.read()[1]
+
+    def wait_for_update(self, timeout: Optional[float] = None, poll_interval: float = 0.001) -> Optional[np.ndarray]:
+        """
+        Wait until a snapshot newer than the last read one is published.
+
+        Args:
+            timeout: Maximum time to wait in seconds, or None to wait forever
+            poll_interval: Time between version checks in seconds
+
+        Returns:
+            The new snapshot record, or None on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            record = self.read_new()
+            if record is not None:
+                return record
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+
+    def close(self) -> None:
+        """Detach from the shared memory block."""
+        if self._shm is None:
+            return
+
+        self._header = None
+        self._record = None
+        self._shm.close()
+        self._shm = None
@@ -0,0 +1,431 @@
+"""
+Push-based snapshot stream over a local Unix domain socket.
+
+The collector runs a SnapshotStreamServer and publishes every snapshot as
+soon as it is acquired. Each subscriber receives length-prefixed binary
+snapshot records through its own bounded queue; when a subscriber falls
+behind, its oldest queued snapshots are dropped so it never slows down
+the collector or the other subscribers.
+"""
+
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional, Sequence, List, Iterator
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.data.record_log import DEFAULT_CHANNELS, snapshot_dtype, pack_snapshot
+
+logger = get_logger(__name__)
+
+STREAM_MAGIC = b'MCST'
+
+# Every frame is prefixed with its payload length
+FRAME_HEADER = struct.Struct('<I')
+HELLO = struct.Struct('<4sI')
+
+
+class _Subscriber:
+    """
+    Connection to one subscriber with its bounded send queue.
+    """
+
+    def __init__(self, conn: socket.socket, queue_size: int, on_close):
+        """
+        Initialize a subscriber, without starting its sender thread yet.
+
+        Args:
+            conn: Accepted client socket
+            queue_size: Maximum number of queued frames
+            on_close: Callback invoked with this subscriber when it disconnects
+        """
+        self.conn = conn
+        self.queue = deque(maxlen=queue_size)
+        self.dropped = 0
+        self.closed = False
+        self._on_close = on_close
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        """Start the sender thread, once the subscriber is registered."""
+        self._thread.start()
+
+    def push(self, frame: bytes) -> None:
+        """
+        Queue a frame, dropping the oldest one if the queue is full.
+
+        Args:
+            frame: Encoded frame
+        """
+        with self._cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(frame)
+            self._cond.notify()
+
+    def _run(self) -> None:
+        """Send queued frames until the subscriber disconnects."""
+        try:
+            while True:
+                with self._cond:
+                    while not self.queue and not self.closed:
+                        self._cond.wait()
+                    # close() may clear self.conn as soon as the lock is released
+                    conn = self.conn
+                    if self.closed or conn is None:
+                        return
+                    frames = list(self.queue)
+                    self.queue.clear()
+
+                conn.sendall(b''.join(frames))
+
+        except OSError as e:
+            logger.info(f"Subscriber disconnected: {e}")
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Close the connection and stop the sender thread."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+            conn, self.conn = self.conn, None
+
+        if conn is None:
+            return
+
+        try:
+            conn.close()
+        except OSError:
+            pass
+        self._on_close(self)
+
+
+class SnapshotStreamServer:
+    """
+    Publisher side of the snapshot stream.
+    """
+
+    def __init__(
+        self,
+        path: str = 'data/modcon.sock',
+        n_channels: int = DEFAULT_CHANNELS,
+        queue_size: int = 256
+    ):
+        """
+        Bind the Unix domain socket and start accepting subscribers.
+
+        A stale socket file left by a previous run is replaced.
+
+        Args:
+            path: Filesystem path of the socket
+            n_channels: Number of register values per snapshot
+            queue_size: Maximum number of snapshots queued per subscriber
+        """
+        self.path = Path(path)
+        self.n_channels = n_channels
+        self.queue_size = queue_size
+        self.dtype = snapshot_dtype(n_channels)
+        self._record = np.zeros((), dtype=self.dtype)
+        self._subscribers: List[_Subscriber] = []
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            os.remove(self.path)
+
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(str(self.path))
+        self._server.listen()
+
+        self._accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._accept_thread.start()
+
+        logger.info(f"SnapshotStreamServer listening on {self.path}")
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    @property
+    def subscriber_count(self) -> int:
+        """Number of connected subscribers."""
+        with self._lock:
+            return len(self._subscribers)
+
+    def _accept_loop(self) -> None:
+        """Accept subscribers until the server is closed."""
+        server = self._server
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+
+            try:
+                conn.sendall(HELLO.pack(STREAM_MAGIC, self.n_channels))
+            except OSError as e:
+                logger.warning(f"Error greeting subscriber: {e}")
+                conn.close()
+                continue
+
+            # Registered before its thread starts, so an immediate disconnect removes it
+            subscriber = _Subscriber(conn, self.queue_size, self._remove)
+            with self._lock:
+                self._subscribers.append(subscriber)
+            subscriber.start()
+            logger.info(f"Subscriber connected, {self.subscriber_count} total")
+
+    def _remove(self, subscriber: _Subscriber) -> None:
+        """
+        Forget a disconnected subscriber.
+
+        Args:
+            subscriber: Subscriber to remove
+        """
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+        if subscriber.dropped:
+            logger.warning(f"Subscriber dropped {subscriber.dropped} snapshots while connected")
+
+    def publish(self, timestamp: float, values: Sequence[Optional[int]]) -> None:
+        """
+        Send a snapshot to every subscriber.
+
+        This only encodes the snapshot once and queues it, it never blocks
+        on a subscriber.
+
+        Args:
+            timestamp: Unix timestamp of the snapshot
+            values: Raw register values in address order, None for unread registers
+        """
+        pack_snapshot(self._record, timestamp, values)
+        payload = self._record.tobytes()
+        frame = FRAME_HEADER.pack(len(payload)) + payload
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            subscriber.push(frame)
+
+    def close(self) -> None:
+        """Disconnect all subscribers and remove the socket."""
+        if self._server is None:
+            return
+
+        # Shutting down wakes the accept thread, closing alone may not
+        try:
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+        self._server = None
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+        logger.info(f"SnapshotStreamServer closed on {self.path}")
+
+
+class SnapshotSubscriber:
+    """
+    Subscriber side of the snapshot stream.
+    """
+
+    def __init__(self, path: str = 'data/modcon.sock', timeout: float = 5.0):
+        """
+        Connect to a snapshot stream.
+
+        Args:
+            path: Filesystem path of the socket
+            timeout: Time to wait for the server greeting in seconds
+
+        Raises:
+            ConnectionError: If the server doesn't speak the snapshot protocol
+        """
+        self.path = path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+        self._buffer = bytearray()
+
+        hello = self._recv_exact(HELLO.size, timeout)
+        if hello is None:
+            self.close()
+            raise ConnectionError(f"No greeting from snapshot stream {path}")
+
+        magic, n_channels = HELLO.unpack(hello)
+        if magic != STREAM_MAGIC:
+            self.close()
+            raise ConnectionError(f"{path} is not a ModCon snapshot stream")
+
+        self.n_channels = n_channels
+        self.dtype = snapshot_dtype(n_channels)
+
+        logger.info(f"SnapshotSubscriber connected to {path}")
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        """
+        Iterate over snapshots as they arrive, until the stream closes.
+        """
+        while True:
+            try:
+                yield self.recv()
+            except ConnectionError:
+                return
+
+    def fileno(self) -> int:
+        """File descriptor of the socket, for use with select or event loops."""
+        return self._sock.fileno()
+
+    def _fill(self, timeout: Optional[float]) -> bool:
+        """
+        Receive available bytes into the buffer.
+
+        Args:
+            timeout: Time to wait for data in seconds, 0 to poll, None to block
+
+        Returns:
+            True if data was received, False on timeout
+
+        Raises:
+            ConnectionError: If the server closed the stream
+        """
+        self._sock.settimeout(timeout)
+        try:
+            data = self._sock.recv(65536)
+        except (socket.timeout, BlockingIOError):
+            return False
+
+        if not data:
+            raise ConnectionError(f"Snapshot stream {self.path} closed")
+
+        self._buffer.extend(data)
+        return True
+
+    def _recv_exact(self, size: int, timeout: Optional[float]) -> Optional[bytes]:
+        """
+        Take exactly size bytes from the stream.
+
+        Args:
+            size: Number of bytes
+            timeout: Overall time limit in seconds, or None to block
+
+        Returns:
+            The bytes, or None on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while len(self._buffer) < size:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self._fill(remaining) and deadline is not None and time.monotonic() >= deadline:
+                return None
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _pop_frame(self) -> Optional[np.ndarray]:
+        """
+        Decode one complete frame from the buffer, if any.
+
+        Returns:
+            Snapshot record, or None if no complete frame is buffered
+        """
+        if len(self._buffer) < FRAME_HEADER.size:
+            return None
+
+        (length,) = FRAME_HEADER.unpack_from(self._buffer)
+        end = FRAME_HEADER.size + length
+        if len(self._buffer) < end:
+            return None
+
+        record = np.frombuffer(bytes(self._buffer[FRAME_HEADER.size:end]), dtype=self.dtype)[0]
+        del self._buffer[:end]
+        return record
+
+    def recv(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        Wait for the next snapshot.
+
+        Args:
+            timeout: Maximum time to wait in seconds, or None to wait forever
+
+        Returns:
+            Snapshot record, or None on timeout
+
+        Raises:
+            ConnectionError: If the server closed the stream
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            record = self._pop_frame()
+            if record is not None:
+                return record
+
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self._fill(remaining) and deadline is not None and time.monotonic() >= deadline:
+                return None
+
+    def recv_pending(self) -> List[np.ndarray]:
+        """
+        Take every snapshot that has already arrived, without waiting.
+
+        Returns:
+            List of snapshot records in arrival order
+
+        Raises:
+            ConnectionError: If the server closed the stream
+        """
+        while self._fill(0):
+            pass
+
+        records = []
+        record = self._pop_frame()
+        while record is not None:
+            records.append(record)
+            record = self._pop_frame()
+
+        return records
+
+    def close(self) -> None:
+        """Disconnect from the stream."""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
@@ -0,0 +1,14 @@
+"""
+Machine learning utilities for ModCon.
+
+This module provides the model inference stages used by the maintainer
+to score inverter snapshots. The pipeline training its models lives in
+utils.ml.training and is imported on its own, as it needs pyarrow.
+"""
+
+from utils.ml.anomaly import AnomalyEvent, StreamingAnomalyDetector
+from utils.ml.features import RollingFeatureEngine
+from utils.ml.inference import BatchPredictor, BatchResult
+from utils.ml.kernel import NumpyClassifier, export_model
+from utils.ml.registry import ModelRegistry
+from utils.ml.rules import LimitRule, RuleEngine, RuleEvent
@@ -0,0 +1,244 @@
+"""
+Streaming anomaly detection for ModCon.
+
+This module tracks an exponentially weighted baseline (mean and
+variance) of every register of every drive and flags samples whose
+z-score exceeds a threshold, as well as slower drifts detected by a
+two-sided CUSUM of the clipped z-scores. The state of all drives is held
+in NumPy arrays of shape (drives, channels), so one acquisition cycle is
+a handful of vectorized operations whatever the number of registers.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.database.schema import ChannelScaling, RegisterSchema
+from utils.ml.state import DeviceStates, device_runs
+
+logger = get_logger(__name__)
+
+
+class AnomalyEvent(NamedTuple):
+    """
+    One anomalous channel of one sample.
+
+    kind is 'zscore' for an outlier, 'cusum_high' or 'cusum_low' for a
+    sustained shift of the channel above or below its baseline.
+    """
+    device: int
+    timestamp: float
+    channel: str
+    kind: str
+    value: float
+    baseline: float
+    score: float
+
+
+class StreamingAnomalyDetector:
+    """
+    EWMA baselines, z-scores and CUSUM over many channels of many devices.
+
+    Each channel's thresholds are divided by its sensitivity, so a
+    sensitivity above 1 flags smaller deviations. No events are emitted
+    for a channel until it has seen warmup samples; after that, samples
+    update the baseline with their deviation clipped to the z-score
+    threshold, so outliers don't inflate it.
+    """
+
+    def __init__(
+        self,
+        channels: Sequence[str],
+        alpha: float = 0.05,
+        z_threshold: float = 4.0,
+        cusum_k: float = 0.5,
+        cusum_h: float = 8.0,
+        warmup: int = 30,
+        sensitivity: Optional[Dict[str, float]] = None,
+        min_std: Optional[Sequence[float]] = None,
+        scaling: Optional[ChannelScaling] = None
+    ):
+        """
+        Initialize the detector.
+
+        Args:
+            channels: Names of the channels, in sample order
+            alpha: Weight of a new sample in the EWMA baselines
+            z_threshold: Absolute z-score flagging an outlier
+            cusum_k: Slack subtracted from each z-score in the CUSUM
+            cusum_h: CUSUM value flagging a shift
+            warmup: Number of samples of a channel before events are emitted
+            sensitivity: Sensitivity per channel name, 1 for unlisted channels
+            min_std: Floor of each channel's standard deviation, None for 1e-6
+            scaling: Conversion of the rows passed to update to the channels,
+                None if rows hold exactly the channels in engineering units
+        """
+        self.channels = list(channels)
+        n = len(self.channels)
+        unknown = set(sensitivity or {}) - set(self.channels)
+        if unknown:
+            raise ValueError(f"Sensitivity given for unknown channels: {sorted(unknown)}")
+
+        self.alpha = alpha
+        self.warmup = warmup
+        self.cusum_k = cusum_k
+        weights = np.array([(sensitivity or {}).get(channel, 1.0) for channel in self.channels], dtype=np.float64)
+        self.z_threshold = z_threshold / weights
+        self.cusum_h = cusum_h / weights
+        self.min_var = np.square(np.full(n, 1e-6) if min_std is None else np.asarray(min_std, dtype=np.float64))
+        self.scaling = scaling or ChannelScaling.identity(n)
+        self.state = DeviceStates(n, mean=0.0, var=0.0, cusum_pos=0.0, cusum_neg=0.0, count=0)
+
+    @classmethod
+    def from_schema(
+        cls,
+        schema: RegisterSchema,
+        channels: Optional[Sequence[str]] = None,
+        **kwargs
+    ) -> 'StreamingAnomalyDetector':
+        """
+        Build a detector reading raw feature rows in the register map layout.
+
+        Values are converted to engineering units, and the standard
+        deviation of each channel is floored at one register count.
+
+        Args:
+            schema: Register schema
+            channels: Register names to watch, None for every register
+            **kwargs: Detector settings passed to the constructor
+
+        Returns:
+            Detector whose update takes full raw feature rows
+        """
+        names = schema.register_names
+        channels = list(channels) if channels else names
+        missing = [channel for channel in channels if channel not in names]
+        if missing:
+            raise ValueError(f"Unknown anomaly channels: {missing}")
+
+        scaling = schema.channel_scaling(channels)
+        return cls(channels, min_std=1.0 / scaling.scales, scaling=scaling, **kwargs)
+
+    def reset(self, device: Optional[int] = None) -> None:
+        """
+        Forget the baselines of a device.
+
+        Args:
+            device: Device ID, None for every device
+        """
+        self.state.reset(device)
+
+    def update(self, devices: Sequence[int], timestamps: Sequence[float], values: np.ndarray) -> List[AnomalyEvent]:
+        """
+        Process one acquisition cycle of several devices.
+
+        Args:
+            devices: Device ID of each row, each device at most once
+            timestamps: Timestamp of each row
+            values: Raw sample matrix of shape (n_devices, n_values), NaN
+                for unread registers; rows hold the channels in order, or
+                full feature rows for a detector built with from_schema
+
+        Returns:
+            Anomaly events of the cycle
+        """
+        values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+        devices = np.atleast_1d(np.asarray(devices))
+        state = self.state
+        rows = state.rows(devices.tolist())
+        if rows.shape[0] and rows[0] == 0 and (rows == np.arange(rows.shape[0])).all():
+            # Cycles with every device in order index views instead of copies
+            rows = slice(0, rows.shape[0])
+
+        x = self.scaling.convert(values)
+        valid = ~np.isnan(x)
+
+        mean = state.mean[rows]
+        var = state.var[rows]
+        count = state.count[rows]
+
+        # A channel's first sample starts its baseline
+        first = valid & (count == 0)
+        mean = np.where(first, x, mean)
+        var = np.where(first, 0.0, var)
+
+        std = np.sqrt(np.maximum(var, self.min_var))
+        z = np.where(valid, (x - mean) / std, 0.0)
+        armed = valid & (count >= self.warmup)
+
+        # The CUSUM only starts accumulating once the baseline has settled, and
+        # sums clipped z-scores so a single outlier can't pass for a shift
+        warming = valid & ~armed
+        clipped = np.clip(z, -self.z_threshold, self.z_threshold)
+        cusum_pos = np.maximum(0.0, state.cusum_pos[rows] + clipped - self.cusum_k)
+        cusum_neg = np.maximum(0.0, state.cusum_neg[rows] - clipped - self.cusum_k)
+        cusum_pos = np.where(warming, 0.0, np.where(valid, cusum_pos, state.cusum_pos[rows]))
+        cusum_neg = np.where(warming, 0.0, np.where(valid, cusum_neg, state.cusum_neg[rows]))
+
+        outlier = armed & (np.abs(z) > self.z_threshold)
+        shift_high = armed & (cusum_pos > self.cusum_h)
+        shift_low = armed & (cusum_neg > self.cusum_h)
+
+        events = []
+        if outlier.any() or shift_high.any() or shift_low.any():
+            events = self._events(devices, timestamps, x, mean, z, cusum_pos, cusum_neg,
+                                  outlier, shift_high, shift_low)
+
+        # Update the baselines, with the deviations clipped to the threshold once warmed up
+        diff = np.where(armed, clipped, z) * std
+        state.mean[rows] = np.where(valid, mean + self.alpha * diff, mean)
+        state.var[rows] = np.where(valid, (1 - self.alpha) * (var + self.alpha * diff * diff), var)
+        state.cusum_pos[rows] = np.where(shift_high, 0.0, cusum_pos)
+        state.cusum_neg[rows] = np.where(shift_low, 0.0, cusum_neg)
+        state.count[rows] = count + valid
+
+        return events
+
+    def _events(
+        self,
+        devices: np.ndarray,
+        timestamps: Sequence[float],
+        x: np.ndarray,
+        mean: np.ndarray,
+        z: np.ndarray,
+        cusum_pos: np.ndarray,
+        cusum_neg: np.ndarray,
+        outlier: np.ndarray,
+        shift_high: np.ndarray,
+        shift_low: np.ndarray
+    ) -> List[AnomalyEvent]:
+        """Build the events of the flagged channels."""
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), (devices.shape[0],))
+        events = []
+
+        for kind, mask, scores in (('zscore', outlier, z), ('cusum_high', shift_high, cusum_pos),
+                                   ('cusum_low', shift_low, cusum_neg)):
+            for i, c in zip(*np.nonzero(mask)):
+                events.append(AnomalyEvent(
+                    int(devices[i]), float(timestamps[i]), self.channels[c], kind,
+                    float(x[i, c]), float(mean[i, c]), float(scores[i, c])
+                ))
+
+        return events
+
+    def update_many(self, devices: np.ndarray, timestamps: np.ndarray, values: np.ndarray) -> List[AnomalyEvent]:
+        """
+        Process samples in time order, several per device allowed.
+
+        Rows are split into runs holding each device at most once, each
+        processed as one cycle.
+
+        Args:
+            devices: Device ID of each row
+            timestamps: Timestamp of each row
+            values: Raw sample matrix, NaN for unread registers
+
+        Returns:
+            Anomaly events of all rows
+        """
+        devices = np.broadcast_to(devices, (values.shape[0],))
+        events = []
+        for run in device_runs(devices):
+            events.extend(self.update(devices[run], timestamps[run], values[run]))
+        return events
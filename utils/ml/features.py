@@ -0,0 +1,314 @@
+"""
+Incremental rolling-window features for ModCon.
+
+This module computes rolling statistics (mean, variance, RMS, min, max,
+slope and peak-to-peak) of selected channels over several window lengths
+as snapshots arrive. Each window is a ring buffer with running sums, so a
+new sample costs O(1) per channel whatever the window length instead of a
+pass over the whole window, and every device keeps its own windows.
+"""
+
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.database.schema import ChannelScaling, RegisterSchema
+
+logger = get_logger(__name__)
+
+# Channels and window lengths (in samples) used by default
+DEFAULT_CHANNELS = ('SPEED', 'CURRENT', 'TORQUE', 'DC_BUS_VOLTS')
+DEFAULT_WINDOWS = (10, 60, 300)
+
+# Statistics computed per channel and window, in feature vector order
+FEATURE_STATS = ('mean', 'var', 'rms', 'min', 'max', 'slope', 'ptp')
+
+
+class RollingWindow:
+    """
+    Ring buffer over the last size samples of several channels.
+
+    Sums of the values, their squares and their products with time are
+    updated as samples enter and leave the buffer; min and max come from
+    monotonic queues. The sums are recomputed from the buffer once per
+    wrap, which keeps floating-point drift bounded at O(1) amortized cost.
+    """
+
+    def __init__(self, size: int, n_channels: int):
+        """
+        Allocate the window.
+
+        Args:
+            size: Number of samples in the window
+            n_channels: Number of channels per sample
+        """
+        if size < 1:
+            raise ValueError(f"Window size must be positive, got {size}")
+
+        self.size = size
+        self.n_channels = n_channels
+        self.values = np.zeros((size, n_channels), dtype=np.float64)
+        self.times = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self.pos = 0
+        self.index = 0
+
+        # Timestamps are stored relative to an origin moved at each resync
+        self.origin: Optional[float] = None
+        self.sum_y = np.zeros(n_channels)
+        self.sum_yy = np.zeros(n_channels)
+        self.sum_ty = np.zeros(n_channels)
+        self.sum_t = 0.0
+        self.sum_tt = 0.0
+
+        # Monotonic queues of (sample index, value) per channel
+        self._min: List[deque] = [deque() for _ in range(n_channels)]
+        self._max: List[deque] = [deque() for _ in range(n_channels)]
+
+    def __len__(self) -> int:
+        """Number of samples in the window."""
+        return self.count
+
+    def push(self, timestamp: float, values: np.ndarray) -> None:
+        """
+        Add a sample, evicting the oldest one if the window is full.
+
+        Args:
+            timestamp: Timestamp of the sample
+            values: Channel values of the sample
+        """
+        if self.origin is None:
+            self.origin = timestamp
+        t = timestamp - self.origin
+
+        if self.count == self.size:
+            old_t = self.times[self.pos]
+            old = self.values[self.pos]
+            self.sum_y -= old
+            self.sum_yy -= old * old
+            self.sum_ty -= old_t * old
+            self.sum_t -= old_t
+            self.sum_tt -= old_t * old_t
+        else:
+            self.count += 1
+
+        self.times[self.pos] = t
+        self.values[self.pos] = values
+        self.sum_y += values
+        self.sum_yy += values * values
+        self.sum_ty += t * values
+        self.sum_t += t
+        self.sum_tt += t * t
+
+        expired = self.index - self.size
+        for c, value in enumerate(values.tolist()):
+            low, high = self._min[c], self._max[c]
+            while low and low[-1][1] >= value:
+                low.pop()
+            low.append((self.index, value))
+            if low[0][0] <= expired:
+                low.popleft()
+
+            while high and high[-1][1] <= value:
+                high.pop()
+            high.append((self.index, value))
+            if high[0][0] <= expired:
+                high.popleft()
+
+        self.index += 1
+        self.pos = (self.pos + 1) % self.size
+        if self.pos == 0:
+            self._resync()
+
+    def _resync(self) -> None:
+        """Recompute the running sums from the buffer around a new time origin."""
+        shift = self.times[:self.count].min()
+        self.origin += shift
+        self.times[:self.count] -= shift
+
+        t = self.times[:self.count]
+        y = self.values[:self.count]
+        self.sum_y = y.sum(axis=0)
+        self.sum_yy = (y * y).sum(axis=0)
+        self.sum_ty = t @ y
+        self.sum_t = float(t.sum())
+        self.sum_tt = float(t @ t)
+
+    def stats(self, out: np.ndarray) -> None:
+        """
+        Compute the window statistics.
+
+        Args:
+            out: Array of shape (len(FEATURE_STATS), n_channels) to fill,
+                NaN where a statistic is undefined
+        """
+        n = self.count
+        if not n:
+            out[:] = np.nan
+            return
+
+        mean = self.sum_y / n
+        out[0] = mean
+        out[1] = np.maximum(self.sum_yy / n - mean * mean, 0.0)
+        out[2] = np.sqrt(np.maximum(self.sum_yy / n, 0.0))
+        out[3] = [queue[0][1] for queue in self._min]
+        out[4] = [queue[0][1] for queue in self._max]
+
+        # Least-squares slope of the values against time, in units per second
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        if n > 1 and denominator > 1e-12 * max(n * self.sum_tt, 1.0):
+            out[5] = (n * self.sum_ty - self.sum_t * self.sum_y) / denominator
+        else:
+            out[5] = np.nan
+
+        out[6] = out[4] - out[3]
+
+
+class RollingFeatureEngine:
+    """
+    Rolling features of several channels over several windows, per device.
+
+    Features are returned as one vector ordered by window, then statistic,
+    then channel, matching feature_names. A device's windows start filling
+    once every channel has been read; until then its features are NaN. An
+    unread register afterwards repeats its last value.
+    """
+
+    def __init__(
+        self,
+        channels: Sequence[str] = DEFAULT_CHANNELS,
+        windows: Sequence[int] = DEFAULT_WINDOWS,
+        scaling: Optional[ChannelScaling] = None
+    ):
+        """
+        Initialize the engine.
+
+        Args:
+            channels: Names of the channels
+            windows: Window lengths in samples
+            scaling: Conversion of the rows passed to update to the channels,
+                None if rows hold exactly the channels in engineering units
+        """
+        self.channels = list(channels)
+        self.windows = [int(w) for w in windows]
+        self.scaling = scaling or ChannelScaling.identity(len(self.channels))
+
+        self._windows: Dict[int, List[RollingWindow]] = {}
+        self._last: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_schema(
+        cls,
+        schema: RegisterSchema,
+        channels: Sequence[str] = DEFAULT_CHANNELS,
+        windows: Sequence[int] = DEFAULT_WINDOWS
+    ) -> 'RollingFeatureEngine':
+        """
+        Build an engine reading raw feature rows in the register map layout.
+
+        Args:
+            schema: Register schema
+            channels: Register names of the channels
+            windows: Window lengths in samples
+
+        Returns:
+            Engine converting the channels to engineering values
+        """
+        names = schema.register_names
+        missing = [channel for channel in channels if channel not in names]
+        if missing:
+            raise ValueError(f"Unknown feature channels: {missing}")
+
+        return cls(channels, windows, schema.channel_scaling(channels))
+
+    @property
+    def feature_names(self) -> List[str]:
+        """Names of the features in vector order."""
+        return [
+            f"{channel}_{stat}_{window}"
+            for window in self.windows
+            for stat in FEATURE_STATS
+            for channel in self.channels
+        ]
+
+    @property
+    def n_features(self) -> int:
+        """Length of the feature vector."""
+        return len(self.windows) * len(FEATURE_STATS) * len(self.channels)
+
+    def reset(self, device: Optional[int] = None) -> None:
+        """
+        Forget the samples of a device.
+
+        Args:
+            device: Device ID, None for every device
+        """
+        if device is None:
+            self._windows.clear()
+            self._last.clear()
+        else:
+            self._windows.pop(device, None)
+            self._last.pop(device, None)
+
+    def _channel_values(self, device: int, row: Sequence[Optional[float]]) -> Optional[np.ndarray]:
+        """Extract and convert the channels of a row, filling unread ones from the last sample."""
+        # None becomes NaN in the float conversion
+        values = self.scaling.convert(np.array(row, dtype=np.float64))
+
+        missing = np.isnan(values)
+        if missing.any():
+            last = self._last.get(device)
+            if last is None:
+                return None
+            values[missing] = last[missing]
+
+        self._last[device] = values
+        return values
+
+    def update(self, device: int, timestamp: float, row: Sequence[Optional[float]]) -> np.ndarray:
+        """
+        Add a sample of a device and get its current features.
+
+        Args:
+            device: Device ID
+            timestamp: Timestamp of the sample
+            row: Feature row, None or NaN for unread registers
+
+        Returns:
+            Feature vector of length n_features
+        """
+        out = np.full((len(self.windows), len(FEATURE_STATS), len(self.channels)), np.nan)
+        values = self._channel_values(device, row)
+        if values is None:
+            return out.ravel()
+
+        windows = self._windows.get(device)
+        if windows is None:
+            windows = [RollingWindow(size, len(self.channels)) for size in self.windows]
+            self._windows[device] = windows
+
+        for window, stats in zip(windows, out):
+            window.push(timestamp, values)
+            window.stats(stats)
+
+        return out.ravel()
+
+    def update_many(self, devices: np.ndarray, timestamps: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+        Add samples in time order and get the features after each one.
+
+        Args:
+            devices: Device ID of each row
+            timestamps: Timestamp of each row
+            rows: Feature matrix, NaN for unread registers
+
+        Returns:
+            Matrix of shape (n_rows, n_features)
+        """
+        devices = np.broadcast_to(devices, (rows.shape[0],))
+        out = np.empty((rows.shape[0], self.n_features))
+        for i, (device, timestamp) in enumerate(zip(devices.tolist(), timestamps.tolist())):
+            out[i] = self.update(device, timestamp, rows[i])
+        return out
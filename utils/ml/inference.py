@@ -0,0 +1,321 @@
+"""
+Batched model inference for ModCon.
+
+This module accumulates snapshots, from the history or from a live
+stream, into a fixed-size window and scores the whole window with a
+single vectorized predict_proba call. The per-call input validation of
+scikit-learn models is paid once per window instead of once per
+snapshot, and the latency of every batch is recorded.
+"""
+
+import time
+from collections import deque
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.data.record_log import valid_mask
+from utils.database.schema import RegisterSchema
+
+logger = get_logger(__name__)
+
+
+class BatchResult(NamedTuple):
+    """
+    Predictions for one window of snapshots.
+    """
+    devices: np.ndarray
+    timestamps: np.ndarray
+    predictions: np.ndarray
+    probabilities: Optional[np.ndarray]
+    skipped: int
+    latency: float
+
+
+def feature_indices(schema: RegisterSchema) -> np.ndarray:
+    """
+    Get the positions of the model features in a raw snapshot.
+
+    Models are trained on one feature per register name (the SinamicV20
+    dict layout); a name read from several addresses uses its first one.
+
+    Args:
+        schema: Register schema giving the snapshot layout
+
+    Returns:
+        Index array selecting the features from raw values in read order
+    """
+    return np.array([schema.columns.index(name) for name in schema.register_names])
+
+
+def snapshot_features(records: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """
+    Build the feature matrix of snapshot records without unpacking them row by row.
+
+    Args:
+        records: Array of snapshot_dtype records
+        indices: Feature positions from feature_indices
+
+    Returns:
+        Float matrix of shape (n_records, n_features), NaN for unread registers
+    """
+    records = np.atleast_1d(records)
+    values = records['values'][:, indices].astype(np.float64)
+    values[~valid_mask(records)[:, indices]] = np.nan
+    return values
+
+
+class SnapshotWindow:
+    """
+    Preallocated window of feature rows filled until it reaches its size.
+    """
+
+    def __init__(self, size: int, n_features: int):
+        """
+        Allocate the window.
+
+        Args:
+            size: Number of snapshots per window
+            n_features: Number of features per snapshot
+        """
+        self.size = size
+        self.features = np.empty((size, n_features), dtype=np.float64)
+        self.devices = np.empty(size, dtype=np.int64)
+        self.timestamps = np.empty(size, dtype=np.float64)
+        self.count = 0
+        self.opened_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        """Number of snapshots in the window."""
+        return self.count
+
+    @property
+    def full(self) -> bool:
+        """Whether the window has reached its size."""
+        return self.count >= self.size
+
+    def extend(self, features: np.ndarray, devices: np.ndarray, timestamps: np.ndarray) -> int:
+        """
+        Copy as many rows as fit into the window.
+
+        Args:
+            features: Feature matrix
+            devices: Device ID of each row
+            timestamps: Timestamp of each row
+
+        Returns:
+            Number of rows copied
+        """
+        n = min(self.size - self.count, features.shape[0])
+        if n and self.count == 0:
+            self.opened_at = time.monotonic()
+
+        self.features[self.count:self.count + n] = features[:n]
+        self.devices[self.count:self.count + n] = devices[:n]
+        self.timestamps[self.count:self.count + n] = timestamps[:n]
+        self.count += n
+        return n
+
+    def take(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Empty the window.
+
+        Returns:
+            Tuple of (features, devices, timestamps) views of the filled rows,
+            valid until the window is written to again
+        """
+        n = self.count
+        self.count = 0
+        self.opened_at = None
+        return self.features[:n], self.devices[:n], self.timestamps[:n]
+
+
+class BatchPredictor:
+    """
+    Scores snapshots in windows of window_size rows with one model call each.
+
+    A partially filled window is scored once its oldest snapshot has
+    waited max_delay seconds, so low sample rates still get timely results.
+    Rows with unread registers are skipped, as the models can't score them.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        window_size: int = 64,
+        max_delay: Optional[float] = None,
+        proba: bool = True,
+        latency_history: int = 1000
+    ):
+        """
+        Initialize the predictor.
+
+        Args:
+            model: Fitted scikit-learn style classifier
+            window_size: Number of snapshots scored per call
+            max_delay: Maximum time in seconds a snapshot waits in a partial window, None to wait for a full one
+            proba: Whether to compute class probabilities (predictions are then their argmax)
+            latency_history: Number of batch latencies kept for statistics
+        """
+        self.window_size = window_size
+        self.max_delay = max_delay
+        self.use_proba = proba
+        self.window: Optional[SnapshotWindow] = None
+        self.set_model(model)
+        self.latencies: deque = deque(maxlen=latency_history)
+        self.scored = 0
+
+    def set_model(self, model: Any) -> None:
+        """
+        Score the following windows with another model.
+
+        Args:
+            model: Fitted classifier taking the same features
+        """
+        n_features = int(getattr(model, 'n_features_in_', 0)) or None
+        if self.window is not None and n_features is not None and n_features != self.window.features.shape[1]:
+            raise ValueError(f"Model expects {n_features} features, got {self.window.features.shape[1]}")
+
+        self.model = model
+        self.proba = self.use_proba and hasattr(model, 'predict_proba')
+        self.n_features = n_features
+
+    def _window_for(self, n_features: int) -> SnapshotWindow:
+        """Get the window, allocating it for the feature count of the first rows."""
+        if self.window is None:
+            if self.n_features is not None and n_features != self.n_features:
+                raise ValueError(f"Model expects {self.n_features} features, got {n_features}")
+            self.window = SnapshotWindow(self.window_size, n_features)
+        return self.window
+
+    def add(self, features: Sequence[Any], device: int = 0, timestamp: Optional[float] = None) -> List[BatchResult]:
+        """
+        Add one snapshot.
+
+        Args:
+            features: Feature values, None or NaN for unread registers
+            device: Device ID of the snapshot
+            timestamp: Timestamp of the snapshot, None for the current time
+
+        Returns:
+            Results of the windows completed by this snapshot
+        """
+        row = np.array([np.nan if v is None else v for v in features], dtype=np.float64)
+        return self.add_many(
+            row[np.newaxis, :],
+            np.array([device]),
+            np.array([time.time() if timestamp is None else timestamp])
+        )
+
+    def add_many(self, features: np.ndarray, devices: np.ndarray, timestamps: np.ndarray) -> List[BatchResult]:
+        """
+        Add several snapshots, scoring every window they complete.
+
+        Args:
+            features: Feature matrix, NaN for unread registers
+            devices: Device ID of each row
+            timestamps: Timestamp of each row
+
+        Returns:
+            Results of the completed windows
+        """
+        window = self._window_for(features.shape[1])
+        devices = np.broadcast_to(devices, (features.shape[0],))
+        results = []
+        start = 0
+
+        while start < features.shape[0]:
+            start += window.extend(features[start:], devices[start:], timestamps[start:])
+            if window.full:
+                results.append(self.score(*window.take()))
+
+        return results
+
+    def poll(self, now: Optional[float] = None) -> Optional[BatchResult]:
+        """
+        Score the partial window if its oldest snapshot waited max_delay seconds.
+
+        Args:
+            now: Current time.monotonic() value, None to read the clock
+
+        Returns:
+            Result of the window, or None if it wasn't due
+        """
+        window = self.window
+        if window is None or not len(window) or self.max_delay is None:
+            return None
+
+        now = time.monotonic() if now is None else now
+        if now - window.opened_at < self.max_delay:
+            return None
+        return self.flush()
+
+    def flush(self) -> Optional[BatchResult]:
+        """
+        Score the partial window now.
+
+        Returns:
+            Result of the window, or None if it was empty
+        """
+        if self.window is None or not len(self.window):
+            return None
+        return self.score(*self.window.take())
+
+    def score(self, features: np.ndarray, devices: np.ndarray, timestamps: np.ndarray) -> BatchResult:
+        """
+        Score a matrix of snapshots with a single model call.
+
+        Args:
+            features: Feature matrix, NaN for unread registers
+            devices: Device ID of each row
+            timestamps: Timestamp of each row
+
+        Returns:
+            BatchResult for the rows without unread registers
+        """
+        start = time.perf_counter()
+
+        complete = ~np.isnan(features).any(axis=1)
+        skipped = int(features.shape[0] - complete.sum())
+        if skipped:
+            features, devices, timestamps = features[complete], devices[complete], timestamps[complete]
+
+        probabilities = None
+        if not features.shape[0]:
+            predictions = np.zeros(0, dtype=getattr(self.model, 'classes_', np.zeros(0)).dtype)
+        elif self.proba:
+            probabilities = self.model.predict_proba(features)
+            predictions = self.model.classes_[probabilities.argmax(axis=1)]
+        else:
+            predictions = self.model.predict(features)
+
+        latency = time.perf_counter() - start
+        self.latencies.append(latency)
+        self.scored += features.shape[0]
+
+        logger.debug(
+            f"Scored {features.shape[0]} snapshots in {latency * 1000:.2f} ms"
+            f"{f', skipped {skipped} incomplete' if skipped else ''}"
+        )
+        return BatchResult(devices.copy(), timestamps.copy(), predictions, probabilities, skipped, latency)
+
+    def latency_stats(self) -> Dict[str, float]:
+        """
+        Summarize the recorded batch latencies.
+
+        Returns:
+            Dictionary with the number of batches and the mean, p50, p95 and
+            max latency in milliseconds
+        """
+        if not self.latencies:
+            return {'batches': 0}
+
+        latencies = np.array(self.latencies) * 1000
+        return {
+            'batches': len(latencies),
+            'mean_ms': float(latencies.mean()),
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'max_ms': float(latencies.max())
+        }
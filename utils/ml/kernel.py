@@ -0,0 +1,311 @@
+"""
+Dependency-free model inference for ModCon.
+
+This module exports fitted scikit-learn classifiers to a compact .npz
+file of coefficients and evaluates them with NumPy alone, so the
+maintainer can score snapshots without importing scikit-learn or
+unpickling the model. Linear classifiers (LogisticRegression,
+SGDClassifier, RidgeClassifier, LinearSVC) and tree ensembles
+(DecisionTreeClassifier, RandomForestClassifier, ExtraTreesClassifier)
+are supported, with outputs matching the original models.
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Version of the .npz layout, stored in every exported file
+KERNEL_FORMAT = 1
+
+LINEAR_MODELS = ('LogisticRegression', 'SGDClassifier', 'RidgeClassifier', 'LinearSVC')
+TREE_MODELS = ('DecisionTreeClassifier', 'RandomForestClassifier', 'ExtraTreesClassifier')
+
+
+def _linear_arrays(model: Any) -> Dict[str, np.ndarray]:
+    """Get the arrays of a fitted linear classifier."""
+    name = type(model).__name__
+    link = 'none'
+
+    if name == 'LogisticRegression':
+        multi_class = getattr(model, 'multi_class', 'auto')
+        ovr = multi_class == 'ovr' or (multi_class != 'multinomial' and model.solver == 'liblinear')
+        link = 'logistic' if len(model.classes_) == 2 or ovr else 'softmax'
+    elif name == 'SGDClassifier' and model.loss in ('log_loss', 'log'):
+        link = 'logistic'
+
+    return {
+        'coef': np.atleast_2d(np.asarray(model.coef_, dtype=np.float64)),
+        'intercept': np.atleast_1d(np.asarray(model.intercept_, dtype=np.float64)),
+        'link': np.array(link)
+    }
+
+
+def _tree_arrays(model: Any) -> Dict[str, np.ndarray]:
+    """Get the arrays of a fitted tree or forest, with the trees' nodes concatenated."""
+    estimators = getattr(model, 'estimators_', [model])
+    n_classes = len(model.classes_)
+    left, right, feature, threshold, missing_left, value, roots = [], [], [], [], [], [], []
+    offset = 0
+    depth = 0
+
+    for estimator in estimators:
+        tree = estimator.tree_
+        leaf = tree.children_left < 0
+        roots.append(offset)
+        left.append(np.where(leaf, -1, tree.children_left + offset))
+        right.append(np.where(leaf, -1, tree.children_right + offset))
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+
+        missing = getattr(tree, 'missing_go_to_left', None)
+        missing_left.append(np.zeros(tree.node_count, dtype=bool) if missing is None else missing.astype(bool))
+
+        # Leaf class distributions, normalized whatever the scikit-learn version stores
+        counts = tree.value[:, 0, :n_classes].astype(np.float64)
+        value.append(counts / np.maximum(counts.sum(axis=1, keepdims=True), 1e-300))
+
+        offset += tree.node_count
+        depth = max(depth, tree.max_depth)
+
+    return {
+        'children_left': np.concatenate(left).astype(np.int32),
+        'children_right': np.concatenate(right).astype(np.int32),
+        'feature': np.concatenate(feature).astype(np.int32),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'missing_left': np.concatenate(missing_left),
+        'value': np.concatenate(value),
+        'roots': np.array(roots, dtype=np.int32),
+        'max_depth': np.array(depth)
+    }
+
+
+def export_model(model: Any, path: str, compress: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Export a fitted classifier to a .npz file for NumpyClassifier.
+
+    Args:
+        model: Fitted scikit-learn classifier of a supported type
+        path: Output .npz file path
+        compress: Whether to compress the arrays
+
+    Returns:
+        Dictionary of the exported arrays
+
+    Raises:
+        TypeError: If the model type isn't supported
+    """
+    name = type(model).__name__
+    if name in LINEAR_MODELS:
+        arrays = _linear_arrays(model)
+        kind = 'linear'
+    elif name in TREE_MODELS:
+        arrays = _tree_arrays(model)
+        kind = 'tree'
+    else:
+        raise TypeError(f"Cannot export {name}, supported models: {', '.join(LINEAR_MODELS + TREE_MODELS)}")
+
+    arrays.update({
+        'format': np.array(KERNEL_FORMAT),
+        'kind': np.array(kind),
+        'model_type': np.array(name),
+        'classes': np.asarray(model.classes_),
+        'n_features': np.array(model.n_features_in_)
+    })
+    if hasattr(model, 'feature_names_in_'):
+        arrays['feature_names'] = np.asarray(model.feature_names_in_, dtype=str)
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        (np.savez_compressed if compress else np.savez)(f, **arrays)
+
+    logger.info(f"Exported {name} with {model.n_features_in_} features to {path}")
+    return arrays
+
+
+def check_parity(model: Any, kernel: 'NumpyClassifier', X: np.ndarray, atol: float = 1e-9) -> float:
+    """
+    Check that an exported kernel reproduces the original model.
+
+    Args:
+        model: Original scikit-learn classifier
+        kernel: Kernel exported from it
+        X: Feature matrix to compare the outputs on
+        atol: Largest accepted probability difference
+
+    Returns:
+        Largest probability difference, 0 for models without probabilities
+
+    Raises:
+        ValueError: If the predictions or probabilities differ
+    """
+    mismatches = int((kernel.predict(X) != model.predict(X)).sum())
+    if mismatches:
+        raise ValueError(f"Kernel predictions differ from the model's on {mismatches} of {X.shape[0]} rows")
+
+    if not hasattr(model, 'predict_proba'):
+        return 0.0
+
+    difference = float(np.abs(kernel.predict_proba(X) - model.predict_proba(X)).max())
+    if difference > atol:
+        raise ValueError(f"Kernel probabilities differ from the model's by up to {difference:.3g}")
+    return difference
+
+
+class NumpyClassifier:
+    """
+    Classifier evaluated with NumPy from an exported .npz file.
+
+    Exposes the scikit-learn attributes and methods the maintainer uses
+    (classes_, n_features_in_, predict, predict_proba), so it can stand in
+    for the original model anywhere.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        """
+        Build the classifier from exported arrays.
+
+        Args:
+            arrays: Arrays written by export_model
+        """
+        if int(arrays['format']) != KERNEL_FORMAT:
+            raise ValueError(f"Unsupported kernel format {int(arrays['format'])}, expected {KERNEL_FORMAT}")
+
+        self.kind = str(arrays['kind'])
+        self.model_type = str(arrays['model_type'])
+        self.classes_ = arrays['classes']
+        self.n_features_in_ = int(arrays['n_features'])
+        if 'feature_names' in arrays:
+            self.feature_names_in_ = arrays['feature_names']
+
+        if self.kind == 'linear':
+            self.coef = arrays['coef']
+            self.intercept = arrays['intercept']
+            self.link = str(arrays['link'])
+            self._coef_t = np.ascontiguousarray(self.coef.T)
+        else:
+            self.children_left = arrays['children_left']
+            self.children_right = arrays['children_right']
+            self.feature = arrays['feature']
+            self.threshold = arrays['threshold']
+            self.missing_left = arrays['missing_left']
+            self.value = arrays['value']
+            self.roots = arrays['roots']
+            self.max_depth = int(arrays['max_depth'])
+            self.link = 'tree'
+
+    @classmethod
+    def load(cls, path: str) -> 'NumpyClassifier':
+        """
+        Load an exported classifier.
+
+        Args:
+            path: Path to the .npz file
+
+        Returns:
+            NumpyClassifier instance
+        """
+        with np.load(path, allow_pickle=False) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def _check(self, X: Any) -> np.ndarray:
+        """Convert the input to a 2-D float matrix of the expected width."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features_in_}")
+        return X
+
+    def decision_function(self, X: Any) -> np.ndarray:
+        """
+        Compute the decision scores of a linear model.
+
+        Args:
+            X: Feature matrix
+
+        Returns:
+            Scores of shape (n_rows,) for two classes, (n_rows, n_classes) otherwise
+        """
+        if self.kind != 'linear':
+            raise AttributeError(f"{self.model_type} has no decision_function")
+
+        scores = self._check(X) @ self._coef_t + self.intercept
+        return scores[:, 0] if scores.shape[1] == 1 else scores
+
+    def _tree_proba(self, X: np.ndarray) -> np.ndarray:
+        """Average the leaf class distributions reached in every tree."""
+        # Trees compare float32 features, as scikit-learn does
+        X = X.astype(np.float32)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.roots.shape[0])).copy()
+
+        for _ in range(self.max_depth):
+            left = self.children_left[nodes]
+            internal = left >= 0
+            if not internal.any():
+                break
+
+            x = X[rows, self.feature[nodes]]
+            go_left = (x <= self.threshold[nodes]) | (np.isnan(x) & self.missing_left[nodes])
+            nodes = np.where(internal, np.where(go_left, left, self.children_right[nodes]), nodes)
+
+        return self.value[nodes].mean(axis=1)
+
+    @property
+    def predict_proba(self) -> Callable[[Any], np.ndarray]:
+        """
+        Class probabilities, only defined for models that provide them.
+
+        Raising AttributeError keeps hasattr(model, 'predict_proba') as
+        for the original model.
+        """
+        if self.link == 'none':
+            raise AttributeError(f"{self.model_type} has no predict_proba")
+        return self._predict_proba
+
+    def _predict_proba(self, X: Any) -> np.ndarray:
+        """
+        Compute the class probabilities.
+
+        Args:
+            X: Feature matrix
+
+        Returns:
+            Matrix of shape (n_rows, n_classes)
+        """
+        if self.kind == 'tree':
+            return self._tree_proba(self._check(X))
+
+        scores = self._check(X) @ self._coef_t + self.intercept
+        if self.link == 'softmax':
+            scores = scores - scores.max(axis=1, keepdims=True)
+            np.exp(scores, out=scores)
+            return scores / scores.sum(axis=1, keepdims=True)
+
+        proba = 1.0 / (1.0 + np.exp(-scores))
+        if proba.shape[1] == 1:
+            return np.hstack([1.0 - proba, proba])
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def predict(self, X: Any) -> np.ndarray:
+        """
+        Predict the class of each row.
+
+        Args:
+            X: Feature matrix
+
+        Returns:
+            Array of class labels
+        """
+        if self.kind == 'tree':
+            return self.classes_[self._predict_proba(X).argmax(axis=1)]
+
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            return self.classes_[(scores > 0).astype(np.intp)]
+        return self.classes_[scores.argmax(axis=1)]
@@ -0,0 +1,222 @@
+"""
+Hot-reloading model registry for ModCon.
+
+This module watches a model file and loads new versions in a background
+thread, so a retrained model can be deployed by replacing the file while
+the maintainer keeps running. Pickled models are loaded with joblib's
+mmap_mode, which maps large arrays from the file instead of copying them,
+and .npz exports are loaded as NumPy kernels. New versions are checked
+against a reference batch before they replace the current model. The
+monitoring loop only reads an attribute to get the current model.
+"""
+
+import os
+import threading
+import time
+from typing import Any, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.ml.kernel import NumpyClassifier
+
+logger = get_logger(__name__)
+
+
+class ModelVersion(NamedTuple):
+    """
+    A loaded model and the file state it was loaded from.
+    """
+    model: Any
+    version: int
+    mtime_ns: int
+    size: int
+    loaded_at: float
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """Get the (mtime_ns, size) of a file, None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_model(path: str, mmap_mode: Optional[str] = 'r') -> Any:
+    """
+    Load a model file.
+
+    Models exported to .npz are loaded as NumpyClassifier, without
+    importing joblib or scikit-learn; other files are unpickled by joblib.
+
+    Args:
+        path: Path to the model file
+        mmap_mode: joblib memory-mapping mode for the model's arrays, None to
+            load them in memory (compressed files are always loaded in memory)
+
+    Returns:
+        Loaded model object
+    """
+    if path.endswith('.npz'):
+        return NumpyClassifier.load(path)
+
+    from joblib import load
+    return load(path, mmap_mode=mmap_mode)
+
+
+def validate_model(model: Any, reference: Optional[np.ndarray], current: Any = None) -> None:
+    """
+    Check that a model can replace the current one.
+
+    Args:
+        model: Candidate model
+        reference: Feature matrix the candidate must score, None to only
+            check the interface
+        current: Model in use, whose feature count the candidate must match
+
+    Raises:
+        ValueError: If the model can't score the maintainer's features
+    """
+    if not hasattr(model, 'predict'):
+        raise ValueError(f"{type(model).__name__} has no predict method")
+
+    n_features = getattr(model, 'n_features_in_', None)
+    expected = getattr(current, 'n_features_in_', None)
+    if reference is not None:
+        expected = reference.shape[1]
+    if n_features is not None and expected is not None and n_features != expected:
+        raise ValueError(f"Model expects {n_features} features, not {expected}")
+
+    if reference is None:
+        return
+
+    predictions = np.asarray(model.predict(reference))
+    if predictions.shape[0] != reference.shape[0]:
+        raise ValueError(f"Model returned {predictions.shape[0]} predictions for {reference.shape[0]} rows")
+
+    if hasattr(model, 'predict_proba'):
+        probabilities = np.asarray(model.predict_proba(reference))
+        if not np.isfinite(probabilities).all():
+            raise ValueError("Model returned non-finite probabilities on the reference batch")
+
+
+class ModelRegistry:
+    """
+    Current version of a model file, reloaded in the background when it changes.
+
+    The model attribute always holds a complete, validated model; a new
+    version replaces it with a single assignment, so a monitoring cycle
+    that reads it once uses one version throughout. Deploy new versions by
+    renaming a complete file over the old one: a file rewritten in place
+    is still picked up once its writes settle, but it would change the
+    arrays of a memory-mapped current version under it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        poll_interval: float = 5.0,
+        mmap_mode: Optional[str] = 'r',
+        reference: Optional[np.ndarray] = None
+    ):
+        """
+        Load the current version and start watching the file.
+
+        Args:
+            path: Path to the model file
+            poll_interval: Seconds between checks of the file, 0 to never reload
+            mmap_mode: joblib memory-mapping mode for the model's arrays
+            reference: Feature matrix new versions must score, see set_reference
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self.mmap_mode = mmap_mode
+        self.reference = reference
+        self.current: Optional[ModelVersion] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._stop = threading.Event()
+
+        self.check()
+
+        self._thread = None
+        if poll_interval > 0:
+            self._thread = threading.Thread(target=self._watch_loop, daemon=True)
+            self._thread.start()
+
+    def __enter__(self):
+        """
+        Context manager entry point.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Context manager exit point.
+        """
+        self.close()
+
+    @property
+    def model(self) -> Any:
+        """Current model, None until a valid version has been loaded."""
+        current = self.current
+        return current.model if current is not None else None
+
+    @property
+    def version(self) -> int:
+        """Number of versions loaded so far, 0 if none."""
+        current = self.current
+        return current.version if current is not None else 0
+
+    def set_reference(self, features: np.ndarray) -> None:
+        """
+        Set the feature matrix new versions are validated against.
+
+        Args:
+            features: Complete feature rows, e.g. a window of live snapshots
+        """
+        self.reference = np.array(features, dtype=np.float64)
+
+    def check(self) -> bool:
+        """
+        Load the file if it changed since the last attempt.
+
+        Returns:
+            Whether a new version replaced the current model
+        """
+        signature = _file_signature(self.path)
+        if signature is None or signature == self._signature:
+            return False
+
+        self._signature = signature
+        start = time.monotonic()
+        try:
+            model = load_model(self.path, self.mmap_mode)
+            validate_model(model, self.reference, self.model)
+        except Exception as e:
+            logger.error(f"Rejected model {self.path}: {e}")
+            return False
+
+        # Skip versions still being written, they are retried once complete
+        if _file_signature(self.path) != signature:
+            self._signature = None
+            return False
+
+        self.current = ModelVersion(model, self.version + 1, signature[0], signature[1], time.time())
+        logger.info(f"Loaded model version {self.version} from {self.path} in {time.monotonic() - start:.2f}s")
+        return True
+
+    def _watch_loop(self) -> None:
+        """Check the file every poll_interval seconds until closed."""
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception(f"Error checking model file {self.path}: {e}")
+
+    def close(self) -> None:
+        """Stop watching the file."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
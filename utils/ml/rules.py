@@ -0,0 +1,341 @@
+"""
+Limit-check rule engine for ModCon.
+
+This module compiles the MIN/MAX limits of the register map, and rules
+written in the configuration such as "CURRENT > 0.9 * RATED_CURRENT" held
+for 10 seconds, into arrays evaluated with a few NumPy operations per
+acquisition cycle, whatever the number of rules and drives. Each rule of
+each drive keeps its state (since when it is violated, whether it is
+raised), so rules can require a duration before raising and clear with
+hysteresis.
+"""
+
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.database.schema import ChannelScaling, RegisterSchema
+from utils.ml.state import DeviceStates, device_runs
+
+logger = get_logger(__name__)
+
+# Comparison operators of the rules, with the side of the threshold that violates them
+RULE_OPERATORS = {'>': 1.0, '>=': 1.0, '<': -1.0, '<=': -1.0}
+SEVERITIES = ('info', 'warning', 'critical')
+
+_CONDITION = re.compile(r'^\s*(\w+)\s*(>=|<=|>|<)\s*(.+?)\s*$')
+_THRESHOLD = re.compile(r'^(?:([-+]?[\d.]+(?:[eE][-+]?\d+)?)\s*[*x×]\s*)?([A-Za-z_]\w*)$')
+
+
+class LimitRule(NamedTuple):
+    """
+    A condition on one channel, raised once it has held for duration seconds.
+
+    The threshold is threshold_factor times the threshold_channel value of
+    the same snapshot when a channel is given, threshold itself otherwise.
+    A raised rule clears once the value is back past the threshold by
+    hysteresis.
+    """
+    name: str
+    channel: str
+    operator: str
+    threshold: float
+    threshold_channel: Optional[str] = None
+    threshold_factor: float = 1.0
+    duration: float = 0.0
+    hysteresis: float = 0.0
+    severity: str = 'warning'
+
+
+class RuleEvent(NamedTuple):
+    """
+    A rule of one device raised or cleared.
+    """
+    device: int
+    timestamp: float
+    rule: str
+    channel: str
+    state: str
+    value: float
+    threshold: float
+    severity: str
+
+
+def parse_rule(spec: Dict[str, Any], constants: Optional[Dict[str, float]] = None) -> LimitRule:
+    """
+    Parse a rule from its configuration.
+
+    The condition compares a channel with a number, a constant or another
+    channel, optionally multiplied by a factor, e.g. "CURRENT > 12.5",
+    "CURRENT > 0.9 * RATED_CURRENT" with RATED_CURRENT in constants, or
+    "ACTUAL_PWR > 0.95 * RATED_PWR" with RATED_PWR a register.
+
+    Args:
+        spec: Dictionary with 'condition' and optionally 'name', 'duration'
+            (seconds), 'hysteresis' (channel units) and 'severity'
+        constants: Named values usable in conditions, e.g. nameplate ratings
+
+    Returns:
+        Parsed rule
+
+    Raises:
+        ValueError: If the condition or severity is invalid
+    """
+    condition = spec.get('condition', '')
+    match = _CONDITION.match(condition)
+    if match is None:
+        raise ValueError(f"Invalid rule condition: {condition!r}")
+    channel, operator, rhs = match.groups()
+
+    threshold_channel = None
+    factor = 1.0
+    try:
+        threshold = float(rhs)
+    except ValueError:
+        threshold_match = _THRESHOLD.match(rhs)
+        if threshold_match is None:
+            raise ValueError(f"Invalid rule threshold: {rhs!r}")
+        factor = float(threshold_match.group(1) or 1.0)
+        name = threshold_match.group(2)
+        if constants and name in constants:
+            threshold, factor = factor * float(constants[name]), 1.0
+        else:
+            threshold, threshold_channel = 0.0, name
+
+    severity = spec.get('severity', 'warning')
+    if severity not in SEVERITIES:
+        raise ValueError(f"Unknown rule severity {severity}, expected one of {', '.join(SEVERITIES)}")
+
+    return LimitRule(
+        name=spec.get('name') or condition,
+        channel=channel,
+        operator=operator,
+        threshold=threshold,
+        threshold_channel=threshold_channel,
+        threshold_factor=factor,
+        duration=float(spec.get('duration', 0.0)),
+        hysteresis=float(spec.get('hysteresis', 0.0)),
+        severity=severity
+    )
+
+
+def limit_rules(schema: RegisterSchema, exclude: Sequence[str] = (), severity: str = 'warning') -> List[LimitRule]:
+    """
+    Build rules from the MIN/MAX limits of the register map.
+
+    Registers without numeric limits (None, booleans) are skipped.
+
+    Args:
+        schema: Register schema
+        exclude: Register names to skip
+        severity: Severity of the limit rules
+
+    Returns:
+        One NAME_max and one NAME_min rule per register with limits
+    """
+    rules = []
+    for name in schema.register_names:
+        if name in exclude:
+            continue
+        register = schema.registers[schema.columns.index(name)]
+        minimum, maximum = register.minimum, register.maximum
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (minimum, maximum)):
+            continue
+        if minimum >= maximum:
+            continue
+
+        rules.append(LimitRule(f"{name}_max", name, '>', float(maximum), severity=severity))
+        rules.append(LimitRule(f"{name}_min", name, '<', float(minimum), severity=severity))
+    return rules
+
+
+class RuleEngine:
+    """
+    Compiled rules evaluated over all devices at once.
+
+    Rules are held as arrays (channel, operator sign, threshold, duration,
+    hysteresis) and evaluated as one (devices, rules) mask per cycle. State
+    is kept in (devices, rules) arrays: the time each rule started being
+    violated and whether it is raised. Unread values leave a rule's state
+    unchanged.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[LimitRule],
+        channels: Sequence[str],
+        scaling: Optional[ChannelScaling] = None
+    ):
+        """
+        Compile the rules.
+
+        Args:
+            rules: Rules to evaluate
+            channels: Names of the channels, in sample order
+            scaling: Conversion of the rows passed to update to the channels,
+                None if rows hold exactly the channels in engineering units
+        """
+        self.rules = list(rules)
+        self.channels = list(channels)
+        n = len(self.channels)
+
+        referenced = {rule.channel for rule in self.rules}
+        referenced |= {rule.threshold_channel for rule in self.rules if rule.threshold_channel}
+        unknown = sorted(referenced - set(self.channels))
+        if unknown:
+            raise ValueError(f"Rules refer to unknown channels: {unknown}")
+        bad = [rule.name for rule in self.rules if rule.operator not in RULE_OPERATORS]
+        if bad:
+            raise ValueError(f"Rules with unknown operators: {bad}")
+
+        # Only the channels some rule reads are converted each cycle
+        used = sorted({self.channels.index(rule.channel) for rule in self.rules}
+                      | {self.channels.index(rule.threshold_channel) for rule in self.rules if rule.threshold_channel})
+        position = {c: i for i, c in enumerate(used)}
+        self.scaling = (scaling or ChannelScaling.identity(n)).subset(used)
+
+        self.channel = np.array([position[self.channels.index(rule.channel)] for rule in self.rules], dtype=np.intp)
+        self.reference = np.array([
+            position[self.channels.index(rule.threshold_channel)] if rule.threshold_channel else -1
+            for rule in self.rules
+        ], dtype=np.intp)
+        self.sign = np.array([RULE_OPERATORS[rule.operator] for rule in self.rules])
+        self.inclusive = np.array([rule.operator in ('>=', '<=') for rule in self.rules])
+        self.threshold = np.array([rule.threshold for rule in self.rules], dtype=np.float64)
+        self.factor = np.array([rule.threshold_factor for rule in self.rules], dtype=np.float64)
+        self.duration = np.array([rule.duration for rule in self.rules], dtype=np.float64)
+        self.hysteresis = np.array([rule.hysteresis for rule in self.rules], dtype=np.float64)
+        self._has_reference = bool((self.reference >= 0).any())
+
+        self.state = DeviceStates(len(self.rules), since=np.nan, raised=False)
+
+    @classmethod
+    def from_schema(
+        cls,
+        schema: RegisterSchema,
+        rules: Sequence[Union[LimitRule, Dict[str, Any]]] = (),
+        limits: bool = True,
+        exclude: Sequence[str] = (),
+        constants: Optional[Dict[str, float]] = None
+    ) -> 'RuleEngine':
+        """
+        Build an engine reading raw feature rows in the register map layout.
+
+        Values are converted to engineering units before being compared.
+
+        Args:
+            schema: Register schema
+            rules: Additional rules, as LimitRule or configuration dictionaries
+            limits: Whether to check the MIN/MAX limits of the register map
+            exclude: Register names whose MIN/MAX limits are not checked
+            constants: Named values usable in rule conditions
+
+        Returns:
+            Engine whose update takes full raw feature rows
+        """
+        compiled = limit_rules(schema, exclude) if limits else []
+        compiled += [rule if isinstance(rule, LimitRule) else parse_rule(rule, constants) for rule in rules]
+
+        names = schema.register_names
+        return cls(compiled, names, schema.channel_scaling(names))
+
+    def reset(self, device: Optional[int] = None) -> None:
+        """
+        Clear the rule states of a device.
+
+        Args:
+            device: Device ID, None for every device
+        """
+        self.state.reset(device)
+
+    def active(self, device: int) -> List[str]:
+        """
+        Get the names of the raised rules of a device.
+
+        Args:
+            device: Device ID
+
+        Returns:
+            Rule names, in rule order
+        """
+        row = self.state.row(device)
+        if row is None:
+            return []
+        return [self.rules[i].name for i in np.flatnonzero(self.state.raised[row])]
+
+    def update(self, devices: Sequence[int], timestamps: Sequence[float], values: np.ndarray) -> List[RuleEvent]:
+        """
+        Evaluate every rule on one acquisition cycle of several devices.
+
+        Args:
+            devices: Device ID of each row, each device at most once
+            timestamps: Timestamp of each row
+            values: Raw sample matrix, NaN for unread registers; rows hold
+                the channels in order, or full feature rows for an engine
+                built with from_schema
+
+        Returns:
+            Rules raised or cleared in the cycle
+        """
+        devices = np.atleast_1d(np.asarray(devices))
+        state = self.state
+        rows = state.rows(devices.tolist())
+        ts = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), (devices.shape[0],))[:, np.newaxis]
+
+        x = self.scaling.convert(np.atleast_2d(np.asarray(values, dtype=np.float64)))
+        value = x[:, self.channel]
+        threshold = self.threshold
+        if self._has_reference:
+            threshold = np.where(self.reference >= 0, self.factor * x[:, self.reference], self.threshold)
+        threshold = np.broadcast_to(threshold, value.shape)
+
+        # Positive margin: past the threshold on the violating side
+        margin = self.sign * (value - threshold)
+        valid = ~np.isnan(margin)
+        violated = valid & ((margin > 0) | (self.inclusive & (margin == 0)))
+        recovered = valid & ~violated & (margin <= -self.hysteresis)
+
+        since = state.since[rows]
+        raised = state.raised[rows]
+        since = np.where(violated, np.where(np.isnan(since), ts, since), np.where(valid, np.nan, since))
+
+        raise_now = ~raised & violated & (ts - since >= self.duration)
+        clear_now = raised & recovered
+        state.since[rows] = since
+        state.raised[rows] = (raised | raise_now) & ~clear_now
+
+        if not (raise_now.any() or clear_now.any()):
+            return []
+
+        events = []
+        for kind, mask in (('raised', raise_now), ('cleared', clear_now)):
+            for i, r in zip(*np.nonzero(mask)):
+                rule = self.rules[r]
+                events.append(RuleEvent(
+                    int(devices[i]), float(ts[i, 0]), rule.name, rule.channel, kind,
+                    float(value[i, r]), float(threshold[i, r]), rule.severity
+                ))
+        return events
+
+    def update_many(self, devices: np.ndarray, timestamps: np.ndarray, values: np.ndarray) -> List[RuleEvent]:
+        """
+        Evaluate samples in time order, several per device allowed.
+
+        Rows are split into runs holding each device at most once, each
+        evaluated as one cycle.
+
+        Args:
+            devices: Device ID of each row
+            timestamps: Timestamp of each row
+            values: Raw sample matrix, NaN for unread registers
+
+        Returns:
+            Rules raised or cleared over all rows
+        """
+        devices = np.broadcast_to(devices, (values.shape[0],))
+        events = []
+        for run in device_runs(devices):
+            events.extend(self.update(devices[run], timestamps[run], values[run]))
+        return events
@@ -0,0 +1,129 @@
+"""
+Per-device state arrays for ModCon.
+
+This module holds the state the streaming stages (anomaly detection,
+rule evaluation) keep for every drive as NumPy arrays with one row per
+device, allocating rows as new devices appear, and splits blocks of
+samples into cycles holding each device at most once.
+"""
+
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+
+class DeviceStates:
+    """
+    Named state arrays of shape (devices, width), one row per device.
+
+    Each array is created with its initial value, which also sets its
+    dtype (e.g. 0.0, 0, np.nan or False). Arrays are available as
+    attributes and are replaced when they grow, so they must be looked up
+    again after rows are allocated.
+    """
+
+    def __init__(self, width: int, **initial: Any):
+        """
+        Initialize empty state arrays.
+
+        Args:
+            width: Number of columns of every array
+            **initial: Initial value of each array, by array name
+        """
+        self.width = width
+        self.initial = initial
+        self._rows: Dict[int, int] = {}
+
+        for name, value in initial.items():
+            setattr(self, name, np.full((0, width), value))
+
+    def __len__(self) -> int:
+        """Number of devices holding a row."""
+        return len(self._rows)
+
+    def row(self, device: int) -> Optional[int]:
+        """
+        Get the row of a device.
+
+        Args:
+            device: Device ID
+
+        Returns:
+            Row index, or None if the device has no state yet
+        """
+        return self._rows.get(device)
+
+    def rows(self, devices: Sequence[int]) -> np.ndarray:
+        """
+        Get the rows of devices, allocating rows for new ones.
+
+        Args:
+            devices: Device IDs
+
+        Returns:
+            Array of row indices
+        """
+        rows = []
+        for device in devices:
+            row = self._rows.get(device)
+            if row is None:
+                row = self._rows[device] = len(self._rows)
+            rows.append(row)
+
+        capacity = self._capacity()
+        if len(self._rows) > capacity:
+            # Grow geometrically so adding devices one by one stays cheap
+            grow = max(len(self._rows), 2 * capacity) - capacity
+            for name, value in self.initial.items():
+                array = getattr(self, name)
+                pad = np.full((grow, self.width), value, dtype=array.dtype)
+                setattr(self, name, np.vstack([array, pad]))
+
+        return np.array(rows, dtype=np.int64)
+
+    def _capacity(self) -> int:
+        """Number of allocated rows."""
+        if not self.initial:
+            return len(self._rows)
+        return getattr(self, next(iter(self.initial))).shape[0]
+
+    def reset(self, device: Optional[int] = None) -> None:
+        """
+        Restore the initial values of a device's state.
+
+        Args:
+            device: Device ID, None for every device
+        """
+        if device is None:
+            target = slice(None)
+        elif device in self._rows:
+            target = self._rows[device]
+        else:
+            return
+
+        for name, value in self.initial.items():
+            getattr(self, name)[target] = value
+
+
+def device_runs(devices: np.ndarray) -> Iterator[slice]:
+    """
+    Split a block of samples into runs holding each device at most once.
+
+    Args:
+        devices: Device ID of each sample, in time order
+
+    Yields:
+        Slices of consecutive samples, in order
+    """
+    start = 0
+    seen = set()
+
+    for i, device in enumerate(devices.tolist()):
+        if device in seen:
+            yield slice(start, i)
+            start = i
+            seen.clear()
+        seen.add(device)
+
+    if start < devices.shape[0]:
+        yield slice(start, devices.shape[0])
@@ -0,0 +1,572 @@
+"""
+Model training from the stored history for ModCon.
+
+This module builds labeled datasets straight from the history (the
+history table of the main database or the partitioned history files) in
+streaming chunks, trains classifiers on them and writes versioned model
+artifacts with their metrics. Models supporting partial_fit are trained
+chunk by chunk over several epochs; the others are fitted on a uniform
+reservoir sample of bounded size, so memory use never depends on the
+length of the history. Cross-validation folds are blocks of device time,
+trained and evaluated in parallel processes.
+
+Snapshots are labeled by the motor's output frequency, nearest to the
+0/7/10/13 Hz levels of the captures the original model was trained on.
+"""
+
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+from utils.config import config
+from utils.database.export import history_paths, iter_history_batches
+from utils.database.operations import history_table_name
+from utils.database.schema import RegisterSchema, get_schema
+from utils.ml.features import DEFAULT_CHANNELS, DEFAULT_WINDOWS, RollingFeatureEngine
+from utils.ml.kernel import export_model
+
+logger = get_logger(__name__)
+
+# Register and levels (in Hz) labeling snapshots, class i being levels[i]
+LABEL_REGISTER = 'FREQ_OUTPUT'
+FREQUENCY_LEVELS = (0.0, 7.0, 10.0, 13.0)
+
+# Models the pipeline can train, and those trained chunk by chunk
+MODEL_TYPES = ('logistic', 'sgd', 'naive_bayes', 'forest')
+PARTIAL_FIT_MODELS = ('sgd', 'naive_bayes')
+
+
+class TrainingSpec(NamedTuple):
+    """
+    Everything defining a training run, recorded with its artifacts.
+    """
+    model: str = 'sgd'
+    source: str = 'database'
+    db_path: Optional[str] = None
+    table_name: Optional[str] = None
+    history_dir: Optional[str] = None
+    values: Optional[str] = None
+    device: Optional[int] = None
+    t0: Optional[float] = None
+    t1: Optional[float] = None
+    label_register: str = LABEL_REGISTER
+    levels: Tuple[float, ...] = FREQUENCY_LEVELS
+    tolerance: float = 1.0
+    rolling_features: bool = False
+    feature_channels: Tuple[str, ...] = DEFAULT_CHANNELS
+    feature_windows: Tuple[int, ...] = DEFAULT_WINDOWS
+    folds: int = 5
+    fold_block: float = 3600.0
+    epochs: int = 5
+    max_rows: int = 200000
+    batch_rows: int = 65536
+    seed: int = 0
+
+
+class FrequencyLabeler:
+    """
+    Labels snapshots by the level nearest to a frequency register.
+    """
+
+    def __init__(
+        self,
+        schema: RegisterSchema,
+        register: str = LABEL_REGISTER,
+        levels: Sequence[float] = FREQUENCY_LEVELS,
+        tolerance: float = 1.0
+    ):
+        """
+        Initialize the labeler.
+
+        Args:
+            schema: Register schema giving the feature layout
+            register: Register name holding the frequency
+            levels: Frequency of each class, in engineering units
+            tolerance: Largest distance to a level for a snapshot to be labeled
+        """
+        if register not in schema.register_names:
+            raise ValueError(f"Unknown label register: {register}")
+
+        self.scaling = schema.channel_scaling([register])
+        self.levels = np.asarray(levels, dtype=np.float64)
+        self.tolerance = tolerance
+
+    @property
+    def classes(self) -> np.ndarray:
+        """Labels of the classes."""
+        return np.arange(len(self.levels))
+
+    def __call__(self, raw: np.ndarray) -> np.ndarray:
+        """
+        Label a matrix of raw feature rows.
+
+        Args:
+            raw: Raw feature matrix in the register map layout
+
+        Returns:
+            Class of each row, -1 for rows too far from every level or unread
+        """
+        value = self.scaling.convert(raw)[:, 0]
+        distance = np.abs(value[:, np.newaxis] - self.levels)
+
+        labels = np.full(raw.shape[0], -1, dtype=np.int64)
+        known = ~np.isnan(value)
+        nearest = distance[known].argmin(axis=1)
+        close = distance[known, nearest] <= self.tolerance
+        labels[np.flatnonzero(known)[close]] = nearest[close]
+        return labels
+
+
+def assign_folds(devices: np.ndarray, timestamps: np.ndarray, folds: int, block: float) -> np.ndarray:
+    """
+    Assign rows to cross-validation folds by blocks of device time.
+
+    Neighbouring snapshots are nearly identical, so rows are grouped in
+    blocks of one device's time before being spread over the folds;
+    splitting rows individually would leak them between folds.
+
+    Args:
+        devices: Device ID of each row
+        timestamps: Timestamp of each row
+        folds: Number of folds
+        block: Length of the blocks in seconds
+
+    Returns:
+        Fold of each row
+    """
+    blocks = np.floor(timestamps / block).astype(np.int64)
+    return ((blocks * 2654435761 + devices.astype(np.int64) * 40503) % 2 ** 31) % folds
+
+
+def iter_feature_batches(spec: TrainingSpec) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Stream the raw feature rows of the history.
+
+    Args:
+        spec: Training run definition
+
+    Yields:
+        Tuples of (device IDs, timestamps, raw feature matrix with NaN for
+        unread registers), ordered by device then time within each file
+    """
+    schema = get_schema(spec.values)
+    columns = [schema.raw_expression(name) for name in schema.register_names]
+    history_table = history_table_name(spec.table_name)
+    paths = history_paths(spec.source, schema, spec.table_name, spec.db_path, spec.history_dir, spec.t0, spec.t1)
+
+    for path in paths:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            for data in iter_history_batches(conn, history_table, columns, spec.device, spec.t0, spec.t1,
+                                             spec.batch_rows):
+                yield data[:, 0].astype(np.int64), data[:, 1], data[:, 2:]
+        finally:
+            conn.close()
+
+
+def iter_labeled_batches(spec: TrainingSpec) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Stream the labeled training rows of the history.
+
+    Rows with unread registers, incomplete rolling windows or no label are
+    left out.
+
+    Args:
+        spec: Training run definition
+
+    Yields:
+        Tuples of (feature matrix, labels, folds)
+    """
+    schema = get_schema(spec.values)
+    labeler = FrequencyLabeler(schema, spec.label_register, spec.levels, spec.tolerance)
+    engine = None
+    if spec.rolling_features:
+        engine = RollingFeatureEngine.from_schema(schema, spec.feature_channels, spec.feature_windows)
+
+    for devices, timestamps, raw in iter_feature_batches(spec):
+        X = raw
+        if engine is not None:
+            X = np.hstack([raw, engine.update_many(devices, timestamps, raw)])
+
+        labels = labeler(raw)
+        keep = (labels >= 0) & ~np.isnan(X).any(axis=1)
+        if keep.any():
+            folds = assign_folds(devices[keep], timestamps[keep], max(spec.folds, 1), spec.fold_block)
+            yield X[keep], labels[keep], folds
+
+
+def feature_names(spec: TrainingSpec) -> List[str]:
+    """
+    Get the names of the features a run trains on.
+
+    Args:
+        spec: Training run definition
+
+    Returns:
+        Register names, followed by the rolling feature names if enabled
+    """
+    schema = get_schema(spec.values)
+    names = list(schema.register_names)
+    if spec.rolling_features:
+        names += RollingFeatureEngine(spec.feature_channels, spec.feature_windows).feature_names
+    return names
+
+
+def make_model(name: str, seed: int = 0) -> Any:
+    """
+    Create an untrained model.
+
+    Args:
+        name: Model type, one of MODEL_TYPES
+        seed: Random seed
+
+    Returns:
+        scikit-learn classifier
+    """
+    if name == 'logistic':
+        from sklearn.linear_model import LogisticRegression
+        return LogisticRegression(max_iter=1000, random_state=seed)
+    if name == 'sgd':
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(loss='log_loss', alpha=1e-4, random_state=seed)
+    if name == 'naive_bayes':
+        from sklearn.naive_bayes import GaussianNB
+        return GaussianNB()
+    if name == 'forest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_estimators=100, max_depth=12, n_jobs=1, random_state=seed)
+    raise ValueError(f"Unknown model type {name}, expected one of {', '.join(MODEL_TYPES)}")
+
+
+def _fold_scaler(model: Any, mean: np.ndarray, scale: np.ndarray) -> None:
+    """Rewrite a linear model fitted on standardized features to take raw features."""
+    coef = model.coef_ / scale
+    model.intercept_ = model.intercept_ - coef @ mean
+    model.coef_ = coef
+
+
+def _training_rows(
+    spec: TrainingSpec,
+    holdout: Optional[int]
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Stream the labeled rows outside the held-out fold."""
+    for X, y, folds in iter_labeled_batches(spec):
+        if holdout is not None:
+            train = folds != holdout
+            X, y = X[train], y[train]
+        if X.shape[0]:
+            yield X, y
+
+
+def fit_model(spec: TrainingSpec, holdout: Optional[int] = None) -> Tuple[Any, int]:
+    """
+    Train a model on the history, chunk by chunk or on a bounded sample.
+
+    Args:
+        spec: Training run definition
+        holdout: Fold left out of training, None to train on every row
+
+    Returns:
+        Tuple of (trained model, number of training rows seen)
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.default_rng(spec.seed)
+    model = make_model(spec.model, spec.seed)
+    classes = np.arange(len(spec.levels))
+    rows = 0
+
+    if spec.model in PARTIAL_FIT_MODELS:
+        # Gradient descent needs standardized features: a first pass
+        # computes the statistics, folded into the model at the end
+        scaler = None
+        if spec.model == 'sgd':
+            scaler = StandardScaler()
+            for X, _ in _training_rows(spec, holdout):
+                scaler.partial_fit(X)
+
+        for epoch in range(spec.epochs if spec.model == 'sgd' else 1):
+            for X, y in _training_rows(spec, holdout):
+                order = rng.permutation(X.shape[0])
+                X, y = X[order], y[order]
+                model.partial_fit(scaler.transform(X) if scaler is not None else X, y, classes=classes)
+                rows += X.shape[0] if epoch == 0 else 0
+
+        if rows and scaler is not None:
+            _fold_scaler(model, scaler.mean_, scaler.scale_)
+        return model, rows
+
+    # Reservoir sample of at most max_rows rows, uniform over the stream
+    sample_X: Optional[np.ndarray] = None
+    sample_y = np.empty(spec.max_rows, dtype=np.int64)
+    for X, y in _training_rows(spec, holdout):
+        if sample_X is None:
+            sample_X = np.empty((spec.max_rows, X.shape[1]))
+
+        fill = min(max(spec.max_rows - rows, 0), X.shape[0])
+        sample_X[rows:rows + fill] = X[:fill]
+        sample_y[rows:rows + fill] = y[:fill]
+
+        if fill < X.shape[0]:
+            slots = rng.integers(0, rows + np.arange(fill, X.shape[0]) + 1)
+            replace = slots < spec.max_rows
+            sample_X[slots[replace]] = X[fill:][replace]
+            sample_y[slots[replace]] = y[fill:][replace]
+        rows += X.shape[0]
+
+    if not rows:
+        return model, 0
+
+    n = min(rows, spec.max_rows)
+    model.fit(sample_X[:n], sample_y[:n])
+    return model, rows
+
+
+def confusion_matrix(spec: TrainingSpec, model: Any, fold: Optional[int] = None) -> np.ndarray:
+    """
+    Score a model on the history, streaming.
+
+    Args:
+        spec: Training run definition
+        model: Trained model
+        fold: Fold to score, None for every row
+
+    Returns:
+        Confusion matrix with true classes as rows and predictions as columns
+    """
+    n = len(spec.levels)
+    matrix = np.zeros((n, n), dtype=np.int64)
+
+    for X, y, folds in iter_labeled_batches(spec):
+        if fold is not None:
+            X, y = X[folds == fold], y[folds == fold]
+        if X.shape[0]:
+            predictions = np.asarray(model.predict(X), dtype=np.int64)
+            np.add.at(matrix, (y, predictions), 1)
+
+    return matrix
+
+
+def classification_metrics(matrix: np.ndarray) -> Dict[str, Any]:
+    """
+    Compute classification metrics from a confusion matrix.
+
+    Args:
+        matrix: Confusion matrix with true classes as rows
+
+    Returns:
+        Dictionary with the row count, accuracy, macro F1 and per-class
+        precision, recall, F1 and support
+    """
+    total = int(matrix.sum())
+    correct = np.diag(matrix).astype(np.float64)
+    predicted = matrix.sum(axis=0)
+    support = matrix.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, correct / predicted, 0.0)
+        recall = np.where(support > 0, correct / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    present = support > 0
+    return {
+        'rows': total,
+        'accuracy': float(correct.sum() / total) if total else 0.0,
+        'macro_f1': float(f1[present].mean()) if present.any() else 0.0,
+        'classes': {
+            str(i): {
+                'precision': float(precision[i]),
+                'recall': float(recall[i]),
+                'f1': float(f1[i]),
+                'support': int(support[i])
+            }
+            for i in range(matrix.shape[0])
+        },
+        'confusion_matrix': matrix.tolist()
+    }
+
+
+def _cross_validate_fold(spec: TrainingSpec, fold: int) -> Dict[str, Any]:
+    """Train without one fold and score on it. Runs in a worker process."""
+    start = time.monotonic()
+    model, rows = fit_model(spec, holdout=fold)
+    if not rows:
+        return {'fold': fold, 'train_rows': 0, **classification_metrics(np.zeros((len(spec.levels),) * 2, int))}
+
+    metrics = classification_metrics(confusion_matrix(spec, model, fold))
+    logger.info(f"Fold {fold}: accuracy {metrics['accuracy']:.4f} on {metrics['rows']} rows "
+                f"in {time.monotonic() - start:.1f}s")
+    return {'fold': fold, 'train_rows': rows, **metrics}
+
+
+def cross_validate(spec: TrainingSpec, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Cross-validate a model over blocks of device time, one process per fold.
+
+    Args:
+        spec: Training run definition
+        workers: Number of processes, None for one per CPU
+
+    Returns:
+        Dictionary with the mean and standard deviation of the accuracy and
+        macro F1, and the metrics of every fold
+    """
+    workers = min(workers or os.cpu_count() or 1, spec.folds)
+    if workers == 1:
+        results = [_cross_validate_fold(spec, fold) for fold in range(spec.folds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_cross_validate_fold, [spec] * spec.folds, range(spec.folds)))
+
+    scored = [result for result in results if result['rows']]
+    accuracy = np.array([result['accuracy'] for result in scored])
+    macro_f1 = np.array([result['macro_f1'] for result in scored])
+    return {
+        'folds': spec.folds,
+        'accuracy_mean': float(accuracy.mean()) if scored else None,
+        'accuracy_std': float(accuracy.std()) if scored else None,
+        'macro_f1_mean': float(macro_f1.mean()) if scored else None,
+        'per_fold': results
+    }
+
+
+def next_version_dir(output_dir: str, name: str) -> Path:
+    """
+    Create the directory of the next version of a model.
+
+    Args:
+        output_dir: Directory holding the model versions
+        name: Model name
+
+    Returns:
+        Path of the new, empty version directory (e.g. models/sgd/v0003)
+    """
+    root = Path(output_dir) / name
+    root.mkdir(parents=True, exist_ok=True)
+
+    while True:
+        versions = [int(path.name[1:]) for path in root.glob('v[0-9]*') if path.name[1:].isdigit()]
+        path = root / f"v{max(versions, default=0) + 1:04d}"
+        try:
+            path.mkdir()
+            return path
+        except FileExistsError:
+            # Another run took this version meanwhile
+            continue
+
+
+def deploy_model(path: Path, target: str) -> None:
+    """
+    Replace a deployed model file atomically, for the maintainer to reload.
+
+    Args:
+        path: Model artifact to deploy
+        target: Model path the maintainer watches
+    """
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{target}.tmp"
+    shutil.copyfile(path, tmp_path)
+    os.replace(tmp_path, target)
+    logger.info(f"Deployed {path} to {target}")
+
+
+def train(
+    spec: TrainingSpec,
+    output_dir: str = 'models',
+    name: Optional[str] = None,
+    workers: Optional[int] = None,
+    deploy: Optional[str] = None
+) -> Path:
+    """
+    Cross-validate, train on the whole history range and write a model version.
+
+    The version directory holds the pickled model (model.joblib), its NumPy
+    export when the model type supports it (model.npz), and metrics.json
+    with the training definition, the cross-validation and training
+    metrics and the library versions.
+
+    Args:
+        spec: Training run definition
+        output_dir: Directory holding the model versions
+        name: Model name, None for the model type
+        workers: Number of cross-validation processes, None for one per CPU
+        deploy: Model path to deploy the new version to, None to only write it
+
+    Returns:
+        Path of the version directory
+    """
+    import joblib
+    import sklearn
+
+    db_config = config.get('database', {})
+    spec = spec._replace(
+        db_path=spec.db_path or db_config.get('path', 'data/inverter.db'),
+        table_name=spec.table_name or db_config.get('table_name', 'sinamicv20'),
+        values=get_schema(spec.values).values
+    )
+    start = time.monotonic()
+
+    cv = None
+    if spec.folds > 1:
+        logger.info(f"Cross-validating {spec.model} over {spec.folds} folds")
+        cv = cross_validate(spec, workers)
+
+    logger.info(f"Training {spec.model} on the whole range")
+    model, rows = fit_model(spec)
+    if not rows:
+        raise ValueError("No labeled rows in the selected history range")
+    train_metrics = classification_metrics(confusion_matrix(spec, model))
+
+    version_dir = next_version_dir(output_dir, name or spec.model)
+    joblib.dump(model, version_dir / 'model.joblib')
+
+    artifacts = ['model.joblib']
+    try:
+        export_model(model, str(version_dir / 'model.npz'))
+        artifacts.append('model.npz')
+    except TypeError as e:
+        logger.warning(f"Not exporting a NumPy kernel: {e}")
+
+    metadata = {
+        'name': name or spec.model,
+        'version': version_dir.name,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'spec': spec._asdict(),
+        'features': feature_names(spec),
+        'classes': {str(i): level for i, level in enumerate(spec.levels)},
+        'train_rows': rows,
+        'train_metrics': train_metrics,
+        'cross_validation': cv,
+        'model_params': model.get_params(),
+        'artifacts': artifacts,
+        'versions': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scikit-learn': sklearn.__version__
+        },
+        'elapsed_seconds': round(time.monotonic() - start, 3)
+    }
+    with open(version_dir / 'metrics.json', 'w') as f:
+        json.dump(metadata, f, indent=2, default=str)
+
+    logger.info(f"Wrote {version_dir}: training accuracy {train_metrics['accuracy']:.4f} on {rows} rows")
+    if cv and cv['accuracy_mean'] is not None:
+        logger.info(f"Cross-validated accuracy {cv['accuracy_mean']:.4f} +/- {cv['accuracy_std']:.4f}")
+
+    if deploy:
+        artifact = 'model.npz' if deploy.endswith('.npz') else 'model.joblib'
+        if artifact not in artifacts:
+            raise ValueError(f"{spec.model} models can't be deployed as {artifact}")
+        deploy_model(version_dir / artifact, deploy)
+
+    return version_dir
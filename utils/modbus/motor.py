@@ -1154,13 +1154,8 @@ class SinamicV20:
             Dictionary of parameter values with parameter names as keys
         """
         try:
-            values_dict = {}
             raw_values = self.read_raw_all_address()
-            
-            for i, address in enumerate(self.ADDRESS_LIST):
-                if i < len(raw_values):
-                    param_name = self.address_to_param[address]['NAME']
-                    values_dict[param_name] = raw_values[i]
+            values_dict = self.convert_values_to_dict(raw_values)
                     
             logger.debug(f"Read {len(values_dict)} parameter values into dictionary")
             return values_dict
@@ -1168,3 +1163,22 @@ class SinamicV20:
         except Exception as e:
             logger.exception(f"Error converting register values to dictionary: {e}")
             return {}
+    
+    def convert_values_to_dict(self, raw_values: List[Optional[int]]) -> Dict[str, Any]:
+        """
+        Convert register values read in ADDRESS_LIST order to a dictionary.
+        
+        Args:
+            raw_values: List of register values as returned by read_raw_all_address
+            
+        Returns:
+            Dictionary of parameter values with parameter names as keys
+        """
+        values_dict = {}
+        
+        for i, address in enumerate(self.ADDRESS_LIST):
+            if i < len(raw_values):
+                param_name = self.address_to_param[address]['NAME']
+                values_dict[param_name] = raw_values[i]
+                
+        return values_dict
@@ -101,9 +101,9 @@ class RealtimePlot:
         if self.y_range:
             self.graph_widget.setYRange(self.y_range[0], self.y_range[1])
         
-        # Create the plot line
+        # Create the plot line, leaving gaps at NaN values
         pen = pg.mkPen(color=self.line_color)
-        self.data_line = self.graph_widget.plot(self.x_data, self.y_data, pen=pen)
+        self.data_line = self.graph_widget.plot(self.x_data, self.y_data, pen=pen, connect='finite')
         
         logger.info("Created plot widget")
         return self.graph_widget
@@ -153,19 +153,35 @@ class RealtimePlot:
             else:
                 new_value = randint(0, 100)
             
-            # Update data arrays
-            self.x_data = self.x_data[1:]
-            self.x_data.append(self.x_data[-1] + 1)
-            
-            self.y_data = self.y_data[1:]
-            self.y_data.append(new_value)
-            
-            # Update plot
-            self.data_line.setData(self.x_data, self.y_data)
+            self.append_value(new_value)
             
         except Exception as e:
             logger.exception(f"Error updating plot: {e}")
     
+    def append_value(self, new_value: float, redraw: bool = True) -> None:
+        """
+        Append a value to the plot, scrolling out the oldest one.
+        
+        Args:
+            new_value: Value to append
+            redraw: Whether to redraw the plot immediately
+        """
+        # Update data arrays
+        self.x_data = self.x_data[1:]
+        self.x_data.append(self.x_data[-1] + 1)
+        
+        self.y_data = self.y_data[1:]
+        self.y_data.append(new_value)
+        
+        # Update plot
+        if redraw and self.data_line is not None:
+            self.data_line.setData(self.x_data, self.y_data)
+    
+    def redraw(self) -> None:
+        """Redraw the plot with the current data."""
+        if self.data_line is not None:
+            self.data_line.setData(self.x_data, self.y_data)
+    
     def set_data(self, x_data: List[float], y_data: List[float]) -> None:
         """
         Set the plot data directly.